@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UNO连接方式基准测试：本机socket vs 命名管道
+
+在形状很多的文档上按get_odg_info的方式遍历所有形状，比较单次UNO调用的平均延迟。
+
+用法（使用LibreOffice自带的Python）:
+    python3 benchmarks/bench_connection.py --shapes 2000 --rounds 5
+    python3 benchmarks/bench_connection.py --file payroll.odg
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+import uno
+from com.sun.star.beans import PropertyValue
+from odg_office import OfficeInstance, build_accept
+from odg_pool import find_free_port
+
+# 每个形状发起的UNO调用数（getShapeType, getPosition, getSize, Name, getString）
+CALLS_PER_SHAPE = 5
+
+def open_document(desktop, file_path, shapes):
+    """打开指定文档，或生成包含指定数量文本形状的文档"""
+    properties = (PropertyValue("Hidden", 0, True, 0),)
+    if file_path:
+        url = uno.systemPathToFileUrl(os.path.abspath(file_path))
+        return desktop.loadComponentFromURL(url, "_blank", 0, properties)
+
+    document = desktop.loadComponentFromURL("private:factory/sdraw", "_blank", 0, properties)
+    page = document.getDrawPages().getByIndex(0)
+    for i in range(shapes):
+        shape = document.createInstance("com.sun.star.drawing.TextShape")
+        page.add(shape)
+        shape.setPosition(uno.createUnoStruct("com.sun.star.awt.Point", (i % 40) * 500, (i // 40) * 300))
+        shape.setSize(uno.createUnoStruct("com.sun.star.awt.Size", 450, 250))
+        shape.Name = f"shape_{i}"
+        shape.setString(f"文本 {i}")
+    return document
+
+def walk_shapes(document):
+    """按get_odg_info的方式读取所有形状的属性，返回调用次数"""
+    calls = 0
+    pages = document.getDrawPages()
+    for i in range(pages.getCount()):
+        page = pages.getByIndex(i)
+        for j in range(page.getCount()):
+            shape = page.getByIndex(j)
+            shape.getShapeType()
+            shape.getPosition()
+            shape.getSize()
+            shape.Name
+            shape.getString()
+            calls += CALLS_PER_SHAPE
+    return calls
+
+def measure(connection, args):
+    """启动指定连接方式的office并测量单次调用延迟（微秒）"""
+    profile_dir = tempfile.mkdtemp(prefix="odg-bench-profile-")
+    accept = build_accept(connection, port=find_free_port(2100), pipe_name=f"odg-bench-{os.getpid()}")
+    office = OfficeInstance(soffice_path=args.soffice, accept=accept, profile_dir=profile_dir,
+                            startup_timeout=120)
+    try:
+        desktop = office.start()
+        document = open_document(desktop, args.file, args.shapes)
+        walk_shapes(document)  # 预热
+
+        per_call = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            calls = walk_shapes(document)
+            per_call.append((time.perf_counter() - start) / calls * 1e6)
+        document.close(True)
+        return per_call, calls
+    finally:
+        office.kill()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="UNO连接方式基准测试")
+    parser.add_argument("--file", default=None, help="测试用的ODG文件（默认生成文档）")
+    parser.add_argument("--shapes", type=int, default=2000, help="生成文档的形状数量")
+    parser.add_argument("--rounds", type=int, default=5, help="测量轮数")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    args = parser.parse_args()
+
+    print(f"{'连接方式':<10}{'调用次数':>10}{'中位数(微秒/次)':>18}{'最小(微秒/次)':>16}")
+    for connection in ("socket", "pipe"):
+        per_call, calls = measure(connection, args)
+        print(f"{connection:<10}{calls:>10}{statistics.median(per_call):>18.1f}{min(per_call):>16.1f}")
+
+if __name__ == "__main__":
+    main()
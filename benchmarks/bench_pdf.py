@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF导出配置基准测试：每个导出配置的导出耗时和PDF大小
+
+同一个文档按每个配置各导出若干次，报告每次导出耗时的中位数和PDF大小。
+默认生成的文档包含一张照片尺寸的图片和若干文本形状，图片分辨率和压缩方式对耗时和大小的影响最明显；
+也可以用 --template 指定实际使用的模板。
+
+用法（使用LibreOffice自带的Python）:
+    python3 benchmarks/bench_pdf.py --runs 20
+    python3 benchmarks/bench_pdf.py --template payroll.odg --profiles fast,archive
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+import uno
+from com.sun.star.beans import PropertyValue
+from odg_office import OfficeInstance, build_accept
+from odg_pdf import filter_data, profiles
+from odg_pool import find_free_port
+from odg_writer import ODGBuilder
+
+def photo_png(width, height, seed=1):
+    """生成照片尺寸的PNG：渐变加噪声，压缩率接近照片"""
+    rng = random.Random(seed)
+    gradient = bytes((x * 255 // width) for x in range(width) for _ in range(3))
+    rows = []
+    for y in range(height):
+        noise = rng.getrandbits(width * 24).to_bytes(width * 3, "little")
+        shade = y * 64 // height
+        rows.append(b"\x00" + bytes((g + (n & 31) + shade) & 0xFF for g, n in zip(gradient, noise)))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+def build_template(desktop, context, path, image_size, shapes):
+    """生成测试文档：文本形状由odg_writer写出，图片通过UNO插入后保存"""
+    builder = ODGBuilder(title="bench")
+    page = builder.add_page("page1")
+    for i in range(shapes):
+        page.text(1000 + (i % 4) * 4800, 16000 + (i // 4) * 1000, 4600, 900, f"字段 {i}：示例文本",
+                  name=f"field_{i}", font_size=10)
+    builder.save(path)
+
+    image_path = os.path.splitext(path)[0] + ".png"
+    with open(image_path, "wb") as f:
+        f.write(photo_png(*image_size))
+
+    url = uno.systemPathToFileUrl(os.path.abspath(path))
+    document = desktop.loadComponentFromURL(url, "_blank", 0, (PropertyValue("Hidden", 0, True, 0),))
+    try:
+        provider = context.ServiceManager.createInstanceWithContext("com.sun.star.graphic.GraphicProvider", context)
+        graphic = provider.queryGraphic((PropertyValue("URL", 0, uno.systemPathToFileUrl(image_path), 0),))
+        shape = document.createInstance("com.sun.star.drawing.GraphicObjectShape")
+        draw_page = document.getDrawPages().getByIndex(0)
+        draw_page.add(shape)
+        shape.setPosition(uno.createUnoStruct("com.sun.star.awt.Point", 1000, 1000))
+        shape.setSize(uno.createUnoStruct("com.sun.star.awt.Size", 19000, 19000 * image_size[1] // image_size[0]))
+        shape.Graphic = graphic
+        shape.Name = "photo"
+        document.store()
+    finally:
+        document.close(True)
+
+def export(document, output_path, profile):
+    properties = (
+        PropertyValue("FilterName", 0, "draw_pdf_Export", 0),
+        PropertyValue("Overwrite", 0, True, 0),
+        filter_data(profile),
+    )
+    document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_path)), properties)
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF导出配置基准测试")
+    parser.add_argument("--template", default=None, help="导出的ODG文件（默认生成包含图片的文档）")
+    parser.add_argument("--profiles", default=None, help="逗号分隔的导出配置（默认全部）")
+    parser.add_argument("--runs", type=int, default=20, help="每个配置的导出次数")
+    parser.add_argument("--image-size", default="3000x2000", help="生成的文档中图片的像素尺寸")
+    parser.add_argument("--shapes", type=int, default=40, help="生成的文档中的文本形状数")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    args = parser.parse_args()
+
+    names = args.profiles.split(",") if args.profiles else list(profiles())
+    unknown = [name for name in names if name not in profiles()]
+    if unknown:
+        parser.error(f"未知的导出配置: {', '.join(unknown)}")
+
+    work_dir = tempfile.mkdtemp(prefix="odg-bench-pdf-")
+    profile_dir = tempfile.mkdtemp(prefix="odg-bench-profile-")
+    office = OfficeInstance(soffice_path=args.soffice, profile_dir=profile_dir,
+                            accept=build_accept(port=find_free_port(2100)), startup_timeout=120)
+    results = []
+    try:
+        desktop = office.start()
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(work_dir, "template.odg")
+            width, height = (int(value) for value in args.image_size.lower().split("x"))
+            build_template(desktop, office.connection.context, template_path, (width, height), args.shapes)
+
+        url = uno.systemPathToFileUrl(os.path.abspath(template_path))
+        properties = (PropertyValue("Hidden", 0, True, 0), PropertyValue("ReadOnly", 0, True, 0))
+        document = desktop.loadComponentFromURL(url, "_blank", 0, properties)
+        try:
+            # 预热：第一次导出加载PDF过滤器和字体
+            export(document, os.path.join(work_dir, "warmup.pdf"), names[0])
+            for name in names:
+                output_path = os.path.join(work_dir, f"{name}.pdf")
+                timings = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    export(document, output_path, name)
+                    timings.append(time.perf_counter() - start)
+                results.append((name, statistics.median(timings), os.path.getsize(output_path)))
+        finally:
+            document.close(True)
+    finally:
+        office.kill()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = dict((name, (seconds, size)) for name, seconds, size in results).get("default")
+    print(f"{'配置':<10}{'中位数(毫秒/次)':>16}{'PDF大小(KB)':>14}{'相对default耗时':>16}{'相对default大小':>16}")
+    for name, seconds, size in results:
+        relative_time = f"{seconds / baseline[0]:.2f}x" if baseline else "-"
+        relative_size = f"{size / baseline[1]:.2f}x" if baseline else "-"
+        print(f"{name:<10}{seconds * 1000:>16.1f}{size / 1024:>14.1f}{relative_time:>16}{relative_size:>16}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG保存配置基准测试：每个保存配置的保存耗时和文件大小
+
+默认生成包含多张照片尺寸图片的模板（图片多时生成缩略图的开销最明显），也可以用 --template 指定实际使用的模板。
+每次保存前修改一个文本形状，按每个配置各保存若干次，报告保存耗时的中位数和文件大小，
+并在office中重新加载每个配置保存的文件，核对修改后的文本。
+
+用法（使用LibreOffice自带的Python）:
+    python3 benchmarks/bench_save.py --images 8 --runs 20
+    python3 benchmarks/bench_save.py --template badge.odg --profiles default,fast
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+import uno
+from com.sun.star.beans import PropertyValue
+from bench_pdf import photo_png
+from odg_office import OfficeInstance, build_accept
+from odg_operations import ODGProcessor
+from odg_pool import find_free_port
+from odg_save import SAVE_PROFILES
+from odg_search import parse_odg
+from odg_writer import ODGBuilder
+
+def build_template(desktop, context, path, images, image_size):
+    """生成测试模板：一个文本形状和images张图片"""
+    builder = ODGBuilder(title="bench")
+    page = builder.add_page("page1")
+    page.text(1000, 27000, 19000, 1000, "占位", name="caption", font_size=12)
+    builder.save(path)
+
+    url = uno.systemPathToFileUrl(os.path.abspath(path))
+    document = desktop.loadComponentFromURL(url, "_blank", 0, (PropertyValue("Hidden", 0, True, 0),))
+    try:
+        provider = context.ServiceManager.createInstanceWithContext("com.sun.star.graphic.GraphicProvider", context)
+        draw_page = document.getDrawPages().getByIndex(0)
+        for i in range(images):
+            image_path = os.path.join(os.path.dirname(path), f"photo_{i}.png")
+            with open(image_path, "wb") as f:
+                f.write(photo_png(*image_size, seed=i))
+            shape = document.createInstance("com.sun.star.drawing.GraphicObjectShape")
+            draw_page.add(shape)
+            shape.setPosition(uno.createUnoStruct("com.sun.star.awt.Point", 1000 + (i % 2) * 9600, 1000 + (i // 2) * 6400))
+            shape.setSize(uno.createUnoStruct("com.sun.star.awt.Size", 9400, 6200))
+            shape.Graphic = provider.queryGraphic(
+                (PropertyValue("URL", 0, uno.systemPathToFileUrl(image_path), 0),))
+            shape.Name = f"photo_{i}"
+        document.store()
+    finally:
+        document.close(True)
+
+def find_text_shape(document):
+    """第一个有名称的文本形状，用于每次保存前修改文本"""
+    pages = document.getDrawPages()
+    for i in range(pages.getCount()):
+        page = pages.getByIndex(i)
+        for j in range(page.getCount()):
+            shape = page.getByIndex(j)
+            if shape.Name and shape.getShapeType() in ("com.sun.star.drawing.TextShape",
+                                                         "com.sun.star.drawing.RectangleShape",
+                                                         "com.sun.star.drawing.CustomShape"):
+                return shape
+    raise RuntimeError("模板中没有有名称的文本形状")
+
+def main():
+    parser = argparse.ArgumentParser(description="ODG保存配置基准测试")
+    parser.add_argument("--template", default=None, help="模板ODG文件（默认生成包含图片的模板）")
+    parser.add_argument("--profiles", default=None, help="逗号分隔的保存配置（默认全部）")
+    parser.add_argument("--runs", type=int, default=20, help="每个配置的保存次数")
+    parser.add_argument("--images", type=int, default=8, help="生成的模板中的图片数")
+    parser.add_argument("--image-size", default="2000x1500", help="生成的模板中图片的像素尺寸")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    args = parser.parse_args()
+
+    names = args.profiles.split(",") if args.profiles else list(SAVE_PROFILES)
+    unknown = [name for name in names if name not in SAVE_PROFILES]
+    if unknown:
+        parser.error(f"未知的保存配置: {', '.join(unknown)}")
+
+    work_dir = tempfile.mkdtemp(prefix="odg-bench-save-")
+    profile_dir = tempfile.mkdtemp(prefix="odg-bench-profile-")
+    office = OfficeInstance(soffice_path=args.soffice, profile_dir=profile_dir,
+                            accept=build_accept(port=find_free_port(2100)), startup_timeout=120)
+    results = []
+    failures = 0
+    try:
+        desktop = office.start()
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(work_dir, "template.odg")
+            width, height = (int(value) for value in args.image_size.lower().split("x"))
+            build_template(desktop, office.connection.context, template_path, args.images, (width, height))
+
+        processor = ODGProcessor(connection_manager=office.connection)
+        for name in names:
+            processor.save_profile = name
+            output_path = os.path.join(work_dir, f"{name}.odg")
+            if not processor.open_odg(template_path):
+                raise RuntimeError(f"无法打开模板: {template_path}")
+            try:
+                shape = find_text_shape(processor.document)
+                shape_name = shape.Name
+                # 预热：第一次保存加载过滤器
+                shape.setString("warmup")
+                processor.store_document(os.path.join(work_dir, f"warmup_{name}.odg"))
+                timings = []
+                for i in range(args.runs):
+                    shape.setString(f"{name} {i}")
+                    start = time.perf_counter()
+                    processor.store_document(output_path)
+                    timings.append(time.perf_counter() - start)
+            finally:
+                processor.close_document()
+
+            with zipfile.ZipFile(output_path) as package:
+                thumbnail = any(entry.startswith("Thumbnails/") for entry in package.namelist())
+            results.append((name, statistics.median(timings), os.path.getsize(output_path), thumbnail))
+
+            # 核对：office能重新加载，且文本为最后一次保存的内容
+            expected = f"{name} {args.runs - 1}"
+            texts = {s["shape_name"]: s["text"] for s in parse_odg(output_path)}
+            url = uno.systemPathToFileUrl(os.path.abspath(output_path))
+            properties = (PropertyValue("Hidden", 0, True, 0), PropertyValue("ReadOnly", 0, True, 0))
+            document = desktop.loadComponentFromURL(url, "_blank", 0, properties)
+            if document is None or texts.get(shape_name) != expected:
+                failures += 1
+                print(f"{name}: 文本 {texts.get(shape_name)!r} != {expected!r}" if document else f"{name}: office无法加载")
+            if document is not None:
+                document.close(True)
+    finally:
+        office.kill()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = dict((name, (seconds, size)) for name, seconds, size, _ in results).get("default")
+    print(f"{'配置':<10}{'中位数(毫秒/次)':>16}{'文件大小(KB)':>14}{'缩略图':>8}{'相对default耗时':>16}")
+    for name, seconds, size, thumbnail in results:
+        relative_time = f"{seconds / baseline[0]:.2f}x" if baseline else "-"
+        print(f"{name:<10}{seconds * 1000:>16.1f}{size / 1024:>14.1f}{'有' if thumbnail else '无':>8}{relative_time:>16}")
+    print(f"核对 {len(results)} 个配置，{failures} 个不一致")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
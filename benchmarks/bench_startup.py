@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+office启动耗时基准测试：全新用户配置 vs 克隆预初始化的配置模板
+
+用法（使用LibreOffice自带的Python）:
+    python3 benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_office import OfficeInstance
+from odg_pool import find_free_port
+from odg_profile import ProfileTemplate
+
+def measure(runs, soffice_path, template=None):
+    """启动并结束office若干次，返回每次的启动耗时（秒）"""
+    timings = []
+    for _ in range(runs):
+        profile_dir = tempfile.mkdtemp(prefix="odg-bench-profile-")
+        if template is not None:
+            template.clone_to(profile_dir)
+        port = find_free_port(2100)
+        office = OfficeInstance(soffice_path=soffice_path, profile_dir=profile_dir,
+                                accept=f"socket,host=localhost,port={port};urp;", startup_timeout=120)
+        try:
+            office.start()
+            timings.append(office.startup_seconds)
+        finally:
+            office.kill()
+            shutil.rmtree(profile_dir, ignore_errors=True)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="office启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式的启动次数")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    args = parser.parse_args()
+
+    template_dir = os.path.join(tempfile.mkdtemp(prefix="odg-bench-"), "template")
+    template = ProfileTemplate(template_dir, soffice_path=args.soffice)
+    template.ensure()
+
+    try:
+        results = {
+            "全新配置": measure(args.runs, args.soffice),
+            "克隆模板": measure(args.runs, args.soffice, template),
+        }
+    finally:
+        shutil.rmtree(os.path.dirname(template_dir), ignore_errors=True)
+
+    print(f"{'方式':<10}{'平均(秒)':>10}{'中位数(秒)':>12}{'最小(秒)':>10}")
+    for name, timings in results.items():
+        print(f"{name:<10}{statistics.mean(timings):>10.2f}"
+              f"{statistics.median(timings):>12.2f}{min(timings):>10.2f}")
+
+if __name__ == "__main__":
+    main()
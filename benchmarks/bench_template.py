@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预编译模板基准测试：每条记录解析content.xml vs 预编译模板
+
+两种方式都不需要office。解析方式每条记录读取ODG包、用ElementTree解析并修改content.xml、
+重新序列化并写出ZIP；预编译方式只拼接字节段并压缩content.xml。
+比较单核每秒生成的文件数，并核对两种方式生成的形状文本一致。
+
+用法:
+    python3 benchmarks/bench_template.py --records 20000 --shapes 40
+    python3 benchmarks/bench_template.py --template payroll.odg --records 5000
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_search import parse_odg
+from odg_template import CompiledTemplate
+from odg_writer import ODGBuilder
+
+_DRAW = "{urn:oasis:names:tc:opendocument:xmlns:drawing:1.0}"
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+def build_template(path, shapes):
+    """生成包含指定数量命名文本形状的模板"""
+    builder = ODGBuilder(title="bench")
+    page = builder.add_page("page1")
+    for i in range(shapes):
+        page.text((i % 10) * 2000, (i // 10) * 1200, 1800, 1000, f"占位 {i}", name=f"field_{i}", font_size=10)
+    builder.save(path)
+
+def shape_names(path):
+    return sorted({shape["shape_name"] for shape in parse_odg(path) if shape["shape_name"]})
+
+def render_parsed(template_path, values):
+    """对照组：每条记录解析和重新序列化content.xml"""
+    with zipfile.ZipFile(template_path) as package:
+        entries = [(info, package.read(info.filename)) for info in package.infolist()]
+    namespaces = {}
+    content = dict((info.filename, data) for info, data in entries)["content.xml"]
+    for _, (prefix, uri) in ET.iterparse(io.BytesIO(content), events=("start-ns",)):
+        namespaces.setdefault(prefix, uri)
+    for prefix, uri in namespaces.items():
+        ET.register_namespace(prefix, uri)
+    root = ET.fromstring(content)
+    done = set()
+    for element in root.iter():
+        name = element.get(f"{_DRAW}name")
+        if name not in values or name in done:
+            continue
+        done.add(name)
+        container = element.find(f"{_DRAW}text-box")
+        container = element if container is None else container
+        for paragraph in container.findall(f"{_TEXT}p"):
+            container.remove(paragraph)
+        for line in str(values[name]).split("\n"):
+            ET.SubElement(container, f"{_TEXT}p").text = line
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as package:
+        for info, data in entries:
+            if info.filename == "content.xml":
+                data = ET.tostring(root, xml_declaration=True, encoding="UTF-8")
+            package.writestr(info, data, info.compress_type)
+    return output.getvalue()
+
+def run(label, render, records, output_dir):
+    start = time.perf_counter()
+    for i, values in enumerate(records):
+        with open(os.path.join(output_dir, f"{label}_{i}.odg"), "wb") as f:
+            f.write(render(values))
+    elapsed = time.perf_counter() - start
+    return elapsed, len(records) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="预编译模板基准测试")
+    parser.add_argument("--template", default=None, help="模板ODG文件（默认生成）")
+    parser.add_argument("--shapes", type=int, default=40, help="生成的模板中的文本形状数")
+    parser.add_argument("--records", type=int, default=20000, help="预编译方式生成的文件数")
+    parser.add_argument("--parsed-records", type=int, default=2000, help="解析方式生成的文件数")
+    parser.add_argument("--level", type=int, default=1, help="content.xml的压缩级别（0不压缩）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="odg-bench-template-")
+    try:
+        template_path = args.template or os.path.join(work_dir, "template.odg")
+        if not args.template:
+            build_template(template_path, args.shapes)
+        names = shape_names(template_path)
+        records = [{name: f"记录{i} {name} <&>" for name in names} for i in range(args.records)]
+
+        start = time.perf_counter()
+        template = CompiledTemplate.compile(template_path, args.level)
+        compile_seconds = time.perf_counter() - start
+
+        compiled_seconds, compiled_rate = run("compiled", template.render, records, work_dir)
+        parsed_seconds, parsed_rate = run("parsed", lambda values: render_parsed(template_path, values),
+                                          records[:args.parsed_records], work_dir)
+
+        # 核对：两种方式生成的第一个文件中的形状文本相同
+        compiled_texts = {s["shape_name"]: s["text"] for s in parse_odg(os.path.join(work_dir, "compiled_0.odg"))}
+        parsed_texts = {s["shape_name"]: s["text"] for s in parse_odg(os.path.join(work_dir, "parsed_0.odg"))}
+        mismatched = [name for name in names if compiled_texts.get(name) != parsed_texts.get(name)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"模板文本形状: {len(names)}，编译耗时: {compile_seconds * 1000:.1f} 毫秒")
+    print(f"{'方式':<12}{'文件数':>8}{'耗时(秒)':>10}{'文件/秒':>12}")
+    print(f"{'预编译':<12}{len(records):>8}{compiled_seconds:>10.2f}{compiled_rate:>12.0f}")
+    print(f"{'解析XML':<12}{min(args.parsed_records, len(records)):>8}{parsed_seconds:>10.2f}{parsed_rate:>12.0f}")
+    print(f"加速: {compiled_rate / parsed_rate:.1f}x，文本不一致的形状: {len(mismatched)}")
+    sys.exit(1 if mismatched else 0)
+
+if __name__ == "__main__":
+    main()
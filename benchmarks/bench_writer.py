@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG写入器基准测试：odg_writer直接写出 vs 通过UNO逐个创建形状并保存
+
+两种方式生成相同的文档（文本框、矩形、椭圆、直线和组合），比较每个文档的耗时；
+同时把odg_writer写出的文档在office中重新加载，核对页数以及每个形状的类型、名称、位置和文本。
+
+用法（使用LibreOffice自带的Python）:
+    python3 benchmarks/bench_writer.py --documents 200 --shapes 50
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+import uno
+from com.sun.star.beans import PropertyValue
+from odg_office import OfficeInstance, build_accept
+from odg_pool import find_free_port
+from odg_writer import ODGBuilder
+
+# 生成的形状依次循环使用的类型 -> UNO形状类型
+SHAPE_TYPES = (
+    ("text", "com.sun.star.drawing.TextShape"),
+    ("rectangle", "com.sun.star.drawing.RectangleShape"),
+    ("ellipse", "com.sun.star.drawing.EllipseShape"),
+    ("line", "com.sun.star.drawing.LineShape"),
+)
+
+def document_spec(index, shapes):
+    """第index个文档的描述：一页，shapes个形状，最后一个为包含两个成员的组合"""
+    spec_shapes = []
+    for i in range(shapes):
+        shape_type = SHAPE_TYPES[i % len(SHAPE_TYPES)][0]
+        x, y = (i % 10) * 2000, (i // 10) * 1500
+        if shape_type == "line":
+            spec_shapes.append({"type": "line", "x1": x, "y1": y, "x2": x + 1800, "y2": y + 1200,
+                                "name": f"shape_{i}"})
+        else:
+            spec_shapes.append({"type": shape_type, "x": x, "y": y, "width": 1800, "height": 1200,
+                                "name": f"shape_{i}", "text": f"文档{index} 形状{i}"})
+    spec_shapes.append({"type": "group", "name": "group", "shapes": [
+        {"type": "rectangle", "x": 0, "y": 27000, "width": 1000, "height": 1000, "name": "member_0"},
+        {"type": "text", "x": 1500, "y": 27000, "width": 3000, "height": 1000, "name": "member_1", "text": "组合"},
+    ]})
+    return {"pages": [{"name": "page1", "shapes": spec_shapes}]}
+
+def write_with_uno(desktop, spec, output_path):
+    """按描述通过UNO创建文档并保存（与以前的create_new_odg加逐个add_shape相同的方式）"""
+    properties = (PropertyValue("Hidden", 0, True, 0),)
+    document = desktop.loadComponentFromURL("private:factory/sdraw", "_blank", 0, properties)
+    page = document.getDrawPages().getByIndex(0)
+    for shape_spec in spec["pages"][0]["shapes"]:
+        if shape_spec["type"] == "group":
+            continue
+        uno_type = dict(SHAPE_TYPES)[shape_spec["type"]]
+        shape = document.createInstance(uno_type)
+        page.add(shape)
+        if shape_spec["type"] == "line":
+            shape.setPosition(uno.createUnoStruct("com.sun.star.awt.Point", shape_spec["x1"], shape_spec["y1"]))
+            shape.setSize(uno.createUnoStruct("com.sun.star.awt.Size", shape_spec["x2"] - shape_spec["x1"],
+                                              shape_spec["y2"] - shape_spec["y1"]))
+        else:
+            shape.setPosition(uno.createUnoStruct("com.sun.star.awt.Point", shape_spec["x"], shape_spec["y"]))
+            shape.setSize(uno.createUnoStruct("com.sun.star.awt.Size", shape_spec["width"], shape_spec["height"]))
+            shape.setString(shape_spec["text"])
+        shape.Name = shape_spec["name"]
+    document.storeAsURL(uno.systemPathToFileUrl(os.path.abspath(output_path)), ())
+    document.close(True)
+
+def verify(desktop, spec, file_path):
+    """在office中加载写出的文档，返回与描述不一致的地方"""
+    properties = (PropertyValue("Hidden", 0, True, 0), PropertyValue("ReadOnly", 0, True, 0))
+    document = desktop.loadComponentFromURL(uno.systemPathToFileUrl(os.path.abspath(file_path)), "_blank", 0, properties)
+    problems = []
+    try:
+        pages = document.getDrawPages()
+        if pages.getCount() != len(spec["pages"]):
+            problems.append(f"页数 {pages.getCount()} != {len(spec['pages'])}")
+        page = pages.getByIndex(0)
+        expected = spec["pages"][0]["shapes"]
+        if page.getCount() != len(expected):
+            problems.append(f"形状数 {page.getCount()} != {len(expected)}")
+        for j in range(min(page.getCount(), len(expected))):
+            shape, shape_spec = page.getByIndex(j), expected[j]
+            if shape.Name != shape_spec["name"]:
+                problems.append(f"形状{j} 名称 {shape.Name!r} != {shape_spec['name']!r}")
+            if shape_spec["type"] == "group":
+                if shape.getShapeType() != "com.sun.star.drawing.GroupShape" or shape.getCount() != 2:
+                    problems.append(f"形状{j} 不是包含两个成员的组合")
+                continue
+            if shape.getShapeType() != dict(SHAPE_TYPES)[shape_spec["type"]]:
+                problems.append(f"形状{j} 类型 {shape.getShapeType()}")
+            position = shape.getPosition()
+            x, y = (shape_spec["x1"], shape_spec["y1"]) if shape_spec["type"] == "line" \
+                else (shape_spec["x"], shape_spec["y"])
+            if abs(position.X - x) > 1 or abs(position.Y - y) > 1:
+                problems.append(f"形状{j} 位置 ({position.X}, {position.Y}) != ({x}, {y})")
+            if "text" in shape_spec and shape.getString() != shape_spec["text"]:
+                problems.append(f"形状{j} 文本 {shape.getString()!r} != {shape_spec['text']!r}")
+    finally:
+        document.close(True)
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="ODG写入器基准测试")
+    parser.add_argument("--documents", type=int, default=200, help="生成的文档数")
+    parser.add_argument("--shapes", type=int, default=50, help="每个文档的形状数")
+    parser.add_argument("--verify", type=int, default=20, help="在office中重新加载核对的文档数")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="odg-bench-writer-")
+    profile_dir = tempfile.mkdtemp(prefix="odg-bench-profile-")
+    office = OfficeInstance(soffice_path=args.soffice, profile_dir=profile_dir,
+                            accept=build_accept(port=find_free_port(2100)), startup_timeout=120)
+    try:
+        specs = [document_spec(i, args.shapes) for i in range(args.documents)]
+        writer_times = []
+        for i, spec in enumerate(specs):
+            start = time.perf_counter()
+            ODGBuilder.from_spec(spec).save(os.path.join(output_dir, f"writer_{i}.odg"))
+            writer_times.append(time.perf_counter() - start)
+
+        desktop = office.start()
+        uno_times = []
+        for i, spec in enumerate(specs):
+            start = time.perf_counter()
+            write_with_uno(desktop, spec, os.path.join(output_dir, f"uno_{i}.odg"))
+            uno_times.append(time.perf_counter() - start)
+
+        failures = 0
+        for i in range(min(args.verify, len(specs))):
+            problems = verify(desktop, specs[i], os.path.join(output_dir, f"writer_{i}.odg"))
+            if problems:
+                failures += 1
+                print(f"writer_{i}.odg: " + "; ".join(problems[:5]))
+    finally:
+        office.kill()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    print(f"{'方式':<12}{'文档数':>8}{'中位数(毫秒/个)':>18}{'合计(秒)':>10}")
+    for name, timings in (("odg_writer", writer_times), ("UNO", uno_times)):
+        print(f"{name:<12}{len(timings):>8}{statistics.median(timings) * 1000:>18.2f}{sum(timings):>10.2f}")
+    print(f"核对 {min(args.verify, len(specs))} 个文档，{failures} 个不一致")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,324 @@ const { spawn, exec } = require('child_process');
 const path = require('path');
 const fs = require('fs').promises;
 const os = require('os');
+const readline = require('readline');
+const { JobQueue, QueueFullError, AbortError } = require('./lib/job_queue');
+const { BridgeDaemon } = require('./lib/bridge_daemon');
+const { JobStream } = require('./lib/job_stream');
+const { RenderClient } = require('./lib/render_client');
+const { InfoCache } = require('./lib/info_cache');
+const { decodeColumnarInfo } = require('./lib/columnar');
+
+// 便捷函数共用的任务队列，避免突发调用同时启动大量Python进程
+let defaultQueue = null;
+
+function getDefaultQueue() {
+    if (!defaultQueue) {
+        defaultQueue = new JobQueue();
+    }
+    return defaultQueue;
+}
+
+// 便捷函数共用的处理器，按队列和构造选项缓存，避免每次调用都新建信息缓存、常驻进程或客户端
+const PROCESSOR_OPTIONS = [
+    'libreOfficePath', 'pythonPath', 'killGraceMs', 'sofficePath', 'operationTimeout', 'jobTimeout',
+    'daemon', 'workers', 'recycle', 'profileTemplate', 'connection', 'port', 'pipeName', 'pipeline',
+    'affinity', 'warmup', 'infoCache', 'saveProfile', 'nodes', 'nodeBackoffMs'
+];
+const defaultProcessors = new WeakMap();
+
+/**
+ * 获取便捷函数使用的处理器，构造选项相同的调用共用同一个处理器
+ * @param {Object} options - ODGProcessor的构造选项，其他字段忽略
+ * @returns {ODGProcessor} 处理器
+ */
+function getDefaultProcessor(options = {}) {
+    const queue = options.queue || getDefaultQueue();
+    let processors = defaultProcessors.get(queue);
+    if (!processors) {
+        processors = new Map();
+        defaultProcessors.set(queue, processors);
+    }
+    const processorOptions = {};
+    for (const name of PROCESSOR_OPTIONS) {
+        if (options[name] !== undefined) {
+            processorOptions[name] = options[name];
+        }
+    }
+    const key = JSON.stringify(processorOptions);
+    let processor = processors.get(key);
+    if (!processor) {
+        processor = new ODGProcessor({ ...processorOptions, queue });
+        processors.set(key, processor);
+    }
+    return processor;
+}
+
+/**
+ * 包装错误信息，取消和队列已满错误保持原样以便调用方识别
+ */
+function wrapError(prefix, error) {
+    if (error instanceof AbortError || error instanceof QueueFullError) {
+        return error;
+    }
+    return new Error(`${prefix}: ${error.message}`);
+}
+
+/**
+ * 页面范围转换为Python端的格式（'2-5,8'）
+ */
+function formatPages(pages) {
+    if (pages === undefined || pages === null) {
+        return '';
+    }
+    return Array.isArray(pages) ? pages.join(',') : String(pages);
+}
+
+/**
+ * exportPDF参数转换为Python端的格式：true/false或PDF导出配置名称（'fast'、'web'、'print'、'archive'），未指定时为true
+ */
+function formatExportPDF(exportPDF) {
+    return exportPDF === undefined || exportPDF === null ? 'true' : String(exportPDF);
+}
+
+/**
+ * 从便捷函数的选项中提取任务选项
+ */
+function jobOptionsFrom(options) {
+    return { priority: options.priority, signal: options.signal };
+}
+
+/**
+ * 将记录以JSONL格式写入可写流，遵循背压
+ */
+async function writeRecords(writable, records) {
+    try {
+        for await (const record of records) {
+            if (!writable.write(JSON.stringify(record) + '\n')) {
+                await new Promise((resolve) => writable.once('drain', resolve));
+            }
+        }
+    } finally {
+        writable.end();
+    }
+}
 
 class ODGProcessor {
+    /**
+     * @param {Object} options - 选项
+     * @param {string} options.libreOfficePath - LibreOffice Python路径
+     * @param {number} options.maxConcurrency - 同时运行的Python进程上限
+     * @param {number} options.maxQueueLength - 排队任务上限，超出时拒绝
+     * @param {number} options.killGraceMs - 取消任务时SIGTERM到SIGKILL的等待时间（默认5000）
+     * @param {JobQueue} options.queue - 共享的任务队列（优先于maxConcurrency/maxQueueLength）
+     * @param {string} options.sofficePath - soffice可执行文件路径（看门狗重启office时使用）
+     * @param {number} options.operationTimeout - 单个加载/保存/导出操作的超时（毫秒，默认120000）
+     * @param {number} options.jobTimeout - 整个Python进程的超时（毫秒），超时后强制结束
+     * @param {boolean} options.daemon - 使用常驻Python进程和office工作进程池，而不是每个任务启动一个进程
+     * @param {number} options.workers - 常驻模式下的office工作进程数（默认2）
+     * @param {Object} options.recycle - 常驻模式下的工作进程回收策略
+     * @param {number} options.recycle.maxJobs - 处理多少个任务后回收
+     * @param {number} options.recycle.maxRssMb - office常驻内存超过多少MB后回收
+     * @param {number} options.recycle.maxAgeMs - 运行多长时间后回收（毫秒）
+     * @param {string|boolean} options.profileTemplate - 常驻模式下工作进程使用的预初始化用户配置模板目录，
+     *                                                   true表示使用临时目录下的默认位置
+     * @param {string} options.connection - UNO连接方式：socket（默认）或 pipe。命名管道的单次调用延迟更低
+     * @param {number} options.port - socket连接端口（默认2002，常驻模式下为起始端口）
+     * @param {string} options.pipeName - pipe连接的管道名（默认odg-processor；常驻模式下每个工作进程自动生成唯一名称）
+     * @param {boolean|Object} options.pipeline - 常驻模式下以 预读 -> 渲染 -> 写盘 流水线执行modifyTexts
+     * @param {number} options.pipeline.prefetch - 已读入内存、等待渲染的任务上限（默认工作进程数的2倍）
+     * @param {number} options.pipeline.writers - 写盘线程数（默认2）
+     * @param {boolean|Object} options.affinity - 常驻模式下按模板内容哈希把任务路由到固定的工作进程
+     * @param {number} options.affinity.spillover - 首选工作进程排队多少个任务后溢出到其他工作进程（默认2）
+     * @param {string|Array<string>} options.warmup - 常驻模式下的预热清单文件或模板路径列表，工作进程预热这些模板后才报告就绪
+     * @param {boolean|Object} options.infoCache - getODGInfo结果缓存（默认开启），false表示关闭
+     * @param {number} options.infoCache.maxEntries - 缓存的文件数（默认256）
+     * @param {string} options.infoCache.dir - 持久化目录，多个进程和重启之后复用Python端的缓存
+     * @param {string} options.saveProfile - 保存ODG时的保存配置：default（office默认选项）、fast、small、stored
+     * @param {Array<string>} options.nodes - 渲染服务节点地址，设置后任务发送到这些节点执行（客户端模式）
+     * @param {number} options.nodeBackoffMs - 客户端模式下节点失败后暂停向其发送任务的时间（毫秒，默认5000）
+     */
     constructor(options = {}) {
         this.libreOfficePath = options.libreOfficePath || this.getDefaultLibreOfficePath();
         this.pythonPath = options.pythonPath || 'python';
         this.scriptPath = path.join(__dirname, 'python', 'odg_bridge.py');
+        this.killGraceMs = options.killGraceMs !== undefined ? options.killGraceMs : 5000;
+        this.workers = options.workers || 2;
+        this.recycle = options.recycle || {};
+        this.profileTemplate = options.profileTemplate === true
+            ? path.join(os.tmpdir(), 'odg-processor-profile')
+            : (options.profileTemplate || null);
+        this.queue = options.queue || new JobQueue({
+            // 常驻模式下并发数默认与工作进程数一致，排队和取消都在Node端完成
+            maxConcurrency: options.maxConcurrency || (options.daemon ? this.workers : undefined),
+            maxQueueLength: options.maxQueueLength
+        });
+        this.sofficePath = options.sofficePath || null;
+        this.connection = options.connection || 'socket';
+        this.port = options.port || null;
+        this.pipeName = options.pipeName || null;
+        this.pipeline = options.pipeline === true ? {} : (options.pipeline || null);
+        this.affinity = options.affinity === true ? {} : (options.affinity || null);
+        this.warmup = options.warmup || null;
+        this.saveProfile = options.saveProfile || null;
+        this.infoCacheOptions = options.infoCache === false ? null
+            : (options.infoCache === true || !options.infoCache ? {} : options.infoCache);
+        this.infoCache = this.infoCacheOptions ? new InfoCache(this.infoCacheOptions) : null;
+        this.operationTimeout = options.operationTimeout !== undefined ? options.operationTimeout : 120000;
+        this.jobTimeout = options.jobTimeout || null;
+        this.metrics = {
+            timeouts: 0,
+            restarts: 0,
+            retries: 0,
+            healthFailures: 0,
+            jobTimeouts: 0
+        };
+        this.daemon = options.daemon ? new BridgeDaemon({
+            pythonPath: this.libreOfficePath,
+            scriptPath: this.scriptPath,
+            env: this.getBridgeEnv()
+        }) : null;
+        this.client = options.nodes && options.nodes.length > 0 ? new RenderClient({
+            nodes: options.nodes,
+            downBackoffMs: options.nodeBackoffMs,
+            timeoutMs: this.jobTimeout || undefined
+        }) : null;
+    }
+
+    /**
+     * 获取常驻模式下工作进程池的状态（每个工作进程的任务数、内存、运行时间及回收次数；
+     * 流水线模式下还包括各阶段的利用率）
+     * @returns {Promise<Object>} 进程池状态
+     */
+    async getPoolStats() {
+        if (!this.daemon) {
+            throw new Error('Pool stats are only available in daemon mode');
+        }
+        return this.daemon.request('pool_stats');
+    }
+
+    /**
+     * 获取客户端模式下各渲染节点的状态（进行中请求数、失败次数、是否可用及节点返回的统计）
+     * @returns {Promise<Array<Object>>} 节点状态
+     */
+    async getNodeStats() {
+        if (!this.client) {
+            throw new Error('Node stats are only available in client mode');
+        }
+        return this.client.getStats();
+    }
+
+    /**
+     * 关闭常驻Python进程及其office工作进程
+     */
+    async close() {
+        if (this.daemon) {
+            await this.daemon.stop();
+        }
+    }
+
+    /**
+     * 获取任务队列统计信息（队列深度、等待时间等）
+     * @returns {Object} 队列统计
+     */
+    getQueueStats() {
+        return this.queue.getStats();
+    }
+
+    /**
+     * 获取getODGInfo结果缓存的统计（条目数、命中次数、命中率）
+     * @returns {Object|null} 缓存统计，关闭缓存时为null
+     */
+    getInfoCacheStats() {
+        return this.infoCache ? this.infoCache.getStats() : null;
+    }
+
+    /**
+     * 获取看门狗指标（操作超时、office重启、任务重试次数）
+     * @returns {Object} 看门狗指标
+     */
+    getMetrics() {
+        return { ...this.metrics };
+    }
+
+    /**
+     * 累加Python端返回的看门狗指标
+     */
+    recordMetrics(result) {
+        const metrics = result && result.metrics;
+        if (!metrics) {
+            return;
+        }
+        this.metrics.timeouts += metrics.timeouts || 0;
+        this.metrics.restarts += metrics.restarts || 0;
+        this.metrics.retries += metrics.retries || 0;
+        this.metrics.healthFailures += metrics.health_failures || 0;
+    }
+
+    /**
+     * 传递给Python桥接脚本的环境变量
+     */
+    getBridgeEnv() {
+        const env = { ...process.env };
+        if (this.sofficePath) {
+            env.ODG_SOFFICE_PATH = this.sofficePath;
+        }
+        env.ODG_OPERATION_TIMEOUT = String((this.operationTimeout || 0) / 1000);
+        env.ODG_CONNECTION = this.connection;
+        if (this.port) {
+            env.ODG_PORT = String(this.port);
+            env.ODG_BASE_PORT = String(this.port);
+        }
+        if (this.pipeName) {
+            env.ODG_PIPE_NAME = this.pipeName;
+        }
+        env.ODG_WORKERS = String(this.workers);
+        if (this.recycle.maxJobs) {
+            env.ODG_RECYCLE_JOBS = String(this.recycle.maxJobs);
+        }
+        if (this.recycle.maxRssMb) {
+            env.ODG_RECYCLE_RSS_MB = String(this.recycle.maxRssMb);
+        }
+        if (this.recycle.maxAgeMs) {
+            env.ODG_RECYCLE_AGE = String(this.recycle.maxAgeMs / 1000);
+        }
+        if (this.profileTemplate) {
+            env.ODG_PROFILE_TEMPLATE = this.profileTemplate;
+        }
+        if (this.affinity) {
+            env.ODG_AFFINITY = '1';
+            if (this.affinity.spillover) {
+                env.ODG_SPILLOVER = String(this.affinity.spillover);
+            }
+        }
+        if (!this.infoCacheOptions) {
+            env.ODG_INFO_CACHE_SIZE = '0';
+        } else {
+            if (this.infoCacheOptions.maxEntries) {
+                env.ODG_INFO_CACHE_SIZE = String(this.infoCacheOptions.maxEntries);
+            }
+            if (this.infoCacheOptions.dir) {
+                env.ODG_INFO_CACHE_DIR = path.resolve(this.infoCacheOptions.dir);
+            }
+        }
+        if (typeof this.warmup === 'string') {
+            env.ODG_WARMUP_MANIFEST = path.resolve(this.warmup);
+        } else if (Array.isArray(this.warmup)) {
+            env.ODG_WARMUP_TEMPLATES = JSON.stringify(this.warmup.map((template) => path.resolve(template)));
+        }
+        if (this.pipeline) {
+            env.ODG_PIPELINE = '1';
+            if (this.pipeline.prefetch) {
+                env.ODG_PIPELINE_PREFETCH = String(this.pipeline.prefetch);
+            }
+            if (this.pipeline.writers) {
+                env.ODG_PIPELINE_WRITERS = String(this.pipeline.writers);
+            }
+        }
+        if (this.saveProfile) {
+            env.ODG_SAVE_PROFILE = this.saveProfile;
+        }
+        return env;
     }
 
     /**
@@ -25,32 +337,202 @@ class ODGProcessor {
     }
 
     /**
-     * 执行Python脚本
+     * 执行Python脚本（经过任务队列）
+     * @param {string} command - 桥接命令
+     * @param {Array<string>} args - 命令参数
+     * @param {Object} jobOptions - 任务选项
+     * @param {string} jobOptions.priority - 优先级：high / normal / low
+     * @param {AbortSignal} jobOptions.signal - 取消信号，运行中的任务会被终止
+     * @param {Function} jobOptions.onEvent - 进度事件回调，设置后Python端逐行输出进度事件
      */
-    async executePythonScript(command, args = []) {
+    async executePythonScript(command, args = [], jobOptions = {}) {
+        const onEvent = jobOptions.onEvent;
+        return this.queue.push(
+            (signal) => this.client
+                ? this.client.run(command, args, signal)
+                : this.daemon
+                ? this.runDaemonRequest(command, args, signal, onEvent)
+                : this.runPythonProcess(command, args, signal, onEvent ? { onMessage: onEvent } : null),
+            jobOptions
+        );
+    }
+
+    /**
+     * 执行不需要office的桥接命令（如模板全文索引），客户端模式下也在本机执行
+     */
+    async executeLocalCommand(command, args = [], jobOptions = {}) {
+        return this.queue.push(
+            (signal) => this.daemon
+                ? this.runDaemonRequest(command, args, signal)
+                : this.runPythonProcess(command, args, signal),
+            jobOptions
+        );
+    }
+
+    /**
+     * 以事件流的形式执行桥接命令
+     * @param {string} command - 桥接命令
+     * @param {Array<string>} args - 命令参数
+     * @param {Object} jobOptions - 任务选项（priority, signal；local为true时客户端模式下也在本机执行）
+     * @param {Iterable|AsyncIterable} input - 逐行写入Python进程stdin的记录（可选，仅batch命令使用）
+     * @returns {JobStream} 事件流，result为最终结果
+     */
+    stream(command, args = [], jobOptions = {}, input = null) {
+        const job = new JobStream();
+        const stream = {
+            input,
+            onMessage: (event) => job.push(event),
+            attach: (pause, resume) => job.setFlowControl(pause, resume)
+        };
+        this.queue.push(
+            (signal) => this.client && !jobOptions.local
+                ? this.runClientRequest(command, args, signal, stream)
+                : this.daemon && !input && command !== 'batch'
+                    ? this.runDaemonRequest(command, args, signal, stream.onMessage)
+                    : this.runPythonProcess(command, args, signal, stream),
+            jobOptions
+        ).then((result) => job.end(result), (error) => job.fail(error));
+        return job;
+    }
+
+    /**
+     * 在渲染节点上执行桥接命令（客户端模式）
+     */
+    async runClientRequest(command, args = [], signal = null, stream = null) {
+        if (command === 'batch') {
+            return this.client.batch(args, stream.input, stream.onMessage, signal);
+        }
+        return this.client.run(command, args, signal);
+    }
+
+    /**
+     * 通过常驻Python进程执行桥接命令
+     */
+    async runDaemonRequest(command, args = [], signal = null, onEvent = null) {
+        try {
+            const result = await this.daemon.request(command, args, signal, this.jobTimeout, onEvent);
+            this.recordMetrics(result);
+            return result;
+        } catch (error) {
+            if (error.code === 'ETIMEDOUT') {
+                this.metrics.jobTimeouts++;
+            }
+            throw error;
+        }
+    }
+
+    /**
+     * 启动Python进程执行桥接命令
+     * @param {Object} stream - 流式命令选项（可选）
+     * @param {Iterable|AsyncIterable} stream.input - 逐行写入Python进程stdin的记录
+     * @param {Function} stream.onMessage - 每行输出消息的回调，stdout按行处理而不累积
+     * @param {Function} stream.attach - 接收暂停/恢复读取stdout的函数，用于背压
+     */
+    runPythonProcess(command, args = [], signal = null, stream = null) {
         return new Promise((resolve, reject) => {
             const pythonArgs = [this.scriptPath, command, ...args];
             const pythonProcess = spawn(this.libreOfficePath, pythonArgs, {
-                stdio: ['pipe', 'pipe', 'pipe']
+                stdio: ['pipe', 'pipe', 'pipe'],
+                env: stream ? { ...this.getBridgeEnv(), ODG_EVENTS: '1' } : this.getBridgeEnv()
             });
 
             let stdout = '';
             let stderr = '';
+            let streamResult = null;
+            let stopReason = null;
+            let killTimer = null;
+            let jobTimer = null;
 
-            pythonProcess.stdout.on('data', (data) => {
-                stdout += data.toString();
-            });
+            // 先发送SIGTERM，让Python端关闭文档；超过宽限时间后强制结束
+            const stop = (reason) => {
+                if (stopReason) {
+                    return;
+                }
+                stopReason = reason;
+                pythonProcess.kill('SIGTERM');
+                killTimer = setTimeout(() => pythonProcess.kill('SIGKILL'), this.killGraceMs);
+            };
+            const onAbort = () => stop('abort');
+            if (signal) {
+                signal.addEventListener('abort', onAbort, { once: true });
+            }
+            if (this.jobTimeout) {
+                jobTimer = setTimeout(() => stop('timeout'), this.jobTimeout);
+            }
+            const finish = (result) => {
+                this.recordMetrics(result);
+                resolve(result);
+            };
+
+            if (stream) {
+                if (stream.attach) {
+                    stream.attach(() => pythonProcess.stdout.pause(), () => pythonProcess.stdout.resume());
+                }
+                readline.createInterface({ input: pythonProcess.stdout }).on('line', (line) => {
+                    if (!line.trim()) {
+                        return;
+                    }
+                    let message;
+                    try {
+                        message = JSON.parse(line);
+                    } catch (e) {
+                        return;
+                    }
+                    if (message.type === 'result') {
+                        streamResult = message.result;
+                    } else if (stream.onMessage) {
+                        stream.onMessage(message);
+                    }
+                });
+                // Python端提前退出时忽略写入错误，结果以退出码为准
+                pythonProcess.stdin.on('error', () => {});
+                if (stream.input) {
+                    writeRecords(pythonProcess.stdin, stream.input).catch(() => stop('abort'));
+                } else {
+                    pythonProcess.stdin.end();
+                }
+            } else {
+                pythonProcess.stdout.on('data', (data) => {
+                    stdout += data.toString();
+                });
+            }
 
             pythonProcess.stderr.on('data', (data) => {
                 stderr += data.toString();
             });
 
             pythonProcess.on('close', (code) => {
+                if (signal) {
+                    signal.removeEventListener('abort', onAbort);
+                }
+                clearTimeout(killTimer);
+                clearTimeout(jobTimer);
+                if (stopReason === 'abort') {
+                    reject(new AbortError());
+                    return;
+                }
+                if (stopReason === 'timeout') {
+                    this.metrics.jobTimeouts++;
+                    const error = new Error(`Python script timed out after ${this.jobTimeout}ms`);
+                    error.code = 'ETIMEDOUT';
+                    reject(error);
+                    return;
+                }
+
+                if (stream) {
+                    if (streamResult) {
+                        finish(streamResult);
+                    } else {
+                        reject(new Error(`Python script failed with code ${code}: ${stderr}`));
+                    }
+                    return;
+                }
+
                 if (code === 0) {
                     try {
                         // 先尝试直接解析为JSON
                         const result = JSON.parse(stdout);
-                        resolve(result);
+                        finish(result);
                     } catch (e) {
                         // 如果失败，尝试从stdout中提取JSON
                         try {
@@ -59,7 +541,7 @@ class ODGProcessor {
                             if (jsonStart !== -1) {
                                 const jsonStr = lines.slice(jsonStart).join('\n');
                                 const result = JSON.parse(jsonStr);
-                                resolve(result);
+                                finish(result);
                             } else {
                                 resolve({ success: true, output: stdout });
                             }
@@ -73,23 +555,192 @@ class ODGProcessor {
             });
 
             pythonProcess.on('error', (error) => {
+                if (signal) {
+                    signal.removeEventListener('abort', onAbort);
+                }
+                clearTimeout(jobTimer);
                 reject(new Error(`Failed to start Python process: ${error.message}`));
             });
         });
     }
 
     /**
-     * 获取ODG文件信息
+     * 获取ODG文件信息（结果按文件标识缓存，文件未变化时不再调用Python）
      * @param {string} filePath - ODG文件路径
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @param {Array<string>} jobOptions.fields - 字段投影，如 ['pages_count', 'shapes.shape_name']
+     * @param {number|string|Array<number>} jobOptions.pages - 只读取这些页面（从1开始），如 3、'2-5,8'、[1, 4]
+     * @param {string} jobOptions.format - 形状的列式编码：columnar 或 binary，数值列解码为Int32Array
      * @returns {Promise<Object>} 文件信息
      */
-    async getODGInfo(filePath) {
+    async getODGInfo(filePath, jobOptions = {}) {
         try {
             const absolutePath = path.resolve(filePath);
-            const result = await this.executePythonScript('get_info', [absolutePath]);
+            const fields = jobOptions.fields ? JSON.stringify(jobOptions.fields) : '';
+            const pages = formatPages(jobOptions.pages);
+            const format = jobOptions.format || '';
+            // 缓存键在调用前取得，调用期间文件被修改时结果不会以新的标识缓存
+            const key = this.infoCache
+                ? await this.infoCache.keyFor(absolutePath, `${fields}|${pages}|${format}`)
+                : null;
+            let result = this.infoCache ? this.infoCache.get(key) : undefined;
+            if (result === undefined) {
+                const args = [absolutePath, fields, pages, format];
+                while (args.length > 1 && !args[args.length - 1]) {
+                    args.pop();
+                }
+                result = await this.executePythonScript('get_info', args, jobOptions);
+                if (this.infoCache && result && result.success) {
+                    this.infoCache.set(key, result);
+                }
+            }
+            if (format && result && result.success) {
+                decodeColumnarInfo(result.data);
+            }
             return result;
         } catch (error) {
-            throw new Error(`Failed to get ODG info: ${error.message}`);
+            throw wrapError('Failed to get ODG info', error);
+        }
+    }
+
+    /**
+     * 逐个读取形状（Python端以NDJSON逐行输出，不建立完整的页面列表）
+     * @param {string} filePath - ODG文件路径
+     * @param {Object} options - 选项
+     * @param {number|string|Array<number>} options.pages - 页面范围（从1开始），默认全部页面
+     * @param {Array<string>} options.fields - 形状字段：shape_index、shape_type、shape_name、position、size、text
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {JobStream} 每个形状触发一次 'shape' 事件（附带page_number），result为形状总数
+     */
+    streamShapes(filePath, options = {}, jobOptions = {}) {
+        const args = [
+            path.resolve(filePath),
+            formatPages(options.pages),
+            options.fields ? JSON.stringify(options.fields) : ''
+        ];
+        return this.stream('shapes', args, jobOptions);
+    }
+
+    /**
+     * 按坐标查询形状（坐标单位为1/100毫米，包括组合形状的成员）
+     *
+     * 第一次查询时Python端读取所有形状的外接矩形并建立每页的空间索引，索引随文件信息缓存一起缓存，
+     * 之后的查询不需要office。多个查询放在一次调用中执行。
+     * @param {string} filePath - ODG文件路径
+     * @param {Array<Object>} queries - 查询列表：
+     *     { op: 'at', page, x, y } 包含该点的形状（最内层的在前）；
+     *     { op: 'in', page, rect: [x, y, w, h], mode: 'intersects' | 'contains' } 区域内的形状；
+     *     { op: 'nearest', page, x, y, k } 最近的k个形状（附带distance）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} data.results 为每个查询命中的形状列表
+     */
+    async queryShapes(filePath, queries, jobOptions = {}) {
+        try {
+            const args = [path.resolve(filePath), JSON.stringify(queries)];
+            return await this.executePythonScript('query_shapes', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to query shapes', error);
+        }
+    }
+
+    /**
+     * 执行单个几何查询，data.shapes 为命中的形状
+     */
+    async querySingle(filePath, query, jobOptions) {
+        const result = await this.queryShapes(filePath, [query], jobOptions);
+        if (!result || !result.success) {
+            return result;
+        }
+        return { ...result, data: { shapes: result.data.results[0] } };
+    }
+
+    /**
+     * 包含某一点的形状（命中测试），最内层（面积最小）的在前
+     * @param {string} filePath - ODG文件路径
+     * @param {number} page - 页码（从1开始）
+     * @param {number} x - 横坐标（1/100毫米）
+     * @param {number} y - 纵坐标（1/100毫米）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} data.shapes 为命中的形状
+     */
+    async shapesAt(filePath, page, x, y, jobOptions = {}) {
+        return this.querySingle(filePath, { op: 'at', page, x, y }, jobOptions);
+    }
+
+    /**
+     * 区域内的形状
+     * @param {string} filePath - ODG文件路径
+     * @param {number} page - 页码（从1开始）
+     * @param {Array<number>} rect - 区域 [x, y, w, h]（1/100毫米）
+     * @param {Object} options - 选项
+     * @param {string} options.mode - intersects（与区域相交，默认）或 contains（完全在区域内）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} data.shapes 为区域内的形状
+     */
+    async shapesIn(filePath, page, rect, options = {}, jobOptions = {}) {
+        return this.querySingle(filePath, { op: 'in', page, rect, mode: options.mode || 'intersects' }, jobOptions);
+    }
+
+    /**
+     * 距离某一点最近的形状
+     * @param {string} filePath - ODG文件路径
+     * @param {number} page - 页码（从1开始）
+     * @param {number} x - 横坐标（1/100毫米）
+     * @param {number} y - 纵坐标（1/100毫米）
+     * @param {number} k - 返回的形状数（默认1）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} data.shapes 为按距离排列的形状（附带distance）
+     */
+    async nearestShapes(filePath, page, x, y, k = 1, jobOptions = {}) {
+        return this.querySingle(filePath, { op: 'nearest', page, x, y, k }, jobOptions);
+    }
+
+    /**
+     * 建立或增量更新模板目录的全文索引
+     *
+     * 直接解析ODG文件中的XML（不需要office），在多个进程中并行解析；
+     * 索引保存在sqlite数据库中，再次调用时只解析修改时间或大小变化的文件，并删除已不存在的文件。
+     * @param {string} directory - 模板目录（包括子目录）
+     * @param {Object} options - 选项
+     * @param {string} options.db - 索引数据库路径
+     * @param {number} options.workers - 并行解析的进程数，默认CPU核数
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 更新统计：scanned、added、updated、removed、unchanged、errors、index
+     */
+    async indexTemplates(directory, options = {}, jobOptions = {}) {
+        try {
+            if (!options.db) {
+                throw new Error('options.db is required');
+            }
+            const args = [path.resolve(directory), path.resolve(options.db)];
+            if (options.workers) {
+                args.push(String(options.workers));
+            }
+            return await this.executeLocalCommand('index_templates', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to index templates', error);
+        }
+    }
+
+    /**
+     * 在模板全文索引中查找包含某个形状名称或文本片段的模板
+     * @param {string} query - 形状名称或文本片段
+     * @param {Object} options - 选项
+     * @param {string} options.db - 索引数据库路径
+     * @param {string} options.field - text（文本包含该片段，默认）、name（形状名称完全匹配，不区分大小写）、any
+     * @param {number} options.limit - 最多返回的形状数（默认100）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} data.matches 为命中的形状（file_path、page_number、shape_index、path、shape_name、text）
+     */
+    async searchTemplates(query, options = {}, jobOptions = {}) {
+        try {
+            if (!options.db) {
+                throw new Error('options.db is required');
+            }
+            const args = [path.resolve(options.db), query, options.field || 'text', String(options.limit || 100)];
+            return await this.executeLocalCommand('search_templates', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to search templates', error);
         }
     }
 
@@ -98,10 +749,11 @@ class ODGProcessor {
      * @param {string} filePath - ODG文件路径
      * @param {Object} shapeTextMap - 形状名称到新文本的映射
      * @param {string} outputPath - 输出文件路径（可选）
-     * @param {boolean} exportPDF - 是否导出PDF（默认true）
+     * @param {boolean|string} exportPDF - 是否导出PDF（默认true），也可以是PDF导出配置名称（fast、web、print、archive）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
      * @returns {Promise<Object>} 修改结果
      */
-    async modifyTexts(filePath, shapeTextMap, outputPath = null, exportPDF = true) {
+    async modifyTexts(filePath, shapeTextMap, outputPath = null, exportPDF = true, jobOptions = {}) {
         try {
             const absolutePath = path.resolve(filePath);
             const absoluteOutputPath = outputPath ? path.resolve(outputPath) : null;
@@ -110,13 +762,13 @@ class ODGProcessor {
                 absolutePath,
                 JSON.stringify(shapeTextMap),
                 absoluteOutputPath || '',
-                exportPDF.toString()
+                formatExportPDF(exportPDF)
             ];
 
-            const result = await this.executePythonScript('modify_texts', args);
+            const result = await this.executePythonScript('modify_texts', args, jobOptions);
             return result;
         } catch (error) {
-            throw new Error(`Failed to modify texts: ${error.message}`);
+            throw wrapError('Failed to modify texts', error);
         }
     }
 
@@ -126,44 +778,275 @@ class ODGProcessor {
      * @param {string} shapeName - 形状名称
      * @param {string} newText - 新文本内容
      * @param {string} outputPath - 输出文件路径（可选）
-     * @param {boolean} exportPDF - 是否导出PDF（默认true）
+     * @param {boolean|string} exportPDF - 是否导出PDF（默认true），也可以是PDF导出配置名称
+     * @param {Object} jobOptions - 任务选项（priority, signal）
      * @returns {Promise<Object>} 修改结果
      */
-    async modifyText(filePath, shapeName, newText, outputPath = null, exportPDF = true) {
+    async modifyText(filePath, shapeName, newText, outputPath = null, exportPDF = true, jobOptions = {}) {
         const shapeTextMap = { [shapeName]: newText };
-        return this.modifyTexts(filePath, shapeTextMap, outputPath, exportPDF);
+        return this.modifyTexts(filePath, shapeTextMap, outputPath, exportPDF, jobOptions);
     }
 
     /**
-     * 创建新的ODG文件
+     * 按形状名称替换图片形状的图片（员工照片、签名、徽标等）
+     *
+     * 图片按内容哈希缓存：同一图片文件只读取一次，每个office工作进程只解码一次，文档中相同的图片只保存一份
+     * @param {string} filePath - ODG文件路径
+     * @param {Object} shapeImageMap - 形状名称到图片文件路径（或 "data:image/png;base64,..."）的映射
+     * @param {string} outputPath - 输出文件路径（可选，默认覆盖原文件）
+     * @param {Object} options - 选项
+     * @param {string} options.engine - uno（默认，经过office）或 xml（直接改写ODG包，不需要office，不导出PDF）
+     * @param {Object} options.texts - 同时修改的文本（形状名称 -> 文本，仅uno方式）
+     * @param {boolean|string} options.exportPDF - 是否导出PDF或PDF导出配置名称（默认true，仅uno方式）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 替换结果
+     */
+    async replaceImages(filePath, shapeImageMap, outputPath = null, options = {}, jobOptions = {}) {
+        try {
+            const images = {};
+            for (const [shapeName, image] of Object.entries(shapeImageMap)) {
+                images[shapeName] = image.startsWith('data:') ? image : path.resolve(image);
+            }
+            const absoluteOutputPath = outputPath ? path.resolve(outputPath) : '';
+            if (options.engine === 'xml') {
+                return await this.executeLocalCommand('replace_images', [
+                    path.resolve(filePath), JSON.stringify(images), absoluteOutputPath
+                ], jobOptions);
+            }
+            const args = [
+                path.resolve(filePath),
+                JSON.stringify(options.texts || {}),
+                absoluteOutputPath,
+                formatExportPDF(options.exportPDF),
+                JSON.stringify(images)
+            ];
+            return await this.executePythonScript('modify_texts', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to replace images', error);
+        }
+    }
+
+    /**
+     * 创建新的ODG文件（只有一个空白页，由Python端直接写出，不需要office）
      * @param {string} outputPath - 输出文件路径
+     * @param {Object} jobOptions - 任务选项（priority, signal）
      * @returns {Promise<Object>} 创建结果
      */
-    async createODG(outputPath) {
+    async createODG(outputPath, jobOptions = {}) {
         try {
             const absoluteOutputPath = path.resolve(outputPath);
-            const result = await this.executePythonScript('create_odg', [absoluteOutputPath]);
+            // 由Python端直接写出ODG文件，不需要office，客户端模式下也在本机执行
+            const result = await this.executeLocalCommand('create_odg', [absoluteOutputPath], jobOptions);
             return result;
         } catch (error) {
-            throw new Error(`Failed to create ODG: ${error.message}`);
+            throw wrapError('Failed to create ODG', error);
+        }
+    }
+
+    /**
+     * 按描述生成ODG文件（Python端直接写出ODF压缩包，不需要office）
+     * @param {string} outputPath - 输出文件路径
+     * @param {Object} spec - 文档描述
+     * @param {number} spec.page_width - 页面宽度（1/100毫米，默认21000）
+     * @param {number} spec.page_height - 页面高度（1/100毫米，默认29700）
+     * @param {string} spec.title - 文档标题
+     * @param {Object} spec.styles - 样式名称到样式属性的映射：fill_color、line_color、line_width、line_style、
+     *     font_size、font_color、bold、text_align（颜色为0xRRGGBB整数）
+     * @param {Array<Object>} spec.pages - 页面：{ name, shapes }，形状为
+     *     { type: 'rectangle' | 'ellipse' | 'text', x, y, width, height, text, name, style }、
+     *     { type: 'line', x1, y1, x2, y2 } 或 { type: 'group', name, shapes }，其他键作为该形状的样式属性
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 创建结果
+     */
+    async buildODG(outputPath, spec, jobOptions = {}) {
+        try {
+            const args = [path.resolve(outputPath), JSON.stringify(spec || {})];
+            return await this.executeLocalCommand('create_odg', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to build ODG', error);
+        }
+    }
+
+    /**
+     * 预编译模板：分析一次content.xml，把命名形状的文本位置和预先压缩的ZIP条目保存为编译产物（不需要office）
+     * @param {string} templatePath - 模板ODG文件路径
+     * @param {Object} options - 选项
+     * @param {string} options.output - 编译产物路径（默认为模板旁边的 .odgt 文件）
+     * @param {number} options.compressLevel - 渲染时content.xml的压缩级别（0不压缩，默认1）
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 编译结果（artifact_path, slots）
+     */
+    async compileTemplate(templatePath, options = {}, jobOptions = {}) {
+        try {
+            const args = [
+                path.resolve(templatePath),
+                options.output ? path.resolve(options.output) : '',
+                String(options.compressLevel !== undefined ? options.compressLevel : 1)
+            ];
+            return await this.executeLocalCommand('compile_template', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to compile template', error);
+        }
+    }
+
+    /**
+     * 用预编译模板生成一个ODG文件（不需要office，不导出PDF）
+     * @param {string} templatePath - 模板ODG文件或编译产物路径（ODG文件在Python进程内只编译一次）
+     * @param {Object} shapeTextMap - 形状名称到文本的映射
+     * @param {string} outputPath - 输出文件路径
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 生成结果
+     */
+    async renderCompiled(templatePath, shapeTextMap, outputPath, jobOptions = {}) {
+        try {
+            const args = [path.resolve(templatePath), JSON.stringify(shapeTextMap), path.resolve(outputPath)];
+            return await this.executeLocalCommand('render_compiled', args, jobOptions);
+        } catch (error) {
+            throw wrapError('Failed to render compiled template', error);
+        }
+    }
+
+    /**
+     * 流式批量渲染：逐条读取记录填充模板，每条记录输出一个文件
+     * @param {string} templatePath - 模板ODG文件路径
+     * @param {string|Iterable|AsyncIterable} source - CSV/JSONL文件路径，或记录对象的（异步）迭代器（经stdin流式传入）
+     * @param {string} outputPattern - 输出路径模板，可使用{id}、{index}及记录中的列，如 "out/{id}.odg"
+     * @param {Object} options - 选项
+     * @param {string} options.format - 记录格式：csv / jsonl（默认按扩展名判断）
+     * @param {Object} options.columns - 列名到形状名称的映射（默认除id列外按同名形状处理）
+     * @param {string} options.idColumn - 记录id所在的列（默认id）
+     * @param {boolean|string} options.exportPDF - 是否同时导出PDF（默认true），也可以是PDF导出配置名称
+     * @param {string} options.encoding - 文件编码（默认utf-8）
+     * @param {string} options.journal - 检查点日志路径，重新运行时跳过已完成的记录
+     * @param {boolean} options.verifyJournal - 跳过记录前校验输出文件的校验和（默认只检查文件是否存在）
+     * @param {number} options.retries - 单条记录失败后的重试次数（默认2）
+     * @param {number} options.progressInterval - progress事件的最短间隔（毫秒，默认1000）
+     * @param {Object} options.images - 图片列名到图片形状名称的映射，列的值为图片文件路径
+     * @param {string} options.imageDir - 图片相对路径的基准目录（默认当前目录）
+     * @param {string} options.engine - compiled：用预编译模板直接生成ODG（不需要office，不导出PDF，客户端模式下也在本机执行）
+     * @param {number} options.compressLevel - 预编译模板渲染时content.xml的压缩级别（默认1）
+     * @param {Function} options.onRecord - 每条记录完成后的回调
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 汇总结果（total, succeeded, skipped, retried, failed, failures）
+     */
+    async batch(templatePath, source, outputPattern, options = {}, jobOptions = {}) {
+        const job = this.streamBatch(templatePath, source, outputPattern, options, jobOptions);
+        if (options.onRecord) {
+            job.on('record-done', options.onRecord);
+        }
+        try {
+            return await job.result;
+        } catch (error) {
+            throw wrapError('Failed to run batch', error);
+        }
+    }
+
+    /**
+     * 以事件流的形式执行批量渲染，参数同batch()
+     *
+     * 每条记录完成时触发 'record-done'（包含输出路径和字节数），并定期触发 'progress'；
+     * 也可以用 for await 逐个消费事件，使上传等后续处理与渲染重叠进行。
+     * @returns {JobStream} 事件流，result为汇总结果
+     */
+    streamBatch(templatePath, source, outputPattern, options = {}, jobOptions = {}) {
+        const fromFile = typeof source === 'string';
+        const args = [
+            path.resolve(templatePath),
+            fromFile ? path.resolve(source) : '-',
+            path.resolve(outputPattern),
+            JSON.stringify({
+                format: options.format || (fromFile ? undefined : 'jsonl'),
+                columns: options.columns,
+                id_column: options.idColumn,
+                export_pdf: options.exportPDF !== undefined ? options.exportPDF : true,
+                encoding: options.encoding,
+                journal: options.journal ? path.resolve(options.journal) : undefined,
+                verify_journal: options.verifyJournal,
+                retries: options.retries,
+                progress_interval: options.progressInterval !== undefined
+                    ? options.progressInterval / 1000
+                    : undefined,
+                images: options.images,
+                image_dir: path.resolve(options.imageDir || '.'),
+                engine: options.engine,
+                compress_level: options.compressLevel
+            })
+        ];
+        // 批量任务需要独占stdin/stdout，常驻模式下也使用单独的Python进程
+        const local = options.engine === 'compiled';
+        return this.stream('batch', args, { ...jobOptions, local }, fromFile ? null : source);
+    }
+
+    /**
+     * 把目录树中的ODG文件并行导出为PDF
+     *
+     * Python端启动多个office工作进程（常驻模式下使用已有的工作进程池），工作进程从共享队列中取文件；
+     * 输出不比源文件旧的文件跳过，中断后重新运行只转换剩下的文件。
+     * @param {string} sourceDir - 源目录（包括子目录）
+     * @param {string} outputDir - 输出目录，保持相同的相对目录结构；为空时输出到源文件旁边
+     * @param {Object} options - 选项
+     * @param {number} options.workers - 单次调用模式下启动的office进程数（默认CPU核数）
+     * @param {boolean} options.force - 重新转换已是最新的文件（更换导出配置后需要指定）
+     * @param {string} options.profile - PDF导出配置名称：default（默认）、fast、web、print、archive
+     * @param {number} options.progressInterval - progress事件的最短间隔（毫秒，默认1000）
+     * @param {Function} options.onFile - 每个文件完成或跳过后的回调
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @returns {Promise<Object>} 汇总结果（total, converted, skipped, failed, failures, elapsed, files_per_second）
+     */
+    async convertDirectory(sourceDir, outputDir = null, options = {}, jobOptions = {}) {
+        const job = this.streamConvertDirectory(sourceDir, outputDir, options, jobOptions);
+        if (options.onFile) {
+            job.on('file-done', options.onFile);
+        }
+        try {
+            return await job.result;
+        } catch (error) {
+            throw wrapError('Failed to convert directory', error);
         }
     }
 
+    /**
+     * 以事件流的形式转换目录，参数同convertDirectory()
+     *
+     * 每个文件完成或跳过时触发 'file-done'（source、output、success、skipped、bytes、seconds），
+     * 并定期触发 'progress'（processed、converted、skipped、failed、rate）。
+     * @returns {JobStream} 事件流，result为汇总结果
+     */
+    streamConvertDirectory(sourceDir, outputDir = null, options = {}, jobOptions = {}) {
+        const args = [
+            path.resolve(sourceDir),
+            outputDir ? path.resolve(outputDir) : '',
+            JSON.stringify({
+                workers: options.workers,
+                force: options.force,
+                profile: options.profile,
+                progress_interval: options.progressInterval !== undefined
+                    ? options.progressInterval / 1000
+                    : undefined
+            })
+        ];
+        return this.stream('convert_dir', args, jobOptions);
+    }
+
     /**
      * 导出ODG为PDF
      * @param {string} filePath - ODG文件路径
      * @param {string} outputPath - PDF输出路径
+     * @param {Object} jobOptions - 任务选项（priority, signal）
+     * @param {string} jobOptions.profile - PDF导出配置名称：default（默认）、fast、web、print、archive
      * @returns {Promise<Object>} 导出结果
      */
-    async exportToPDF(filePath, outputPath) {
+    async exportToPDF(filePath, outputPath, jobOptions = {}) {
         try {
             const absolutePath = path.resolve(filePath);
             const absoluteOutputPath = path.resolve(outputPath);
+            const { profile, ...options } = jobOptions;
             
-            const result = await this.executePythonScript('export_pdf', [absolutePath, absoluteOutputPath]);
+            const result = await this.executePythonScript(
+                'export_pdf', [absolutePath, absoluteOutputPath, profile || ''], options);
             return result;
         } catch (error) {
-            throw new Error(`Failed to export PDF: ${error.message}`);
+            throw wrapError('Failed to export PDF', error);
         }
     }
 }
@@ -176,8 +1059,13 @@ class ODGProcessor {
  * @returns {Promise<Object>} 文件信息
  */
 async function getODGInfo(filePath, options = {}) {
-    const processor = new ODGProcessor(options);
-    return processor.getODGInfo(filePath);
+    const processor = getDefaultProcessor(options);
+    return processor.getODGInfo(filePath, {
+        ...jobOptionsFrom(options),
+        fields: options.fields,
+        pages: options.pages,
+        format: options.format
+    });
 }
 
 /**
@@ -188,12 +1076,13 @@ async function getODGInfo(filePath, options = {}) {
  * @returns {Promise<Object>} 修改结果
  */
 async function modifyODGTexts(filePath, shapeTextMap, options = {}) {
-    const processor = new ODGProcessor(options);
+    const processor = getDefaultProcessor(options);
     return processor.modifyTexts(
         filePath, 
         shapeTextMap, 
         options.outputPath, 
-        options.exportPDF !== false
+        options.exportPDF !== undefined ? options.exportPDF : true,
+        jobOptionsFrom(options)
     );
 }
 
@@ -206,18 +1095,25 @@ async function modifyODGTexts(filePath, shapeTextMap, options = {}) {
  * @returns {Promise<Object>} 修改结果
  */
 async function modifyODGText(filePath, shapeName, newText, options = {}) {
-    const processor = new ODGProcessor(options);
+    const processor = getDefaultProcessor(options);
     return processor.modifyText(
         filePath, 
         shapeName, 
         newText, 
         options.outputPath, 
-        options.exportPDF !== false
+        options.exportPDF !== undefined ? options.exportPDF : true,
+        jobOptionsFrom(options)
     );
 }
 
 module.exports = {
     ODGProcessor,
+    JobQueue,
+    JobStream,
+    QueueFullError,
+    AbortError,
+    getDefaultQueue,
+    getDefaultProcessor,
     getODGInfo,
     modifyODGTexts,
     modifyODGText
@@ -0,0 +1,175 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+const { AbortError } = require('./job_queue');
+
+/**
+ * 常驻的Python桥接进程（odg_bridge.py serve）
+ *
+ * Python端维护office工作进程池，请求和响应以逐行JSON的形式通过stdin/stdout传递，
+ * 避免每个任务都启动新的Python进程并重新连接office。
+ */
+class BridgeDaemon {
+    /**
+     * @param {Object} options - 选项
+     * @param {string} options.pythonPath - LibreOffice Python路径
+     * @param {string} options.scriptPath - odg_bridge.py路径
+     * @param {Object} options.env - 传递给Python进程的环境变量
+     */
+    constructor(options) {
+        this.pythonPath = options.pythonPath;
+        this.scriptPath = options.scriptPath;
+        this.env = options.env;
+        this.process = null;
+        this.ready = null;
+        this.pending = new Map();
+        this.nextId = 0;
+        this.stderrTail = '';
+    }
+
+    /**
+     * 启动常驻进程，工作进程池就绪后resolve
+     */
+    start() {
+        if (this.ready) {
+            return this.ready;
+        }
+
+        this.ready = new Promise((resolve, reject) => {
+            const child = spawn(this.pythonPath, [this.scriptPath, 'serve'], {
+                stdio: ['pipe', 'pipe', 'pipe'],
+                env: this.env
+            });
+            this.process = child;
+
+            child.stderr.on('data', (data) => {
+                // 只保留最近的日志，用于进程异常退出时的错误信息
+                this.stderrTail = (this.stderrTail + data.toString()).slice(-4096);
+            });
+
+            readline.createInterface({ input: child.stdout }).on('line', (line) => {
+                let message;
+                try {
+                    message = JSON.parse(line);
+                } catch (e) {
+                    return;
+                }
+                if (message.type === 'ready') {
+                    resolve(message);
+                } else if (message.type === 'error' && message.id === undefined) {
+                    reject(new Error(`Bridge daemon failed to start: ${message.error}`));
+                } else {
+                    this.handleMessage(message);
+                }
+            });
+
+            child.on('error', (error) => {
+                reject(new Error(`Failed to start Python process: ${error.message}`));
+            });
+
+            child.on('close', (code) => {
+                const error = new Error(`Bridge daemon exited with code ${code}: ${this.stderrTail}`);
+                reject(error);
+                for (const { reject: rejectPending } of this.pending.values()) {
+                    rejectPending(error);
+                }
+                this.pending.clear();
+                // 下一次请求时重新启动
+                this.process = null;
+                this.ready = null;
+            });
+        });
+
+        return this.ready;
+    }
+
+    /**
+     * 处理Python端的响应消息
+     */
+    handleMessage(message) {
+        const entry = this.pending.get(message.id);
+        if (!entry) {
+            return;
+        }
+        if (message.type === 'event') {
+            if (entry.onEvent) {
+                entry.onEvent(message.event);
+            }
+            return;
+        }
+        this.pending.delete(message.id);
+        entry.resolve(message.result);
+    }
+
+    /**
+     * 发送请求
+     * @param {string} command - 桥接命令
+     * @param {Array} args - 命令参数
+     * @param {AbortSignal} signal - 取消信号
+     * @param {number} timeoutMs - 超时（毫秒），超时后取消任务
+     * @param {Function} onEvent - 进度事件回调（可选）
+     * @returns {Promise<Object>} 命令结果
+     */
+    async request(command, args = [], signal = null, timeoutMs = null, onEvent = null) {
+        await this.start();
+
+        return new Promise((resolve, reject) => {
+            const id = ++this.nextId;
+            let timer = null;
+            const cancel = (error) => {
+                if (this.pending.delete(id)) {
+                    cleanup();
+                    this.send({ type: 'cancel', id });
+                    reject(error);
+                }
+            };
+            const onAbort = () => cancel(new AbortError());
+            const cleanup = () => {
+                clearTimeout(timer);
+                if (signal) {
+                    signal.removeEventListener('abort', onAbort);
+                }
+            };
+            if (timeoutMs) {
+                timer = setTimeout(() => {
+                    const error = new Error(`Bridge request timed out after ${timeoutMs}ms`);
+                    error.code = 'ETIMEDOUT';
+                    cancel(error);
+                }, timeoutMs);
+            }
+
+            this.pending.set(id, {
+                resolve: (result) => { cleanup(); resolve(result); },
+                reject: (error) => { cleanup(); reject(error); },
+                onEvent
+            });
+            if (signal) {
+                signal.addEventListener('abort', onAbort, { once: true });
+            }
+            this.send(onEvent ? { id, command, args, events: true } : { id, command, args });
+        });
+    }
+
+    send(message) {
+        if (this.process) {
+            this.process.stdin.write(JSON.stringify(message) + '\n');
+        }
+    }
+
+    /**
+     * 停止常驻进程，Python端会等待正在执行的任务完成后关闭所有office
+     */
+    async stop() {
+        if (!this.process) {
+            return;
+        }
+        const child = this.process;
+        await new Promise((resolve) => {
+            child.once('close', resolve);
+            child.stdin.end();
+        });
+    }
+}
+
+module.exports = {
+    BridgeDaemon
+};
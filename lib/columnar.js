@@ -0,0 +1,55 @@
+const os = require('os');
+
+const LITTLE_ENDIAN = os.endianness() === 'LE';
+
+// 列式编码中的数值列
+const NUMERIC_COLUMNS = ['index', 'x', 'y', 'w', 'h', 'types'];
+
+/**
+ * 解码一列数值：binary编码为base64的小端int32，columnar编码为JSON数组
+ * @returns {Int32Array}
+ */
+function decodeInt32Column(column) {
+    if (typeof column !== 'string') {
+        return Int32Array.from(column);
+    }
+    const buffer = Buffer.from(column, 'base64');
+    if (LITTLE_ENDIAN) {
+        // 复制到对齐的ArrayBuffer后直接作为Int32Array使用
+        const aligned = new Uint8Array(buffer.length);
+        aligned.set(buffer);
+        return new Int32Array(aligned.buffer);
+    }
+    const values = new Int32Array(buffer.length / 4);
+    for (let i = 0; i < values.length; i++) {
+        values[i] = buffer.readInt32LE(i * 4);
+    }
+    return values;
+}
+
+/**
+ * 把列式编码（columnar / binary）的文件信息中的数值列解码为Int32Array
+ *
+ * 每页的 columns 包含 index、x、y、w、h、types（shape_types中的序号）数值列，
+ * 以及 names、text 字符串数组；只包含请求的字段对应的列。
+ * @param {Object} data - Python端返回的data
+ * @returns {Object} 数值列为Int32Array的文件信息
+ */
+function decodeColumnarInfo(data) {
+    if (!data || !data.pages_info) {
+        return data;
+    }
+    for (const page of data.pages_info) {
+        for (const name of NUMERIC_COLUMNS) {
+            if (page.columns && page.columns[name] !== undefined) {
+                page.columns[name] = decodeInt32Column(page.columns[name]);
+            }
+        }
+    }
+    return data;
+}
+
+module.exports = {
+    decodeColumnarInfo,
+    decodeInt32Column
+};
@@ -0,0 +1,71 @@
+const fs = require('fs').promises;
+
+/**
+ * 文件信息的LRU缓存
+ *
+ * 按文件标识（路径、大小、修改时间、inode）和查询参数缓存getODGInfo的结果，
+ * 文件被修改后标识变化，旧条目不再命中并随LRU淘汰。
+ */
+class InfoCache {
+    /**
+     * @param {Object} options - 选项
+     * @param {number} options.maxEntries - 缓存的条目数（默认256）
+     */
+    constructor(options = {}) {
+        this.maxEntries = options.maxEntries || 256;
+        this.entries = new Map();
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    /**
+     * 文件标识加上查询参数（字段投影、页面范围），文件不存在时返回null
+     */
+    async keyFor(filePath, variant = '') {
+        try {
+            const stat = await fs.stat(filePath);
+            return [filePath, stat.size, stat.mtimeMs, stat.ino, variant].join('\u0000');
+        } catch (error) {
+            return null;
+        }
+    }
+
+    get(key) {
+        if (key === null || !this.entries.has(key)) {
+            this.misses++;
+            return undefined;
+        }
+        const value = this.entries.get(key);
+        // 重新插入，使其成为最近使用的条目
+        this.entries.delete(key);
+        this.entries.set(key, value);
+        this.hits++;
+        return JSON.parse(value);
+    }
+
+    set(key, value) {
+        if (key === null) {
+            return;
+        }
+        this.entries.delete(key);
+        // 以JSON保存，调用方修改返回值不会影响缓存
+        this.entries.set(key, JSON.stringify(value));
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+
+    getStats() {
+        const lookups = this.hits + this.misses;
+        return {
+            entries: this.entries.size,
+            hits: this.hits,
+            misses: this.misses,
+            hitRate: lookups ? this.hits / lookups : null
+        };
+    }
+}
+
+module.exports = {
+    InfoCache
+};
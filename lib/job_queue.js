@@ -0,0 +1,215 @@
+const os = require('os');
+
+/**
+ * 优先级定义，数值越小越先执行
+ */
+const PRIORITIES = {
+    high: 0,
+    normal: 1,
+    low: 2
+};
+
+/**
+ * 队列已满时抛出的错误
+ */
+class QueueFullError extends Error {
+    constructor(maxQueueLength) {
+        super(`Job queue is full (maxQueueLength=${maxQueueLength})`);
+        this.name = 'QueueFullError';
+        this.code = 'EQUEUEFULL';
+    }
+}
+
+/**
+ * 任务被AbortSignal取消时抛出的错误
+ */
+class AbortError extends Error {
+    constructor(message = 'The job was aborted') {
+        super(message);
+        this.name = 'AbortError';
+        this.code = 'ABORT_ERR';
+    }
+}
+
+/**
+ * 带并发上限、有界队列、优先级和取消功能的任务队列
+ */
+class JobQueue {
+    /**
+     * @param {Object} options - 队列选项
+     * @param {number} options.maxConcurrency - 最大并发任务数（默认CPU核数）
+     * @param {number} options.maxQueueLength - 最大排队任务数，超出时拒绝（默认1000）
+     */
+    constructor(options = {}) {
+        this.maxConcurrency = Math.max(1, options.maxConcurrency || os.cpus().length || 1);
+        this.maxQueueLength = options.maxQueueLength !== undefined ? options.maxQueueLength : 1000;
+
+        // 每个优先级一个FIFO队列
+        this.queues = Object.keys(PRIORITIES).map(() => []);
+        this.running = 0;
+        this.sequence = 0;
+
+        this.stats = {
+            submitted: 0,
+            completed: 0,
+            failed: 0,
+            cancelled: 0,
+            rejected: 0,
+            totalWaitMs: 0,
+            maxWaitMs: 0,
+            startedCount: 0
+        };
+    }
+
+    /**
+     * 当前排队任务数
+     */
+    get depth() {
+        return this.queues.reduce((sum, queue) => sum + queue.length, 0);
+    }
+
+    /**
+     * 提交任务
+     * @param {Function} task - 任务函数，参数为AbortSignal（可能为undefined），返回Promise
+     * @param {Object} jobOptions - 任务选项
+     * @param {string} jobOptions.priority - 优先级：high / normal / low（默认normal）
+     * @param {AbortSignal} jobOptions.signal - 用于取消任务的AbortSignal
+     * @returns {Promise<*>} 任务结果
+     */
+    push(task, jobOptions = {}) {
+        const { signal } = jobOptions;
+        const priority = jobOptions.priority || 'normal';
+
+        if (!(priority in PRIORITIES)) {
+            return Promise.reject(new Error(`Unknown job priority: ${priority}`));
+        }
+        if (signal && signal.aborted) {
+            this.stats.cancelled++;
+            return Promise.reject(new AbortError());
+        }
+        if (this.running >= this.maxConcurrency && this.depth >= this.maxQueueLength) {
+            this.stats.rejected++;
+            return Promise.reject(new QueueFullError(this.maxQueueLength));
+        }
+
+        this.stats.submitted++;
+
+        return new Promise((resolve, reject) => {
+            const job = {
+                id: ++this.sequence,
+                task,
+                signal,
+                resolve,
+                reject,
+                enqueuedAt: Date.now(),
+                queue: this.queues[PRIORITIES[priority]],
+                onAbort: null
+            };
+
+            // 排队期间被取消：直接从队列移除
+            if (signal) {
+                job.onAbort = () => {
+                    const index = job.queue.indexOf(job);
+                    if (index !== -1) {
+                        job.queue.splice(index, 1);
+                        this.stats.cancelled++;
+                        reject(new AbortError());
+                    }
+                };
+                signal.addEventListener('abort', job.onAbort, { once: true });
+            }
+
+            job.queue.push(job);
+            this._drain();
+        });
+    }
+
+    /**
+     * 在并发允许时启动排队中的任务
+     */
+    _drain() {
+        while (this.running < this.maxConcurrency) {
+            const queue = this.queues.find(q => q.length > 0);
+            if (!queue) {
+                return;
+            }
+            this._start(queue.shift());
+        }
+    }
+
+    _start(job) {
+        if (job.signal && job.onAbort) {
+            job.signal.removeEventListener('abort', job.onAbort);
+        }
+
+        const waitMs = Date.now() - job.enqueuedAt;
+        this.stats.startedCount++;
+        this.stats.totalWaitMs += waitMs;
+        this.stats.maxWaitMs = Math.max(this.stats.maxWaitMs, waitMs);
+
+        this.running++;
+        let promise;
+        try {
+            promise = Promise.resolve(job.task(job.signal));
+        } catch (error) {
+            promise = Promise.reject(error);
+        }
+
+        promise.then(
+            (result) => {
+                this.stats.completed++;
+                job.resolve(result);
+            },
+            (error) => {
+                if (error && error.name === 'AbortError') {
+                    this.stats.cancelled++;
+                } else {
+                    this.stats.failed++;
+                }
+                job.reject(error);
+            }
+        ).then(() => {
+            this.running--;
+            this._drain();
+        });
+    }
+
+    /**
+     * 获取队列统计信息
+     * @returns {Object} 队列深度、运行数和等待时间统计
+     */
+    getStats() {
+        const queuedByPriority = {};
+        for (const [name, index] of Object.entries(PRIORITIES)) {
+            queuedByPriority[name] = this.queues[index].length;
+        }
+
+        const now = Date.now();
+        const oldest = this.queues
+            .filter(q => q.length > 0)
+            .map(q => q[0].enqueuedAt);
+
+        return {
+            maxConcurrency: this.maxConcurrency,
+            maxQueueLength: this.maxQueueLength,
+            running: this.running,
+            queued: this.depth,
+            queuedByPriority,
+            submitted: this.stats.submitted,
+            completed: this.stats.completed,
+            failed: this.stats.failed,
+            cancelled: this.stats.cancelled,
+            rejected: this.stats.rejected,
+            avgWaitMs: this.stats.startedCount ? this.stats.totalWaitMs / this.stats.startedCount : 0,
+            maxWaitMs: this.stats.maxWaitMs,
+            oldestWaitMs: oldest.length ? now - Math.min(...oldest) : 0
+        };
+    }
+}
+
+module.exports = {
+    JobQueue,
+    QueueFullError,
+    AbortError,
+    PRIORITIES
+};
@@ -0,0 +1,138 @@
+const { EventEmitter } = require('events');
+
+/**
+ * 长任务的事件流
+ *
+ * Python端逐行输出的事件按其type（progress、record-done）触发同名事件，并统一触发 'event'；
+ * 也可以用 for await 逐个消费。任务结束时触发 'end'，result 解析为最终结果。
+ * 以迭代器消费时，未消费的事件超过 highWaterMark 会暂停读取Python端输出，形成背压。
+ */
+class JobStream extends EventEmitter {
+    /**
+     * @param {Object} options - 选项
+     * @param {number} options.highWaterMark - 迭代器缓冲的事件上限（默认1000）
+     */
+    constructor(options = {}) {
+        super();
+        this.highWaterMark = options.highWaterMark || 1000;
+        this.buffer = [];
+        this.waiters = [];
+        this.iterating = false;
+        this.finished = false;
+        this.error = null;
+        this.paused = false;
+        this.flowControl = null;
+        this.result = new Promise((resolve, reject) => {
+            this.resolveResult = resolve;
+            this.rejectResult = reject;
+        });
+        // 只通过事件或迭代器消费时，result的拒绝不应成为未处理的Promise拒绝
+        this.result.catch(() => {});
+    }
+
+    /**
+     * 设置暂停/恢复Python端输出的函数
+     */
+    setFlowControl(pause, resume) {
+        this.flowControl = { pause, resume };
+    }
+
+    /**
+     * 推送一条事件
+     */
+    push(event) {
+        if (this.finished) {
+            return;
+        }
+        if (event.type) {
+            this.emit(event.type, event);
+        }
+        this.emit('event', event);
+        if (!this.iterating) {
+            return;
+        }
+        const waiter = this.waiters.shift();
+        if (waiter) {
+            waiter.resolve({ value: event, done: false });
+            return;
+        }
+        this.buffer.push(event);
+        if (this.buffer.length >= this.highWaterMark && this.flowControl && !this.paused) {
+            this.paused = true;
+            this.flowControl.pause();
+        }
+    }
+
+    /**
+     * 任务完成
+     */
+    end(result) {
+        if (this.finished) {
+            return;
+        }
+        this.finished = true;
+        this.resolveResult(result);
+        this.emit('end', result);
+        for (const waiter of this.waiters.splice(0)) {
+            waiter.resolve({ value: undefined, done: true });
+        }
+    }
+
+    /**
+     * 任务失败
+     */
+    fail(error) {
+        if (this.finished) {
+            return;
+        }
+        this.finished = true;
+        this.error = error;
+        this.rejectResult(error);
+        if (this.listenerCount('error') > 0) {
+            this.emit('error', error);
+        }
+        for (const waiter of this.waiters.splice(0)) {
+            waiter.reject(error);
+        }
+    }
+
+    [Symbol.asyncIterator]() {
+        this.iterating = true;
+        return {
+            next: () => {
+                if (this.buffer.length > 0) {
+                    const value = this.buffer.shift();
+                    if (this.paused && this.buffer.length <= this.highWaterMark / 2) {
+                        this.paused = false;
+                        this.flowControl.resume();
+                    }
+                    return Promise.resolve({ value, done: false });
+                }
+                if (this.error) {
+                    return Promise.reject(this.error);
+                }
+                if (this.finished) {
+                    return Promise.resolve({ value: undefined, done: true });
+                }
+                return new Promise((resolve, reject) => this.waiters.push({ resolve, reject }));
+            },
+            return: () => {
+                // 提前结束迭代时不再缓冲事件，任务本身继续运行
+                this.iterating = false;
+                this.buffer = [];
+                if (this.paused) {
+                    this.paused = false;
+                    this.flowControl.resume();
+                }
+                return Promise.resolve({ value: undefined, done: true });
+            },
+            [Symbol.asyncIterator]() {
+                return this;
+            }
+        };
+    }
+}
+
+module.exports = {
+    JobStream
+};
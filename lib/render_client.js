@@ -0,0 +1,487 @@
+const http = require('http');
+const https = require('https');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const { pipeline } = require('stream/promises');
+const { AbortError } = require('./job_queue');
+
+// 可以换一个节点重试的网络错误
+const RETRYABLE_CODES = new Set(['ECONNREFUSED', 'ECONNRESET', 'EHOSTUNREACH', 'ENOTFOUND', 'EPIPE', 'ESOCKETTIMEDOUT']);
+
+/**
+ * 渲染服务（odg_server.py）的客户端
+ *
+ * 在多个渲染节点之间做客户端负载均衡：选择进行中请求最少的可用节点，
+ * 节点拒绝连接或返回503（过载、未就绪）时暂时标记为不可用并换一个节点重试。
+ * 模板按内容哈希上传，每个节点只上传一次。
+ */
+class RenderClient {
+    /**
+     * @param {Object} options - 选项
+     * @param {Array<string>} options.nodes - 渲染节点地址，如 ['http://render1:8080', 'http://render2:8080']
+     * @param {number} options.retries - 换节点重试的次数（默认为节点数-1）
+     * @param {number} options.downBackoffMs - 节点失败后的暂停时间（毫秒，默认5000，503时按Retry-After）
+     * @param {number} options.timeoutMs - 单个请求的空闲超时（毫秒，默认600000）
+     */
+    constructor(options = {}) {
+        if (!options.nodes || options.nodes.length === 0) {
+            throw new Error('At least one render node is required');
+        }
+        this.nodes = options.nodes.map((url) => ({
+            url: new URL(url),
+            inflight: 0,
+            requests: 0,
+            failures: 0,
+            downUntil: 0,
+            templates: new Set()
+        }));
+        this.retries = options.retries !== undefined ? options.retries : this.nodes.length - 1;
+        this.downBackoffMs = options.downBackoffMs || 5000;
+        this.timeoutMs = options.timeoutMs || 600000;
+        this.nextIndex = 0;
+        this.hashCache = new Map();
+    }
+
+    /**
+     * 选择节点：可用节点中进行中请求最少的，相同时轮流选择
+     */
+    pickNode(exclude) {
+        const now = Date.now();
+        const candidates = this.nodes.filter((node) => !exclude.has(node));
+        if (candidates.length === 0) {
+            return null;
+        }
+        const healthy = candidates.filter((node) => node.downUntil <= now);
+        if (healthy.length === 0) {
+            // 全部不可用时选择最早恢复的节点
+            return candidates.reduce((a, b) => (a.downUntil <= b.downUntil ? a : b));
+        }
+        const start = this.nextIndex++ % this.nodes.length;
+        let best = null;
+        for (let i = 0; i < this.nodes.length; i++) {
+            const node = this.nodes[(start + i) % this.nodes.length];
+            if (healthy.includes(node) && (!best || node.inflight < best.inflight)) {
+                best = node;
+            }
+        }
+        return best;
+    }
+
+    /**
+     * 在选出的节点上执行操作，可重试的失败换节点重试
+     */
+    async withNode(fn, signal) {
+        const tried = new Set();
+        let lastError = null;
+        for (let attempt = 0; attempt <= this.retries; attempt++) {
+            const node = this.pickNode(tried);
+            if (!node) {
+                break;
+            }
+            tried.add(node);
+            node.inflight++;
+            node.requests++;
+            try {
+                return await fn(node);
+            } catch (error) {
+                if (signal && signal.aborted) {
+                    throw new AbortError();
+                }
+                if (!isRetryable(error)) {
+                    throw error;
+                }
+                node.failures++;
+                node.downUntil = Date.now() + (error.retryAfterMs || this.downBackoffMs);
+                lastError = error;
+            } finally {
+                node.inflight--;
+            }
+        }
+        throw lastError || new Error('No render node available');
+    }
+
+    /**
+     * 发送请求，返回响应流
+     */
+    send(node, method, pathname, options = {}) {
+        return new Promise((resolve, reject) => {
+            const url = new URL(pathname, node.url);
+            const transport = url.protocol === 'https:' ? https : http;
+            const request = transport.request(url, {
+                method,
+                headers: options.headers || {},
+                signal: options.signal,
+                timeout: this.timeoutMs
+            });
+            request.on('response', resolve);
+            request.on('timeout', () => {
+                const error = new Error(`Render node ${node.url.origin} timed out`);
+                error.code = 'ESOCKETTIMEDOUT';
+                request.destroy(error);
+            });
+            request.on('error', (error) => {
+                reject(error.name === 'AbortError' ? new AbortError() : error);
+            });
+
+            const body = options.body;
+            if (body && typeof body.pipe === 'function') {
+                body.on('error', (error) => request.destroy(error));
+                body.pipe(request);
+            } else if (body && typeof body === 'object' && !Buffer.isBuffer(body)) {
+                // 记录数组或（异步）迭代器，以JSONL格式写出
+                writeLines(request, body).catch((error) => request.destroy(error));
+            } else {
+                request.end(body);
+            }
+        });
+    }
+
+    /**
+     * 读取JSON响应，状态码表示失败时抛出错误
+     */
+    async readJSON(response) {
+        let text = '';
+        for await (const chunk of response) {
+            text += chunk;
+        }
+        let payload;
+        try {
+            payload = JSON.parse(text || '{}');
+        } catch (e) {
+            payload = { success: false, error: text };
+        }
+        if (response.statusCode >= 400) {
+            throw responseError(response, payload.error || `HTTP ${response.statusCode}`);
+        }
+        return payload;
+    }
+
+    async requestJSON(node, method, pathname, payload, signal) {
+        const body = payload === undefined ? undefined : JSON.stringify(payload);
+        const headers = body === undefined ? {} : {
+            'Content-Type': 'application/json',
+            'Content-Length': Buffer.byteLength(body)
+        };
+        const response = await this.send(node, method, pathname, { body, headers, signal });
+        return this.readJSON(response);
+    }
+
+    /**
+     * 把响应流写入文件（先写临时文件再改名）
+     */
+    async download(node, pathname, outputPath, signal) {
+        const response = await this.send(node, 'GET', pathname, { signal });
+        if (response.statusCode >= 400) {
+            await this.readJSON(response);
+        }
+        await saveStream(response, outputPath);
+    }
+
+    /**
+     * 模板的内容哈希，按文件大小和修改时间缓存
+     */
+    async templateHash(filePath) {
+        const stat = await fs.promises.stat(filePath);
+        const cached = this.hashCache.get(filePath);
+        if (cached && cached.size === stat.size && cached.mtimeMs === stat.mtimeMs) {
+            return cached.hash;
+        }
+        const hash = crypto.createHash('sha256');
+        await pipeline(fs.createReadStream(filePath), hash);
+        const digest = hash.digest('hex');
+        this.hashCache.set(filePath, { size: stat.size, mtimeMs: stat.mtimeMs, hash: digest });
+        return digest;
+    }
+
+    /**
+     * 确保节点上已有该模板，没有时流式上传
+     * @returns {Promise<string>} 模板哈希
+     */
+    async ensureTemplate(node, filePath, signal) {
+        const hash = await this.templateHash(filePath);
+        if (node.templates.has(hash)) {
+            return hash;
+        }
+        const head = await this.send(node, 'HEAD', `/templates/${hash}`, { signal });
+        head.resume();
+        if (head.statusCode === 503) {
+            throw responseError(head, 'Render node unavailable');
+        }
+        if (head.statusCode !== 200) {
+            const { size } = await fs.promises.stat(filePath);
+            const response = await this.send(node, 'PUT', '/templates', {
+                body: fs.createReadStream(filePath),
+                headers: { 'Content-Type': 'application/vnd.oasis.opendocument.graphics', 'Content-Length': size },
+                signal
+            });
+            await this.readJSON(response);
+        }
+        node.templates.add(hash);
+        return hash;
+    }
+
+    /**
+     * 使用节点上的模板执行操作；节点清理过模板（404）时重新上传一次
+     */
+    async withTemplate(node, filePath, fn, signal) {
+        const hash = await this.ensureTemplate(node, filePath, signal);
+        try {
+            return await fn(hash);
+        } catch (error) {
+            if (error.status !== 404 || error.noFailover) {
+                throw error;
+            }
+            node.templates.delete(hash);
+            return fn(await this.ensureTemplate(node, filePath, signal));
+        }
+    }
+
+    /**
+     * 执行桥接命令（参数格式与odg_bridge.py相同）
+     */
+    async run(command, args = [], signal = null) {
+        return this.withNode(async (node) => {
+            if (command === 'get_info') {
+                const fields = args[1] ? JSON.parse(args[1]) : undefined;
+                const pages = args[2] || undefined;
+                const format = args[3] || undefined;
+                return this.withTemplate(node, args[0], (template) => this.requestJSON(
+                    node, 'POST', '/info', { template, fields, pages, format }, signal), signal);
+            }
+            if (command === 'query_shapes') {
+                const queries = JSON.parse(args[1]);
+                return this.withTemplate(node, args[0], (template) => this.requestJSON(
+                    node, 'POST', '/query', { template, queries }, signal), signal);
+            }
+            if (command === 'modify_texts') {
+                return this.modifyTexts(node, args, signal);
+            }
+            if (command === 'export_pdf') {
+                return this.withTemplate(node, args[0], async (template) => {
+                    const body = JSON.stringify({ template, profile: args[2] || undefined });
+                    const response = await this.send(node, 'POST', '/export', {
+                        body,
+                        headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) },
+                        signal
+                    });
+                    if (response.statusCode !== 200) {
+                        return this.readJSON(response);
+                    }
+                    await saveStream(response, args[1]);
+                    return { success: true, message: `PDF已导出: ${args[1]}` };
+                }, signal);
+            }
+            throw new Error(`Command ${command} is not supported in client mode`);
+        }, signal);
+    }
+
+    async modifyTexts(node, args, signal) {
+        const [filePath, shapeTextMap, outputPath, exportPDF, images] = args;
+        if (images && images !== '{}') {
+            throw new Error('Image replacement is not supported in client mode, use engine "xml"');
+        }
+        const target = outputPath || filePath;
+        const result = await this.withTemplate(node, filePath, (template) => this.requestJSON(node, 'POST', '/modify', {
+            template,
+            texts: JSON.parse(shapeTextMap),
+            format: 'json',
+            export_pdf: exportPDF || 'true'
+        }, signal), signal);
+
+        // 下载输出文件到本地，路径与本地执行时一致
+        const files = result.files || {};
+        if (files.odg) {
+            await this.download(node, files.odg, target, signal);
+            result.data.output_path = target;
+        }
+        if (files.pdf) {
+            const pdfPath = target.replace('.odg', '.pdf');
+            await this.download(node, files.pdf, pdfPath, signal);
+            result.data.pdf_path = pdfPath;
+        }
+        delete result.files;
+        result.node = node.url.origin;
+        return result;
+    }
+
+    /**
+     * 在一个节点上执行批量渲染：记录流式上传，输出文件随 record-done 事件下载到本地
+     * 只有在记录开始上传（标准输入）或收到第一条完成事件（文件）之前出错才换节点重试，
+     * 之后出错直接抛出，避免重试时丢失已读取的记录
+     * @param {Array<string>} args - batch命令参数：模板、记录来源（'-'表示input）、输出路径模板、选项JSON
+     * @param {Iterable|AsyncIterable} input - 记录对象
+     * @param {Function} onMessage - 事件回调
+     */
+    async batch(args, input, onMessage, signal) {
+        const [templatePath, source, outputPattern, optionsJSON] = args;
+        const options = JSON.parse(optionsJSON || '{}');
+        if (options.images) {
+            throw new Error('Image columns are not supported in client mode');
+        }
+        // 输出路径模板中第一个占位符之前的目录为本地输出目录，其余部分交给服务端
+        const brace = outputPattern.indexOf('{');
+        const baseDir = path.dirname(brace === -1 ? outputPattern : outputPattern.slice(0, brace + 1));
+        const relativePattern = path.relative(baseDir, outputPattern).split(path.sep).join('/');
+
+        return this.withNode((node) => this.withTemplate(node, templatePath, async (template) => {
+            const query = new URLSearchParams({ template, output_pattern: relativePattern });
+            if (options.columns) {
+                query.set('columns', JSON.stringify(options.columns));
+            }
+            if (options.id_column) {
+                query.set('id_column', options.id_column);
+            }
+            if (options.encoding) {
+                query.set('encoding', options.encoding);
+            }
+            query.set('export_pdf', String(options.export_pdf !== undefined ? options.export_pdf : true));
+            const format = options.format || (source !== '-' && source.toLowerCase().endsWith('.csv') ? 'csv' : 'jsonl');
+            query.set('format', format);
+
+            let started = false;
+            const body = source === '-'
+                ? onFirstRecord(input, () => { started = true; })
+                : fs.createReadStream(source);
+            try {
+                const response = await this.send(node, 'POST', `/batch?${query}`, {
+                    body,
+                    headers: { 'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson', 'Transfer-Encoding': 'chunked' },
+                    signal
+                });
+                if (response.statusCode !== 200) {
+                    return await this.readJSON(response);
+                }
+
+                let result = null;
+                for await (const line of readline.createInterface({ input: response })) {
+                    if (!line.trim()) {
+                        continue;
+                    }
+                    const message = JSON.parse(line);
+                    if (message.type === 'result') {
+                        result = message.result;
+                        continue;
+                    }
+                    if (message.type === 'record-done') {
+                        // 记录文件可以重新读取，但已完成的记录不应在另一个节点上重复渲染
+                        started = true;
+                        await this.fetchRecordOutputs(node, message, baseDir, signal);
+                    }
+                    onMessage(message);
+                }
+                if (!result) {
+                    throw new Error(`Render node ${node.url.origin} closed the batch stream early`);
+                }
+                return result;
+            } catch (error) {
+                if (started) {
+                    error.noFailover = true;
+                }
+                throw error;
+            }
+        }, signal), signal);
+    }
+
+    async fetchRecordOutputs(node, message, baseDir, signal) {
+        const files = message.files || {};
+        delete message.files;
+        if (!message.relative_path) {
+            return;
+        }
+        message.output_path = path.join(baseDir, message.relative_path);
+        try {
+            if (files.odg) {
+                await this.download(node, files.odg, message.output_path, signal);
+                message.bytes = (await fs.promises.stat(message.output_path)).size;
+            }
+            if (files.pdf) {
+                message.pdf_path = message.output_path.replace('.odg', '.pdf');
+                await this.download(node, files.pdf, message.pdf_path, signal);
+                message.pdf_bytes = (await fs.promises.stat(message.pdf_path)).size;
+            }
+        } catch (error) {
+            message.success = false;
+            message.error = `Failed to download output: ${error.message}`;
+        }
+    }
+
+    /**
+     * 各节点的状态（本地统计及节点 /stats 返回的数据）
+     */
+    async getStats() {
+        return Promise.all(this.nodes.map(async (node) => {
+            const local = {
+                node: node.url.origin,
+                inflight: node.inflight,
+                requests: node.requests,
+                failures: node.failures,
+                available: node.downUntil <= Date.now(),
+                templates: node.templates.size
+            };
+            try {
+                const stats = await this.requestJSON(node, 'GET', '/stats');
+                return { ...local, stats: stats.data };
+            } catch (error) {
+                return { ...local, error: error.message };
+            }
+        }));
+    }
+}
+
+function responseError(response, message) {
+    const error = new Error(message);
+    error.status = response.statusCode;
+    const retryAfter = Number(response.headers['retry-after']);
+    if (retryAfter) {
+        error.retryAfterMs = retryAfter * 1000;
+    }
+    return error;
+}
+
+function isRetryable(error) {
+    return !error.noFailover && (error.status === 503 || RETRYABLE_CODES.has(error.code));
+}
+
+/**
+ * 逐条传递记录，读取第一条记录时调用回调
+ */
+async function* onFirstRecord(records, callback) {
+    let first = true;
+    for await (const record of records) {
+        if (first) {
+            first = false;
+            callback();
+        }
+        yield record;
+    }
+}
+
+/**
+ * 以JSONL格式写出记录，遵循背压
+ */
+async function writeLines(writable, records) {
+    for await (const record of records) {
+        if (!writable.write(JSON.stringify(record) + '\n')) {
+            await new Promise((resolve) => writable.once('drain', resolve));
+        }
+    }
+    writable.end();
+}
+
+async function saveStream(stream, outputPath) {
+    await fs.promises.mkdir(path.dirname(path.resolve(outputPath)), { recursive: true });
+    const tempPath = `${outputPath}.${process.pid}.download`;
+    try {
+        await pipeline(stream, fs.createWriteStream(tempPath));
+        await fs.promises.rename(tempPath, outputPath);
+    } catch (error) {
+        await fs.promises.rm(tempPath, { force: true });
+        throw error;
+    }
+}
+
+module.exports = {
+    RenderClient
+};
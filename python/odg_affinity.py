@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板亲和路由
+按模板内容哈希在一致性哈希环上选择工作进程，同一模板的任务总是交给同一个工作进程，
+该进程的office中模板相关的缓存保持预热；工作进程增减时只有少量模板改变归属
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+def content_hash(data):
+    """文件内容的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+class TemplateHasher:
+    """
+    计算模板文件的内容哈希
+
+    结果按 (路径, 大小, 修改时间, inode) 缓存，文件未变化时不再重新读取
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hash_file(self, path):
+        """
+        Returns:
+            str: 内容哈希，文件不存在时返回None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+class HashRing:
+    """一致性哈希环，每个节点在环上放置若干虚拟节点使分布均匀"""
+
+    def __init__(self, replicas=64):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+    def rebuild(self, nodes):
+        """用新的节点集合重建哈希环"""
+        ring = {}
+        for node in nodes:
+            for i in range(self.replicas):
+                ring[self._hash(f"{node}#{i}")] = node
+        self._points = sorted(ring)
+        self._nodes = ring
+
+    def candidates(self, key):
+        """
+        按环上顺序返回键对应的节点，第一个为首选节点，其余为溢出时的备选
+
+        Yields:
+            节点（不重复）
+        """
+        if not self._points:
+            return
+        seen = set()
+        start = bisect.bisect(self._points, self._hash(key))
+        for i in range(len(self._points)):
+            node = self._nodes[self._points[(start + i) % len(self._points)]]
+            if node not in seen:
+                seen.add(node)
+                yield node
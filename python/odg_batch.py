@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式批量渲染
+从CSV/JSONL文件或标准输入逐条读取记录，经过 解析 -> 渲染 -> 写出 的生成器管道处理，
+任何时刻只有一条记录在内存中，内存占用与批量大小无关
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+def _open_source(source, encoding):
+    if source in (None, "-"):
+        return sys.stdin, False
+    if hasattr(source, "read"):
+        return source, False
+    return open(source, encoding=encoding, newline=""), True
+
+def detect_format(source, fmt=None):
+    """根据参数或文件扩展名确定记录格式（csv / jsonl），标准输入和文本流默认jsonl"""
+    if fmt:
+        return fmt.lower()
+    if isinstance(source, str) and source != "-" and os.path.splitext(source)[1].lower() == ".csv":
+        return "csv"
+    return "jsonl"
+
+def read_records(source, fmt=None, encoding="utf-8"):
+    """
+    逐条读取记录
+
+    Args:
+        source: 文件路径，"-"或None表示标准输入，也可以是已打开的文本流
+        fmt: 记录格式 csv / jsonl，None则按扩展名判断
+        encoding: 文件编码（CSV带BOM时可使用utf-8-sig）
+
+    Yields:
+        dict: 一条记录
+    """
+    fmt = detect_format(source, fmt)
+    stream, should_close = _open_source(source, encoding)
+    try:
+        if fmt == "csv":
+            for row in csv.DictReader(stream):
+                yield row
+        elif fmt == "jsonl":
+            for line_number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"第{line_number}行不是有效的JSON: {e}")
+        else:
+            raise ValueError(f"不支持的记录格式: {fmt}")
+    finally:
+        if should_close:
+            stream.close()
+
+def map_record(record, column_map=None, id_column="id", image_columns=None):
+    """
+    将记录转换为形状名称到文本的映射
+
+    Args:
+        record: 一条记录
+        column_map: 列名到形状名称的映射，None则除id列和图片列以外的所有列都按同名形状处理
+        id_column: 记录id所在的列
+        image_columns: 图片列（见map_images），不作为文本处理
+
+    Returns:
+        dict: 形状名称 -> 文本
+    """
+    if column_map is None:
+        column_map = {column: column for column in record
+                      if column != id_column and column not in (image_columns or {})}
+    return {
+        shape_name: "" if record[column] is None else str(record[column])
+        for column, shape_name in column_map.items()
+        if column in record
+    }
+
+def map_images(record, image_columns, image_dir=None):
+    """
+    将记录中的图片列转换为形状名称到图片的映射
+
+    Args:
+        record: 一条记录
+        image_columns: 图片列名到图片形状名称的映射，列的值为图片文件路径
+        image_dir: 相对路径的基准目录，None表示当前目录
+
+    Returns:
+        dict: 形状名称 -> 图片文件路径（值为空的列跳过，保留模板中的图片）
+    """
+    images = {}
+    for column, shape_name in image_columns.items():
+        value = record.get(column)
+        if value in (None, ""):
+            continue
+        value = str(value)
+        if image_dir and not value.startswith("data:"):
+            value = os.path.join(image_dir, value)
+        images[shape_name] = value
+    return images
+
+def record_id_of(record, index, id_column="id"):
+    """记录id，没有id列时使用从1开始的序号"""
+    value = record.get(id_column)
+    return str(value) if value not in (None, "") else str(index + 1)
+
+def output_path_for(output_pattern, record, record_id, index):
+    """
+    根据输出路径模板生成输出路径
+
+    模板中可以使用 {id}、{index} 以及记录中的任意列，如 "out/payroll_{id}.odg"
+    """
+    safe_id = record_id.replace("/", "_").replace("\\", "_")
+    values = {key: value for key, value in record.items() if isinstance(key, str)}
+    values.update(id=safe_id, index=index)
+    return output_pattern.format_map(values)
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """计算文件的SHA-256，文件不存在时返回None"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BatchJournal:
+    """
+    批量任务的检查点日志
+
+    只追加写入的JSONL文件，每行记录一条已完成的记录：id、输出路径及其校验和。
+    重新运行同一批任务时跳过日志中已完成且输出文件仍然存在的记录。
+
+    内存中不保存日志条目：打开时把每个id在日志文件中的偏移写入临时的sqlite数据库，
+    检查记录是否完成时再从日志文件读取该条目，内存占用与日志大小无关。
+    """
+
+    def __init__(self, path, verify=False):
+        """
+        Args:
+            path: 日志文件路径
+            verify: 跳过记录前是否重新计算输出文件的校验和（默认只检查文件是否存在）
+        """
+        self.path = path
+        self.verify = verify
+        # 文件名为空时sqlite使用关闭后自动删除的临时磁盘数据库
+        self._index = sqlite3.connect("")
+        self._index.execute("CREATE TABLE completed (id TEXT PRIMARY KEY, offset INTEGER NOT NULL)")
+        self._count = 0
+        # 上次中断时最后一行可能不完整，下一条记录需要从新的一行开始
+        self._needs_newline = False
+        self._load()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        self._reader = open(path, "rb")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        def entries(f):
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    self._needs_newline = not line.endswith(b"\n")
+                else:
+                    self._needs_newline = False
+                    yield entry["id"], offset
+                offset += len(line)
+
+        with open(self.path, "rb") as f, self._index:
+            self._index.executemany("INSERT OR REPLACE INTO completed VALUES (?, ?)", entries(f))
+        self._count = self._index.execute("SELECT COUNT(*) FROM completed").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _entry(self, record_id):
+        row = self._index.execute("SELECT offset FROM completed WHERE id = ?", (record_id,)).fetchone()
+        if row is None:
+            return None
+        self._reader.seek(row[0])
+        return json.loads(self._reader.readline())
+
+    def completed(self, record_id):
+        """
+        记录是否已经完成且输出文件完好
+
+        Returns:
+            dict: 日志中的条目，未完成时返回None
+        """
+        entry = self._entry(record_id)
+        if entry is None:
+            return None
+        for path_key, checksum_key in (("output_path", "sha256"), ("pdf_path", "pdf_sha256")):
+            path = entry.get(path_key)
+            if not path:
+                continue
+            if not os.path.exists(path):
+                return None
+            if self.verify and file_checksum(path) != entry.get(checksum_key):
+                return None
+        return entry
+
+    def record(self, result):
+        """追加一条完成记录并立即写入磁盘"""
+        entry = {
+            "id": result["record_id"],
+            "output_path": result.get("output_path"),
+            "sha256": file_checksum(result.get("output_path")),
+            "pdf_path": result.get("pdf_path"),
+            "pdf_sha256": file_checksum(result.get("pdf_path")),
+            "completed_at": time.time()
+        }
+        if self._needs_newline:
+            self._file.write(b"\n")
+            self._needs_newline = False
+        offset = self._file.tell()
+        self._file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with self._index:
+            exists = self._index.execute("SELECT 1 FROM completed WHERE id = ?", (entry["id"],)).fetchone()
+            self._index.execute("INSERT OR REPLACE INTO completed VALUES (?, ?)", (entry["id"], offset))
+        if exists is None:
+            self._count += 1
+        return entry
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            self._reader.close()
+            self._index.close()
+
+def _render_one(render, record, record_id, index, output_pattern, column_map, id_column,
+                image_columns=None, image_dir=None):
+    try:
+        output_path = output_path_for(output_pattern, record, record_id, index)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        texts = map_record(record, column_map, id_column, image_columns)
+        if image_columns:
+            result = render(texts, output_path, map_images(record, image_columns, image_dir))
+        else:
+            result = render(texts, output_path)
+    except Exception as e:
+        return {"record_id": record_id, "index": index, "success": False, "error": str(e)}
+
+    pdf_path = result.get("pdf_path")
+    replaced_images = (result.get("images") or {}).get("replaced_count")
+    # 要求导出PDF时PDF导出失败也算失败，否则日志会记录为已完成，恢复时不再重试
+    pdf_failed = bool(result.get("pdf_profile") and result.get("pdf_export_error"))
+    # 一个目标形状都没有找到时不会保存输出，同样不能记录为已完成
+    no_output = not (result.get("modified_count") or result.get("unchanged_count") or replaced_images) \
+        or not os.path.exists(output_path)
+    error = result.get("error") or result.get("save_error") or result.get("pdf_export_error")
+    if result.get("success") and no_output and not error:
+        error = "没有找到任何目标形状，未生成输出文件"
+    return {
+        "record_id": record_id,
+        "index": index,
+        "success": bool(result.get("success")) and not result.get("save_error") and not pdf_failed and not no_output,
+        "output_path": output_path,
+        "bytes": os.path.getsize(output_path) if os.path.exists(output_path) else None,
+        "pdf_path": pdf_path,
+        "pdf_bytes": os.path.getsize(pdf_path) if pdf_path and os.path.exists(pdf_path) else None,
+        "modified_count": result.get("modified_count"),
+        "unchanged_count": result.get("unchanged_count"),
+        "replaced_images": replaced_images,
+        "not_found_shapes": result.get("not_found_shapes", []),
+        "error": error
+    }
+
+def render_records(render, records, output_pattern, column_map=None, id_column="id",
+                   journal=None, retries=0, retry_delay=1.0, image_columns=None, image_dir=None):
+    """
+    渲染记录的生成器
+
+    Args:
+        render: 渲染函数 render(shape_text_map, output_path) -> 结果字典，
+                指定image_columns时为 render(shape_text_map, output_path, shape_image_map)
+        records: 记录迭代器
+        output_pattern: 输出路径模板
+        column_map: 列名到形状名称的映射
+        id_column: 记录id所在的列
+        journal: 检查点日志（BatchJournal），已完成的记录会被跳过
+        retries: 单条记录失败后的重试次数，重试仍失败的记录不会中断批量任务
+        retry_delay: 首次重试前的等待时间（秒），之后每次加倍
+        image_columns: 图片列名到图片形状名称的映射
+        image_dir: 图片相对路径的基准目录
+
+    Yields:
+        dict: 每条记录的渲染结果
+    """
+    for index, record in enumerate(records):
+        record_id = record_id_of(record, index, id_column)
+        entry = journal.completed(record_id) if journal is not None else None
+        if entry is not None:
+            yield {
+                "record_id": record_id,
+                "index": index,
+                "success": True,
+                "skipped": True,
+                "output_path": entry.get("output_path"),
+                "pdf_path": entry.get("pdf_path")
+            }
+            continue
+
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                time.sleep(retry_delay * (2 ** (attempt - 1)))
+            result = _render_one(render, record, record_id, index, output_pattern, column_map, id_column,
+                                 image_columns, image_dir)
+            if result["success"]:
+                break
+        result["attempts"] = attempt + 1
+
+        if result["success"] and journal is not None:
+            entry = journal.record(result)
+            result["sha256"] = entry["sha256"]
+        yield result
+
+def run_batch(render, source, output_pattern, fmt=None, column_map=None, id_column="id",
+              encoding="utf-8", on_result=None, journal_path=None, verify_journal=False,
+              retries=0, retry_delay=1.0, on_progress=None, progress_interval=1.0,
+              image_columns=None, image_dir=None):
+    """
+    执行批量渲染，只保留汇总计数和失败的记录
+
+    Args:
+        render: 渲染函数 render(shape_text_map, output_path) -> 结果字典
+        source: 记录来源（文件路径或"-"表示标准输入）
+        output_pattern: 输出路径模板
+        on_result: 每条记录完成后的回调
+        journal_path: 检查点日志路径，指定后中断的任务可以从上次完成的位置继续
+        verify_journal: 跳过已完成记录前是否校验输出文件的校验和
+        retries: 单条记录失败后的重试次数
+        on_progress: 进度回调，参数为已处理数、成功数、跳过数、失败数、耗时和速率
+        progress_interval: 两次进度回调之间的最短间隔（秒），结束时总会回调一次
+        image_columns: 图片列名到图片形状名称的映射，列的值为图片文件路径
+        image_dir: 图片相对路径的基准目录
+
+    Returns:
+        dict: 汇总（总数、成功数、跳过数、失败数及最终失败的记录）
+    """
+    summary = {"total": 0, "succeeded": 0, "skipped": 0, "retried": 0, "failed": 0, "failures": []}
+    journal = BatchJournal(journal_path, verify_journal) if journal_path else None
+    started = time.monotonic()
+    last_progress = started
+    reported = None
+
+    def report():
+        nonlocal reported
+        reported = summary["total"]
+        elapsed = time.monotonic() - started
+        on_progress({
+            "processed": summary["total"],
+            "succeeded": summary["succeeded"],
+            "skipped": summary["skipped"],
+            "failed": summary["failed"],
+            "elapsed": round(elapsed, 3),
+            "rate": round(summary["total"] / elapsed, 2) if elapsed > 0 else None
+        })
+
+    try:
+        records = read_records(source, fmt, encoding)
+        for result in render_records(render, records, output_pattern, column_map, id_column,
+                                     journal, retries, retry_delay, image_columns, image_dir):
+            summary["total"] += 1
+            if result.get("skipped"):
+                summary["skipped"] += 1
+            elif result["success"]:
+                summary["succeeded"] += 1
+            else:
+                summary["failed"] += 1
+                summary["failures"].append({
+                    "record_id": result["record_id"],
+                    "index": result["index"],
+                    "error": result.get("error")
+                })
+            if result.get("attempts", 1) > 1:
+                summary["retried"] += 1
+            if on_result:
+                on_result(result)
+            if on_progress and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                report()
+        if on_progress and reported != summary["total"]:
+            report()
+    finally:
+        if journal is not None:
+            journal.close()
+    return summary
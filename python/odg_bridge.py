@@ -7,32 +7,277 @@ ODG处理桥接脚本 - 用于Node.js调用
 import sys
 import json
 import os
+import signal
+import threading
 import traceback
+from concurrent.futures import Future
 
 # 导入我们的ODG处理器
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from odg_operations import ODGProcessor
+from odg_columnar import FORMATS as COLUMNAR_FORMATS, encode_info
+from odg_images import GraphicCache, replace_images_in_package, shared_image_store
+from odg_info_cache import InfoCache, file_identity, project_info
+from odg_operations import ODGProcessor, parse_pages
+from odg_office import OfficeInstance, OfficeSupervisor, build_accept
+from odg_pdf import resolve_profile
+from odg_spatial import DocumentGeometry, GeometryCache
 
-def get_odg_info(file_path):
-    """获取ODG文件信息"""
+# 当前任务使用的处理器，任务被取消时用于关闭已打开的文档
+_active_processor = None
+
+# office看门狗，配置来自Node端传入的环境变量
+_supervisor = None
+
+# 事件输出函数，流式输出模式下把进度事件逐行写到stdout
+_event_sink = None
+
+# 文件信息缓存，配置来自环境变量 ODG_INFO_CACHE_SIZE（0表示不缓存）、ODG_INFO_CACHE_DIR（持久化目录）
+_info_cache = None
+
+# 形状几何（空间索引）缓存，与文件信息缓存使用相同的配置，持久化在其geometry子目录
+_geometry_cache = None
+
+# 图形对象缓存，属于看门狗office的连接，由每个任务的处理器共享
+_graphic_cache = GraphicCache()
+
+def _emit_event(event):
+    """输出一条进度事件（未启用流式输出时忽略）"""
+    if _event_sink is not None:
+        _event_sink(event)
+
+def _connection_from_env():
+    """根据环境变量生成连接字符串：ODG_CONNECTION（socket/pipe）、ODG_PORT、ODG_PIPE_NAME"""
+    return build_accept(
+        os.environ.get("ODG_CONNECTION") or "socket",
+        port=int(os.environ.get("ODG_PORT") or 2002),
+        pipe_name=os.environ.get("ODG_PIPE_NAME") or "odg-processor"
+    )
+
+def _get_supervisor():
+    """根据环境变量创建office看门狗"""
+    global _supervisor
+    if _supervisor is None:
+        office = OfficeInstance(
+            soffice_path=os.environ.get("ODG_SOFFICE_PATH") or None,
+            accept=_connection_from_env(),
+            startup_timeout=float(os.environ.get("ODG_STARTUP_TIMEOUT", "30"))
+        )
+        _supervisor = OfficeSupervisor(
+            office,
+            operation_timeout=float(os.environ.get("ODG_OPERATION_TIMEOUT", "120"))
+        )
+    return _supervisor
+
+def _job_succeeded(result):
+    """外层和处理器返回的结果都成功才算任务成功"""
+    if not result or not result.get("success"):
+        return False
+    data = result.get("data")
+    return not isinstance(data, dict) or data.get("success", True)
+
+class JobCancelled(BaseException):
+    """任务被Node端取消（收到SIGTERM）"""
+
+def _handle_sigterm(signum, frame):
+    """收到SIGTERM时中断当前任务"""
+    raise JobCancelled()
+
+def _new_processor():
+    """创建处理器并登记为当前任务的处理器"""
+    global _active_processor
+    supervisor = _get_supervisor()
+    _active_processor = ODGProcessor(supervisor=supervisor, connection=supervisor.office.accept)
+    _active_processor.on_event = _emit_event
+    _active_processor.graphic_cache = _graphic_cache
+    return _active_processor
+
+def _abort_active_job():
+    """关闭被取消任务打开的文档，避免在LibreOffice中残留"""
+    if _active_processor is not None and _active_processor.document is not None:
+        _active_processor.close_document()
+
+def _get_info_cache():
+    """根据环境变量创建文件信息缓存，关闭缓存时返回None"""
+    global _info_cache
+    if _info_cache is None:
+        size = int(os.environ.get("ODG_INFO_CACHE_SIZE") or 256)
+        if size <= 0:
+            return None
+        _info_cache = InfoCache(max_entries=size, persist_dir=os.environ.get("ODG_INFO_CACHE_DIR") or None)
+    return _info_cache
+
+def _get_geometry_cache():
+    """根据环境变量创建形状几何缓存，关闭缓存时返回None"""
+    global _geometry_cache
+    if _geometry_cache is None:
+        size = int(os.environ.get("ODG_INFO_CACHE_SIZE") or 256)
+        if size <= 0:
+            return None
+        persist_dir = os.environ.get("ODG_INFO_CACHE_DIR") or None
+        _geometry_cache = GeometryCache(
+            max_entries=size, persist_dir=os.path.join(persist_dir, "geometry") if persist_dir else None)
+    return _geometry_cache
+
+def _parse_fields(fields):
+    """字段投影参数：JSON数组或逗号分隔的字符串"""
+    if isinstance(fields, str):
+        fields = json.loads(fields) if fields.strip().startswith("[") else fields.split(",")
+    return [field.strip() for field in fields if field.strip()] if fields else None
+
+def _select_pages(info, pages):
+    """只保留指定页面的信息"""
+    if pages is None or pages == "":
+        return info
+    wanted = set(parse_pages(pages, info["pages_count"]))
+    return {**info, "pages_info": [page for page in info["pages_info"] if page["page_number"] - 1 in wanted]}
+
+def _shape_fields(fields):
+    """字段投影中的形状字段（shapes.<字段>），没有时返回None"""
+    fields = _parse_fields(fields)
+    if not fields:
+        return None
+    shape_fields = [field.split(".", 1)[1] for field in fields if field.startswith("shapes.")]
+    return shape_fields or None
+
+def _info_result(info, fields, fmt, cached):
+    """按字段投影，需要时转换为列式编码"""
+    data = project_info(info, _parse_fields(fields))
+    if fmt in COLUMNAR_FORMATS:
+        data = encode_info(data, fmt)
+    return {"success": True, "data": data, "cached": cached}
+
+def cached_info(file_path, fields=None, pages=None, fmt=None):
+    """
+    从缓存中获取ODG文件信息，不需要office
+
+    Returns:
+        dict: 与get_odg_info相同格式的结果，未命中时返回None
+    """
+    cache = _get_info_cache()
+    info = cache.get(file_path) if cache is not None else None
+    if info is None:
+        return None
+    return _info_result(_select_pages(info, pages), fields, fmt, True)
+
+def get_odg_info(file_path, processor=None, fields=None, pages=None, fmt=None):
+    """
+    获取ODG文件信息（先查缓存；指定页面时只读取这些页面，结果不缓存）
+
+    fmt为columnar或binary时以列式编码返回形状（见odg_columnar）
+    """
+    try:
+        result = cached_info(file_path, fields, pages, fmt)
+        if result is not None:
+            return result
+        identity = file_identity(file_path)
+        processor = processor or _new_processor()
+        partial = pages is not None and pages != ""
+        if partial:
+            info = processor.get_odg_info(file_path, pages=pages, fields=_shape_fields(fields))
+        else:
+            info = processor.get_odg_info(file_path)
+        if info is None:
+            return {"success": False, "error": "无法读取ODG文件信息"}
+        cache = _get_info_cache()
+        if cache is not None and not partial:
+            cache.put(file_path, info, identity)
+        return _info_result(info, fields, fmt, False)
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def iter_shapes(file_path, pages=None, fields=None, processor=None):
+    """
+    逐个输出形状信息：每个形状作为一条 {"type": "shape", ...} 事件输出，结果中只返回形状数
+
+    缓存中已有文件信息时直接从缓存输出，不需要office
+    """
+    try:
+        fields = _parse_fields(fields)
+        if fields:
+            fields = [field.split(".", 1)[1] if field.startswith("shapes.") else field for field in fields]
+        emit = processor.on_event if processor is not None else _emit_event
+        cache = _get_info_cache()
+        info = cache.get(file_path) if cache is not None else None
+        if info is not None:
+            shapes = (
+                {**{key: value for key, value in shape.items() if not fields or key in fields},
+                 "page_number": page["page_number"]}
+                for page in _select_pages(info, pages)["pages_info"] for shape in page["shapes"]
+            )
+        else:
+            processor = processor or _new_processor()
+            shapes = processor.iter_shapes(file_path, pages=pages, fields=fields)
+        count = 0
+        for shape in shapes:
+            count += 1
+            if emit is not None:
+                emit({"type": "shape", **shape})
+        return {"success": True, "data": {"shapes_count": count}, "cached": info is not None}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def _parse_queries(queries):
+    """几何查询参数：JSON字符串、单个查询或查询列表"""
+    if isinstance(queries, str):
+        queries = json.loads(queries)
+    return [queries] if isinstance(queries, dict) else list(queries)
+
+def _query_result(geometry, queries, cached):
+    results = [geometry.query(query) for query in _parse_queries(queries)]
+    return {"success": True, "data": {"results": results}, "cached": cached}
+
+def cached_query(file_path, queries):
+    """
+    在缓存的空间索引上执行几何查询，不需要office
+
+    Returns:
+        dict: 与query_shapes相同格式的结果，未命中时返回None
+    """
+    cache = _get_geometry_cache()
+    geometry = cache.get(file_path) if cache is not None else None
+    if geometry is None:
+        return None
+    try:
+        return _query_result(geometry, queries, True)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def query_shapes(file_path, queries, processor=None):
+    """
+    按坐标查询形状：命中测试（at）、区域查询（in）和最近形状（nearest），查询格式见odg_spatial
+
+    第一次查询时读取所有形状（包括组合成员）的外接矩形并缓存，之后的查询只使用空间索引
+
+    Returns:
+        dict: data.results 为每个查询命中的形状列表
+    """
     try:
-        processor = ODGProcessor()
-        info = processor.get_odg_info(file_path)
-        return {"success": True, "data": info}
+        result = cached_query(file_path, queries)
+        if result is not None:
+            return result
+        identity = file_identity(file_path)
+        processor = processor or _new_processor()
+        geometry = DocumentGeometry(processor.get_geometry(file_path))
+        cache = _get_geometry_cache()
+        if cache is not None:
+            cache.put(file_path, geometry, identity)
+        return _query_result(geometry, queries, False)
     except Exception as e:
         return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
-def modify_texts(file_path, shape_text_map, output_path=None, export_pdf=True):
-    """批量修改文本"""
+def modify_texts(file_path, shape_text_map, output_path=None, export_pdf=True, processor=None,
+                 shape_image_map=None):
+    """批量修改文本，shape_image_map指定时同时替换图片形状的图片；export_pdf可以是PDF导出配置名称"""
     try:
-        processor = ODGProcessor()
+        processor = processor or _new_processor()
         
         # 解析参数
         if isinstance(shape_text_map, str):
             shape_text_map = json.loads(shape_text_map)
+        if isinstance(shape_image_map, str):
+            shape_image_map = json.loads(shape_image_map) if shape_image_map.strip() else None
         
-        if isinstance(export_pdf, str):
-            export_pdf = export_pdf.lower() == 'true'
+        export_pdf = resolve_profile(export_pdf)
         
         output_path = output_path if output_path and output_path.strip() else None
         
@@ -40,81 +285,612 @@ def modify_texts(file_path, shape_text_map, output_path=None, export_pdf=True):
             file_path=file_path,
             shape_text_map=shape_text_map,
             output_path=output_path,
-            export_pdf=export_pdf
+            export_pdf=export_pdf,
+            shape_image_map=shape_image_map
         )
         
         return {"success": True, "data": result}
     except Exception as e:
         return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
-def create_odg(output_path):
-    """创建新的ODG文件"""
+def create_odg(output_path, spec=None):
+    """
+    创建ODG文件（由odg_writer直接写出，不需要office）
+
+    Args:
+        output_path: 输出路径
+        spec: 文档描述（JSON字符串或字典，格式见ODGBuilder.from_spec），为空时创建只有一个空白页的文档
+    """
+    from odg_writer import write_odg
+
     try:
-        processor = ODGProcessor()
-        success = processor.create_new_odg(output_path)
-        return {"success": success, "message": f"ODG文件已创建: {output_path}" if success else "创建失败"}
+        if isinstance(spec, str):
+            spec = json.loads(spec) if spec.strip() else None
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        write_odg(output_path, spec)
+        return {"success": True, "message": f"ODG文件已创建: {output_path}"}
     except Exception as e:
         return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
-def export_pdf(file_path, output_path):
-    """导出为PDF"""
+def export_pdf(file_path, output_path, processor=None, profile=None):
+    """导出为PDF，profile为导出配置名称（见odg_pdf.PDF_PROFILES），为空时使用默认配置"""
     try:
-        processor = ODGProcessor()
+        profile = resolve_profile(profile or True)
+        processor = processor or _new_processor()
         if processor.open_odg(file_path):
-            success = processor.export_to_pdf(output_path)
+            success = processor.export_to_pdf(output_path, profile)
             processor.close_document()
+            if success:
+                processor._emit("pdf_exported", output_path)
             return {"success": success, "message": f"PDF已导出: {output_path}" if success else "导出失败"}
         else:
             return {"success": False, "error": "无法打开ODG文件"}
     except Exception as e:
         return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
+def _run_supervised(job):
+    """在看门狗下执行任务（超时或office失效时重启并重试一次），并附带看门狗指标"""
+    supervisor = _get_supervisor()
+    result = supervisor.run_job(job, _job_succeeded)
+    result["metrics"] = dict(supervisor.metrics)
+    result["connection"] = supervisor.office.connection.metrics()
+    return result
+
+# 常驻模式下可由工作进程池执行的命令，第一个参数为工作进程提供的处理器
+POOL_COMMANDS = {
+    "get_info": lambda processor, file_path, fields=None, pages=None, fmt=None:
+        get_odg_info(file_path, processor=processor, fields=fields, pages=pages, fmt=fmt),
+    "shapes": lambda processor, file_path, pages=None, fields=None:
+        iter_shapes(file_path, pages, fields, processor=processor),
+    "query_shapes": lambda processor, file_path, queries:
+        query_shapes(file_path, queries, processor=processor),
+    "modify_texts": lambda processor, file_path, shape_text_map, output_path=None, export_pdf=True, images=None:
+        modify_texts(file_path, shape_text_map, output_path, export_pdf, processor=processor, shape_image_map=images),
+    "export_pdf": lambda processor, file_path, output_path, profile=None:
+        export_pdf(file_path, output_path, processor=processor, profile=profile),
+}
+
+def index_templates(directory, db_path, workers=None):
+    """增量更新模板目录的全文索引（解析XML，不需要office）"""
+    from odg_search import index_templates as run_index
+    try:
+        workers = int(workers) if workers not in (None, "") else None
+        return {"success": True, "data": run_index(directory, db_path, workers=workers)}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def search_templates(db_path, query, field="text", limit=100):
+    """在模板全文索引中查询形状名称或文本"""
+    from odg_search import search_templates as run_search
+    try:
+        return {"success": True, "data": run_search(db_path, query, field=field or "text", limit=int(limit or 100))}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def replace_images(file_path, shape_image_map, output_path=None):
+    """直接改写ODG包替换图片形状的图片（不需要office，不导出PDF）"""
+    try:
+        if isinstance(shape_image_map, str):
+            shape_image_map = json.loads(shape_image_map)
+        output_path = output_path if output_path and output_path.strip() else None
+        return {"success": True, "data": replace_images_in_package(file_path, shape_image_map, output_path)}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def compile_template(file_path, artifact_path=None, compress_level=1):
+    """预编译模板并保存编译产物（不需要office）"""
+    from odg_template import compile_template as run_compile
+    try:
+        artifact_path = artifact_path if artifact_path and artifact_path.strip() else None
+        return {"success": True, "data": run_compile(file_path, artifact_path, int(compress_level))}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+def render_compiled(template_path, shape_text_map, output_path):
+    """用预编译模板（ODG文件或编译产物，进程内只编译一次）渲染一个ODG文件，不需要office"""
+    from odg_template import compiled_template
+    try:
+        if isinstance(shape_text_map, str):
+            shape_text_map = json.loads(shape_text_map)
+        return {"success": True, "data": compiled_template(template_path).render_file(shape_text_map, output_path)}
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+# 不需要office的命令，常驻模式下在单独的线程中执行，不经过工作进程池
+DIRECT_COMMANDS = {
+    "create_odg": create_odg,
+    "replace_images": replace_images,
+    "compile_template": compile_template,
+    "render_compiled": render_compiled,
+    "index_templates": index_templates,
+    "search_templates": search_templates,
+}
+
+def batch(template_path, source, output_pattern, options=None):
+    """
+    流式批量渲染：逐条读取记录，填充模板并写出
+
+    每条记录完成后输出 record-done 事件，并定期输出 stage 为 batch 的 progress 事件
+
+    Args:
+        template_path: 模板ODG文件路径
+        source: 记录来源（CSV/JSONL文件路径，"-"表示标准输入）
+        output_pattern: 输出路径模板，如 "out/{id}.odg"
+        options: 选项（JSON字符串或字典）：format、columns、id_column、export_pdf（布尔值或PDF导出配置名称）、encoding、
+                 journal（检查点日志路径）、verify_journal、retries（单条记录的重试次数）、
+                 progress_interval（进度事件的最短间隔，秒）、
+                 images（图片列名到图片形状名称的映射）、image_dir（图片相对路径的基准目录）、
+                 engine（compiled表示用预编译模板直接生成ODG，不需要office，不导出PDF）、
+                 compress_level（预编译模板渲染时content.xml的压缩级别）
+
+    Returns:
+        dict: 汇总结果
+    """
+    from odg_batch import run_batch
+
+    if isinstance(options, str):
+        options = json.loads(options) if options.strip() else {}
+    options = options or {}
+    try:
+        export_pdf = resolve_profile(options.get("export_pdf", True))
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    supervisor = None
+    if options.get("engine") == "compiled":
+        from odg_template import compiled_template
+        if options.get("images"):
+            return {"success": False, "error": "预编译模板不支持图片列"}
+        try:
+            render = compiled_template(template_path, int(options.get("compress_level", 1))).render_file
+        except Exception as e:
+            return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+    else:
+        supervisor = _get_supervisor()
+        processor = _new_processor()
+        # 批量任务只报告记录级事件，不输出每条记录内部的加载/保存阶段
+        processor.on_event = None
+
+        def render(shape_text_map, output_path, shape_image_map=None):
+            result = supervisor.run_job(
+                lambda: modify_texts(template_path, shape_text_map, output_path, export_pdf, processor=processor,
+                                     shape_image_map=shape_image_map),
+                _job_succeeded
+            )
+            return result.get("data") or result
+
+    try:
+        summary = run_batch(
+            render, source, output_pattern,
+            fmt=options.get("format"),
+            column_map=options.get("columns"),
+            id_column=options.get("id_column", "id"),
+            encoding=options.get("encoding", "utf-8"),
+            on_result=lambda record: _emit_event({"type": "record-done", **record}),
+            journal_path=options.get("journal"),
+            verify_journal=options.get("verify_journal", False),
+            retries=options.get("retries", 2),
+            on_progress=lambda progress: _emit_event({"type": "progress", "stage": "batch", **progress}),
+            progress_interval=options.get("progress_interval", 1.0),
+            image_columns=options.get("images"),
+            image_dir=options.get("image_dir")
+        )
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+    if supervisor is None:
+        return {"success": True, "data": summary}
+    return {
+        "success": True,
+        "data": summary,
+        "metrics": dict(supervisor.metrics),
+        "connection": supervisor.office.connection.metrics()
+    }
+
+def _run_streaming(command, args):
+    """
+    流式输出模式（batch、shapes、convert_dir命令，或设置了ODG_EVENTS=1）：
+    进度事件逐行写到stdout，最后写出 {"type": "result", "result": {...}}
+    """
+    global _event_sink
+
+    # 处理器的日志输出改写到stderr，stdout只用于逐行的事件
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(message):
+        out.write(json.dumps(message, ensure_ascii=False) + "\n")
+        out.flush()
+
+    _event_sink = send
+    try:
+        result = _dispatch(command, args)
+    except JobCancelled:
+        _abort_active_job()
+        send({"type": "result", "result": {"success": False, "cancelled": True, "error": "任务已取消"}})
+        return 130
+    except Exception as e:
+        result = {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+    send({"type": "result", "result": result})
+    return 0
+
+def _with_events(fn, emit):
+    """包装常驻模式的命令，把处理器的进度事件转发给emit"""
+    def run(processor, *args):
+        processor.on_event = emit
+        return fn(processor, *args)
+    return run
+
+# 第一个参数为输入ODG文件、可以按模板亲和路由的命令
+AFFINITY_COMMANDS = ("get_info", "shapes", "query_shapes", "modify_texts", "export_pdf")
+
+def _submit_pipelined(scheduler, args, on_event=None):
+    """按modify_texts的参数格式向流水线提交任务"""
+    file_path, shape_text_map = args[0], args[1]
+    output_path = args[2] if len(args) > 2 else None
+    export_pdf = args[3] if len(args) > 3 else True
+    shape_image_map = args[4] if len(args) > 4 else None
+    if isinstance(shape_text_map, str):
+        shape_text_map = json.loads(shape_text_map)
+    if isinstance(shape_image_map, str):
+        shape_image_map = json.loads(shape_image_map) if shape_image_map.strip() else None
+    try:
+        export_pdf = resolve_profile(export_pdf)
+    except ValueError as e:
+        future = Future()
+        future.set_result({"success": False, "error": str(e)})
+        return future
+    output_path = output_path if output_path and output_path.strip() else None
+    return scheduler.submit(file_path, shape_text_map, output_path, export_pdf, on_event, shape_image_map)
+
+def _env_number(name, cast=float):
+    """读取数值型环境变量，未设置时返回None"""
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+def _create_pool(size=None, warmer=None):
+    """根据环境变量创建office工作进程池（尚未启动）"""
+    from odg_pool import WorkerPool, RecyclePolicy
+    from odg_profile import ProfileTemplate
+
+    soffice_path = os.environ.get("ODG_SOFFICE_PATH") or None
+    profile_template = None
+    if os.environ.get("ODG_PROFILE_TEMPLATE"):
+        profile_template = ProfileTemplate(os.environ["ODG_PROFILE_TEMPLATE"], soffice_path=soffice_path)
+    return WorkerPool(
+        size=size or _env_number("ODG_WORKERS", int) or 2,
+        soffice_path=soffice_path,
+        profile_template=profile_template,
+        connection=os.environ.get("ODG_CONNECTION") or "socket",
+        base_port=_env_number("ODG_BASE_PORT", int) or 2002,
+        affinity=os.environ.get("ODG_AFFINITY") == "1",
+        spillover=_env_number("ODG_SPILLOVER", int) or 2,
+        warmer=warmer,
+        operation_timeout=_env_number("ODG_OPERATION_TIMEOUT"),
+        startup_timeout=_env_number("ODG_STARTUP_TIMEOUT") or 30,
+        recycle_policy=RecyclePolicy(
+            max_jobs=_env_number("ODG_RECYCLE_JOBS", int),
+            max_rss_mb=_env_number("ODG_RECYCLE_RSS_MB"),
+            max_age=_env_number("ODG_RECYCLE_AGE")
+        )
+    )
+
+def convert_dir(source_dir, output_dir=None, options=None, pool=None, emit=None, cancel=None):
+    """
+    把目录树中的ODG文件并行导出为PDF（见odg_convert）
+
+    每个文件完成或跳过后输出 file-done 事件，并定期输出 stage 为 convert 的 progress 事件
+
+    Args:
+        source_dir: 源目录
+        output_dir: 输出目录，空表示输出到源文件旁边
+        options: 选项（JSON字符串或字典）：workers（未指定pool时启动的office进程数，默认CPU核数）、
+                 force（重新转换已是最新的文件）、progress_interval（进度事件的最短间隔，秒）、
+                 profile（PDF导出配置名称）
+        pool: 已启动的工作进程池（常驻模式），None表示为本次转换启动一个进程池
+        emit: 事件输出函数，默认为流式输出
+        cancel: 取消标志（threading.Event，常驻模式下收到取消请求时设置）
+
+    Returns:
+        dict: 汇总结果，包括每秒转换的文件数
+    """
+    from odg_convert import convert_directory
+
+    if isinstance(options, str):
+        options = json.loads(options) if options.strip() else {}
+    options = options or {}
+    emit = emit or _emit_event
+    own_pool = pool is None
+    try:
+        profile = resolve_profile(options.get("profile") or True)
+        if own_pool:
+            pool = _create_pool(size=options.get("workers") or os.cpu_count() or 2)
+            pool.start()
+        summary = convert_directory(
+            pool, source_dir, output_dir or None,
+            force=options.get("force", False),
+            profile=profile,
+            on_result=lambda result: emit({"type": "file-done", **result}),
+            on_progress=lambda progress: emit({"type": "progress", "stage": "convert", **progress}),
+            progress_interval=options.get("progress_interval", 1.0),
+            succeeded=_job_succeeded,
+            cancel=cancel
+        )
+    except Exception as e:
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+    finally:
+        if own_pool and pool is not None:
+            pool.shutdown()
+    if summary["cancelled"]:
+        return {"success": False, "cancelled": True, "error": "任务已取消", "data": summary}
+    return {"success": True, "data": summary}
+
+class _ConvertRun:
+    """常驻模式下运行中的目录转换，与进程池任务一样登记在futures中以便取消"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        return True
+
+def serve():
+    """
+    常驻模式：启动office工作进程池，从stdin逐行读取JSON请求，向stdout逐行写出响应
+
+    请求: {"id": 1, "command": "get_info", "args": [...], "events": false}
+    取消: {"type": "cancel", "id": 1}
+    响应: {"type": "ready", ...} / {"id": 1, "result": {...}}
+    事件: {"id": 1, "type": "event", "event": {...}}（请求中events为true时）
+    """
+    from odg_affinity import TemplateHasher
+
+    # 处理器的日志输出改写到stderr，stdout只用于协议消息
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def send(message):
+        with write_lock:
+            protocol_out.write(json.dumps(message, ensure_ascii=False) + "\n")
+            protocol_out.flush()
+
+    # 预热清单：工作进程就绪前预先加载模板、建立形状索引并做一次预热导出
+    warmer = None
+    if os.environ.get("ODG_WARMUP_MANIFEST") or os.environ.get("ODG_WARMUP_TEMPLATES"):
+        from odg_warmup import TemplateWarmer, load_manifest
+        if os.environ.get("ODG_WARMUP_MANIFEST"):
+            templates = load_manifest(os.environ["ODG_WARMUP_MANIFEST"])
+        else:
+            templates = json.loads(os.environ["ODG_WARMUP_TEMPLATES"])
+        poll_interval = _env_number("ODG_WARMUP_POLL")
+        warmer = TemplateWarmer(templates, poll_interval=2.0 if poll_interval is None else poll_interval)
+
+    pool = _create_pool(warmer=warmer)
+    try:
+        pool.start()
+    except Exception as e:
+        send({"type": "error", "error": str(e)})
+        return 1
+    # 流水线模式：modify_texts拆成预读、渲染、写盘三个阶段，与其他任务重叠执行
+    scheduler = None
+    if os.environ.get("ODG_PIPELINE") == "1":
+        from odg_pipeline import PipelineScheduler
+        scheduler = PipelineScheduler(
+            pool,
+            prefetch_depth=_env_number("ODG_PIPELINE_PREFETCH", int),
+            writers=_env_number("ODG_PIPELINE_WRITERS", int) or 2
+        )
+    send({"type": "ready", "workers": pool.size, "pipeline": scheduler is not None,
+          "warmup": warmer.stats() if warmer is not None else None})
+
+    # 模板亲和：按第一个参数（ODG文件路径）的内容哈希选择工作进程
+    hasher = TemplateHasher() if pool.affinity else None
+
+    futures = {}
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                send({"type": "error", "error": f"无效的请求: {e}"})
+                continue
+
+            request_id = request.get("id")
+            if request.get("type") == "cancel":
+                future = futures.pop(request_id, None)
+                if future is not None:
+                    future.cancel()
+                continue
+
+            command = request.get("command")
+            if command == "pool_stats":
+                stats = pool.stats()
+                if _get_info_cache() is not None:
+                    stats["info_cache"] = _get_info_cache().stats()
+                    stats["geometry_cache"] = _get_geometry_cache().stats()
+                if scheduler is not None:
+                    stats["pipeline"] = scheduler.stats()
+                stats["image_cache"] = shared_image_store().stats()
+                send({"id": request_id, "result": {"success": True, "data": stats}})
+                continue
+            if command == "convert_dir":
+                run = futures[request_id] = _ConvertRun()
+
+                def run_convert(args=request.get("args", []), request_id=request_id, events=request.get("events"),
+                                run=run):
+                    emit = (lambda event: send({"id": request_id, "type": "event", "event": event})) \
+                        if events else (lambda event: None)
+                    padded = (list(args) + [None, None])[:3]
+                    try:
+                        result = convert_dir(*padded, pool=pool, emit=emit, cancel=run.cancelled)
+                    finally:
+                        futures.pop(request_id, None)
+                    send({"id": request_id, "result": result})
+                threading.Thread(target=run_convert, daemon=True).start()
+                continue
+            if command in DIRECT_COMMANDS:
+                def run_direct(fn=DIRECT_COMMANDS[command], args=request.get("args", []), request_id=request_id):
+                    try:
+                        result = fn(*args)
+                    except Exception as e:
+                        result = {"success": False, "error": str(e)}
+                    send({"id": request_id, "result": result})
+                threading.Thread(target=run_direct, daemon=True).start()
+                continue
+            if command not in POOL_COMMANDS:
+                send({"id": request_id, "result": {"success": False, "error": f"未知命令: {command}"}})
+                continue
+
+            # 文件信息和空间索引缓存命中时直接返回，不经过工作进程池
+            result = None
+            if command == "get_info" and request.get("args"):
+                result = cached_info(*request["args"][:4])
+            elif command == "query_shapes" and len(request.get("args", [])) >= 2:
+                result = cached_query(*request["args"][:2])
+            if result is not None:
+                send({"id": request_id, "result": result})
+                continue
+
+            on_event = None
+            if request.get("events"):
+                on_event = lambda event, request_id=request_id: send(
+                    {"id": request_id, "type": "event", "event": event})
+            if scheduler is not None and command == "modify_texts":
+                future = _submit_pipelined(scheduler, request.get("args", []), on_event)
+            else:
+                fn = POOL_COMMANDS[command]
+                if on_event is not None:
+                    fn = _with_events(fn, on_event)
+                args = request.get("args", [])
+                affinity_key = None
+                if hasher is not None and command in AFFINITY_COMMANDS and args:
+                    affinity_key = hasher.hash_file(args[0])
+                future = pool.submit(fn, *args, succeeded=_job_succeeded, affinity_key=affinity_key)
+            futures[request_id] = future
+
+            def on_done(f, request_id=request_id):
+                futures.pop(request_id, None)
+                if f.cancelled():
+                    send({"id": request_id, "result": {"success": False, "cancelled": True, "error": "任务已取消"}})
+                elif f.exception() is not None:
+                    send({"id": request_id, "result": {"success": False, "error": str(f.exception())}})
+                else:
+                    send({"id": request_id, "result": f.result()})
+
+            future.add_done_callback(on_done)
+    except JobCancelled:
+        pass
+    finally:
+        pool.shutdown()
+        if scheduler is not None:
+            scheduler.shutdown()
+    return 0
+
+def _dispatch(command, args):
+    """执行单次命令并返回结果"""
+    if command == "get_info":
+        if len(args) < 1:
+            return {"success": False, "error": "缺少文件路径参数"}
+        fields = args[1] if len(args) > 1 else None
+        pages = args[2] if len(args) > 2 else None
+        fmt = args[3] if len(args) > 3 else None
+        # 缓存命中时不需要启动或连接office
+        return cached_info(args[0], fields, pages, fmt) or _run_supervised(
+            lambda: get_odg_info(args[0], fields=fields, pages=pages, fmt=fmt))
+
+    elif command == "shapes":
+        if len(args) < 1:
+            return {"success": False, "error": "缺少文件路径参数"}
+        pages = args[1] if len(args) > 1 else None
+        fields = args[2] if len(args) > 2 else None
+        cache = _get_info_cache()
+        if cache is not None and cache.get(args[0]) is not None:
+            return iter_shapes(args[0], pages, fields)
+        return _run_supervised(lambda: iter_shapes(args[0], pages, fields))
+
+    elif command == "query_shapes":
+        if len(args) < 2:
+            return {"success": False, "error": "参数不足"}
+        return cached_query(args[0], args[1]) or _run_supervised(lambda: query_shapes(args[0], args[1]))
+
+    elif command == "create_odg":
+        if len(args) < 1:
+            return {"success": False, "error": "缺少输出路径参数"}
+        return create_odg(args[0], args[1] if len(args) > 1 else None)
+
+    elif command == "compile_template":
+        if len(args) < 1:
+            return {"success": False, "error": "缺少模板路径参数"}
+        return compile_template(*args[:3])
+
+    elif command in DIRECT_COMMANDS:
+        if len(args) < 2:
+            return {"success": False, "error": "参数不足"}
+        return DIRECT_COMMANDS[command](*args)
+
+    elif command == "modify_texts":
+        if len(args) < 2:
+            return {"success": False, "error": "参数不足"}
+        file_path = args[0]
+        shape_text_map = args[1]
+        output_path = args[2] if len(args) > 2 else None
+        export_pdf = args[3] if len(args) > 3 else True
+        shape_image_map = args[4] if len(args) > 4 else None
+        return _run_supervised(
+            lambda: modify_texts(file_path, shape_text_map, output_path, export_pdf,
+                                 shape_image_map=shape_image_map))
+
+    elif command == "export_pdf":
+        if len(args) < 2:
+            return {"success": False, "error": "参数不足"}
+        profile = args[2] if len(args) > 2 else None
+        return _run_supervised(lambda: export_pdf(args[0], args[1], profile=profile))
+
+    elif command == "convert_dir":
+        if len(args) < 1:
+            return {"success": False, "error": "缺少源目录参数"}
+        return convert_dir(args[0], args[1] if len(args) > 1 else None, args[2] if len(args) > 2 else None)
+
+    elif command == "batch":
+        if len(args) < 3:
+            return {"success": False, "error": "参数不足"}
+        return batch(args[0], args[1], args[2], args[3] if len(args) > 3 else None)
+
+    return {"success": False, "error": f"未知命令: {command}"}
+
 def main():
     """主函数 - 处理命令行参数"""
     if len(sys.argv) < 2:
         print(json.dumps({"success": False, "error": "缺少命令参数"}))
         sys.exit(1)
     
-    command = sys.argv[1]
+    # 命令行中也可以写作 convert-dir
+    command = sys.argv[1].replace("-", "_")
     args = sys.argv[2:]
     
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    
+    if command == "serve":
+        sys.exit(serve())
+    if command in ("batch", "shapes", "convert_dir") or os.environ.get("ODG_EVENTS") == "1":
+        sys.exit(_run_streaming(command, args))
+    
     try:
-        if command == "get_info":
-            if len(args) < 1:
-                result = {"success": False, "error": "缺少文件路径参数"}
-            else:
-                result = get_odg_info(args[0])
-                
-        elif command == "modify_texts":
-            if len(args) < 2:
-                result = {"success": False, "error": "参数不足"}
-            else:
-                file_path = args[0]
-                shape_text_map = args[1]
-                output_path = args[2] if len(args) > 2 else None
-                export_pdf = args[3] if len(args) > 3 else True
-                result = modify_texts(file_path, shape_text_map, output_path, export_pdf)
-                
-        elif command == "create_odg":
-            if len(args) < 1:
-                result = {"success": False, "error": "缺少输出路径参数"}
-            else:
-                result = create_odg(args[0])
-                
-        elif command == "export_pdf":
-            if len(args) < 2:
-                result = {"success": False, "error": "参数不足"}
-            else:
-                result = export_pdf(args[0], args[1])
-                
-        else:
-            result = {"success": False, "error": f"未知命令: {command}"}
-            
+        result = _dispatch(command, args)
+    except JobCancelled:
+        _abort_active_job()
+        print(json.dumps({"success": False, "cancelled": True, "error": "任务已取消"}, ensure_ascii=False, indent=2))
+        sys.exit(130)
     except Exception as e:
         result = {"success": False, "error": str(e), "traceback": traceback.format_exc()}
     
-    # 输出JSON结果
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    # 输出JSON结果（列式编码的结果面向程序读取，不缩进）
+    data = result.get("data") if isinstance(result, dict) else None
+    compact = isinstance(data, dict) and data.get("format") in COLUMNAR_FORMATS
+    print(json.dumps(result, ensure_ascii=False, indent=None if compact else 2))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UNO连接管理
+在URP桥接上注册disposing监听器，office重启或连接断开时立即使缓存的Desktop和文档引用失效，
+下一次使用时按指数退避延迟重连，并提供连接状态指标
+"""
+
+import threading
+import time
+import weakref
+
+import uno
+import unohelper
+from com.sun.star.connection import NoConnectException
+from com.sun.star.lang import XEventListener
+
+DEFAULT_CONNECTION = "socket,host=localhost,port=2002;urp;"
+
+class ConnectionUnavailable(Exception):
+    """连接处于退避期，暂时不会尝试重连"""
+
+    def __init__(self, connection, retry_after, last_error):
+        super().__init__(f"连接 {connection} 不可用，{retry_after:.1f}秒后重试（上次错误: {last_error}）")
+        self.retry_after = retry_after
+        self.last_error = last_error
+
+class _DisposeListener(unohelper.Base, XEventListener):
+    """桥接或Desktop被释放时通知连接管理器"""
+
+    def __init__(self, manager, generation):
+        self._manager = weakref.ref(manager)
+        self._generation = generation
+
+    def disposing(self, event):
+        manager = self._manager()
+        if manager is not None:
+            manager._on_disposed(self._generation)
+
+class ConnectionManager:
+    """
+    管理到单个office实例的连接
+
+    状态: disconnected（未连接）、connected（已连接）、backoff（连接失败，等待退避）
+    """
+
+    def __init__(self, connection=DEFAULT_CONNECTION, initial_backoff=0.5, max_backoff=30):
+        """
+        Args:
+            connection: UNO连接字符串（不含 "uno:" 前缀和对象名）
+            initial_backoff: 首次连接失败后的等待时间（秒）
+            max_backoff: 最长等待时间（秒）
+        """
+        self.connection = connection
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self.state = "disconnected"
+        self.context = None
+        self._desktop = None
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._generation = 0
+        self._retry_at = 0
+        self._consecutive_failures = 0
+        self._connected_since = None
+        self._last_error = None
+        self._counters = {
+            "connects": 0,
+            "disconnects": 0,
+            "connect_attempts": 0,
+            "connect_failures": 0
+        }
+
+    @property
+    def desktop(self):
+        """当前连接的Desktop对象，未连接或连接已失效时为None（不会触发重连）"""
+        return self._desktop
+
+    def add_invalidation_listener(self, callback):
+        """
+        注册连接失效回调，用于清除缓存的文档引用
+
+        绑定方法以弱引用保存，处理器对象被回收后自动移除；每个任务都会创建处理器，
+        注册时同时清理已回收的处理器留下的弱引用，回调列表不会随任务数增长
+        """
+        if hasattr(callback, "__self__"):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+        with self._lock:
+            self._listeners = [listener for listener in self._listeners if listener() is not None]
+            self._listeners.append(ref)
+
+    def retry_after(self):
+        """距离允许下一次重连的秒数，0表示可以立即连接"""
+        if self.state != "backoff":
+            return 0
+        return max(0, self._retry_at - time.monotonic())
+
+    def connect(self):
+        """
+        立即尝试连接（忽略退避）
+
+        Raises:
+            NoConnectException: office未运行或未监听该连接
+        """
+        with self._lock:
+            if self.state == "connected" and self._desktop is not None:
+                return self._desktop
+
+            self._counters["connect_attempts"] += 1
+            try:
+                bridge = self._create_bridge(uno.getComponentContext())
+                context = bridge.getInstance("StarOffice.ComponentContext")
+                desktop = context.ServiceManager.createInstanceWithContext(
+                    "com.sun.star.frame.Desktop", context)
+            except Exception as e:
+                self._record_failure(e)
+                raise
+
+            self._generation += 1
+            listener = _DisposeListener(self, self._generation)
+            bridge.addEventListener(listener)
+            desktop.addEventListener(listener)
+
+            self.context = context
+            self._desktop = desktop
+            self.state = "connected"
+            self._consecutive_failures = 0
+            self._connected_since = time.time()
+            self._counters["connects"] += 1
+            return desktop
+
+    def get_desktop(self):
+        """
+        获取Desktop，未连接时按退避策略重连
+
+        Raises:
+            ConnectionUnavailable: 仍处于退避期
+            NoConnectException: 重连失败
+        """
+        with self._lock:
+            if self.state == "connected" and self._desktop is not None:
+                return self._desktop
+            wait = self.retry_after()
+            if wait > 0:
+                raise ConnectionUnavailable(self.connection, wait, self._last_error)
+            return self.connect()
+
+    def _create_bridge(self, local_context):
+        """
+        为本连接管理器建立独立命名的URP桥接
+
+        UnoUrlResolver建立的桥接是匿名且共享的，无法区分属于哪个连接；
+        独立的桥接只在本连接断开时触发disposing
+
+        Raises:
+            NoConnectException: office未运行或未监听该连接
+        """
+        description, protocol = self.connection.split(";")[:2]
+        connector = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.connection.Connector", local_context)
+        factory = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.BridgeFactory", local_context)
+        connection = connector.connect(description)
+        return factory.createBridge(f"odg-{id(self):x}-{self._generation + 1}", protocol, connection, None)
+
+    def _record_failure(self, error):
+        self._counters["connect_failures"] += 1
+        self._consecutive_failures += 1
+        self._last_error = str(error)
+        backoff = min(self.max_backoff, self.initial_backoff * (2 ** (self._consecutive_failures - 1)))
+        self._retry_at = time.monotonic() + backoff
+        self.state = "backoff"
+
+    def _on_disposed(self, generation):
+        with self._lock:
+            # 旧连接的迟到事件不影响新连接
+            if generation != self._generation or self.state != "connected":
+                return
+            self.invalidate("桥接已断开")
+
+    def invalidate(self, reason="连接已失效"):
+        """丢弃当前连接及所有缓存的引用，下一次使用时重连"""
+        with self._lock:
+            if self.state == "connected":
+                self._counters["disconnects"] += 1
+                print(f"LibreOffice连接已失效: {reason}")
+            self._desktop = None
+            self.context = None
+            self._connected_since = None
+            if self.state != "backoff":
+                self.state = "disconnected"
+            listeners = list(self._listeners)
+
+        alive = []
+        for ref in listeners:
+            callback = ref()
+            if callback is not None:
+                alive.append(ref)
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"连接失效回调出错: {e}")
+        with self._lock:
+            self._listeners = [ref for ref in self._listeners if ref in alive or ref not in listeners]
+
+    def metrics(self):
+        """连接状态指标"""
+        with self._lock:
+            return {
+                "connection": self.connection,
+                "state": self.state,
+                "connected_since": self._connected_since,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_after_seconds": round(self.retry_after(), 2),
+                "last_error": self._last_error,
+                **self._counters
+            }
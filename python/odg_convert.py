@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录批量转换
+遍历目录树中的ODG文件，分发到office工作进程池并行导出为PDF。工作进程从共享队列中取任务，
+处理快的进程自动多分到文件；输出比源文件新的文件跳过，中断后重新运行只转换剩下的文件。
+"""
+
+import os
+import queue
+import threading
+import time
+
+from odg_pdf import forget_profile, profile_marker_path
+
+def output_path_for(source, source_dir, output_dir, extension=".pdf"):
+    """
+    输出路径：在output_dir下保持与source_dir相同的相对目录结构，output_dir为None时输出到源文件旁边
+    """
+    base = os.path.splitext(source)[0] + extension
+    if output_dir is None:
+        return base
+    return os.path.join(output_dir, os.path.relpath(base, source_dir))
+
+def is_up_to_date(source, output):
+    """输出文件存在、不为空且不比源文件旧"""
+    try:
+        output_stat = os.stat(output)
+    except OSError:
+        return False
+    return output_stat.st_size > 0 and output_stat.st_mtime_ns >= os.stat(source).st_mtime_ns
+
+def iter_sources(source_dir, extensions=(".odg",)):
+    """按目录顺序遍历目录树中的源文件"""
+    for dir_path, dir_names, file_names in os.walk(source_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(extensions):
+                yield os.path.join(dir_path, file_name)
+
+def export_job(processor, source, output, profile=None):
+    """
+    工作进程池任务：导出一个文件，profile为PDF导出配置名称
+
+    先导出到同一目录下的临时文件再改名，中断时不会留下被当作已完成的不完整输出
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    temp_path = f"{os.path.splitext(output)[0]}.{os.getpid()}.{threading.get_ident()}.tmp.pdf"
+    try:
+        if not processor.open_odg(source):
+            return {"success": False, "error": "无法打开ODG文件"}
+        try:
+            success = processor.export_to_pdf(temp_path, profile)
+        finally:
+            processor.close_document()
+        if not success:
+            return {"success": False, "error": "导出失败"}
+        os.replace(temp_path, output)
+        # 导出配置的记录随PDF一起改名
+        if os.path.exists(profile_marker_path(temp_path)):
+            os.replace(profile_marker_path(temp_path), profile_marker_path(output))
+        return {"success": True, "bytes": os.path.getsize(output)}
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        forget_profile(temp_path)
+
+def convert_directory(pool, source_dir, output_dir=None, force=False, extensions=(".odg",),
+                      on_result=None, on_progress=None, progress_interval=1.0, max_pending=None,
+                      succeeded=None, profile=None, cancel=None):
+    """
+    把目录树中的ODG文件并行导出为PDF
+
+    Args:
+        pool: WorkerPool工作进程池
+        source_dir: 源目录（包括子目录）
+        output_dir: 输出目录，None表示输出到源文件旁边
+        force: 是否重新转换已是最新的文件
+        extensions: 转换的文件扩展名
+        on_result: 每个文件完成（或跳过）后的回调，参数为
+                   {source, output, success, skipped, bytes, error, seconds}
+        on_progress: 进度回调，参数为已处理数、转换数、跳过数、失败数、耗时和速率
+        progress_interval: 两次进度回调之间的最短间隔（秒），结束时总会回调一次
+        max_pending: 同时提交到进程池的文件数上限，默认为工作进程数的4倍
+        succeeded: 判断任务是否成功的函数（用于看门狗重试）
+        profile: PDF导出配置名称（见odg_pdf.PDF_PROFILES），None表示默认配置。
+                 只按修改时间判断输出是否最新，更换配置后需要指定force重新转换
+        cancel: 取消标志（threading.Event），设置后不再提交新文件，已提交但未开始的文件被取消
+
+    Returns:
+        dict: 汇总（总数、转换数、跳过数、失败数、失败的文件、耗时、每秒文件数和输出字节数，以及是否被取消）
+    """
+    source_dir = os.path.abspath(source_dir)
+    output_dir = os.path.abspath(output_dir) if output_dir else None
+    summary = {"total": 0, "converted": 0, "skipped": 0, "failed": 0, "failures": [], "bytes": 0}
+    started = time.monotonic()
+    last_progress = started
+    # 限制已提交未完成的文件数，几万个文件时不会一次全部放入进程池队列
+    slots = threading.BoundedSemaphore(max_pending or pool.size * 4)
+    done = queue.Queue()
+    # 已提交未完成的任务，取消时用于取消还在排队的文件
+    in_flight = set()
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    def report():
+        elapsed = time.monotonic() - started
+        on_progress({
+            "processed": summary["total"],
+            "converted": summary["converted"],
+            "skipped": summary["skipped"],
+            "failed": summary["failed"],
+            "elapsed": round(elapsed, 3),
+            "rate": round(summary["total"] / elapsed, 2) if elapsed > 0 else None
+        })
+
+    def finish(result):
+        nonlocal last_progress
+        summary["total"] += 1
+        if result.get("skipped"):
+            summary["skipped"] += 1
+        elif result["success"]:
+            summary["converted"] += 1
+            summary["bytes"] += result.get("bytes") or 0
+        else:
+            summary["failed"] += 1
+            summary["failures"].append({"source": result["source"], "error": result.get("error")})
+        if on_result:
+            on_result(result)
+        if on_progress and time.monotonic() - last_progress >= progress_interval:
+            last_progress = time.monotonic()
+            report()
+
+    def submit(source, output):
+        submitted = time.monotonic()
+        future = pool.submit(export_job, source, output, profile, succeeded=succeeded)
+        in_flight.add(future)
+
+        def on_done(f):
+            in_flight.discard(f)
+            slots.release()
+            if f.cancelled():
+                result = {"success": False, "error": "任务已取消"}
+            elif f.exception() is not None:
+                result = {"success": False, "error": str(f.exception())}
+            else:
+                result = f.result() or {"success": False, "error": "没有结果"}
+            done.put({"source": source, "output": output, "success": bool(result.get("success")),
+                      "skipped": False, "bytes": result.get("bytes"), "error": result.get("error"),
+                      "seconds": round(time.monotonic() - submitted, 3)})
+
+        future.add_done_callback(on_done)
+
+    pending = 0
+    for source in iter_sources(source_dir, extensions):
+        if cancelled():
+            break
+        output = output_path_for(source, source_dir, output_dir)
+        if not force and is_up_to_date(source, output):
+            finish({"source": source, "output": output, "success": True, "skipped": True})
+            continue
+        # 等待空闲的位置，期间输出已完成文件的结果
+        acquired = False
+        while not acquired and not cancelled():
+            acquired = slots.acquire(timeout=0.1)
+            while not done.empty():
+                finish(done.get())
+                pending -= 1
+        if not acquired:
+            break
+        submit(source, output)
+        pending += 1
+        while not done.empty():
+            finish(done.get())
+            pending -= 1
+    if cancelled():
+        for future in list(in_flight):
+            future.cancel()
+    while pending > 0:
+        finish(done.get())
+        pending -= 1
+
+    elapsed = time.monotonic() - started
+    if on_progress:
+        report()
+    summary["elapsed"] = round(elapsed, 3)
+    summary["cancelled"] = cancelled()
+    summary["files_per_second"] = round(summary["converted"] / elapsed, 2) if elapsed > 0 else None
+    summary["mb_per_second"] = round(summary["bytes"] / 1048576 / elapsed, 2) if elapsed > 0 else None
+    return summary
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按形状名称替换图片
+员工照片、签名、徽标等图片按内容哈希缓存：图片文件在每个进程中只读取一次（文件变化后重新读取），
+在每个工作进程中只解码为office的图形对象一次，同一文档中相同的图片只保存一份。
+提供两种方式：通过UNO设置图片形状的Graphic属性，或不经过office直接改写ODG包中的XML和图片。
+"""
+
+import base64
+import hashlib
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape, unescape
+
+from odg_writer import MIMETYPE
+
+# 文件头 -> (媒体类型, 扩展名)
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+    (b"BM", "image/bmp", ".bmp"),
+    (b"II*\x00", "image/tiff", ".tif"),
+    (b"MM\x00*", "image/tiff", ".tif"),
+)
+
+def detect_media_type(data):
+    """
+    按文件头识别图片格式
+
+    Returns:
+        tuple: (媒体类型, 扩展名)
+    """
+    for signature, media_type, extension in _SIGNATURES:
+        if data.startswith(signature):
+            return media_type, extension
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if b"<svg" in data[:1024]:
+        return "image/svg+xml", ".svg"
+    raise ValueError("无法识别的图片格式")
+
+class ImageData:
+    """图片内容及其SHA-256、媒体类型"""
+
+    __slots__ = ("data", "sha256", "media_type", "extension")
+
+    def __init__(self, data):
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.media_type, self.extension = detect_media_type(data)
+
+    @property
+    def package_path(self):
+        """在ODG包中的路径，按内容命名，同一文档中相同的图片只保存一份"""
+        return f"Pictures/{self.sha256[:32]}{self.extension}"
+
+class ImageStore:
+    """
+    图片文件内容缓存（按总字节数LRU）
+
+    按 (大小, 修改时间, inode) 判断文件是否变化，批量渲染时每条记录引用同一张图片不会重复读盘
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, source):
+        """
+        Args:
+            source: 图片文件路径、"data:<媒体类型>;base64,..." 形式的内容，或bytes
+
+        Returns:
+            ImageData
+        """
+        if isinstance(source, (bytes, bytearray)):
+            return ImageData(bytes(source))
+        if source.startswith("data:"):
+            header, _, payload = source.partition(",")
+            if not header.endswith(";base64"):
+                raise ValueError("data URI只支持base64编码")
+            return ImageData(base64.b64decode(payload))
+
+        path = os.path.abspath(source)
+        stat = os.stat(path)
+        identity = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == identity:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry[1]
+            self.misses += 1
+        with open(path, "rb") as f:
+            image = ImageData(f.read())
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._bytes -= len(previous[1].data)
+            if len(image.data) <= self.max_bytes:
+                self._entries[path] = (identity, image)
+                self._bytes += len(image.data)
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted.data)
+        return image
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def shared_image_store():
+    """进程内共享的图片文件缓存（常驻模式下所有工作进程共用）"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = ImageStore(int(os.environ.get("ODG_IMAGE_CACHE_BYTES") or 64 * 1024 * 1024))
+        return _shared_store
+
+class GraphicCache:
+    """
+    按图片内容哈希缓存office的图形对象（XGraphic），每个工作进程一份
+
+    同一个图形对象设置到多个形状时，office保存文档时只写出一份图片。
+    图形对象属于一个office连接，连接变化后缓存自动清空。
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._context = None
+        self._provider = None
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._entries.clear()
+        self._context = None
+        self._provider = None
+
+    def graphic_for(self, image, context):
+        """
+        Args:
+            image: ImageData
+            context: 当前office连接的组件上下文
+
+        Returns:
+            XGraphic
+        """
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        if context is not self._context:
+            self.clear()
+            self._context = context
+        graphic = self._entries.get(image.sha256)
+        if graphic is not None:
+            self.hits += 1
+            self._entries.move_to_end(image.sha256)
+            return graphic
+        self.misses += 1
+        service_manager = context.ServiceManager
+        if self._provider is None:
+            self._provider = service_manager.createInstanceWithContext(
+                "com.sun.star.graphic.GraphicProvider", context)
+        stream = service_manager.createInstanceWithArgumentsAndContext(
+            "com.sun.star.io.SequenceInputStream", (uno.ByteSequence(image.data),), context)
+        graphic = self._provider.queryGraphic((PropertyValue("InputStream", 0, stream, 0),))
+        if graphic is None:
+            raise ValueError("office无法解码图片")
+        self._entries[image.sha256] = graphic
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return graphic
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+_FRAME = re.compile(r"<draw:frame\b[^>]*(?<!/)>.*?</draw:frame>", re.S)
+_FRAME_NAME = re.compile(r'^<draw:frame\b[^>]*?\sdraw:name="([^"]*)"')
+_IMAGE_TAG = re.compile(r"<draw:image\b[^>]*>")
+_HREF = re.compile(r'(\sxlink:href=")([^"]*)(")')
+_MIME = re.compile(r'(\s(?:draw|loext):mime-type=")([^"]*)(")')
+_MANIFEST_ENTRY = '<manifest:file-entry manifest:full-path="{path}" manifest:media-type="{media_type}"/>'
+
+def manifest_without(manifest, path):
+    """删除清单（META-INF/manifest.xml）中该路径的条目，路径以/结尾时为目录条目"""
+    pattern = r'\s*<manifest:file-entry\b[^>]*\smanifest:full-path="' + re.escape(escape(path)) + r'"[^>]*/>'
+    return re.sub(pattern, "", manifest)
+
+def replace_images_in_package(file_path, shape_image_map, output_path=None, store=None):
+    """
+    不经过office，直接改写ODG包中图片形状（draw:frame中的draw:image）引用的图片
+
+    新图片按内容哈希命名写入Pictures目录，不再被引用的旧图片从包中删除
+
+    Args:
+        file_path: ODG文件路径
+        shape_image_map: 形状名称到图片的映射（图片格式见ImageStore.load）
+        output_path: 输出路径，None则覆盖原文件
+        store: ImageStore，默认使用进程内共享的缓存
+
+    Returns:
+        dict: 替换结果统计
+    """
+    store = store or shared_image_store()
+    images = {name: store.load(source) for name, source in shape_image_map.items()}
+    result = {
+        "success": True,
+        "total_targets": len(shape_image_map),
+        "replaced_count": 0,
+        "replaced_shapes": [],
+        "not_found_shapes": [],
+        "error_shapes": []
+    }
+
+    with zipfile.ZipFile(file_path) as package:
+        content = package.read("content.xml").decode("utf-8")
+        replaced_hrefs = set()
+        used = {}
+
+        def replace_frame(match):
+            frame = match.group(0)
+            name_match = _FRAME_NAME.match(frame)
+            name = unescape(name_match.group(1), {"&quot;": '"', "&apos;": "'"}) if name_match else None
+            image = images.get(name)
+            if image is None:
+                return frame
+            if not _IMAGE_TAG.search(frame):
+                result["error_shapes"].append({"name": name, "error": "不是图片形状，无法替换图片"})
+                return frame
+
+            def replace_image(tag_match):
+                tag = tag_match.group(0)
+                href = _HREF.search(tag)
+                if href is not None:
+                    replaced_hrefs.add(href.group(2))
+                    tag = _HREF.sub(lambda m: m.group(1) + image.package_path + m.group(3), tag)
+                else:
+                    tag = tag.replace("<draw:image", f'<draw:image xlink:href="{image.package_path}"', 1)
+                return _MIME.sub(lambda m: m.group(1) + image.media_type + m.group(3), tag)
+
+            used[image.package_path] = image
+            result["replaced_count"] += 1
+            result["replaced_shapes"].append(name)
+            return _IMAGE_TAG.sub(replace_image, frame)
+
+        content = _FRAME.sub(replace_frame, content)
+        found = set(result["replaced_shapes"]) | {error["name"] for error in result["error_shapes"]}
+        result["not_found_shapes"] = [name for name in shape_image_map if name not in found]
+
+        # 删除不再被任何XML引用的旧图片
+        entries = {info.filename: info for info in package.infolist()}
+        other_xml = [package.read(name).decode("utf-8") for name in entries
+                     if name.endswith(".xml") and name not in ("content.xml", "META-INF/manifest.xml")]
+        removed = sorted(
+            href for href in replaced_hrefs
+            if href in entries and href not in used
+            and f'"{href}"' not in content and not any(f'"{href}"' in xml for xml in other_xml)
+        )
+        manifest = package.read("META-INF/manifest.xml").decode("utf-8")
+        for href in removed:
+            manifest = manifest_without(manifest, href)
+        added = [path for path in used if path not in entries]
+        manifest = manifest.replace("</manifest:manifest>", "".join(
+            _MANIFEST_ENTRY.format(path=path, media_type=used[path].media_type) for path in added
+        ) + "</manifest:manifest>")
+        result["pictures_added"] = added
+        result["pictures_removed"] = removed
+
+        output_path = output_path or file_path
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as out:
+                # mimetype必须是第一个且不压缩的条目
+                out.writestr(zipfile.ZipInfo("mimetype"), MIMETYPE, zipfile.ZIP_STORED)
+                for name, info in entries.items():
+                    if name == "mimetype" or name in removed:
+                        continue
+                    if name == "content.xml":
+                        out.writestr(info, content.encode("utf-8"), zipfile.ZIP_DEFLATED)
+                    elif name == "META-INF/manifest.xml":
+                        out.writestr(info, manifest.encode("utf-8"), zipfile.ZIP_DEFLATED)
+                    else:
+                        out.writestr(info, package.read(name), info.compress_type)
+                # 图片本身已经压缩，不再压缩
+                for path in added:
+                    out.writestr(zipfile.ZipInfo(path), used[path].data, zipfile.ZIP_STORED)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    os.replace(temp_path, output_path)
+    return result
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG文件信息缓存
+get_odg_info需要在office中完整加载并遍历文档，同一模板反复查询时代价很高。
+缓存按文件标识 (路径, 大小, 修改时间, inode) 保存在内存中（LRU），
+指定持久化目录时再按内容哈希写入磁盘，多个进程和重启之后都可以复用。
+"""
+
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from odg_affinity import TemplateHasher
+
+# 持久化格式版本，信息结构变化时递增，旧的缓存文件自动失效
+CACHE_VERSION = 1
+
+def file_identity(file_path):
+    """
+    Returns:
+        tuple: (绝对路径, 大小, 修改时间, inode)，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+def project_info(info, fields=None):
+    """
+    按字段投影文件信息
+
+    Args:
+        info: get_odg_info返回的信息
+        fields: 字段列表。顶层字段（pages_count、document_properties等）原样保留；
+                "shapes.<字段>"（如 shapes.shape_name、shapes.text）只保留每个形状的指定字段，
+                页面结构和page_number保持不变。None表示返回全部字段
+
+    Returns:
+        dict: 投影后的信息（与缓存互不影响的副本）
+    """
+    if not fields:
+        return copy.deepcopy(info)
+    result = {}
+    shape_fields = [field.split(".", 1)[1] for field in fields if field.startswith("shapes.")]
+    for field in fields:
+        if field in info:
+            result[field] = copy.deepcopy(info[field])
+    if shape_fields and "pages_info" not in result:
+        result["pages_info"] = [
+            {
+                "page_number": page["page_number"],
+                "shapes": [{key: shape[key] for key in shape_fields if key in shape} for shape in page["shapes"]]
+            }
+            for page in info.get("pages_info", [])
+        ]
+    return result
+
+class InfoCache:
+    """文件信息的LRU缓存，可选按内容哈希持久化到磁盘"""
+
+    def __init__(self, max_entries=256, persist_dir=None):
+        """
+        Args:
+            max_entries: 内存中缓存的文件数
+            persist_dir: 持久化目录，None表示只缓存在内存中
+        """
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.hasher = TemplateHasher() if persist_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def _disk_path(self, file_path):
+        content_hash = self.hasher.hash_file(file_path)
+        return os.path.join(self.persist_dir, f"{content_hash}.json") if content_hash else None
+
+    def get(self, file_path):
+        """
+        Returns:
+            dict: 缓存的信息（调用方不应修改），未命中时返回None
+        """
+        identity = file_identity(file_path)
+        if identity is None:
+            return None
+        with self._lock:
+            info = self._entries.get(identity)
+            if info is not None:
+                self._entries.move_to_end(identity)
+                self.metrics["hits"] += 1
+                return info
+
+        info = self._load_from_disk(file_path)
+        with self._lock:
+            if info is None:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["disk_hits"] += 1
+        self._remember(identity, info)
+        return info
+
+    def put(self, file_path, info, identity=None):
+        """
+        缓存文件信息
+
+        Args:
+            file_path: 文件路径
+            info: 文件信息
+            identity: 读取信息之前的文件标识，文件在读取期间被修改时不缓存
+        """
+        current = file_identity(file_path)
+        if current is None or (identity is not None and identity != current):
+            return
+        identity = current
+        self._remember(identity, info)
+        if self.persist_dir:
+            self._save_to_disk(file_path, info)
+
+    def _remember(self, identity, info):
+        with self._lock:
+            self._entries[identity] = info
+            self._entries.move_to_end(identity)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    def _load_from_disk(self, file_path):
+        if not self.persist_dir:
+            return None
+        disk_path = self._disk_path(file_path)
+        if disk_path is None or not os.path.exists(disk_path):
+            return None
+        try:
+            with open(disk_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            return None
+        # 内容相同的文件共享缓存条目，文件名以本次查询的文件为准
+        info = entry["info"]
+        info["file_path"] = file_path
+        info["file_name"] = os.path.basename(file_path)
+        return info
+
+    def _save_to_disk(self, file_path, info):
+        disk_path = self._disk_path(file_path)
+        if disk_path is None:
+            return
+        temp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "info": info}, f, ensure_ascii=False)
+            os.replace(temp_path, disk_path)
+        except OSError as e:
+            print(f"写入信息缓存失败: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+            return {
+                "entries": len(self._entries),
+                **self.metrics,
+                "hit_rate": round((lookups - self.metrics["misses"]) / lookups, 3) if lookups else None,
+                "persist_dir": self.persist_dir
+            }
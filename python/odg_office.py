@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LibreOffice进程管理与看门狗
+负责启动/结束soffice进程、为UNO调用设置超时、检测无响应或已断开的连接并自动重启
+"""
+
+import os
+import re
+import signal
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+
+import uno
+from com.sun.star.connection import NoConnectException
+from com.sun.star.lang import DisposedException
+from com.sun.star.uno import RuntimeException
+
+from odg_connection import ConnectionManager
+
+# 常见的LibreOffice安装路径
+SOFFICE_PATHS = [
+    r"C:\Program Files\LibreOffice\program\soffice.exe",
+    r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+    "/usr/bin/libreoffice",
+    "/usr/bin/soffice",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice"
+]
+
+DEFAULT_ACCEPT = "socket,host=localhost,port=2002;urp;"
+
+def build_accept(connection="socket", host="localhost", port=2002, pipe_name=None):
+    """
+    生成UNO连接字符串
+
+    命名管道不经过TCP协议栈，单次UNO调用的延迟比本机socket更低，
+    适合get_odg_info等需要对每个形状发起多次调用的场景
+
+    Args:
+        connection: 连接类型，socket或pipe
+        host, port: socket连接的地址和端口
+        pipe_name: 命名管道名称（pipe连接时必填，每个office实例必须唯一）
+
+    Returns:
+        str: 如 "socket,host=localhost,port=2002;urp;" 或 "pipe,name=odg-1;urp;"
+    """
+    if connection == "pipe":
+        if not pipe_name:
+            raise ValueError("pipe连接需要指定pipe_name")
+        return f"pipe,name={pipe_name};urp;"
+    if connection != "socket":
+        raise ValueError(f"未知的连接类型: {connection}")
+    return f"socket,host={host},port={port};urp;"
+
+class OperationTimeout(Exception):
+    """UNO操作超过截止时间"""
+
+    def __init__(self, operation, timeout):
+        super().__init__(f"操作 '{operation}' 超时（{timeout}秒）")
+        self.operation = operation
+        self.timeout = timeout
+
+def find_soffice():
+    """查找soffice可执行文件路径"""
+    for path in SOFFICE_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def _pidfile_dir():
+    """
+    当前用户的pidfile目录（临时目录下，仅当前用户可写）
+
+    Raises:
+        RuntimeError: 目录不是当前用户的私有目录（可能被他人预先创建）
+    """
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    path = os.path.join(tempfile.gettempdir(), f"odg-processor-{user}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    if hasattr(os, "getuid"):
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise RuntimeError(f"pidfile目录不是当前用户的私有目录: {path}")
+    return path
+
+def _process_command_line(pid):
+    """进程的命令行参数，进程不存在或无法读取时返回None"""
+    proc_path = f"/proc/{pid}/cmdline"
+    if os.path.exists("/proc/self/cmdline"):
+        try:
+            with open(proc_path, "rb") as f:
+                return [arg.decode("utf-8", "replace") for arg in f.read().split(b"\0") if arg]
+        except OSError:
+            return None
+    if os.name == "nt":
+        output = subprocess.run(["wmic", "process", "where", f"ProcessId={pid}", "get", "CommandLine"],
+                                capture_output=True, text=True).stdout
+    else:
+        output = subprocess.run(["ps", "-p", str(pid), "-o", "command="], capture_output=True, text=True).stdout
+    return output.split() or None
+
+def _is_office_process(pid, accept):
+    """进程是否为以该连接字符串启动的soffice"""
+    args = _process_command_line(pid)
+    if not args:
+        return False
+    return any("soffice" in arg for arg in args) and any(arg.strip('"') == f"--accept={accept}" for arg in args)
+
+def call_with_deadline(operation, timeout, fn, *args):
+    """
+    在截止时间内执行函数
+
+    UNO调用无法被中断，因此在后台线程中执行；超时后调用方应结束office进程，
+    这样挂起的调用会以DisposedException结束。
+
+    Args:
+        operation: 操作名称（用于错误信息）
+        timeout: 超时时间（秒），None表示不限制
+        fn: 要执行的函数
+
+    Returns:
+        函数返回值
+
+    Raises:
+        OperationTimeout: 超过截止时间
+    """
+    if not timeout:
+        return fn(*args)
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = fn(*args)
+        except BaseException as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=target, name=f"uno-{operation}", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise OperationTimeout(operation, timeout)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("value")
+
+class OfficeInstance:
+    """单个soffice进程：启动、连接、健康检查与强制结束"""
+
+    def __init__(self, soffice_path=None, accept=DEFAULT_ACCEPT, startup_timeout=30, profile_dir=None):
+        """
+        Args:
+            soffice_path: soffice可执行文件路径，None则自动查找
+            accept: UNO连接字符串（不含 "uno:" 前缀和对象名）
+            startup_timeout: 等待office启动完成的最长时间（秒）
+            profile_dir: 独立的用户配置目录，None则使用默认配置。
+                         同一配置目录只能运行一个office，多实例时必须设置
+        """
+        self.soffice_path = soffice_path or find_soffice()
+        self.accept = accept
+        self.startup_timeout = startup_timeout
+        self.profile_dir = profile_dir
+        self.started_at = None
+        self.startup_seconds = None
+        self.process = None
+        self.connection = ConnectionManager(accept)
+
+        # 进程号记录在当前用户的pidfile目录中，使得其他桥接进程也能结束挂起的office
+        name = re.sub(r"[^A-Za-z0-9]+", "_", accept).strip("_")
+        self.pidfile = os.path.join(_pidfile_dir(), f"{name}.pid")
+
+    @property
+    def desktop(self):
+        """当前连接的Desktop对象，未连接或连接已断开时为None"""
+        return self.connection.desktop
+
+    def connect(self):
+        """立即连接到office实例，返回Desktop对象"""
+        return self.connection.connect()
+
+    def start(self):
+        """启动office进程并等待其可以连接"""
+        if not self.soffice_path or not os.path.exists(self.soffice_path):
+            raise RuntimeError("未找到LibreOffice安装路径，请手动指定")
+
+        cmd = [
+            self.soffice_path,
+            "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+            f"--accept={self.accept}"
+        ]
+        if self.profile_dir:
+            profile_url = uno.systemPathToFileUrl(os.path.abspath(self.profile_dir))
+            cmd.append(f"-env:UserInstallation={profile_url}")
+        popen_args = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        if os.name == "nt":
+            popen_args["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            # 独立进程组，结束时连同soffice.bin子进程一起结束
+            popen_args["start_new_session"] = True
+
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(cmd, **popen_args)
+        self._write_pidfile(self.process.pid)
+        print(f"已启动LibreOffice进程 (pid={self.process.pid})")
+
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                desktop = self.connect()
+                self.startup_seconds = time.monotonic() - self.started_at
+                return desktop
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    self.kill()
+                    raise RuntimeError(f"LibreOffice在{self.startup_timeout}秒内未能启动")
+                time.sleep(0.25)
+
+    def ensure_connected(self):
+        """连接已运行的实例（连接失败后按退避策略重连），没有则启动新实例"""
+        try:
+            return self.connection.get_desktop()
+        except NoConnectException:
+            return self.start()
+
+    def is_responsive(self, timeout=10):
+        """检查连接是否可用且office能在限定时间内响应"""
+        if self.desktop is None:
+            return False
+        try:
+            call_with_deadline("health_check", timeout, self.desktop.getComponents)
+            return True
+        except Exception:
+            # 超时、DisposedException或桥接已断开
+            return False
+
+    @property
+    def pid(self):
+        """office进程号，未记录时为None"""
+        return self._recorded_pid()
+
+    def _write_pidfile(self, pid):
+        """新建pidfile（不跟随符号链接），已有的pidfile是上一个进程留下的"""
+        try:
+            os.remove(self.pidfile)
+        except FileNotFoundError:
+            pass
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+        with os.fdopen(os.open(self.pidfile, flags, 0o600), "w") as f:
+            f.write(str(pid))
+
+    def _recorded_pid(self):
+        """
+        本实例启动的进程号，或pidfile中记录的进程号
+
+        pidfile中的进程必须仍是以本实例的连接字符串启动的office，否则视为过期并删除pidfile，
+        避免结束进程号被复用后的无关进程
+        """
+        if self.process is not None:
+            return self.process.pid
+        try:
+            fd = os.open(self.pidfile, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+            with os.fdopen(fd) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        if _is_office_process(pid, self.accept):
+            return pid
+        try:
+            os.remove(self.pidfile)
+        except OSError:
+            pass
+        return None
+
+    def kill(self):
+        """
+        强制结束office进程
+
+        Returns:
+            bool: 是否找到并结束了进程（未记录进程号的外部实例无法结束）
+        """
+        pid = self._recorded_pid()
+        self.connection.invalidate("office进程被结束")
+        if pid is None:
+            return False
+
+        try:
+            if os.name == "nt":
+                subprocess.call(["taskkill", "/F", "/T", "/PID", str(pid)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+            self.process = None
+        try:
+            os.remove(self.pidfile)
+        except OSError:
+            pass
+        print(f"已结束LibreOffice进程 (pid={pid})")
+        return True
+
+    def restart(self):
+        """结束并重新启动office进程"""
+        self.kill()
+        return self.start()
+
+class OfficeSupervisor:
+    """
+    Office看门狗
+
+    为加载、保存和导出操作设置截止时间；操作超时或连接断开时结束并重启office，
+    并将任务在新实例上重试一次。超时和重启次数记录在metrics中。
+    """
+
+    def __init__(self, office=None, operation_timeout=120, health_timeout=10):
+        """
+        Args:
+            office: OfficeInstance，None则使用默认实例
+            operation_timeout: 单个UNO操作的截止时间（秒），None或0表示不限制
+            health_timeout: 健康检查的截止时间（秒）
+        """
+        self.office = office or OfficeInstance()
+        self.operation_timeout = operation_timeout
+        self.health_timeout = health_timeout
+        self.generation = 0
+        self.metrics = {
+            "timeouts": 0,
+            "restarts": 0,
+            "retries": 0,
+            "health_failures": 0
+        }
+
+    def get_desktop(self):
+        """获取可用的Desktop对象"""
+        if self.office.desktop is None:
+            self.office.ensure_connected()
+        return self.office.desktop
+
+    def restart(self, reason):
+        """重启office进程"""
+        print(f"重启LibreOffice: {reason}")
+        self.office.restart()
+        self.generation += 1
+        self.metrics["restarts"] += 1
+
+    def call(self, operation, fn, *args):
+        """在截止时间内执行UNO操作，超时则重启office后抛出OperationTimeout"""
+        try:
+            return call_with_deadline(operation, self.operation_timeout, fn, *args)
+        except OperationTimeout:
+            self.metrics["timeouts"] += 1
+            try:
+                self.restart(f"操作 '{operation}' 超时")
+            except Exception as e:
+                print(f"重启LibreOffice失败: {e}")
+            raise
+
+    def check_health(self):
+        """
+        检查office是否可用，无响应或连接已断开时重启
+
+        Returns:
+            bool: 检查前office是否健康
+        """
+        try:
+            if self.office.desktop is None:
+                self.office.ensure_connected()
+            if self.office.is_responsive(self.health_timeout):
+                return True
+        except Exception:
+            pass
+        self.metrics["health_failures"] += 1
+        self.restart("office无响应或连接已断开")
+        return False
+
+    def run_job(self, job, succeeded=None):
+        """
+        执行任务，若任务期间office被重启或已不可用则在新实例上重试一次
+
+        Args:
+            job: 无参数函数，返回包含success字段的结果字典
+            succeeded: 判断结果是否成功的函数，默认检查success字段
+
+        Returns:
+            dict: 任务结果
+        """
+        succeeded = succeeded or (lambda r: bool(r and r.get("success")))
+        result = None
+        for attempt in range(2):
+            generation = self.generation
+            try:
+                result = job()
+            except (OperationTimeout, DisposedException, RuntimeException) as e:
+                result = {"success": False, "error": str(e)}
+
+            # 任务期间发生过重启（例如导出超时）时，即使结果标记为成功也需要重试
+            if succeeded(result) and self.generation == generation:
+                return result
+            try:
+                if self.generation == generation and self.check_health():
+                    # 普通的任务失败，与office状态无关
+                    return result
+            except Exception as e:
+                result = dict(result or {"success": False}, restart_error=str(e))
+                return result
+            if attempt == 0:
+                self.metrics["retries"] += 1
+                print("在新的LibreOffice实例上重试任务")
+        return result
@@ -5,35 +5,194 @@ LibreOffice/OpenOffice API (Python-UNO Bridge) 操作ODG文件
 ODG (OpenDocument Graphics) 文件操作示例
 """
 
+import filecmp
 import os
+import shutil
 import sys
 import uno
+import unohelper
 from com.sun.star.beans import PropertyValue
 from com.sun.star.connection import NoConnectException
+from com.sun.star.io import XOutputStream
+
+from odg_affinity import content_hash
+from odg_convert import is_up_to_date
+from odg_images import GraphicCache, shared_image_store
+from odg_pdf import exported_with, filter_data, forget_profile, record_profile, resolve_profile
+from odg_save import needs_repack, repack, resolve_save_profile, store_properties, write_package
+from odg_connection import ConnectionManager, ConnectionUnavailable
+
+class _BytesOutputStream(unohelper.Base, XOutputStream):
+    """在内存中收集office写出的数据，用于 storeToURL("private:stream")"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writeBytes(self, data):
+        self.chunks.append(data.value)
+
+    def flush(self):
+        pass
+
+    def closeOutput(self):
+        pass
+
+    def getvalue(self):
+        return b"".join(self.chunks)
+
+# iter_shapes可以选择的形状字段
+SHAPE_FIELDS = ("shape_index", "shape_type", "shape_name", "position", "size", "text")
+
+def describe_shape(shape, index, fields=None):
+    """
+    读取形状的信息
+    
+    Args:
+        shape: 形状对象
+        index: 形状在页面中的序号
+        fields: 需要的字段（SHAPE_FIELDS的子集），None表示全部；未请求的字段不会调用UNO读取
+        
+    Returns:
+        dict: 形状信息
+    """
+    wanted = SHAPE_FIELDS if fields is None else fields
+    shape_info = {}
+    if 'shape_index' in wanted:
+        shape_info['shape_index'] = index
+    if 'shape_type' in wanted:
+        shape_info['shape_type'] = shape.getShapeType()
+    if 'shape_name' in wanted:
+        shape_info['shape_name'] = ''
+    if 'position' in wanted:
+        position = shape.getPosition()
+        shape_info['position'] = {'x': position.X, 'y': position.Y}
+    if 'size' in wanted:
+        size = shape.getSize()
+        shape_info['size'] = {'width': size.Width, 'height': size.Height}
+    
+    # 获取形状名称
+    if 'shape_name' in wanted:
+        try:
+            if hasattr(shape, 'Name'):
+                shape_info['shape_name'] = shape.Name
+            elif hasattr(shape, 'getString') and shape.getString():
+                # 对于文本形状，如果没有名称，可以用文本内容作为标识
+                shape_info['shape_name'] = f"Text: {shape.getString()[:20]}..."
+        except Exception:
+            shape_info['shape_name'] = f"Shape_{index+1}"
+    
+    # 如果是文本形状，获取文本内容
+    if 'text' in wanted:
+        try:
+            if hasattr(shape, 'getString'):
+                shape_info['text'] = shape.getString()
+            elif hasattr(shape, 'Text'):
+                shape_info['text'] = shape.Text.getString()
+        except Exception:
+            pass
+    return shape_info
+
+def parse_pages(pages, count):
+    """
+    解析页面范围
+    
+    Args:
+        pages: 页码（从1开始）、页码列表或范围字符串，如 3、[1, 4]、"2-5,8"；None表示全部页面
+        count: 文档页数
+        
+    Returns:
+        list: 按顺序排列、不重复的页面序号（从0开始），超出文档的页码被忽略
+    """
+    if pages is None or pages == "":
+        return list(range(count))
+    if isinstance(pages, int):
+        pages = [pages]
+    if isinstance(pages, str):
+        numbers = []
+        for part in pages.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "-" in part:
+                first, last = part.split("-", 1)
+                numbers.extend(range(int(first or 1), int(last or count) + 1))
+            else:
+                numbers.append(int(part))
+        pages = numbers
+    return sorted({n - 1 for n in pages if 1 <= n <= count})
 
 class ODGProcessor:
     """ODG文件处理器类"""
     
-    def __init__(self, libreoffice_path=None):
+    def __init__(self, libreoffice_path=None, supervisor=None, connection=None, connection_manager=None):
         """
         初始化ODG处理器
         
         Args:
             libreoffice_path: LibreOffice安装路径，如果为None则使用系统默认路径
+            supervisor: OfficeSupervisor看门狗，设置后加载/保存/导出操作带有超时，
+                        并由看门狗负责启动和重启office
+            connection: UNO连接字符串，如 "pipe,name=odg;urp;"，默认使用2002端口的socket
+            connection_manager: 共享的ConnectionManager，默认使用看门狗office的连接或新建
         """
         self.libreoffice_path = libreoffice_path
-        self.desktop = None
+        self.supervisor = supervisor
+        if connection_manager is None:
+            if supervisor is not None:
+                connection_manager = supervisor.office.connection
+            else:
+                connection_manager = ConnectionManager(connection or "socket,host=localhost,port=2002;urp;")
+        self.connection_manager = connection_manager
+        self.connection = connection_manager.connection
+        self.document = None
+        # 进度事件回调 on_event(event)，用于向调用方流式报告长任务的进度
+        self.on_event = None
+        # 共享的形状索引（ShapeIndex）及当前文档的内容哈希，设置后修改文本时直接定位形状
+        self.shape_index = None
+        self.document_key = None
+        # 替换图片用的图片文件缓存（进程内共享）和图形对象缓存，
+        # 图形对象缓存由创建处理器的工作进程共享给它的所有处理器，单独使用时每个处理器一份
+        self.image_store = shared_image_store()
+        self.graphic_cache = GraphicCache()
+        # 保存ODG时使用的保存配置（见odg_save.SAVE_PROFILES），默认由 ODG_SAVE_PROFILE 指定
+        self.save_profile = resolve_save_profile()
+        # office重启或桥接断开时，已打开的文档引用随之失效
+        self.connection_manager.add_invalidation_listener(self._on_connection_lost)
+    
+    @property
+    def desktop(self):
+        """当前连接的Desktop对象，连接断开后为None，下一次操作时自动重连"""
+        return self.connection_manager.desktop
+    
+    def _on_connection_lost(self):
+        """连接失效时丢弃缓存的文档引用和图形对象"""
         self.document = None
+        self.graphic_cache.clear()
+    
+    def _emit(self, stage, path=None):
+        """报告任务进度，写出文件的阶段附带文件路径和字节数"""
+        if self.on_event is None:
+            return
+        event = {"type": "progress", "stage": stage}
+        if path:
+            event["path"] = os.path.abspath(path)
+            event["bytes"] = os.path.getsize(path) if os.path.exists(path) else None
+        try:
+            self.on_event(event)
+        except Exception as e:
+            print(f"进度事件回调出错: {e}")
+
+    def _uno_call(self, operation, fn, *args):
+        """执行可能挂起的UNO操作，有看门狗时带截止时间"""
+        if self.supervisor:
+            return self.supervisor.call(operation, fn, *args)
+        return fn(*args)
         
     def connect_to_libreoffice(self):
         """连接到LibreOffice"""
         try:
-            # 尝试连接到已运行的LibreOffice实例
-            local_context = uno.getComponentContext()
-            resolver = local_context.ServiceManager.createInstanceWithContext(
-                "com.sun.star.bridge.UnoUrlResolver", local_context)
-            context = resolver.resolve("uno:socket,host=localhost,port=2002;urp;StarOffice.ComponentContext")
-            self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+            # 尝试连接到已运行的LibreOffice实例（连接失败后按退避策略重连）
+            self.connection_manager.get_desktop()
             print("已连接到运行中的LibreOffice实例")
             return True
         except Exception as e:
@@ -42,6 +201,24 @@ class ODGProcessor:
     
     def start_libreoffice_server(self):
         """启动LibreOffice服务器模式"""
+        if self.supervisor:
+            try:
+                self.supervisor.get_desktop()
+                return True
+            except Exception as e:
+                print(f"启动LibreOffice服务器失败: {e}")
+                return False
+        
+        # 先尝试重新连接已运行的实例；处于退避期时直接返回，不重复启动office
+        try:
+            self.connection_manager.get_desktop()
+            return True
+        except ConnectionUnavailable as e:
+            print(e)
+            return False
+        except Exception:
+            pass
+        
         if self.libreoffice_path is None:
             # 尝试常见的LibreOffice安装路径
             possible_paths = [
@@ -61,12 +238,14 @@ class ODGProcessor:
             import subprocess
             try:
                 # 启动LibreOffice服务器模式
-                cmd = [self.libreoffice_path, "--headless", "--accept=socket,host=localhost,port=2002;urp;"]
+                cmd = [self.libreoffice_path, "--headless", f"--accept={self.connection}"]
                 subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
                 print("已启动LibreOffice服务器模式")
                 import time
                 time.sleep(3)  # 等待服务器启动
-                return self.connect_to_libreoffice()
+                self.connection_manager.connect()
+                print("已连接到运行中的LibreOffice实例")
+                return True
             except Exception as e:
                 print(f"启动LibreOffice服务器失败: {e}")
                 return False
@@ -76,28 +255,17 @@ class ODGProcessor:
     
     def create_new_odg(self, output_path):
         """
-        创建新的ODG文件
+        创建新的ODG文件（由odg_writer直接写出，不需要office）；需要继续用UNO编辑时再调用open_odg
         
         Args:
             output_path: 输出文件路径
         """
+        from odg_writer import write_odg
+
         try:
-            if not self.desktop:
-                if not self.start_libreoffice_server():
-                    return False
-            
-            # 创建新的绘图文档
-            url = uno.systemPathToFileUrl(os.path.abspath(output_path))
-            properties = (
-                PropertyValue("Hidden", 0, True, 0),
-                PropertyValue("ReadOnly", 0, False, 0),
-            )
-            
-            self.document = self.desktop.loadComponentFromURL(
-                "private:factory/sdraw", "_blank", 0, properties)
-            
-            # 保存文档
-            self.document.storeAsUrl(url, ())
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            os.makedirs(output_dir, exist_ok=True)
+            write_odg(output_path)
             print(f"已创建新的ODG文件: {output_path}")
             return True
             
@@ -123,7 +291,8 @@ class ODGProcessor:
                 PropertyValue("ReadOnly", 0, False, 0),
             )
             
-            self.document = self.desktop.loadComponentFromURL(url, "_blank", 0, properties)
+            self.document = self._uno_call(
+                "load", self.desktop.loadComponentFromURL, url, "_blank", 0, properties)
             print(f"已打开ODG文件: {file_path}")
             return True
             
@@ -214,14 +383,8 @@ class ODGProcessor:
                 print("没有打开的文档")
                 return False
             
-            if output_path:
-                url = uno.systemPathToFileUrl(os.path.abspath(output_path))
-                self.document.storeAsUrl(url, ())
-                print(f"文档已保存到: {output_path}")
-            else:
-                self.document.store()
-                print("文档已保存")
-            
+            self.store_document(output_path)
+            print(f"文档已保存到: {output_path}" if output_path else "文档已保存")
             return True
             
         except Exception as e:
@@ -240,12 +403,13 @@ class ODGProcessor:
             print(f"关闭文档失败: {e}")
             return False
     
-    def export_to_pdf(self, output_path):
+    def export_to_pdf(self, output_path, profile=None):
         """
         导出当前文档为PDF
         
         Args:
             output_path: PDF输出路径
+            profile: 导出配置名称（见odg_pdf.PDF_PROFILES），None表示默认配置
             
         Returns:
             bool: 是否成功导出
@@ -262,19 +426,22 @@ class ODGProcessor:
             
             url = uno.systemPathToFileUrl(os.path.abspath(output_path))
             print(f"导出为PDF: {url}")
+            pdf_filter_data = filter_data(profile)
+            forget_profile(output_path)
             
             # 方法1：使用标准的PDF导出过滤器 (最兼容的方法)
             try:
-                filter_data = (
+                store_properties = (
                     PropertyValue("FilterName", 0, "draw_pdf_Export", 0),
                     PropertyValue("Overwrite", 0, True, 0),
-                    PropertyValue("Quality", 0, 90, 0),  # 添加质量设置
+                    pdf_filter_data,
                 )
-                self.document.storeToURL(url, filter_data)
+                self._uno_call("export_pdf", self.document.storeToURL, url, store_properties)
                 
                 # 验证文件是否真的被创建
                 if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                     print(f"已导出为PDF: {output_path} (大小: {os.path.getsize(output_path)} 字节)")
+                    record_profile(output_path, profile)
                     return True
                 else:
                     print(f"PDF文件创建失败或为空: {output_path}")
@@ -288,12 +455,13 @@ class ODGProcessor:
                         pdf_properties = (
                             PropertyValue("URL", 0, url, 0),
                             PropertyValue("FilterName", 0, "draw_pdf_Export", 0),  # 使用draw而不是writer
-                            PropertyValue("Quality", 0, 90, 0),
+                            pdf_filter_data,
                         )
-                        self.document.exportAsPDF(pdf_properties)
+                        self._uno_call("export_pdf", self.document.exportAsPDF, pdf_properties)
                         
                         if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                             print(f"已导出为PDF (方法2): {output_path} (大小: {os.path.getsize(output_path)} 字节)")
+                            record_profile(output_path, profile)
                             return True
                         else:
                             print(f"方法2: PDF文件创建失败或为空: {output_path}")
@@ -306,12 +474,13 @@ class ODGProcessor:
                         export_filter = (
                             PropertyValue("FilterName", 0, "impress_pdf_Export", 0),  # 尝试使用impress过滤器
                             PropertyValue("Overwrite", 0, True, 0),
-                            PropertyValue("Quality", 0, 90, 0),
+                            pdf_filter_data,
                         )
-                        self.document.storeToURL(url, export_filter)
+                        self._uno_call("export_pdf", self.document.storeToURL, url, export_filter)
                         
                         if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                             print(f"已导出为PDF (方法3): {output_path} (大小: {os.path.getsize(output_path)} 字节)")
+                            record_profile(output_path, profile)
                             return True
                         else:
                             print(f"方法3: PDF文件创建失败或为空: {output_path}")
@@ -325,7 +494,7 @@ class ODGProcessor:
                                 PropertyValue("FilterName", 0, "PDF - Portable Document Format", 0),
                                 PropertyValue("Overwrite", 0, True, 0),
                             )
-                            self.document.storeToURL(url, basic_filter)
+                            self._uno_call("export_pdf", self.document.storeToURL, url, basic_filter)
                             
                             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                                 print(f"已导出为PDF (方法4): {output_path} (大小: {os.path.getsize(output_path)} 字节)")
@@ -345,12 +514,118 @@ class ODGProcessor:
             traceback.print_exc()
             return False
 
-    def get_odg_info(self, file_path):
+    def open_odg_bytes(self, data):
+        """
+        从内存中的文件内容打开ODG文档（文件已预先读入内存时避免office读磁盘）
+        
+        Args:
+            data: ODG文件内容
+            
+        Returns:
+            bool: 是否成功打开
+        """
+        if not self.desktop:
+            if not self.start_libreoffice_server():
+                return False
+        
+        context = self.connection_manager.context
+        stream = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.io.SequenceInputStream", context)
+        stream.initialize((uno.ByteSequence(data),))
+        properties = (
+            PropertyValue("Hidden", 0, True, 0),
+            PropertyValue("InputStream", 0, stream, 0),
+        )
+        self.document = self._uno_call(
+            "load", self.desktop.loadComponentFromURL, "private:stream", "_blank", 0, properties)
+        return self.document is not None
+    
+    def store_document(self, output_path=None):
+        """
+        按保存配置保存当前文档
+
+        默认配置直接由office保存；其他配置由office写入内存（不生成缩略图），重新打包后写盘
+
+        Args:
+            output_path: 保存路径，None表示保存到原文件
+        """
+        if not needs_repack(self.save_profile):
+            if output_path:
+                url = uno.systemPathToFileUrl(os.path.abspath(output_path))
+                self._uno_call("store", self.document.storeAsUrl, url, ())
+            else:
+                self._uno_call("store", self.document.store)
+            return
+        path = output_path or uno.fileUrlToSystemPath(self.document.getLocation())
+        write_package(path, self.odg_bytes())
+
+    def odg_bytes(self):
+        """按保存配置把当前文档写入内存，返回ODG文件内容"""
+        data = self.store_to_bytes("draw8", store_properties(self.save_profile))
+        return repack(data, self.save_profile) if needs_repack(self.save_profile) else data
+
+    def store_to_bytes(self, filter_name="draw8", extra_properties=()):
+        """
+        将当前文档按指定过滤器写入内存，由调用方决定何时写盘
+        
+        Args:
+            filter_name: 过滤器名称，draw8为ODG，draw_pdf_Export为PDF
+            extra_properties: 额外的存储属性
+            
+        Returns:
+            bytes: 文件内容
+        """
+        output = _BytesOutputStream()
+        properties = (
+            PropertyValue("FilterName", 0, filter_name, 0),
+            PropertyValue("OutputStream", 0, output, 0),
+        ) + tuple(extra_properties)
+        self._uno_call("store", self.document.storeToURL, "private:stream", properties)
+        return output.getvalue()
+    
+    def render_to_bytes(self, data, shape_text_map, export_pdf=True, shape_image_map=None):
+        """
+        在内存中完成 加载 -> 修改文本 -> 保存/导出，不写磁盘
+        
+        Args:
+            data: 模板ODG文件内容
+            shape_text_map: 形状名称到新文本的映射
+            export_pdf: 是否同时导出PDF，也可以是导出配置名称（见odg_pdf.PDF_PROFILES）
+            shape_image_map: 形状名称到图片的映射（见_apply_images）
+            
+        Returns:
+            dict: 修改结果，odg_bytes / pdf_bytes 为输出内容
+        """
+        try:
+            export_pdf = resolve_profile(export_pdf)
+            if not self.open_odg_bytes(data):
+                return {"success": False, "error": "无法打开ODG文件"}
+            self.document_key = content_hash(data) if self.shape_index is not None else None
+            self._emit("loaded")
+            result = self._apply_texts(shape_text_map)
+            if shape_image_map:
+                result["images"] = self._apply_images(shape_image_map)
+            # 没有修改时输出与模板相同，不需要再保存一次
+            changed = result["modified_count"] > 0 or result.get("images", {}).get("replaced_count", 0) > 0
+            result["odg_bytes"] = self.odg_bytes() if changed else data
+            if export_pdf:
+                result["pdf_bytes"] = self.store_to_bytes("draw_pdf_Export", (filter_data(export_pdf),))
+                result["pdf_profile"] = export_pdf
+            return result
+        except Exception as e:
+            print(f"渲染文档失败: {e}")
+            return {"success": False, "error": str(e)}
+        finally:
+            self.close_document()
+
+    def get_odg_info(self, file_path, pages=None, fields=None):
         """
         获取ODG文件信息
         
         Args:
             file_path: ODG文件路径
+            pages: 只读取这些页面的形状（格式见parse_pages），None表示全部页面
+            fields: 形状字段（SHAPE_FIELDS的子集），None表示全部
             
         Returns:
             dict: 包含文件信息的字典
@@ -366,7 +641,8 @@ class ODGProcessor:
                 PropertyValue("ReadOnly", 0, True, 0),  # 只读模式
             )
             
-            self.document = self.desktop.loadComponentFromURL(url, "_blank", 0, properties)
+            self.document = self._uno_call(
+                "load", self.desktop.loadComponentFromURL, url, "_blank", 0, properties)
             
             # 获取文档信息
             info = {
@@ -378,12 +654,12 @@ class ODGProcessor:
             }
             
             # 获取页面信息
-            pages = self.document.getDrawPages()
-            info['pages_count'] = pages.getCount()
+            draw_pages = self.document.getDrawPages()
+            info['pages_count'] = draw_pages.getCount()
             
             # 遍历每个页面获取详细信息
-            for i in range(pages.getCount()):
-                page = pages.getByIndex(i)
+            for i in parse_pages(pages, draw_pages.getCount()):
+                page = draw_pages.getByIndex(i)
                 page_info = {
                     'page_number': i + 1,
                     'shapes_count': page.getCount(),
@@ -392,40 +668,7 @@ class ODGProcessor:
                 
                 # 获取页面中的所有形状
                 for j in range(page.getCount()):
-                    shape = page.getByIndex(j)
-                    shape_info = {
-                        'shape_index': j,
-                        'shape_type': shape.getShapeType(),
-                        'shape_name': '',
-                        'position': {
-                            'x': shape.getPosition().X,
-                            'y': shape.getPosition().Y
-                        },
-                        'size': {
-                            'width': shape.getSize().Width,
-                            'height': shape.getSize().Height
-                        }
-                    }
-                    
-                    # 获取形状名称
-                    try:
-                        if hasattr(shape, 'Name'):
-                            shape_info['shape_name'] = shape.Name
-                        elif hasattr(shape, 'getString') and shape.getString():
-                            # 对于文本形状，如果没有名称，可以用文本内容作为标识
-                            shape_info['shape_name'] = f"Text: {shape.getString()[:20]}..."
-                    except:
-                        shape_info['shape_name'] = f"Shape_{j+1}"
-                    
-                    # 如果是文本形状，获取文本内容
-                    try:
-                        if hasattr(shape, 'getString'):
-                            shape_info['text'] = shape.getString()
-                        elif hasattr(shape, 'Text'):
-                            shape_info['text'] = shape.Text.getString()
-                    except:
-                        pass
-                    
+                    shape_info = describe_shape(page.getByIndex(j), j, fields)
                     page_info['shapes'].append(shape_info)
                 
                 info['pages_info'].append(page_info)
@@ -440,7 +683,7 @@ class ODGProcessor:
                     'creation_date': str(doc_props.CreationDate),
                     'modification_date': str(doc_props.ModificationDate)
                 }
-            except:
+            except Exception:
                 pass
             
             # 关闭文档
@@ -453,7 +696,282 @@ class ODGProcessor:
             print(f"获取ODG文件信息失败: {e}")
             return None
 
-    def modify_text_by_shape_names(self, file_path, shape_text_map, output_path=None, export_pdf=True):
+    def iter_shapes(self, file_path, pages=None, fields=None):
+        """
+        逐个读取形状信息（生成器），只访问指定的页面和字段
+        
+        与get_odg_info不同，不会先为所有页面和形状建立完整的列表，
+        大文档只需要其中几页时内存占用和延迟都小得多。文档在迭代结束或生成器关闭时关闭。
+        
+        Args:
+            file_path: ODG文件路径
+            pages: 页面范围，格式见parse_pages，None表示全部页面
+            fields: 形状字段（SHAPE_FIELDS的子集），None表示全部
+            
+        Yields:
+            dict: 形状信息，附带page_number（从1开始）
+        """
+        if not self.desktop:
+            if not self.start_libreoffice_server():
+                raise RuntimeError("无法启动LibreOffice服务器")
+        
+        url = uno.systemPathToFileUrl(os.path.abspath(file_path))
+        properties = (
+            PropertyValue("Hidden", 0, True, 0),
+            PropertyValue("ReadOnly", 0, True, 0),
+        )
+        self.document = self._uno_call(
+            "load", self.desktop.loadComponentFromURL, url, "_blank", 0, properties)
+        try:
+            draw_pages = self.document.getDrawPages()
+            for i in parse_pages(pages, draw_pages.getCount()):
+                page = draw_pages.getByIndex(i)
+                for j in range(page.getCount()):
+                    shape_info = describe_shape(page.getByIndex(j), j, fields)
+                    shape_info['page_number'] = i + 1
+                    yield shape_info
+        finally:
+            self.close_document()
+
+    def get_geometry(self, file_path):
+        """
+        读取所有形状（包括组合形状的成员）的外接矩形，用于建立空间索引
+
+        Args:
+            file_path: ODG文件路径
+
+        Returns:
+            list: 每页的形状几何，格式见odg_spatial.collect_geometry
+        """
+        from odg_spatial import collect_geometry
+
+        if not self.desktop:
+            if not self.start_libreoffice_server():
+                raise RuntimeError("无法启动LibreOffice服务器")
+
+        url = uno.systemPathToFileUrl(os.path.abspath(file_path))
+        properties = (
+            PropertyValue("Hidden", 0, True, 0),
+            PropertyValue("ReadOnly", 0, True, 0),
+        )
+        self.document = self._uno_call(
+            "load", self.desktop.loadComponentFromURL, url, "_blank", 0, properties)
+        try:
+            return collect_geometry(self.document)
+        finally:
+            self.close_document()
+
+    def _apply_texts(self, shape_text_map):
+        """
+        在当前打开的文档中按形状名称设置文本
+        
+        Args:
+            shape_text_map: 形状名称到新文本的映射
+            
+        Returns:
+            dict: 修改结果统计
+        """
+        # 统计信息
+        result = {
+            "success": True,
+            "total_targets": len(shape_text_map),
+            "modified_count": 0,
+            "unchanged_count": 0,
+            "found_shapes": [],
+            "unchanged_shapes": [],
+            "not_found_shapes": [],
+            "error_shapes": []
+        }
+        
+        targets = self._find_targets(shape_text_map)
+        
+        # 记录已修改的形状
+        found_shapes = set()
+        for shape_name, shape in targets:
+            new_text = shape_text_map[shape_name]
+            try:
+                # 尝试修改文本内容，与当前文本相同时不写入
+                if hasattr(shape, 'setString'):
+                    text_range = shape
+                elif hasattr(shape, 'Text'):
+                    text_range = shape.Text
+                else:
+                    result["error_shapes"].append({
+                        "name": shape_name,
+                        "error": "不是文本形状，无法修改文本内容"
+                    })
+                    print(f"形状 '{shape_name}' 不是文本形状，无法修改文本内容")
+                    continue
+                if text_range.getString() == new_text:
+                    result["unchanged_count"] += 1
+                    result["unchanged_shapes"].append(shape_name)
+                    found_shapes.add(shape_name)
+                    continue
+                text_range.setString(new_text)
+                result["modified_count"] += 1
+                result["found_shapes"].append(shape_name)
+                found_shapes.add(shape_name)
+                print(f"已修改形状 '{shape_name}' 的文本内容为: {new_text}")
+            except Exception as e:
+                result["error_shapes"].append({
+                    "name": shape_name,
+                    "error": str(e)
+                })
+                print(f"修改形状 '{shape_name}' 文本失败: {e}")
+        
+        # 找出未找到的形状
+        for target_name in shape_text_map:
+            if target_name not in found_shapes:
+                result["not_found_shapes"].append(target_name)
+        
+        return result
+
+    def _find_targets(self, shape_map):
+        """
+        在当前打开的文档中按名称查找目标形状
+        
+        Args:
+            shape_map: 以形状名称为键的映射
+            
+        Returns:
+            list: 按文档顺序排列的 (形状名称, 形状)
+        """
+        pages = self.document.getDrawPages()
+        targets = self._indexed_targets(pages, shape_map)
+        if targets is not None:
+            return targets
+        
+        # 没有索引时遍历所有页面，同时为该模板建立索引
+        targets = []
+        index = {}
+        seen = set()
+        for i in range(pages.getCount()):
+            page = pages.getByIndex(i)
+            
+            # 遍历页面中的所有形状
+            for j in range(page.getCount()):
+                shape = page.getByIndex(j)
+                
+                # 获取形状名称
+                shape_name = ""
+                try:
+                    if hasattr(shape, 'Name'):
+                        shape_name = shape.Name
+                except Exception:
+                    continue
+                if shape_name and shape_name not in index:
+                    index[shape_name] = (i, j)
+                
+                # 检查是否是目标形状
+                if shape_name in shape_map and shape_name not in seen:
+                    targets.append((shape_name, shape))
+                    seen.add(shape_name)
+        if self.shape_index is not None and self.document_key:
+            self.shape_index.put(self.document_key, index)
+        return targets
+
+    def _apply_images(self, shape_image_map):
+        """
+        在当前打开的文档中按形状名称替换图片形状的图片
+        
+        图片按内容哈希从图片文件缓存和图形对象缓存中取得，同一张图片只读盘和解码一次；
+        多个形状使用同一个图形对象，保存时只写出一份图片
+        
+        Args:
+            shape_image_map: 形状名称到图片的映射（图片文件路径、base64 data URI或bytes）
+            
+        Returns:
+            dict: 替换结果统计
+        """
+        result = {
+            "total_targets": len(shape_image_map),
+            "replaced_count": 0,
+            "replaced_shapes": [],
+            "not_found_shapes": [],
+            "error_shapes": []
+        }
+        
+        found_shapes = set()
+        for shape_name, shape in self._find_targets(shape_image_map):
+            found_shapes.add(shape_name)
+            try:
+                if not shape.getPropertySetInfo().hasPropertyByName("Graphic"):
+                    result["error_shapes"].append({
+                        "name": shape_name,
+                        "error": "不是图片形状，无法替换图片"
+                    })
+                    print(f"形状 '{shape_name}' 不是图片形状，无法替换图片")
+                    continue
+                image = self.image_store.load(shape_image_map[shape_name])
+                shape.Graphic = self.graphic_cache.graphic_for(image, self.connection_manager.context)
+                result["replaced_count"] += 1
+                result["replaced_shapes"].append(shape_name)
+                print(f"已替换形状 '{shape_name}' 的图片")
+            except Exception as e:
+                result["error_shapes"].append({
+                    "name": shape_name,
+                    "error": str(e)
+                })
+                print(f"替换形状 '{shape_name}' 的图片失败: {e}")
+        
+        result["not_found_shapes"] = [name for name in shape_image_map if name not in found_shapes]
+        return result
+
+    def _indexed_targets(self, pages, shape_text_map):
+        """
+        按形状索引直接定位目标形状
+        
+        Returns:
+            list: 按文档顺序排列的 (形状名称, 形状)，没有索引或索引与文档不符时返回None
+        """
+        if self.shape_index is None or not self.document_key:
+            return None
+        index = self.shape_index.get(self.document_key)
+        if index is None:
+            return None
+        positions = sorted((index[name], name) for name in shape_text_map if name in index)
+        targets = []
+        try:
+            for (i, j), shape_name in positions:
+                shape = pages.getByIndex(i).getByIndex(j)
+                if shape.Name != shape_name:
+                    return None
+                targets.append((shape_name, shape))
+        except Exception:
+            return None
+        return targets
+
+    def _existing_outputs(self, file_path, output_path, export_pdf, result):
+        """
+        文本都没有变化时返回已有的输出，而不是重新保存和导出
+
+        输出文件与原文件内容相同时直接使用，不存在或不同时复制原文件；
+        PDF存在、不比ODG旧且以相同的导出配置导出时直接使用，否则从当前打开的文档导出
+        """
+        odg_path = output_path or file_path
+        if output_path and not (os.path.exists(output_path) and filecmp.cmp(file_path, output_path, shallow=False)):
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            os.makedirs(output_dir, exist_ok=True)
+            shutil.copyfile(file_path, output_path)
+            print(f"已复制原文件到: {output_path}")
+            self._emit("saved", output_path)
+        result["unchanged"] = True
+        if not export_pdf:
+            return
+        pdf_path = odg_path.replace('.odg', '.pdf')
+        if is_up_to_date(odg_path, pdf_path) and exported_with(pdf_path, export_pdf):
+            result["pdf_path"] = pdf_path
+            print(f"使用已有的PDF: {pdf_path}")
+        elif self.export_to_pdf(pdf_path, export_pdf):
+            result["pdf_path"] = pdf_path
+            self._emit("pdf_exported", pdf_path)
+            print(f"PDF导出成功: {pdf_path}")
+        else:
+            print(f"PDF导出失败: {pdf_path}")
+            result["pdf_export_error"] = "PDF导出失败"
+
+    def modify_text_by_shape_names(self, file_path, shape_text_map, output_path=None, export_pdf=True,
+                                   shape_image_map=None):
         """
         根据形状名称批量修改文本内容
         
@@ -462,12 +980,15 @@ class ODGProcessor:
             shape_text_map: 字典，键为形状名称，值为新的文本内容
                           例如: {"name1": "新文本1", "name2": "新文本2"}
             output_path: 输出文件路径，如果为None则覆盖原文件
-            export_pdf: 是否自动导出为PDF，默认为True
+            export_pdf: 是否自动导出为PDF，默认为True；也可以是导出配置名称（见odg_pdf.PDF_PROFILES）
+            shape_image_map: 形状名称到图片的映射（见_apply_images），结果在images中
             
         Returns:
-            dict: 修改结果，包含成功和失败的统计
+            dict: 修改结果，包含成功和失败的统计；文本与要求的相同的形状计入unchanged_shapes，
+                  所有形状都没有变化时不保存，返回已有的输出（unchanged为True）
         """
         try:
+            export_pdf = resolve_profile(export_pdf)
             if not self.desktop:
                 if not self.start_libreoffice_server():
                     return {"success": False, "error": "无法启动LibreOffice服务器"}
@@ -478,101 +999,48 @@ class ODGProcessor:
                 PropertyValue("ReadOnly", 0, False, 0),  # 可编辑模式
             )
             
-            self.document = self.desktop.loadComponentFromURL(url, "_blank", 0, properties)
+            self.document = self._uno_call(
+                "load", self.desktop.loadComponentFromURL, url, "_blank", 0, properties)
+            self.document_key = self.shape_index.key_for(file_path) if self.shape_index is not None else None
+            self._emit("loaded")
             
-            # 统计信息
-            result = {
-                "success": True,
-                "total_targets": len(shape_text_map),
-                "modified_count": 0,
-                "found_shapes": [],
-                "not_found_shapes": [],
-                "error_shapes": []
-            }
-            
-            # 记录已找到的形状，避免重复修改
-            found_shapes = set()
+            result = self._apply_texts(shape_text_map)
+            if export_pdf:
+                result["pdf_profile"] = export_pdf
+            if shape_image_map:
+                result["images"] = self._apply_images(shape_image_map)
             
-            # 遍历所有页面
-            pages = self.document.getDrawPages()
-            for i in range(pages.getCount()):
-                page = pages.getByIndex(i)
-                
-                # 遍历页面中的所有形状
-                for j in range(page.getCount()):
-                    shape = page.getByIndex(j)
-                    
-                    # 获取形状名称
-                    shape_name = ""
-                    try:
-                        if hasattr(shape, 'Name'):
-                            shape_name = shape.Name
-                    except:
-                        continue
-                    
-                    # 检查是否是目标形状
-                    if shape_name in shape_text_map and shape_name not in found_shapes:
-                        new_text = shape_text_map[shape_name]
-                        try:
-                            # 尝试修改文本内容
-                            if hasattr(shape, 'setString'):
-                                shape.setString(new_text)
-                                result["modified_count"] += 1
-                                result["found_shapes"].append(shape_name)
-                                found_shapes.add(shape_name)
-                                print(f"已修改形状 '{shape_name}' 的文本内容为: {new_text}")
-                            elif hasattr(shape, 'Text'):
-                                shape.Text.setString(new_text)
-                                result["modified_count"] += 1
-                                result["found_shapes"].append(shape_name)
-                                found_shapes.add(shape_name)
-                                print(f"已修改形状 '{shape_name}' 的文本内容为: {new_text}")
-                            else:
-                                result["error_shapes"].append({
-                                    "name": shape_name,
-                                    "error": "不是文本形状，无法修改文本内容"
-                                })
-                                print(f"形状 '{shape_name}' 不是文本形状，无法修改文本内容")
-                        except Exception as e:
-                            result["error_shapes"].append({
-                                "name": shape_name,
-                                "error": str(e)
-                            })
-                            print(f"修改形状 '{shape_name}' 文本失败: {e}")
-            
-            # 找出未找到的形状
-            for target_name in shape_text_map:
-                if target_name not in found_shapes:
-                    result["not_found_shapes"].append(target_name)
-            
-            if result["modified_count"] > 0:
+            if result["modified_count"] > 0 or result.get("images", {}).get("replaced_count", 0) > 0:
                 # 保存文档
                 try:
                     if output_path:
-                        save_url = uno.systemPathToFileUrl(os.path.abspath(output_path))
-                        self.document.storeAsUrl(save_url, ())
+                        self.store_document(output_path)
                         print(f"已保存修改后的ODG文件到: {output_path}")
+                        self._emit("saved", output_path)
                         
                         # 导出为PDF
                         if export_pdf:
                             pdf_path = output_path.replace('.odg', '.pdf')
                             print(f"尝试导出PDF到: {pdf_path}")
-                            if self.export_to_pdf(pdf_path):
+                            if self.export_to_pdf(pdf_path, export_pdf):
                                 result["pdf_path"] = pdf_path
+                                self._emit("pdf_exported", pdf_path)
                                 print(f"PDF导出成功: {pdf_path}")
                             else:
                                 print(f"PDF导出失败: {pdf_path}")
                                 result["pdf_export_error"] = "PDF导出失败"
                     else:
-                        self.document.store()
+                        self.store_document()
                         print("已保存修改到原文件")
+                        self._emit("saved", file_path)
                     
                         # 导出为PDF（使用原文件名）
                         if export_pdf:
                             pdf_path = file_path.replace('.odg', '.pdf')
                             print(f"尝试导出PDF到: {pdf_path}")
-                            if self.export_to_pdf(pdf_path):
+                            if self.export_to_pdf(pdf_path, export_pdf):
                                 result["pdf_path"] = pdf_path
+                                self._emit("pdf_exported", pdf_path)
                                 print(f"PDF导出成功: {pdf_path}")
                             else:
                                 print(f"PDF导出失败: {pdf_path}")
@@ -587,12 +1055,16 @@ class ODGProcessor:
                     if export_pdf:
                         pdf_path = (output_path or file_path).replace('.odg', '.pdf')
                         print(f"尝试直接导出PDF到: {pdf_path}")
-                        if self.export_to_pdf(pdf_path):
+                        if self.export_to_pdf(pdf_path, export_pdf):
                             result["pdf_path"] = pdf_path
+                            self._emit("pdf_exported", pdf_path)
                             print(f"PDF导出成功: {pdf_path}")
                         else:
                             print(f"PDF导出失败: {pdf_path}")
                             result["pdf_export_error"] = "PDF导出失败"
+            elif result["unchanged_count"] > 0:
+                print("所有形状的文本与要求的相同，跳过保存")
+                self._existing_outputs(file_path, output_path, export_pdf, result)
             else:
                 print("没有修改任何形状，跳过保存和PDF导出")
             
@@ -679,6 +1151,8 @@ def main():
                 print(f"成功修改: {result['modified_count']}")
                 if result["found_shapes"]:
                     print(f"成功修改的形状: {', '.join(result['found_shapes'])}")
+                if result["unchanged_shapes"]:
+                    print(f"文本未变化的形状: {', '.join(result['unchanged_shapes'])}")
                 if result["not_found_shapes"]:
                     print(f"未找到的形状: {', '.join(result['not_found_shapes'])}")
                 if result["error_shapes"]:
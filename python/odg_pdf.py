@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF导出配置
+导出耗时和PDF大小主要取决于图片的压缩质量和分辨率、是否无损压缩、是否嵌入字体以及是否生成带标签的PDF或PDF/A。
+每个配置是PDF导出过滤器的一组FilterData，调用时按名称选择；导出PDF的参数为True时使用默认配置。
+"""
+
+import json
+import os
+import threading
+
+# 配置名称 -> PDF导出过滤器的FilterData
+PDF_PROFILES = {
+    # 与以前相同：JPEG质量90，其余使用office的默认值
+    "default": {
+        "Quality": 90,
+    },
+    # 导出最快、文件最小：图片降到150DPI、质量75，不生成标签、书签和注释，不嵌入标准字体
+    "fast": {
+        "Quality": 75,
+        "ReduceImageResolution": True,
+        "MaxImageResolution": 150,
+        "UseLosslessCompression": False,
+        "UseTaggedPDF": False,
+        "ExportBookmarks": False,
+        "ExportNotes": False,
+        "EmbedStandardFonts": False,
+    },
+    # 屏幕浏览和下载：图片150DPI、质量80，保留书签
+    "web": {
+        "Quality": 80,
+        "ReduceImageResolution": True,
+        "MaxImageResolution": 150,
+        "UseLosslessCompression": False,
+        "UseTaggedPDF": False,
+        "ExportBookmarks": True,
+        "EmbedStandardFonts": False,
+    },
+    # 打印：图片300DPI、质量95，嵌入所有字体
+    "print": {
+        "Quality": 95,
+        "ReduceImageResolution": True,
+        "MaxImageResolution": 300,
+        "UseLosslessCompression": False,
+        "EmbedStandardFonts": True,
+    },
+    # 归档：PDF/A-2b，带标签，嵌入所有字体，图片无损压缩且不降低分辨率（导出最慢、文件最大）
+    "archive": {
+        "SelectPdfVersion": 2,
+        "UseTaggedPDF": True,
+        "EmbedStandardFonts": True,
+        "UseLosslessCompression": True,
+        "ReduceImageResolution": False,
+    },
+}
+
+_custom_profiles = None
+_custom_lock = threading.Lock()
+
+def profiles():
+    """
+    所有导出配置：内置配置加上 ODG_PDF_PROFILES 指定的JSON文件中的配置（同名时覆盖内置配置）
+
+    JSON文件格式为 {"配置名称": {"FilterData属性": 值, ...}, ...}
+    """
+    global _custom_profiles
+    with _custom_lock:
+        if _custom_profiles is None:
+            path = os.environ.get("ODG_PDF_PROFILES")
+            if path:
+                with open(path, encoding="utf-8") as f:
+                    _custom_profiles = {name.lower(): data for name, data in json.load(f).items()}
+            else:
+                _custom_profiles = {}
+    return {**PDF_PROFILES, **_custom_profiles}
+
+def default_profile():
+    """导出PDF的参数为True时使用的配置，可用 ODG_PDF_PROFILE 修改"""
+    return (os.environ.get("ODG_PDF_PROFILE") or "default").lower()
+
+def resolve_profile(export_pdf):
+    """
+    解析导出PDF的参数
+
+    Args:
+        export_pdf: True/False、"true"/"false"，或导出配置名称
+
+    Returns:
+        str: 导出配置名称，不导出PDF时返回None
+    """
+    if export_pdf is None or export_pdf is False:
+        return None
+    if export_pdf is True:
+        name = default_profile()
+    else:
+        name = str(export_pdf).strip().lower()
+        if name in ("", "false", "0", "no"):
+            return None
+        if name in ("true", "1", "yes"):
+            name = default_profile()
+    if name not in profiles():
+        raise ValueError(f"未知的PDF导出配置: {export_pdf}（可用: {', '.join(sorted(profiles()))}）")
+    return name
+
+def profile_signature(profile=None):
+    """导出配置的名称及其FilterData，配置内容修改后签名也随之改变"""
+    name = resolve_profile(profile or True)
+    return json.dumps({"profile": name, "filter_data": profiles()[name]}, sort_keys=True)
+
+def profile_marker_path(pdf_path):
+    """记录PDF导出配置的隐藏文件（与PDF在同一目录）"""
+    directory, name = os.path.split(os.path.abspath(pdf_path))
+    return os.path.join(directory, f".{name}.profile")
+
+def forget_profile(pdf_path):
+    """删除PDF的导出配置记录（重新导出前调用，导出失败时不会留下与PDF不符的记录）"""
+    try:
+        os.remove(profile_marker_path(pdf_path))
+    except FileNotFoundError:
+        pass
+
+def record_profile(pdf_path, profile=None):
+    """记录PDF导出使用的配置"""
+    with open(profile_marker_path(pdf_path), "w", encoding="utf-8") as f:
+        f.write(profile_signature(profile))
+
+def exported_with(pdf_path, profile=None):
+    """
+    PDF是否使用该导出配置导出
+
+    Returns:
+        bool: 没有记录（如旧版本导出的PDF）或配置不同时返回False
+    """
+    try:
+        with open(profile_marker_path(pdf_path), encoding="utf-8") as f:
+            return f.read() == profile_signature(profile)
+    except OSError:
+        return False
+
+def filter_data(profile=None):
+    """
+    Args:
+        profile: 导出配置名称，None表示默认配置
+
+    Returns:
+        com.sun.star.beans.PropertyValue: 导出时使用的FilterData属性
+    """
+    import uno
+    from com.sun.star.beans import PropertyValue
+
+    name = resolve_profile(profile or True)
+    values = tuple(PropertyValue(key, 0, value, 0) for key, value in profiles()[name].items())
+    return PropertyValue("FilterData", 0, uno.Any("[]com.sun.star.beans.PropertyValue", values), 0)
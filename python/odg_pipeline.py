@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染流水线
+把一个任务拆成 预读 -> 渲染 -> 写盘 三个阶段，分别由不同的线程执行：
+预读线程在工作进程忙碌时提前把后续任务的模板读入内存，工作进程从内存加载文档并把ODG/PDF
+导出到内存，写盘线程在工作进程开始下一个任务的同时把结果写入磁盘。
+各阶段的利用率用于判断限制吞吐量的是哪个阶段。
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from odg_affinity import content_hash
+from odg_pdf import forget_profile, record_profile
+
+class StageStats:
+    """流水线阶段的耗时统计"""
+
+    def __init__(self, name, slots):
+        self.name = name
+        self.slots = slots
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, waited=0.0):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+            self.wait_seconds += waited
+
+    def snapshot(self, elapsed):
+        """
+        Args:
+            elapsed: 流水线运行时间（秒）
+
+        Returns:
+            dict: 处理数、平均耗时、平均等待时间和利用率（忙碌时间 / 运行时间 / 并行数）
+        """
+        with self._lock:
+            capacity = elapsed * self.slots
+            return {
+                "slots": self.slots,
+                "items": self.items,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "avg_seconds": round(self.busy_seconds / self.items, 4) if self.items else None,
+                "avg_wait_seconds": round(self.wait_seconds / self.items, 4) if self.items else None,
+                "utilization": round(self.busy_seconds / capacity, 3) if capacity > 0 else None
+            }
+
+def _write_file(path, data):
+    """先写临时文件再改名，读取方不会看到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+def _resolve(future, result):
+    """设置结果，调用方已取消的任务忽略"""
+    if not future.cancelled():
+        future.set_result(result)
+
+class PipelineScheduler:
+    """在WorkerPool之上的 预读 -> 渲染 -> 写盘 流水线调度器"""
+
+    def __init__(self, pool, prefetch_threads=2, prefetch_depth=None, writers=2):
+        """
+        Args:
+            pool: WorkerPool工作进程池
+            prefetch_threads: 预读线程数
+            prefetch_depth: 已读入内存、等待渲染的任务上限，默认为工作进程数的2倍
+            writers: 写盘线程数
+        """
+        self.pool = pool
+        self.prefetch_depth = prefetch_depth or pool.size * 2
+        self._prefetch = ThreadPoolExecutor(max_workers=prefetch_threads, thread_name_prefix="odg-prefetch")
+        self._writers = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="odg-writer")
+        self._ready = threading.BoundedSemaphore(self.prefetch_depth)
+        self._started = time.monotonic()
+        self.stages = {
+            "prefetch": StageStats("prefetch", prefetch_threads),
+            "render": StageStats("render", pool.size),
+            "write": StageStats("write", writers)
+        }
+
+    def submit(self, file_path, shape_text_map, output_path=None, export_pdf=True, on_event=None,
+               shape_image_map=None):
+        """
+        提交渲染任务
+
+        Args:
+            file_path: 模板ODG文件路径
+            shape_text_map: 形状名称到新文本的映射
+            output_path: 输出路径，None则覆盖模板
+            export_pdf: 是否导出PDF（与ODG同名的.pdf文件），也可以是PDF导出配置名称
+            on_event: 进度事件回调
+            shape_image_map: 形状名称到图片的映射
+
+        Returns:
+            Future: 结果字典，格式与bridge的modify_texts相同
+        """
+        future = Future()
+        output_path = output_path or file_path
+        self._prefetch.submit(self._prefetch_job, future, file_path, shape_text_map,
+                              output_path, export_pdf, on_event, shape_image_map)
+        return future
+
+    def _prefetch_job(self, future, file_path, shape_text_map, output_path, export_pdf, on_event,
+                      shape_image_map=None):
+        # 限制已读入内存的任务数，渲染跟不上时预读自然停下
+        self._ready.acquire()
+        if future.cancelled():
+            self._ready.release()
+            return
+        start = time.monotonic()
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            self._ready.release()
+            _resolve(future, {"success": False, "error": str(e)})
+            return
+        prefetched_at = time.monotonic()
+        self.stages["prefetch"].record(prefetched_at - start)
+
+        released = threading.Event()
+
+        def render(processor):
+            # 看门狗重试时会再次调用，只在第一次开始渲染时释放预读名额
+            if not released.is_set():
+                released.set()
+                self._ready.release()
+            processor.on_event = on_event
+            render_start = time.monotonic()
+            result = processor.render_to_bytes(data, shape_text_map, export_pdf, shape_image_map)
+            self.stages["render"].record(time.monotonic() - render_start, render_start - prefetched_at)
+            return {"success": bool(result.get("success")), "data": result}
+
+        render_future = self.pool.submit(
+            render, succeeded=lambda r: bool(r and r.get("success") and r["data"].get("success")),
+            affinity_key=content_hash(data) if self.pool.affinity else None)
+        # 调用方取消时，尚未开始渲染的任务从工作进程池的队列中撤销
+        future.add_done_callback(lambda f: f.cancelled() and render_future.cancel())
+
+        def on_rendered(f):
+            if not released.is_set():
+                released.set()
+                self._ready.release()
+            if f.cancelled():
+                future.cancel()
+            elif f.exception() is not None:
+                if not future.cancelled():
+                    future.set_exception(f.exception())
+            else:
+                rendered_at = time.monotonic()
+                self._writers.submit(self._write_job, future, f.result(), output_path, export_pdf,
+                                     on_event, rendered_at)
+
+        render_future.add_done_callback(on_rendered)
+
+    def _write_job(self, future, result, output_path, export_pdf, on_event, rendered_at):
+        start = time.monotonic()
+        data = result.get("data") or {}
+        try:
+            odg_bytes = data.pop("odg_bytes", None)
+            pdf_bytes = data.pop("pdf_bytes", None)
+            if odg_bytes is not None:
+                _write_file(output_path, odg_bytes)
+                data["output_path"] = output_path
+                self._notify(on_event, "saved", output_path)
+            if pdf_bytes is not None:
+                pdf_path = output_path.replace(".odg", ".pdf")
+                forget_profile(pdf_path)
+                _write_file(pdf_path, pdf_bytes)
+                record_profile(pdf_path, data.get("pdf_profile") or export_pdf)
+                data["pdf_path"] = pdf_path
+                self._notify(on_event, "pdf_exported", pdf_path)
+            elif export_pdf and result.get("success"):
+                data["pdf_export_error"] = "PDF导出失败"
+        except OSError as e:
+            data["save_error"] = str(e)
+        self.stages["write"].record(time.monotonic() - start, start - rendered_at)
+        _resolve(future, result)
+
+    @staticmethod
+    def _notify(on_event, stage, path):
+        if on_event is not None:
+            on_event({"type": "progress", "stage": stage, "path": os.path.abspath(path),
+                      "bytes": os.path.getsize(path)})
+
+    def stats(self):
+        """各阶段的处理数、平均耗时、等待时间和利用率，以及利用率最高的阶段"""
+        elapsed = time.monotonic() - self._started
+        stages = {name: stage.snapshot(elapsed) for name, stage in self.stages.items()}
+        busiest = max(stages, key=lambda name: stages[name]["utilization"] or 0)
+        return {
+            "elapsed_seconds": round(elapsed, 1),
+            "prefetch_depth": self.prefetch_depth,
+            "stages": stages,
+            "bottleneck": busiest if stages[busiest]["items"] else None
+        }
+
+    def shutdown(self, wait=True):
+        """停止预读和写盘线程（等待已提交的写盘完成）"""
+        self._prefetch.shutdown(wait=wait)
+        self._writers.shutdown(wait=wait)
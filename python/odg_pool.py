@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LibreOffice工作进程池
+每个工作进程拥有独立的office实例（独立端口和用户配置目录），
+并按处理任务数、内存占用（RSS）和运行时间回收，回收时先启动替换进程再平滑退出；
+开启模板亲和后，同一模板的任务优先交给同一个工作进程；
+指定预热清单时，工作进程预热完清单中的模板后才开始接收任务
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from odg_affinity import HashRing
+from odg_images import GraphicCache
+from odg_office import OfficeInstance, OfficeSupervisor, build_accept
+from odg_operations import ODGProcessor
+from odg_warmup import ShapeIndex
+
+def _child_pids(pid):
+    """从/proc中查找进程的所有子孙进程"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名可能包含空格，从最后一个')'之后解析
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    result = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        for child in children.get(current, []):
+            result.append(child)
+            pending.append(child)
+    return result
+
+def process_tree_rss(pid):
+    """
+    读取进程及其子进程的常驻内存（soffice启动脚本会派生soffice.bin）
+
+    Returns:
+        int: 字节数；系统没有/proc时返回None
+    """
+    if pid is None or not os.path.isdir("/proc"):
+        return None
+    total = 0
+    for p in [pid] + _child_pids(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+def find_free_port(start, exclude=()):
+    """从start开始查找本机可用端口"""
+    port = start
+    while True:
+        if port not in exclude:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                try:
+                    s.bind(("localhost", port))
+                    return port
+                except OSError:
+                    pass
+        port += 1
+
+class RecyclePolicy:
+    """工作进程回收策略，任一条件满足即回收"""
+
+    def __init__(self, max_jobs=None, max_rss_mb=None, max_age=None):
+        """
+        Args:
+            max_jobs: 处理多少个任务后回收
+            max_rss_mb: office进程树常驻内存超过多少MB后回收（从/proc读取）
+            max_age: 运行多少秒后回收
+        """
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.max_age = max_age
+
+    def check(self, worker):
+        """
+        检查工作进程是否需要回收
+
+        Returns:
+            str: 回收原因（jobs / rss / age），不需要回收时返回None
+        """
+        if self.max_jobs and worker.jobs_done >= self.max_jobs:
+            return "jobs"
+        if self.max_age and worker.age() >= self.max_age:
+            return "age"
+        if self.max_rss_mb:
+            rss = worker.rss_bytes()
+            if rss is not None and rss >= self.max_rss_mb * 1024 * 1024:
+                return "rss"
+        return None
+
+class OfficeWorker:
+    """池中的工作进程：一个office实例、它的看门狗和一个处理线程"""
+
+    def __init__(self, pool, worker_id, port=None, pipe_name=None):
+        self.pool = pool
+        self.worker_id = worker_id
+        self.port = port
+        self.pipe_name = pipe_name
+        self.profile_dir = tempfile.mkdtemp(prefix=f"odg-worker-{worker_id}-")
+        self.office = OfficeInstance(
+            soffice_path=pool.soffice_path,
+            accept=build_accept(pool.connection, port=port, pipe_name=pipe_name),
+            startup_timeout=pool.startup_timeout,
+            profile_dir=self.profile_dir
+        )
+        self.supervisor = OfficeSupervisor(self.office, operation_timeout=pool.operation_timeout)
+        # starting -> ready -> recycling（替换进程预热中，仍接收任务） -> draining -> stopped
+        self.state = "starting"
+        self.jobs_done = 0
+        self.busy = False
+        self.started_at = None
+        self.thread = None
+        # 按模板亲和路由到本工作进程的任务，以及处理过的模板（内容哈希 -> 最近使用时间）
+        self.queue = deque()
+        self.warm_templates = OrderedDict()
+        self.affinity_hits = 0
+        self.affinity_misses = 0
+        # 图形对象属于本进程的office连接，由本进程的所有处理器共享
+        self.graphic_cache = GraphicCache()
+
+    def age(self):
+        """运行时间（秒）"""
+        return time.monotonic() - self.started_at if self.started_at else 0
+
+    def rss_bytes(self):
+        """office进程树的常驻内存"""
+        return process_tree_rss(self.office.pid)
+
+    def new_processor(self):
+        """创建绑定到本工作进程office的处理器"""
+        processor = ODGProcessor(supervisor=self.supervisor, connection=self.office.accept)
+        processor.shape_index = self.pool.shape_index
+        processor.graphic_cache = self.graphic_cache
+        return processor
+
+    def start(self):
+        """启动office并开始处理任务"""
+        if self.pool.profile_template is not None:
+            self.pool.profile_template.clone_to(self.profile_dir)
+        self.office.start()
+        self.started_at = time.monotonic()
+        if self.pool.warmer is not None:
+            warmed = self.pool.warmer.warm_worker(self.new_processor(), self.pool.shape_index)
+            print(f"工作进程 {self.worker_id} 已预热 {warmed} 个模板")
+        self.state = "ready"
+        self.thread = threading.Thread(target=self._loop, name=f"odg-worker-{self.worker_id}", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while self.state in ("ready", "recycling"):
+            # 连接处于退避期时不领取任务，让任务由其他工作进程处理
+            wait = self.office.connection.retry_after()
+            if wait > 0:
+                time.sleep(min(wait, 0.5))
+                continue
+            job = self.pool._take_job(self, timeout=0.2)
+            if job is None:
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            if job.affinity_key is not None:
+                self._touch_template(job.affinity_key)
+            self.busy = True
+            try:
+                job.future.set_result(self._run(job))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                self.busy = False
+                self.jobs_done += 1
+                self.pool._after_job(self)
+
+        # 路由到本进程但尚未开始的任务交给其他工作进程
+        self.pool._requeue(self)
+        self._stop_office()
+
+    def _touch_template(self, key):
+        """记录模板亲和命中情况，并更新最近处理过的模板"""
+        hit = key in self.warm_templates
+        if hit:
+            self.affinity_hits += 1
+            self.warm_templates.move_to_end(key)
+        else:
+            self.affinity_misses += 1
+        self.warm_templates[key] = time.time()
+        while len(self.warm_templates) > self.pool.warm_templates:
+            self.warm_templates.popitem(last=False)
+        self.pool._record_affinity(hit)
+
+    def _run(self, job):
+        before = dict(self.supervisor.metrics)
+        result = self.supervisor.run_job(
+            lambda: job.fn(self.new_processor(), *job.args), job.succeeded)
+        if isinstance(result, dict):
+            # 只返回本任务产生的看门狗指标增量
+            result["metrics"] = {
+                key: value - before.get(key, 0) for key, value in self.supervisor.metrics.items()
+            }
+        return result
+
+    def _stop_office(self):
+        self.office.kill()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        self.state = "stopped"
+        self.pool._remove_worker(self)
+
+    def stats(self):
+        """工作进程状态"""
+        return {
+            "worker_id": self.worker_id,
+            "pid": self.office.pid,
+            "port": self.port,
+            "pipe_name": self.pipe_name,
+            "state": self.state,
+            "busy": self.busy,
+            "jobs_done": self.jobs_done,
+            "age_seconds": round(self.age(), 1),
+            "rss_bytes": self.rss_bytes(),
+            "startup_seconds": self.office.startup_seconds,
+            "queued": len(self.queue),
+            "warm_templates": len(self.warm_templates),
+            "affinity_hits": self.affinity_hits,
+            "affinity_misses": self.affinity_misses,
+            "graphic_cache": self.graphic_cache.stats(),
+            "metrics": dict(self.supervisor.metrics),
+            "connection": self.office.connection.metrics()
+        }
+
+class _PoolJob:
+    def __init__(self, fn, args, succeeded, affinity_key=None):
+        self.fn = fn
+        self.args = args
+        self.succeeded = succeeded
+        self.affinity_key = affinity_key
+        self.future = Future()
+
+class WorkerPool:
+    """
+    office工作进程池
+
+    任务放入共享队列，由空闲的工作进程取出执行。工作进程满足回收策略时，
+    先启动并预热替换进程，替换进程就绪后旧进程完成手上的任务再退出，
+    因此回收不会造成请求排队。
+
+    开启模板亲和（affinity）时，带有模板内容哈希的任务按一致性哈希放入首选工作进程的队列；
+    首选进程排队的任务达到spillover时依次溢出到环上的下一个工作进程，全部饱和时放入共享队列。
+    """
+
+    def __init__(self, size=2, soffice_path=None, base_port=2002, operation_timeout=120,
+                 startup_timeout=30, recycle_policy=None, monitor_interval=10, profile_template=None,
+                 connection="socket", affinity=False, spillover=2, warm_templates=16, warmer=None):
+        """
+        Args:
+            size: 工作进程数量
+            soffice_path: soffice可执行文件路径
+            base_port: 工作进程端口的起始值
+            operation_timeout: 单个UNO操作的超时（秒）
+            startup_timeout: office启动超时（秒）
+            recycle_policy: RecyclePolicy回收策略，None表示不回收
+            monitor_interval: 空闲时检查内存和运行时间的间隔（秒）
+            profile_template: ProfileTemplate用户配置模板，工作进程启动前克隆到各自的配置目录
+            connection: 工作进程的连接类型，socket或pipe（每个工作进程使用唯一的管道名）
+            affinity: 是否按模板内容哈希把任务路由到固定的工作进程
+            spillover: 首选工作进程排队多少个任务后溢出到其他工作进程
+            warm_templates: 每个工作进程记录的最近处理过的模板数量
+            warmer: TemplateWarmer，工作进程就绪前按清单预热模板，模板文件变化时重新预热
+        """
+        self.size = size
+        self.soffice_path = soffice_path
+        self.base_port = base_port
+        self.operation_timeout = operation_timeout
+        self.startup_timeout = startup_timeout
+        self.recycle_policy = recycle_policy
+        self.monitor_interval = monitor_interval
+        self.profile_template = profile_template
+        self.connection = connection
+        self.affinity = affinity
+        self.spillover = spillover
+        self.warm_templates = warm_templates
+        self.warmer = warmer
+        # 所有工作进程共享的形状索引（按模板内容哈希）
+        self.shape_index = ShapeIndex()
+
+        self.workers = []
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._ring = HashRing()
+        self._ring_members = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._running = False
+        self.metrics = {
+            "jobs_submitted": 0,
+            "recycles": {"jobs": 0, "rss": 0, "age": 0},
+            "recycle_failures": 0,
+            "affinity": {"routed": 0, "spilled": 0, "unrouted": 0, "hits": 0, "misses": 0}
+        }
+
+    def _spawn_worker(self):
+        with self._lock:
+            self._next_id += 1
+            if self.connection == "pipe":
+                # 管道名包含进程号，多个进程池可以同时运行
+                worker = OfficeWorker(self, self._next_id, pipe_name=f"odg-{os.getpid()}-{self._next_id}")
+            else:
+                used_ports = {w.port for w in self.workers}
+                port = find_free_port(self.base_port, used_ports)
+                worker = OfficeWorker(self, self._next_id, port=port)
+            self.workers.append(worker)
+        try:
+            worker.start()
+        except Exception:
+            self._remove_worker(worker)
+            shutil.rmtree(worker.profile_dir, ignore_errors=True)
+            raise
+        print(f"工作进程 {worker.worker_id} 已就绪 ({worker.office.accept} 启动耗时 {worker.office.startup_seconds:.2f}秒)")
+        return worker
+
+    def _remove_worker(self, worker):
+        with self._lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+
+    def start(self):
+        """并行启动所有工作进程，全部就绪后返回"""
+        self._running = True
+        errors = []
+        if self.profile_template is not None:
+            self.profile_template.ensure()
+
+        def spawn():
+            try:
+                self._spawn_worker()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=spawn) for _ in range(self.size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            self.shutdown()
+            raise errors[0]
+
+        threading.Thread(target=self._monitor, name="odg-pool-monitor", daemon=True).start()
+        if self.warmer is not None:
+            self.warmer.watch(self)
+
+    def submit(self, fn, *args, succeeded=None, affinity_key=None):
+        """
+        提交任务
+
+        Args:
+            fn: 任务函数，第一个参数为绑定到工作进程的ODGProcessor，返回结果字典
+            succeeded: 判断结果是否成功的函数（用于看门狗重试）
+            affinity_key: 模板内容哈希，开启亲和路由时用于选择工作进程
+
+        Returns:
+            Future: 任务结果
+        """
+        job = _PoolJob(fn, args, succeeded, affinity_key if self.affinity else None)
+        with self._cond:
+            self.metrics["jobs_submitted"] += 1
+            worker = self._route(job)
+            (worker.queue if worker is not None else self._jobs).append(job)
+            self._cond.notify_all()
+        return job.future
+
+    def broadcast(self, fn, *args):
+        """
+        在每个工作进程上各执行一次任务（放在各自队列的末尾）
+
+        Returns:
+            list: 各工作进程任务的Future
+        """
+        futures = []
+        with self._cond:
+            for worker in list(self.workers):
+                if worker.state in ("ready", "recycling"):
+                    job = _PoolJob(fn, args, None)
+                    worker.queue.append(job)
+                    futures.append(job.future)
+            self._cond.notify_all()
+        return futures
+
+    def _route(self, job):
+        """选择亲和的工作进程，返回None表示放入共享队列（调用方持有_cond）"""
+        if job.affinity_key is None:
+            return None
+        workers = {w.worker_id: w for w in list(self.workers) if w.state in ("ready", "recycling")}
+        members = tuple(sorted(workers))
+        if members != self._ring_members:
+            self._ring.rebuild(members)
+            self._ring_members = members
+
+        affinity = self.metrics["affinity"]
+        for rank, worker_id in enumerate(self._ring.candidates(job.affinity_key)):
+            worker = workers[worker_id]
+            if len(worker.queue) < self.spillover:
+                affinity["routed" if rank == 0 else "spilled"] += 1
+                return worker
+        affinity["unrouted"] += 1
+        return None
+
+    def _take_job(self, worker, timeout):
+        """取出下一个任务：先处理路由到本进程的任务，再处理共享队列"""
+        with self._cond:
+            if not worker.queue and not self._jobs:
+                self._cond.wait(timeout)
+            if worker.queue:
+                return worker.queue.popleft()
+            if self._jobs:
+                return self._jobs.popleft()
+            return None
+
+    def _requeue(self, worker):
+        """把退出的工作进程队列中的任务移回共享队列"""
+        with self._cond:
+            while worker.queue:
+                self._jobs.appendleft(worker.queue.pop())
+            self._cond.notify_all()
+
+    def _record_affinity(self, hit):
+        with self._cond:
+            self.metrics["affinity"]["hits" if hit else "misses"] += 1
+
+    def _after_job(self, worker):
+        if self.recycle_policy and self._running:
+            reason = self.recycle_policy.check(worker)
+            if reason:
+                self._recycle(worker, reason)
+
+    def _recycle(self, worker, reason):
+        """启动替换进程，就绪后让旧进程排空退出"""
+        with self._lock:
+            if worker.state != "ready":
+                return
+            worker.state = "recycling"
+
+        def replace():
+            print(f"回收工作进程 {worker.worker_id}（原因: {reason}）")
+            try:
+                self._spawn_worker()
+            except Exception as e:
+                print(f"启动替换工作进程失败: {e}")
+                self.metrics["recycle_failures"] += 1
+                if worker.state == "recycling":
+                    worker.state = "ready"
+                return
+            self.metrics["recycles"][reason] += 1
+            worker.state = "draining"
+
+        threading.Thread(target=replace, name=f"odg-recycle-{worker.worker_id}", daemon=True).start()
+
+    def _monitor(self):
+        """定期检查空闲工作进程的内存和运行时间"""
+        while self._running:
+            time.sleep(self.monitor_interval)
+            if not self.recycle_policy:
+                continue
+            for worker in list(self.workers):
+                if worker.state == "ready" and not worker.busy:
+                    reason = self.recycle_policy.check(worker)
+                    if reason:
+                        self._recycle(worker, reason)
+
+    def queued(self):
+        """尚未开始执行的任务数（共享队列和各工作进程队列）"""
+        with self._cond:
+            return len(self._jobs) + sum(len(w.queue) for w in list(self.workers))
+
+    def stats(self):
+        """进程池状态、回收指标和模板亲和命中率"""
+        workers = list(self.workers)
+        queued = self.queued()
+        with self._cond:
+            affinity = dict(self.metrics["affinity"])
+        lookups = affinity["hits"] + affinity["misses"]
+        affinity["enabled"] = self.affinity
+        affinity["hit_rate"] = round(affinity["hits"] / lookups, 3) if lookups else None
+        return {
+            "size": self.size,
+            "queued": queued,
+            "workers": [w.stats() for w in workers],
+            "metrics": {
+                "jobs_submitted": self.metrics["jobs_submitted"],
+                "recycles": dict(self.metrics["recycles"]),
+                "recycle_failures": self.metrics["recycle_failures"],
+                "affinity": affinity
+            },
+            "shape_index": self.shape_index.stats(),
+            "warmup": self.warmer.stats() if self.warmer is not None else None
+        }
+
+    def shutdown(self, wait=True):
+        """停止所有工作进程，等待正在执行的任务完成"""
+        self._running = False
+        if self.warmer is not None:
+            self.warmer.stop()
+        workers = list(self.workers)
+        for worker in workers:
+            worker.state = "draining"
+        if wait:
+            for worker in workers:
+                if worker.thread is not None:
+                    worker.thread.join()
+        for worker in workers:
+            if worker.state != "stopped" and worker.thread is None:
+                worker._stop_office()
+
+        # 取消尚未开始的任务
+        with self._cond:
+            pending = list(self._jobs)
+            self._jobs.clear()
+            for worker in workers:
+                pending.extend(worker.queue)
+                worker.queue.clear()
+        for job in pending:
+            job.future.cancel()
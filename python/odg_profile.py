@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预初始化的LibreOffice用户配置模板
+使用全新的 -env:UserInstallation 首次启动office时需要数秒创建和迁移用户配置，
+这里只初始化一次模板并写入调优设置，之后复制（尽量使用硬链接）到每个工作进程的配置目录
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+import uno
+
+from odg_office import find_soffice
+
+# 写入registrymodifications.xcu的调优设置：(节点路径, 属性名, 类型, 值)
+DEFAULT_SETTINGS = [
+    # 关闭自动保存和崩溃恢复
+    ("/org.openoffice.Office.Common/Save/Document", "AutoSave", "xs:boolean", "false"),
+    ("/org.openoffice.Office.Recovery/AutoSave", "Enabled", "xs:boolean", "false"),
+    ("/org.openoffice.Office.Recovery/RecoveryInfo", "Enabled", "xs:boolean", "false"),
+    # 跳过首次启动向导和提示
+    ("/org.openoffice.Setup/Office", "ooSetupInstCompleted", "xs:boolean", "true"),
+    ("/org.openoffice.Office.Common/Misc", "FirstRun", "xs:boolean", "false"),
+    ("/org.openoffice.Office.Common/Misc", "ShowTipOfTheDay", "xs:boolean", "false"),
+    # 关闭更新检查
+    ("/org.openoffice.Office.Jobs/Jobs/org.openoffice.Office.Jobs:Job['UpdateCheck']/Arguments",
+     "AutoCheckEnabled", "xs:boolean", "false"),
+    # 图形缓存大小（字节），新旧版本使用不同的属性名
+    ("/org.openoffice.Office.Common/Cache/GraphicManager", "GraphicMemoryLimit", "xs:int", "300000000"),
+    ("/org.openoffice.Office.Common/Cache/GraphicManager", "TotalCacheSize", "xs:int", "300000000"),
+]
+
+# office会在运行时改写的文件，克隆时复制而不是硬链接，避免改动传回模板
+_MUTABLE_SUFFIXES = (".xcu", ".xml", ".dat", ".lock", ".db")
+
+_MARKER = ".odg-profile-template"
+
+def _attr(value):
+    return escape(value, {'"': "&quot;"})
+
+def _xcu_item(path, name, value_type, value):
+    return (f'<item oor:path="{_attr(path)}">'
+            f'<prop oor:name="{name}" oor:op="fuse" oor:type="{value_type}">'
+            f'<value>{escape(value)}</value></prop></item>')
+
+def apply_settings(profile_dir, settings=None):
+    """
+    将设置合并到用户配置的registrymodifications.xcu
+
+    Args:
+        profile_dir: 用户配置目录（UserInstallation）
+        settings: 设置列表，None则使用DEFAULT_SETTINGS
+    """
+    settings = DEFAULT_SETTINGS if settings is None else settings
+    xcu_path = os.path.join(profile_dir, "user", "registrymodifications.xcu")
+    os.makedirs(os.path.dirname(xcu_path), exist_ok=True)
+
+    if os.path.exists(xcu_path):
+        with open(xcu_path, encoding="utf-8") as f:
+            content = f.read()
+    else:
+        content = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<oor:items xmlns:oor="http://openoffice.org/2001/registry" '
+                   'xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+                   'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+                   '</oor:items>\n')
+
+    items = []
+    for path, name, value_type, value in settings:
+        # 移除同一属性的已有设置
+        pattern = (r'<item oor:path="' + re.escape(_attr(path)) +
+                   r'"><prop oor:name="' + re.escape(name) + r'"[^>]*>.*?</prop></item>\n?')
+        content = re.sub(pattern, "", content, flags=re.S)
+        items.append(_xcu_item(path, name, value_type, value))
+
+    content = content.replace("</oor:items>", "\n".join(items) + "\n</oor:items>")
+    with open(xcu_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+class ProfileTemplate:
+    """用户配置模板：初始化一次，克隆到每个工作进程"""
+
+    def __init__(self, template_dir=None, soffice_path=None, settings=None, init_timeout=120):
+        """
+        Args:
+            template_dir: 模板目录，None则使用临时目录下的固定位置
+            soffice_path: soffice可执行文件路径
+            settings: 调优设置，None则使用DEFAULT_SETTINGS
+            init_timeout: 初始化模板时等待office退出的最长时间（秒）
+        """
+        self.template_dir = template_dir or os.path.join(tempfile.gettempdir(), "odg-processor-profile")
+        self.soffice_path = soffice_path or find_soffice()
+        self.settings = settings
+        self.init_timeout = init_timeout
+
+    @property
+    def is_initialized(self):
+        """模板是否已经初始化"""
+        return os.path.exists(os.path.join(self.template_dir, _MARKER))
+
+    def ensure(self):
+        """
+        模板不存在时初始化：让office创建用户配置后立即退出，再写入调优设置
+
+        Returns:
+            str: 模板目录
+        """
+        if self.is_initialized:
+            return self.template_dir
+        if not self.soffice_path or not os.path.exists(self.soffice_path):
+            raise RuntimeError("未找到LibreOffice安装路径，请手动指定")
+
+        # 先在临时目录中初始化，完成后再移动，避免并发进程看到半成品
+        parent_dir = os.path.dirname(os.path.abspath(self.template_dir))
+        os.makedirs(parent_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="odg-profile-init-", dir=parent_dir)
+        profile_url = uno.systemPathToFileUrl(os.path.abspath(work_dir))
+        start = time.monotonic()
+        try:
+            subprocess.run(
+                [self.soffice_path, "--headless", "--invisible", "--nologo", "--norestore",
+                 "--terminate_after_init", f"-env:UserInstallation={profile_url}"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=self.init_timeout, check=True
+            )
+            apply_settings(work_dir, self.settings)
+            with open(os.path.join(work_dir, _MARKER), "w") as f:
+                f.write(str(time.time()))
+        except BaseException:
+            # 初始化失败或超时，不能留下半成品
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(work_dir, self.template_dir)
+        except OSError:
+            # 其他进程已经完成了初始化
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"用户配置模板已初始化: {self.template_dir} (耗时 {time.monotonic() - start:.2f}秒)")
+        return self.template_dir
+
+    def clone_to(self, dest_dir, hardlink=True):
+        """
+        将模板克隆到工作进程的配置目录
+
+        office运行时会改写的配置文件总是复制，其余文件尽量硬链接（跨文件系统时退回复制）
+
+        Args:
+            dest_dir: 目标配置目录（可以已存在但应为空）
+            hardlink: 是否对只读文件使用硬链接
+        """
+        self.ensure()
+
+        def copy(src, dst):
+            if hardlink and not src.endswith(_MUTABLE_SUFFIXES):
+                try:
+                    os.link(src, dst)
+                    return dst
+                except OSError:
+                    pass
+            return shutil.copy2(src, dst)
+
+        shutil.copytree(self.template_dir, dest_dir, copy_function=copy, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns(_MARKER, ".lock"))
+        return dest_dir
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG保存配置
+office默认的保存选项每次保存都重新渲染缩略图（Thumbnails/thumbnail.png，图片多的模板尤其慢），
+以默认级别压缩所有XML，并写出视图和打印机设置（settings.xml）。
+保存配置可以跳过缩略图、选择压缩级别并省略设置；非默认配置由office写入内存后在Python中重新打包。
+"""
+
+import io
+import os
+import threading
+import zipfile
+
+from odg_images import manifest_without
+
+# 配置名称 -> 保存选项
+#   thumbnail: 是否生成缩略图
+#   compress_level: 重新压缩XML等条目的级别（0不压缩），None表示使用office写出的包
+#   settings: 是否保留settings.xml
+SAVE_PROFILES = {
+    # office默认选项（与以前相同）
+    "default": {"thumbnail": True, "compress_level": None, "settings": True},
+    # 保存最快：不生成缩略图，最低级别压缩，不写设置
+    "fast": {"thumbnail": False, "compress_level": 1, "settings": False},
+    # 文件最小：不生成缩略图，最高级别压缩，不写设置
+    "small": {"thumbnail": False, "compress_level": 9, "settings": False},
+    # 不压缩：写出最快、文件最大，适合随后还要再处理的中间文件
+    "stored": {"thumbnail": False, "compress_level": 0, "settings": False},
+}
+
+_THUMBNAIL_DIR = "Thumbnails/"
+
+def default_save_profile():
+    """未指定时使用的配置，可用 ODG_SAVE_PROFILE 修改"""
+    return (os.environ.get("ODG_SAVE_PROFILE") or "default").lower()
+
+def resolve_save_profile(name=None):
+    """
+    Args:
+        name: 配置名称，None或空表示默认配置
+
+    Returns:
+        str: 配置名称
+    """
+    name = str(name).strip().lower() if name else default_save_profile()
+    if name not in SAVE_PROFILES:
+        raise ValueError(f"未知的保存配置: {name}（可用: {', '.join(sorted(SAVE_PROFILES))}）")
+    return name
+
+def needs_repack(name):
+    """保存后是否需要重新打包"""
+    profile = SAVE_PROFILES[name]
+    return profile["compress_level"] is not None or not profile["settings"] or not profile["thumbnail"]
+
+def store_properties(name):
+    """
+    Returns:
+        tuple: 保存时传给office的MediaDescriptor属性
+    """
+    from com.sun.star.beans import PropertyValue
+
+    if SAVE_PROFILES[name]["thumbnail"]:
+        return ()
+    return (PropertyValue("NoThumbnail", 0, True, 0),)
+
+def repack(data, name):
+    """
+    按配置重新打包office写出的ODG：删除缩略图和（按配置）settings.xml及其清单项，按指定级别重新压缩
+
+    mimetype保持为第一个不压缩的条目；office不压缩的条目（图片等）原样存储
+
+    Args:
+        data: office写出的ODG文件内容
+        name: 配置名称
+
+    Returns:
+        bytes: 重新打包后的文件内容
+    """
+    profile = SAVE_PROFILES[name]
+    level = profile["compress_level"]
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, zipfile.ZipFile(output, "w") as target:
+        entries = source.infolist()
+        removed = [info.filename for info in entries
+                   if (not profile["thumbnail"] and info.filename.startswith(_THUMBNAIL_DIR))
+                   or (not profile["settings"] and info.filename == "settings.xml")]
+        for info in entries:
+            if info.filename in removed:
+                continue
+            content = source.read(info)
+            if info.filename == "META-INF/manifest.xml" and removed:
+                manifest = content.decode("utf-8")
+                for path in removed + [_THUMBNAIL_DIR]:
+                    manifest = manifest_without(manifest, path)
+                content = manifest.encode("utf-8")
+            if info.compress_type == zipfile.ZIP_STORED or level == 0:
+                target.writestr(info, content, zipfile.ZIP_STORED)
+            else:
+                target.writestr(info, content, zipfile.ZIP_DEFLATED, level)
+    return output.getvalue()
+
+def write_package(path, data):
+    """先写临时文件再改名，读取方不会看到写了一半的文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
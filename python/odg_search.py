@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG模板全文索引
+直接解析ODG文件（zip）中的content.xml，不需要office进程。扫描目录时在多个进程中并行解析，
+把形状名称和文本分词后写入sqlite中的倒排索引（词 -> 文件、页面、形状），
+之后按修改时间和大小增量更新，查询只访问索引。
+
+分词：拉丁字母和数字按单词切分（查询词按前缀匹配，查询开头的词可以从单词中间开始），
+中日韩文字按单字和相邻二字切分；查询时先用倒排索引取得候选形状，再按子串确认。
+
+用法:
+    python3 python/odg_search.py index templates/ --db templates.sqlite
+    python3 python/odg_search.py search "合同编号" --db templates.sqlite
+    python3 python/odg_search.py search invoice_no --field name --db templates.sqlite
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+# 索引结构版本，结构变化时递增，旧索引自动重建
+SCHEMA_VERSION = 2
+
+_NS = {
+    "office": "urn:oasis:names:tc:opendocument:xmlns:office:1.0",
+    "draw": "urn:oasis:names:tc:opendocument:xmlns:drawing:1.0",
+    "text": "urn:oasis:names:tc:opendocument:xmlns:text:1.0",
+}
+_DRAW = "{%s}" % _NS["draw"]
+_TEXT = "{%s}" % _NS["text"]
+
+# 中日韩文字（按单字和二字切分），其余的单词字符按单词切分
+_CJK = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+def tokenize(text):
+    """
+    Returns:
+        set: 文本中的词（小写）
+    """
+    tokens = set()
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+    return tokens
+
+def _query_terms(text):
+    """
+    查询文本的检索词：[(词, 匹配方式)]，匹配方式为 exact（完全匹配）、prefix（前缀）或 infix（包含）
+
+    查询文本是子串，开头的词前面可能还有同一个词的其他字符（"voice" 在 "invoice" 中、
+    "no" 在 "invoice_no" 中），只能按包含匹配；其后的词都从词的开头开始，按前缀匹配
+    """
+    text = text.lower()
+    terms = []
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                terms.append((run, "exact"))
+            terms.extend((run[i:i + 2], "exact") for i in range(len(run) - 1))
+        elif not terms and text.startswith(run):
+            terms.append((run, "infix"))
+        else:
+            terms.append((run, "prefix"))
+    return terms
+
+def _element_text(element):
+    """段落文本，text:s、text:tab、text:line-break 按对应的空白字符输出"""
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag == _TEXT + "s":
+            parts.append(" " * int(child.get(_TEXT + "c", "1")))
+        elif child.tag == _TEXT + "tab":
+            parts.append("\t")
+        elif child.tag == _TEXT + "line-break":
+            parts.append("\n")
+        else:
+            parts.append(_element_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+def _shape_text(shape):
+    paragraphs = []
+    for element in shape.iter():
+        if element.tag in (_TEXT + "p", _TEXT + "h"):
+            paragraphs.append(_element_text(element))
+    return "\n".join(paragraphs)
+
+def _walk_shapes(container, page_number, path, shapes):
+    index = 0
+    for child in container:
+        if not child.tag.startswith(_DRAW):
+            continue
+        child_path = path + [index]
+        index += 1
+        is_group = child.tag == _DRAW + "g"
+        shapes.append({
+            "page_number": page_number,
+            "path": child_path,
+            "shape_name": child.get(_DRAW + "name", ""),
+            # 组合形状的文本属于其成员
+            "text": "" if is_group else _shape_text(child)
+        })
+        if is_group:
+            _walk_shapes(child, page_number, child_path, shapes)
+
+def parse_odg(file_path):
+    """
+    从content.xml中读取所有形状的名称和文本（包括组合形状的成员），不需要office
+
+    Returns:
+        list: [{page_number, path, shape_name, text}]，path为从页面开始的序号路径
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        root = ET.fromstring(archive.read("content.xml"))
+    shapes = []
+    pages = root.iterfind("office:body/office:drawing/draw:page", _NS)
+    for page_number, page in enumerate(pages, 1):
+        _walk_shapes(page, page_number, [], shapes)
+    return shapes
+
+def _parse_job(file_path):
+    """在工作进程中解析一个文件并分词，返回 (路径, 形状, 错误)"""
+    try:
+        shapes = parse_odg(file_path)
+    except Exception as e:
+        return file_path, None, str(e)
+    for shape in shapes:
+        shape["tokens"] = tokenize(shape["shape_name"]) | tokenize(shape["text"])
+    return file_path, shapes, None
+
+class TemplateIndex:
+    """保存在sqlite中的ODG模板倒排索引"""
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: 索引数据库路径，不存在时创建
+        """
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.db.executescript("""
+                DROP TABLE IF EXISTS postings;
+                DROP TABLE IF EXISTS shapes;
+                DROP TABLE IF EXISTS files;
+            """)
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS shapes (
+                id INTEGER PRIMARY KEY,
+                file_id INTEGER NOT NULL,
+                page_number INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                shape_name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                text TEXT NOT NULL,
+                text_key TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS shapes_file ON shapes (file_id);
+            CREATE INDEX IF NOT EXISTS shapes_name ON shapes (name_key);
+            CREATE TABLE IF NOT EXISTS postings (
+                token TEXT NOT NULL,
+                shape_id INTEGER NOT NULL,
+                PRIMARY KEY (token, shape_id)
+            ) WITHOUT ROWID;
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def _remove_file(self, file_id):
+        # 按保存的名称和文本重新分词得到形状的词，按主键删除，倒排表不需要按形状的二级索引
+        rows = self.db.execute("SELECT id, shape_name, text FROM shapes WHERE file_id = ?", (file_id,)).fetchall()
+        self.db.executemany(
+            "DELETE FROM postings WHERE token = ? AND shape_id = ?",
+            [(token, shape_id) for shape_id, name, text in rows for token in tokenize(name) | tokenize(text)])
+        self.db.execute("DELETE FROM shapes WHERE file_id = ?", (file_id,))
+        self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _store_file(self, file_path, stat, shapes, error, postings):
+        row = self.db.execute("SELECT id FROM files WHERE path = ?", (file_path,)).fetchone()
+        if row is not None:
+            self._remove_file(row[0])
+        file_id = self.db.execute(
+            "INSERT INTO files (path, size, mtime_ns, error) VALUES (?, ?, ?, ?)",
+            (file_path, stat.st_size, stat.st_mtime_ns, error)).lastrowid
+        for shape in shapes or ():
+            shape_id = self.db.execute(
+                "INSERT INTO shapes (file_id, page_number, path, shape_name, name_key, text, text_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_id, shape["page_number"], json.dumps(shape["path"]), shape["shape_name"],
+                 shape["shape_name"].lower(), shape["text"], shape["text"].lower())).lastrowid
+            postings.extend((token, shape_id) for token in shape["tokens"])
+
+    def update(self, directory, workers=None, extensions=(".odg",)):
+        """
+        扫描目录（包括子目录），解析新增和修改过的文件，删除已不存在的文件
+
+        大小和修改时间都未变化的文件不重新解析；解析失败的文件记录错误，修改后重试。
+
+        Args:
+            directory: 模板目录
+            workers: 并行解析的进程数，默认CPU核数；1表示在当前进程中解析
+            extensions: 索引的文件扩展名
+
+        Returns:
+            dict: {scanned, added, updated, removed, unchanged, errors, elapsed}
+        """
+        started = time.monotonic()
+        known = {path: (file_id, size, mtime_ns)
+                 for file_id, path, size, mtime_ns in self.db.execute("SELECT id, path, size, mtime_ns FROM files")}
+        root = os.path.abspath(directory)
+        stats = {"scanned": 0, "added": 0, "updated": 0, "removed": 0, "unchanged": 0, "errors": []}
+        changed = {}
+        seen = set()
+        for dir_path, _, file_names in os.walk(root):
+            for file_name in file_names:
+                if not file_name.lower().endswith(extensions):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                stats["scanned"] += 1
+                seen.add(file_path)
+                previous = known.get(file_path)
+                if previous is not None and previous[1:] == (stat.st_size, stat.st_mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                changed[file_path] = stat
+                stats["updated" if previous is not None else "added"] += 1
+
+        prefix = root + os.sep
+        for file_path, (file_id, _, _) in known.items():
+            if file_path.startswith(prefix) and file_path not in seen:
+                self._remove_file(file_id)
+                stats["removed"] += 1
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        paths = sorted(changed)
+        if workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+                results = executor.map(_parse_job, paths, chunksize=max(1, len(paths) // (workers * 8)))
+                self._store_results(results, changed, stats)
+        else:
+            self._store_results(map(_parse_job, paths), changed, stats)
+        self.db.commit()
+        stats["elapsed"] = round(time.monotonic() - started, 3)
+        return stats
+
+    def _store_results(self, results, changed, stats):
+        postings = []
+        for file_path, shapes, error in results:
+            if error is not None:
+                stats["errors"].append({"file_path": file_path, "error": error})
+            self._store_file(file_path, changed[file_path], shapes, error, postings)
+        # 按词排序后一次写入，B树按顺序追加，比逐个文件随机插入快得多
+        postings.sort()
+        self.db.executemany("INSERT INTO postings (token, shape_id) VALUES (?, ?)", postings)
+
+    def _rows(self, where, params, limit):
+        rows = self.db.execute(
+            "SELECT files.path, shapes.page_number, shapes.path, shapes.shape_name, shapes.text "
+            f"FROM shapes JOIN files ON files.id = shapes.file_id WHERE {where} "
+            "ORDER BY files.path, shapes.page_number, shapes.id LIMIT ?",
+            (*params, limit))
+        return [
+            {"file_path": file_path, "page_number": page_number, "shape_index": json.loads(path)[0],
+             "path": json.loads(path), "shape_name": shape_name, "text": text}
+            for file_path, page_number, path, shape_name, text in rows
+        ]
+
+    def _candidates(self, term, match):
+        if match == "infix":
+            # 不能使用索引的范围查找，扫描倒排表中的词（比扫描所有形状的文本小）
+            rows = self.db.execute("SELECT shape_id FROM postings WHERE instr(token, ?) > 0", (term,))
+        elif match == "prefix":
+            rows = self.db.execute(
+                "SELECT shape_id FROM postings WHERE token >= ? AND token < ?", (term, term + "\uffff"))
+        else:
+            rows = self.db.execute("SELECT shape_id FROM postings WHERE token = ?", (term,))
+        return {row[0] for row in rows}
+
+    def search(self, query, field="text", limit=100):
+        """
+        查询索引
+
+        Args:
+            query: 形状名称或文本片段
+            field: name（形状名称，不区分大小写的完全匹配）、text（文本包含该片段）、
+                   any（名称或文本包含该片段）
+            limit: 最多返回的形状数
+
+        Returns:
+            list: [{file_path, page_number, shape_index, path, shape_name, text}]，按文件和页面排列
+        """
+        if field == "name":
+            return self._rows("shapes.name_key = ?", (query.lower(),), limit)
+        if field not in ("text", "any"):
+            raise ValueError(f"未知的查询字段: {field}")
+
+        # sqlite的lower()只转换ASCII字母，比较索引时用Python转换的小写列
+        needle = query.lower()
+        columns = "shapes.text_key" if field == "text" else "shapes.name_key || char(10) || shapes.text_key"
+        terms = _query_terms(query)
+        if not terms:
+            # 没有可检索的词（如只有标点），只能逐个比较
+            return self._rows(f"instr({columns}, ?) > 0", (needle,), limit)
+
+        if len(terms) > 1:
+            # 开头的词需要扫描，其余的词已经足以缩小候选范围，开头的词由最后的子串比较确认
+            terms = [term for term in terms if term[1] != "infix"]
+        candidates = None
+        for term, match in sorted(set(terms), key=lambda item: -len(item[0])):
+            ids = self._candidates(term, match)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        # 候选形状可能很多，放在临时表中而不是展开为SQL参数
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY)")
+        self.db.execute("DELETE FROM candidates")
+        self.db.executemany("INSERT INTO candidates (id) VALUES (?)", ((shape_id,) for shape_id in candidates))
+        return self._rows(f"shapes.id IN (SELECT id FROM candidates) AND instr({columns}, ?) > 0",
+                          (needle,), limit)
+
+    def stats(self):
+        """索引中的文件数、形状数、词数和解析失败的文件数"""
+        count = lambda sql: self.db.execute(sql).fetchone()[0]
+        return {
+            "files": count("SELECT COUNT(*) FROM files"),
+            "shapes": count("SELECT COUNT(*) FROM shapes"),
+            "tokens": count("SELECT COUNT(DISTINCT token) FROM postings"),
+            "errors": count("SELECT COUNT(*) FROM files WHERE error IS NOT NULL")
+        }
+
+def index_templates(directory, db_path, workers=None):
+    """增量更新目录的索引，返回更新统计和索引统计"""
+    index = TemplateIndex(db_path)
+    try:
+        return {**index.update(directory, workers=workers), "index": index.stats()}
+    finally:
+        index.close()
+
+def search_templates(db_path, query, field="text", limit=100):
+    """查询索引，返回命中的形状"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"索引不存在: {db_path}")
+    index = TemplateIndex(db_path)
+    try:
+        started = time.monotonic()
+        matches = index.search(query, field=field, limit=limit)
+        return {"matches": matches, "count": len(matches), "elapsed": round(time.monotonic() - started, 4)}
+    finally:
+        index.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="ODG模板全文索引")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="增量更新目录的索引")
+    index_parser.add_argument("directory", help="模板目录")
+    index_parser.add_argument("--db", required=True, help="索引数据库路径")
+    index_parser.add_argument("--workers", type=int, default=None, help="并行解析的进程数，默认CPU核数")
+    search_parser = subparsers.add_parser("search", help="查询索引")
+    search_parser.add_argument("query", help="形状名称或文本片段")
+    search_parser.add_argument("--db", required=True, help="索引数据库路径")
+    search_parser.add_argument("--field", default="text", choices=("text", "name", "any"), help="查询字段")
+    search_parser.add_argument("--limit", type=int, default=100, help="最多返回的形状数")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        result = index_templates(args.directory, args.db, workers=args.workers)
+    else:
+        result = search_templates(args.db, args.query, field=args.field, limit=args.limit)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ODG渲染服务
+独立运行的HTTP/JSON服务，封装ODGProcessor和office工作进程池，多台应用服务器可以共享多个渲染节点。
+
+接口:
+    GET  /healthz                 存活检查
+    GET  /readyz                  就绪检查（工作进程池已启动且未过载时返回200）
+    GET  /stats                   进程池和服务状态
+    PUT  /templates               上传模板（请求体为ODG文件，支持分块传输），返回内容哈希
+    HEAD /templates/<hash>        模板是否已上传
+    POST /info                    {"template": 哈希, "fields": [...], "pages": "1-3", "format": "columnar"}
+                                  -> 文件信息（按页面和字段投影，可选列式编码）
+    POST /query                   {"template", "queries": [{"op": "at" | "in" | "nearest", "page", ...}]}
+                                  -> 按坐标查询形状（见odg_spatial）
+    POST /modify                  {"template", "texts", "format": "json" | "odg" | "pdf", "export_pdf"}
+                                  export_pdf为布尔值或PDF导出配置名称（见odg_pdf）
+    POST /export                  {"template", "profile"} -> PDF文件
+    POST /batch?template=<哈希>   请求体为JSONL/CSV记录流，响应为NDJSON事件流（export_pdf参数同/modify）
+    GET  /outputs/<id>/<name>     下载输出文件（下载后删除）
+
+用法（使用LibreOffice自带的Python）:
+    python3 python/odg_server.py --port 8080 --workers 4
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit, unquote
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from odg_affinity import TemplateHasher
+from odg_batch import map_record, output_path_for, read_records, record_id_of
+from odg_bridge import POOL_COMMANDS, _get_geometry_cache, _get_info_cache, _job_succeeded, cached_info, cached_query
+from odg_pdf import resolve_profile
+from odg_pool import RecyclePolicy, WorkerPool
+from odg_save import SAVE_PROFILES
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class HTTPError(Exception):
+    """以指定状态码返回给客户端的错误"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+def _pdf_profile(value):
+    """请求中的export_pdf参数 -> PDF导出配置名称（不导出时为None）"""
+    try:
+        return resolve_profile(value)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+class _RequestBody(io.RawIOBase):
+    """请求体的流式读取，支持Content-Length和分块传输编码"""
+
+    def __init__(self, rfile, length=None, chunked=False):
+        self._rfile = rfile
+        self._remaining = length or 0
+        self._chunked = chunked
+        self._eof = not chunked and not length
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        size_line = self._rfile.readline(1024)
+        if not size_line:
+            raise HTTPError(400, "分块传输的请求体不完整")
+        size = int(size_line.split(b";")[0].strip(), 16)
+        if size == 0:
+            # 读取可选的trailer直到空行
+            while self._rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                pass
+            self._eof = True
+        self._remaining = size
+
+    def readinto(self, buffer):
+        if self._eof:
+            return 0
+        if self._remaining == 0:
+            if not self._chunked:
+                self._eof = True
+                return 0
+            self._next_chunk()
+            if self._eof:
+                return 0
+        data = self._rfile.read(min(len(buffer), self._remaining))
+        if not data:
+            raise HTTPError(400, "请求体不完整")
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        if self._chunked and self._remaining == 0:
+            self._rfile.readline(16)  # 每个分块后的CRLF
+        return len(data)
+
+class RenderService:
+    """渲染服务的状态：工作进程池、模板存储、输出文件和负载控制"""
+
+    def __init__(self, pool, storage_dir, scheduler=None, max_inflight=None, max_queue=None,
+                 max_upload_mb=200, output_ttl=600, request_timeout=600, allow_local_paths=False):
+        """
+        Args:
+            pool: WorkerPool工作进程池
+            storage_dir: 模板和输出文件的存储目录
+            scheduler: PipelineScheduler流水线（可选），设置后 /modify 经过流水线执行
+            max_inflight: 同时处理的请求上限，超出时返回503（默认工作进程数的4倍）
+            max_queue: 进程池排队任务上限，超出时返回503（默认工作进程数的8倍）
+            max_upload_mb: 单个模板的大小上限（MB）
+            output_ttl: 未下载的输出文件保留时间（秒）
+            request_timeout: 等待单个任务完成的最长时间（秒）
+            allow_local_paths: 是否允许请求直接使用服务器本地路径（{"path": ...}）
+        """
+        self.pool = pool
+        self.scheduler = scheduler
+        self.storage_dir = storage_dir
+        self.templates_dir = os.path.join(storage_dir, "templates")
+        self.outputs_dir = os.path.join(storage_dir, "outputs")
+        os.makedirs(self.templates_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        self.max_inflight = max_inflight or pool.size * 4
+        self.max_queue = max_queue or pool.size * 8
+        self.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+        self.output_ttl = output_ttl
+        self.request_timeout = request_timeout
+        self.allow_local_paths = allow_local_paths
+        self.hasher = TemplateHasher()
+
+        self.state = "starting"
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self.metrics = {"requests": 0, "shed": 0, "errors": 0, "uploads": 0, "downloads": 0}
+
+    def start(self):
+        """启动工作进程池并开始清理过期的输出文件"""
+        try:
+            self.pool.start()
+        except Exception as e:
+            self.state = "failed"
+            print(f"工作进程池启动失败: {e}")
+            raise
+        self.state = "ready"
+        threading.Thread(target=self._cleanup_outputs, name="odg-server-cleanup", daemon=True).start()
+
+    def shutdown(self):
+        self.state = "draining"
+        self.pool.shutdown()
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+
+    def is_ready(self):
+        """就绪：进程池已启动、至少一个工作进程可用且未过载"""
+        if self.state != "ready":
+            return False, self.state
+        if not any(w.state in ("ready", "recycling") for w in list(self.pool.workers)):
+            return False, "no_workers"
+        if self.overloaded():
+            return False, "overloaded"
+        return True, "ready"
+
+    def overloaded(self):
+        return self.inflight >= self.max_inflight or self.pool.queued() >= self.max_queue
+
+    def admit(self):
+        """负载控制：过载时拒绝新请求，由客户端转发到其他节点"""
+        with self._lock:
+            self.metrics["requests"] += 1
+            if self.state != "ready":
+                raise HTTPError(503, f"服务未就绪: {self.state}", {"Retry-After": "5"})
+            if self.overloaded():
+                self.metrics["shed"] += 1
+                raise HTTPError(503, "服务过载", {"Retry-After": "1"})
+            self.inflight += 1
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def stats(self):
+        stats = {
+            "state": self.state,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "metrics": dict(self.metrics),
+            "pool": self.pool.stats()
+        }
+        if self.scheduler is not None:
+            stats["pipeline"] = self.scheduler.stats()
+        if _get_info_cache() is not None:
+            stats["info_cache"] = _get_info_cache().stats()
+            stats["geometry_cache"] = _get_geometry_cache().stats()
+        return stats
+
+    # 模板
+
+    def template_path(self, template_hash):
+        if not _HASH_PATTERN.match(template_hash or ""):
+            raise HTTPError(400, "无效的模板哈希")
+        return os.path.join(self.templates_dir, f"{template_hash}.odg")
+
+    def store_template(self, body):
+        """
+        流式保存上传的模板，同时计算内容哈希
+
+        Returns:
+            str: 内容哈希
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.templates_dir, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: body.read(1024 * 1024), b""):
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise HTTPError(413, "模板文件过大")
+                    digest.update(chunk)
+                    f.write(chunk)
+            template_hash = digest.hexdigest()
+            os.replace(temp_path, self.template_path(template_hash))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.metrics["uploads"] += 1
+        return template_hash
+
+    def resolve_source(self, request):
+        """
+        根据请求确定输入文件
+
+        Returns:
+            tuple: (文件路径, 亲和路由键)
+        """
+        if request.get("template"):
+            path = self.template_path(request["template"])
+            if not os.path.exists(path):
+                raise HTTPError(404, "模板不存在，请先上传")
+            return path, request["template"]
+        if request.get("path"):
+            if not self.allow_local_paths:
+                raise HTTPError(403, "服务未允许使用本地路径")
+            path = os.path.abspath(request["path"])
+            if not os.path.exists(path):
+                raise HTTPError(404, f"文件不存在: {path}")
+            return path, self.hasher.hash_file(path)
+        raise HTTPError(400, "缺少template或path参数")
+
+    # 输出文件
+
+    def new_output_dir(self):
+        output_id = uuid.uuid4().hex
+        path = os.path.join(self.outputs_dir, output_id)
+        os.makedirs(path)
+        return output_id, path
+
+    def output_url(self, output_id, output_dir, path):
+        relative = os.path.relpath(path, output_dir).replace(os.sep, "/")
+        return f"/outputs/{output_id}/{relative}"
+
+    def output_file(self, url_path):
+        """把 /outputs/<id>/<name> 解析为输出目录中的文件，防止越出目录"""
+        parts = url_path.split("/", 3)
+        if len(parts) < 4 or not re.match(r"^[0-9a-f]{32}$", parts[2]):
+            raise HTTPError(404, "输出文件不存在")
+        output_dir = os.path.realpath(os.path.join(self.outputs_dir, parts[2]))
+        path = os.path.realpath(os.path.join(output_dir, unquote(parts[3])))
+        if not path.startswith(output_dir + os.sep) or not os.path.isfile(path):
+            raise HTTPError(404, "输出文件不存在")
+        return output_dir, path
+
+    def remove_output(self, output_dir, path):
+        """删除已下载的输出文件，目录为空时一并删除"""
+        try:
+            os.remove(path)
+            parent = os.path.dirname(path)
+            while parent.startswith(output_dir) and not os.listdir(parent):
+                os.rmdir(parent)
+                if parent == output_dir:
+                    break
+                parent = os.path.dirname(parent)
+        except OSError:
+            pass
+
+    def _cleanup_outputs(self):
+        """删除超过保留时间仍未下载的输出"""
+        while self.state in ("starting", "ready"):
+            time.sleep(min(60, self.output_ttl))
+            deadline = time.time() - self.output_ttl
+            for name in os.listdir(self.outputs_dir):
+                path = os.path.join(self.outputs_dir, name)
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    continue
+
+    # 任务
+
+    def run(self, command, *args, affinity_key=None):
+        """在工作进程池中执行命令并等待结果"""
+        future = self.pool.submit(POOL_COMMANDS[command], *args, succeeded=_job_succeeded,
+                                  affinity_key=affinity_key)
+        return self._wait(future)
+
+    def render(self, source, texts, output_path, export_pdf, affinity_key=None):
+        """修改文本并保存，有流水线时经过流水线"""
+        if self.scheduler is not None:
+            return self._wait(self.scheduler.submit(source, texts, output_path, export_pdf))
+        return self.run("modify_texts", source, texts, output_path, export_pdf, affinity_key=affinity_key)
+
+    def submit_render(self, source, texts, output_path, export_pdf, affinity_key=None):
+        if self.scheduler is not None:
+            return self.scheduler.submit(source, texts, output_path, export_pdf)
+        return self.pool.submit(POOL_COMMANDS["modify_texts"], source, texts, output_path, export_pdf,
+                                succeeded=_job_succeeded, affinity_key=affinity_key)
+
+    def _wait(self, future):
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HTTPError(504, "任务超时")
+
+def _admitted(fn):
+    """需要经过负载控制的接口"""
+    def wrapper(self, path):
+        self.service.admit()
+        try:
+            return fn(self, path)
+        finally:
+            self.service.release()
+    return wrapper
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ODGRenderServer/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+    # 请求和响应
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            return io.BufferedReader(_RequestBody(self.rfile, chunked=True))
+        length = int(self.headers.get("Content-Length") or 0)
+        return io.BufferedReader(_RequestBody(self.rfile, length=length))
+
+    def _json_body(self):
+        data = self._body().read()
+        try:
+            return json.loads(data or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"无效的JSON: {e}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_file(self, path, content_type):
+        """流式发送文件，不整体读入内存"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+        self.service.metrics["downloads"] += 1
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _dispatch(self, routes):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        handler = None
+        for pattern, fn in routes:
+            if re.match(pattern, url.path):
+                handler = fn
+                break
+        try:
+            if handler is None:
+                raise HTTPError(404, "接口不存在")
+            handler(url.path)
+        except HTTPError as e:
+            self.close_connection = True
+            self._send_json(e.status, {"success": False, "error": str(e)}, e.headers)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            self.service.metrics["errors"] += 1
+            self.close_connection = True
+            self._send_json(500, {"success": False, "error": str(e), "traceback": traceback.format_exc()})
+
+    def do_GET(self):
+        self._dispatch([
+            (r"^/healthz$", self.handle_health),
+            (r"^/readyz$", self.handle_ready),
+            (r"^/stats$", self.handle_stats),
+            (r"^/outputs/", self.handle_download),
+        ])
+
+    def do_HEAD(self):
+        self._dispatch([(r"^/templates/[0-9a-f]{64}$", self.handle_template_exists)])
+
+    def do_PUT(self):
+        self._dispatch([(r"^/templates$", self.handle_upload)])
+
+    def do_POST(self):
+        self._dispatch([
+            (r"^/templates$", self.handle_upload),
+            (r"^/info$", self.handle_info),
+            (r"^/query$", self.handle_query),
+            (r"^/modify$", self.handle_modify),
+            (r"^/export$", self.handle_export),
+            (r"^/batch$", self.handle_batch),
+        ])
+
+    # 接口
+
+    def handle_health(self, path):
+        self._send_json(200, {"status": "ok", "state": self.service.state})
+
+    def handle_ready(self, path):
+        ready, reason = self.service.is_ready()
+        self._send_json(200 if ready else 503, {"ready": ready, "reason": reason})
+
+    def handle_stats(self, path):
+        self._send_json(200, {"success": True, "data": self.service.stats()})
+
+    def handle_template_exists(self, path):
+        template_hash = path.rsplit("/", 1)[1]
+        exists = os.path.exists(self.service.template_path(template_hash))
+        self._send_json(200 if exists else 404, {"exists": exists})
+
+    def handle_upload(self, path):
+        template_hash = self.service.store_template(self._body())
+        self._send_json(201, {"success": True, "template": template_hash})
+
+    def handle_download(self, path):
+        output_dir, file_path = self.service.output_file(path)
+        content_type = "application/pdf" if file_path.endswith(".pdf") else "application/vnd.oasis.opendocument.graphics"
+        self._send_file(file_path, content_type)
+        self.service.remove_output(output_dir, file_path)
+
+    @_admitted
+    def handle_info(self, path):
+        request = self._json_body()
+        source, affinity_key = self.service.resolve_source(request)
+        fields = request.get("fields")
+        pages = request.get("pages")
+        fmt = request.get("format")
+        result = cached_info(source, fields, pages, fmt)
+        if result is None:
+            result = self.service.run("get_info", source, fields, pages, fmt, affinity_key=affinity_key)
+        self._send_json(200, result)
+
+    @_admitted
+    def handle_query(self, path):
+        request = self._json_body()
+        source, affinity_key = self.service.resolve_source(request)
+        queries = request.get("queries")
+        if not queries:
+            raise HTTPError(400, "缺少queries")
+        result = cached_query(source, queries)
+        if result is None:
+            result = self.service.run("query_shapes", source, queries, affinity_key=affinity_key)
+        self._send_json(200, result)
+
+    @_admitted
+    def handle_modify(self, path):
+        request = self._json_body()
+        source, affinity_key = self.service.resolve_source(request)
+        output_format = request.get("format", "json")
+        export_pdf = request.get("export_pdf", True)
+        if output_format == "pdf":
+            export_pdf = export_pdf if isinstance(export_pdf, str) else True
+        elif output_format != "json":
+            export_pdf = False
+        export_pdf = _pdf_profile(export_pdf)
+
+        output_id, output_dir = self.service.new_output_dir()
+        output_path = os.path.join(output_dir, "output.odg")
+        result = self.service.render(source, request.get("texts") or {}, output_path, export_pdf, affinity_key)
+        data = result.get("data") or {}
+
+        if output_format in ("odg", "pdf"):
+            file_path = output_path if output_format == "odg" else data.get("pdf_path")
+            if not _job_succeeded(result) or not file_path or not os.path.exists(file_path):
+                shutil.rmtree(output_dir, ignore_errors=True)
+                self._send_json(422, result)
+                return
+            self._send_file(file_path, "application/pdf" if output_format == "pdf"
+                            else "application/vnd.oasis.opendocument.graphics")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            return
+
+        # json格式返回结果和输出文件的下载地址
+        files = {}
+        for name, file_path in (("odg", output_path), ("pdf", data.get("pdf_path"))):
+            if file_path and os.path.exists(file_path):
+                files[name] = self.service.output_url(output_id, output_dir, file_path)
+        if not files:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        result["files"] = files
+        self._send_json(200, result)
+
+    @_admitted
+    def handle_export(self, path):
+        request = self._json_body()
+        source, affinity_key = self.service.resolve_source(request)
+        profile = _pdf_profile(request.get("profile") or True)
+        output_id, output_dir = self.service.new_output_dir()
+        pdf_path = os.path.join(output_dir, "output.pdf")
+        try:
+            result = self.service.run("export_pdf", source, pdf_path, profile, affinity_key=affinity_key)
+            if not result.get("success") or not os.path.exists(pdf_path):
+                self._send_json(422, result)
+                return
+            self._send_file(pdf_path, "application/pdf")
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    @_admitted
+    def handle_batch(self, path):
+        """
+        批量渲染：逐条读取请求体中的记录，并行提交给工作进程池，
+        每条记录完成后立即以NDJSON写出 record-done 事件（包含输出文件的下载地址）
+        """
+        service = self.service
+        source, affinity_key = service.resolve_source(self.query)
+        columns = json.loads(self.query["columns"]) if self.query.get("columns") else None
+        id_column = self.query.get("id_column", "id")
+        export_pdf = _pdf_profile(self.query.get("export_pdf", "true"))
+        output_pattern = self.query.get("output_pattern", "{id}.odg")
+        content_type = self.headers.get("Content-Type", "")
+        fmt = self.query.get("format") or ("csv" if "csv" in content_type else "jsonl")
+
+        output_id, output_dir = service.new_output_dir()
+        real_output_dir = os.path.realpath(output_dir)
+        text = io.TextIOWrapper(self._body(), encoding=self.query.get("encoding", "utf-8"), newline="")
+
+        self._start_chunked("application/x-ndjson")
+        write_lock = threading.Lock()
+        done = threading.Condition()
+        state = {"pending": 0, "aborted": False}
+        summary = {"total": 0, "succeeded": 0, "failed": 0, "failures": []}
+        # 同时在进程池中的记录数上限，请求体读取随之放慢，内存占用保持平稳
+        max_pending = max(2, service.pool.size * 2)
+
+        def send(message):
+            with write_lock:
+                if state["aborted"]:
+                    return
+                try:
+                    self._write_chunk((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                except OSError:
+                    state["aborted"] = True
+
+        def finish(record_id, index, output_path, future):
+            if future.cancelled():
+                result = {"success": False, "error": "任务已取消"}
+            elif future.exception() is not None:
+                result = {"success": False, "error": str(future.exception())}
+            else:
+                result = future.result()
+            data = result.get("data") or {}
+            success = _job_succeeded(result) and not data.get("save_error")
+            event = {"type": "record-done", "record_id": record_id, "index": index, "success": success,
+                     "error": result.get("error") or data.get("error") or data.get("save_error"),
+                     "files": {}}
+            for name, file_path in (("odg", output_path), ("pdf", data.get("pdf_path"))):
+                if file_path and os.path.exists(file_path):
+                    event["files"][name] = service.output_url(output_id, output_dir, file_path)
+                    event.setdefault("relative_path", os.path.relpath(output_path, output_dir).replace(os.sep, "/"))
+            with done:
+                summary["total"] += 1
+                summary["succeeded" if success else "failed"] += 1
+                if not success:
+                    summary["failures"].append({"record_id": record_id, "index": index, "error": event["error"]})
+            send(event)
+            with done:
+                state["pending"] -= 1
+                done.notify_all()
+
+        try:
+            for index, record in enumerate(read_records(text, fmt)):
+                if state["aborted"]:
+                    break
+                record_id = record_id_of(record, index, id_column)
+                relative = output_path_for(output_pattern, record, record_id, index)
+                output_path = os.path.realpath(os.path.join(output_dir, relative))
+                if not output_path.startswith(real_output_dir + os.sep):
+                    raise HTTPError(400, f"输出路径越出输出目录: {relative}")
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+                with done:
+                    while state["pending"] >= max_pending:
+                        done.wait()
+                    state["pending"] += 1
+                future = service.submit_render(source, map_record(record, columns, id_column),
+                                               output_path, export_pdf, affinity_key)
+                future.add_done_callback(
+                    lambda f, r=record_id, i=index, o=output_path: finish(r, i, o, f))
+
+            with done:
+                while state["pending"] > 0:
+                    done.wait()
+            send({"type": "result", "result": {"success": True, "data": summary}})
+        except Exception as e:
+            send({"type": "result", "result": {"success": False, "error": str(e)}})
+        with write_lock:
+            if not state["aborted"]:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="ODG渲染服务")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    parser.add_argument("--workers", type=int, default=2, help="office工作进程数")
+    parser.add_argument("--soffice", default=None, help="soffice可执行文件路径")
+    parser.add_argument("--base-port", type=int, default=2002, help="工作进程端口的起始值")
+    parser.add_argument("--connection", default="socket", choices=("socket", "pipe"), help="UNO连接方式")
+    parser.add_argument("--storage", default=os.path.join(tempfile.gettempdir(), "odg-server"),
+                        help="模板和输出文件的存储目录")
+    parser.add_argument("--operation-timeout", type=float, default=120, help="单个UNO操作的超时（秒）")
+    parser.add_argument("--request-timeout", type=float, default=600, help="单个任务的超时（秒）")
+    parser.add_argument("--max-inflight", type=int, default=None, help="同时处理的请求上限")
+    parser.add_argument("--max-queue", type=int, default=None, help="进程池排队任务上限")
+    parser.add_argument("--max-upload-mb", type=float, default=200, help="模板大小上限（MB）")
+    parser.add_argument("--output-ttl", type=float, default=600, help="未下载的输出文件保留时间（秒）")
+    parser.add_argument("--affinity", action="store_true", help="按模板内容哈希路由到固定的工作进程")
+    parser.add_argument("--pipeline", action="store_true", help="以 预读 -> 渲染 -> 写盘 流水线执行修改任务")
+    parser.add_argument("--profile-template", default=None, help="预初始化的用户配置模板目录")
+    parser.add_argument("--info-cache-size", type=int, default=256, help="缓存的文件信息数量，0表示不缓存")
+    parser.add_argument("--info-cache-dir", default=None, help="文件信息缓存的持久化目录")
+    parser.add_argument("--warmup-manifest", default=None,
+                        help="预热清单（模板路径或已上传模板的哈希），工作进程预热后才报告就绪")
+    parser.add_argument("--warmup-poll", type=float, default=2.0, help="检查预热模板变化的间隔（秒），0表示不检查")
+    parser.add_argument("--allow-local-paths", action="store_true", help="允许请求使用服务器本地文件路径")
+    parser.add_argument("--recycle-jobs", type=int, default=None, help="工作进程处理多少个任务后回收")
+    parser.add_argument("--recycle-rss-mb", type=float, default=None, help="office内存超过多少MB后回收")
+    parser.add_argument("--recycle-age", type=float, default=None, help="工作进程运行多少秒后回收")
+    parser.add_argument("--save-profile", default=None, choices=sorted(SAVE_PROFILES),
+                        help="保存ODG时的保存配置（见odg_save）")
+    args = parser.parse_args()
+
+    # 文件信息缓存由odg_bridge按环境变量创建
+    os.environ["ODG_INFO_CACHE_SIZE"] = str(args.info_cache_size)
+    if args.info_cache_dir:
+        os.environ["ODG_INFO_CACHE_DIR"] = args.info_cache_dir
+    # 工作进程的处理器按环境变量选择保存配置
+    if args.save_profile:
+        os.environ["ODG_SAVE_PROFILE"] = args.save_profile
+
+    profile_template = None
+    if args.profile_template:
+        from odg_profile import ProfileTemplate
+        profile_template = ProfileTemplate(args.profile_template, soffice_path=args.soffice)
+
+    warmer = None
+    if args.warmup_manifest:
+        from odg_warmup import TemplateWarmer
+        templates_dir = os.path.join(args.storage, "templates")
+        warmer = TemplateWarmer.from_manifest(
+            args.warmup_manifest, poll_interval=args.warmup_poll,
+            resolve=lambda template_hash: os.path.join(templates_dir, f"{template_hash}.odg"))
+
+    pool = WorkerPool(
+        size=args.workers,
+        soffice_path=args.soffice,
+        base_port=args.base_port,
+        connection=args.connection,
+        operation_timeout=args.operation_timeout,
+        profile_template=profile_template,
+        affinity=args.affinity,
+        warmer=warmer,
+        recycle_policy=RecyclePolicy(args.recycle_jobs, args.recycle_rss_mb, args.recycle_age)
+    )
+    scheduler = None
+    if args.pipeline:
+        from odg_pipeline import PipelineScheduler
+        scheduler = PipelineScheduler(pool)
+
+    service = RenderService(
+        pool, args.storage, scheduler=scheduler,
+        max_inflight=args.max_inflight, max_queue=args.max_queue,
+        max_upload_mb=args.max_upload_mb, output_ttl=args.output_ttl,
+        request_timeout=args.request_timeout, allow_local_paths=args.allow_local_paths
+    )
+    server = ThreadingHTTPServer((args.host, args.port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+
+    def stop(signum, frame):
+        # 先报告未就绪，再停止接收请求
+        service.state = "draining"
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # 先开始监听，使 /healthz 和 /readyz 在office启动期间可用
+    threading.Thread(target=service.start, name="odg-server-start", daemon=True).start()
+    print(f"ODG渲染服务监听 {args.host}:{args.port}（{args.workers}个工作进程）")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+
+if __name__ == "__main__":
+    main()
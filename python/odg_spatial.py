@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+形状几何的空间索引
+按每页形状（包括组合形状内的成员）的外接矩形建立均匀网格索引，用于
+点击坐标命中测试（shapes_at）、区域查询（shapes_in）和最近形状查询（nearest）。
+坐标单位与UNO相同（1/100毫米）。
+"""
+
+import math
+from collections import defaultdict
+
+from odg_info_cache import InfoCache
+
+def collect_geometry(document):
+    """
+    遍历文档中所有形状的外接矩形，组合形状的成员也会列出
+
+    Returns:
+        list: 每页一个列表，元素为 {shape_name, shape_type, path, depth, x, y, w, h}，
+              path为从页面开始的序号路径（组合成员为 [组合序号, 成员序号, ...]）
+    """
+    pages = []
+    draw_pages = document.getDrawPages()
+    for i in range(draw_pages.getCount()):
+        entries = []
+        _collect_shapes(draw_pages.getByIndex(i), [], entries)
+        pages.append(entries)
+    return pages
+
+def _collect_shapes(container, path, entries):
+    for j in range(container.getCount()):
+        shape = container.getByIndex(j)
+        position = shape.getPosition()
+        size = shape.getSize()
+        try:
+            name = shape.Name
+        except Exception:
+            name = ""
+        shape_type = shape.getShapeType()
+        entries.append({
+            "shape_name": name,
+            "shape_type": shape_type,
+            "path": path + [j],
+            "depth": len(path),
+            "x": position.X,
+            "y": position.Y,
+            "w": size.Width,
+            "h": size.Height
+        })
+        if shape_type == "com.sun.star.drawing.GroupShape":
+            _collect_shapes(shape, path + [j], entries)
+
+def _contains(entry, x, y):
+    return entry["x"] <= x <= entry["x"] + entry["w"] and entry["y"] <= y <= entry["y"] + entry["h"]
+
+def _distance(entry, x, y):
+    """点到外接矩形的距离，点在矩形内时为0"""
+    dx = max(entry["x"] - x, 0, x - (entry["x"] + entry["w"]))
+    dy = max(entry["y"] - y, 0, y - (entry["y"] + entry["h"]))
+    return math.hypot(dx, dy)
+
+class SpatialIndex:
+    """一页形状外接矩形的均匀网格索引"""
+
+    def __init__(self, entries, cell_size=None):
+        """
+        Args:
+            entries: collect_geometry返回的一页形状
+            cell_size: 网格边长，默认按形状的平均尺寸选择
+        """
+        self.entries = entries
+        if cell_size is None:
+            sizes = sorted(max(e["w"], e["h"]) for e in entries) or [1000]
+            cell_size = sizes[len(sizes) // 2]
+        self.cell_size = max(int(cell_size), 100)
+        self._cells = defaultdict(list)
+        self._bounds = None
+        for i, entry in enumerate(entries):
+            for cell in self._cells_for(entry["x"], entry["y"], entry["x"] + entry["w"], entry["y"] + entry["h"]):
+                self._cells[cell].append(i)
+        if self._cells:
+            xs = [cx for cx, _ in self._cells]
+            ys = [cy for _, cy in self._cells]
+            self._bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def _cells_for(self, x0, y0, x1, y1, clamp=False):
+        """
+        矩形覆盖的网格；clamp为True时只列出索引范围内的网格（查询区域可以远大于页面）
+        """
+        size = self.cell_size
+        gx0, gy0 = math.floor(x0 / size), math.floor(y0 / size)
+        gx1, gy1 = math.floor(x1 / size), math.floor(y1 / size)
+        if clamp:
+            if self._bounds is None:
+                return
+            min_x, min_y, max_x, max_y = self._bounds
+            gx0, gy0 = max(gx0, min_x), max(gy0, min_y)
+            gx1, gy1 = min(gx1, max_x), min(gy1, max_y)
+        for cx in range(gx0, gx1 + 1):
+            for cy in range(gy0, gy1 + 1):
+                yield (cx, cy)
+
+    def _ring_cells(self, cx, cy, ring):
+        """以(cx, cy)为中心、第ring圈上且在索引范围内的网格"""
+        min_x, min_y, max_x, max_y = self._bounds
+        if ring == 0:
+            if min_x <= cx <= max_x and min_y <= cy <= max_y:
+                yield (cx, cy)
+            return
+        x0, x1 = max(cx - ring, min_x), min(cx + ring, max_x)
+        for gy in (cy - ring, cy + ring):
+            if min_y <= gy <= max_y:
+                for gx in range(x0, x1 + 1):
+                    yield (gx, gy)
+        y0, y1 = max(cy - ring + 1, min_y), min(cy + ring - 1, max_y)
+        for gx in (cx - ring, cx + ring):
+            if min_x <= gx <= max_x:
+                for gy in range(y0, y1 + 1):
+                    yield (gx, gy)
+
+    def shapes_at(self, x, y):
+        """
+        包含该点的形状，最内层（面积最小）的在前
+
+        Returns:
+            list: 形状
+        """
+        cell = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        hits = [self.entries[i] for i in self._cells.get(cell, ()) if _contains(self.entries[i], x, y)]
+        return sorted(hits, key=lambda e: (e["w"] * e["h"], -e["depth"]))
+
+    def shapes_in(self, x, y, w, h, mode="intersects"):
+        """
+        区域内的形状
+
+        Args:
+            x, y, w, h: 区域
+            mode: intersects（与区域相交）或 contains（完全在区域内）
+
+        Returns:
+            list: 按文档顺序排列的形状
+        """
+        found = set()
+        for cell in self._cells_for(x, y, x + w, y + h, clamp=True):
+            found.update(self._cells.get(cell, ()))
+        result = []
+        for i in sorted(found):
+            e = self.entries[i]
+            if mode == "contains":
+                inside = e["x"] >= x and e["y"] >= y and e["x"] + e["w"] <= x + w and e["y"] + e["h"] <= y + h
+            else:
+                inside = e["x"] <= x + w and e["x"] + e["w"] >= x and e["y"] <= y + h and e["y"] + e["h"] >= y
+            if inside:
+                result.append(e)
+        return result
+
+    def nearest(self, x, y, k=1):
+        """
+        距离该点最近的k个形状（点在形状内时距离为0）
+
+        从点所在的网格开始逐圈向外查找（点在索引范围外时从第一个与索引范围相交的圈开始），
+        每圈只查找圈上且在索引范围内的网格，已找到的第k近距离不超过未查找网格的最小距离时停止
+
+        Returns:
+            list: [{"distance": 距离, **形状}]，按距离排列
+        """
+        if self._bounds is None:
+            return []
+        size = self.cell_size
+        cx, cy = math.floor(x / size), math.floor(y / size)
+        min_x, min_y, max_x, max_y = self._bounds
+        first_ring = max(min_x - cx, cx - max_x, min_y - cy, cy - max_y, 0)
+        max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        seen = set()
+        best = []
+        for ring in range(first_ring, max_ring + 1):
+            for cell in self._ring_cells(cx, cy, ring):
+                for i in self._cells.get(cell, ()):
+                    if i not in seen:
+                        seen.add(i)
+                        best.append((_distance(self.entries[i], x, y), i))
+            best.sort()
+            del best[k:]
+            # 下一圈网格中的点与查询点的距离至少为 ring * size
+            if len(best) >= k and best[-1][0] <= ring * size:
+                break
+        return [{"distance": round(distance, 1), **self.entries[i]} for distance, i in best]
+
+class DocumentGeometry:
+    """文档所有页面的空间索引，各页的索引在第一次查询时建立"""
+
+    def __init__(self, pages):
+        """
+        Args:
+            pages: collect_geometry的结果
+        """
+        self.pages = pages
+        self._indexes = {}
+
+    def index(self, page_number):
+        """页面的空间索引（page_number从1开始）"""
+        if not 1 <= page_number <= len(self.pages):
+            raise ValueError(f"页码超出范围: {page_number}")
+        if page_number not in self._indexes:
+            self._indexes[page_number] = SpatialIndex(self.pages[page_number - 1])
+        return self._indexes[page_number]
+
+    def query(self, query):
+        """
+        执行一个查询
+
+        Args:
+            query: {"op": "at", "page", "x", "y"}
+                   {"op": "in", "page", "rect": [x, y, w, h], "mode": "intersects" | "contains"}
+                   {"op": "nearest", "page", "x", "y", "k"}
+
+        Returns:
+            list: 命中的形状
+        """
+        op = query.get("op")
+        index = self.index(int(query.get("page", 1)))
+        if op == "at":
+            return index.shapes_at(query["x"], query["y"])
+        if op == "in":
+            x, y, w, h = query["rect"]
+            return index.shapes_in(x, y, w, h, query.get("mode", "intersects"))
+        if op == "nearest":
+            return index.nearest(query["x"], query["y"], int(query.get("k", 1)))
+        raise ValueError(f"未知的查询: {op}")
+
+class GeometryCache(InfoCache):
+    """
+    文档几何的缓存：与文件信息缓存相同，按文件标识缓存在内存中、按内容哈希持久化，
+    内存中保存已建立索引的DocumentGeometry，磁盘上只保存形状几何
+    """
+
+    def _load_from_disk(self, file_path):
+        entry = super()._load_from_disk(file_path)
+        return DocumentGeometry(entry["pages"]) if entry is not None else None
+
+    def _save_to_disk(self, file_path, geometry):
+        super()._save_to_disk(file_path, {"pages": geometry.pages})
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预编译模板
+只输出ODG、数量很大时，每条记录都解析一次content.xml的代价也太高。编译时分析一次模板：
+content.xml按命名形状的文本位置切分为静态字节段和文本槽，其他ZIP条目预先压缩，
+连同本地文件头和中央目录记录一起保存。渲染一条记录只需转义文本、拼接字节段，
+压缩content.xml并拼接预先生成的ZIP结构，不需要office也不需要XML解析。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import xml.parsers.expat
+import zipfile
+import zlib
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from odg_info_cache import file_identity
+from odg_writer import paragraphs_xml
+
+# 编译产物格式版本，结构变化时递增
+ARTIFACT_VERSION = 1
+ARTIFACT_MAGIC = b"ODGT"
+
+_DRAW = "urn:oasis:names:tc:opendocument:xmlns:drawing:1.0"
+_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+
+# 可以包含文本的绘图形状
+_TEXT_SHAPES = {"rect", "ellipse", "circle", "custom-shape", "line", "polyline", "polygon", "path",
+                "connector", "caption", "measure", "frame"}
+# 形状文本的段落元素
+_PARAGRAPHS = {"p", "h", "list"}
+
+# 开始标签（属性值中可能出现 >）
+_START_TAG = re.compile(rb"""<([^\s/>]+)(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*/?>""")
+
+class TemplateSlot:
+    """content.xml中一个命名形状的文本位置"""
+
+    __slots__ = ("name", "paragraph_style", "span_style", "default", "_open", "_close")
+
+    def __init__(self, name, paragraph_style=None, span_style=None, default=b""):
+        self.name = name
+        self.paragraph_style = paragraph_style
+        self.span_style = span_style
+        # 模板中原有的文本（包括段落标签），记录中没有该形状时原样输出
+        self.default = default
+        # 单段文本直接拼接段落标签
+        self._open, self._close = paragraphs_xml("\x00", paragraph_style, span_style).split("\x00")
+
+    def fill(self, value):
+        """文本 -> 段落XML，沿用模板中第一段的段落样式和字符样式"""
+        value = "" if value is None else str(value)
+        if "\n" in value or "\t" in value or "  " in value:
+            return paragraphs_xml(value, self.paragraph_style, self.span_style).encode("utf-8")
+        return (self._open + escape(value) + self._close).encode("utf-8")
+
+    def to_json(self):
+        return {"name": self.name, "paragraph_style": self.paragraph_style, "span_style": self.span_style}
+
+def _local(name):
+    uri, _, local = name.rpartition(" ")
+    return uri, local
+
+def find_slots(content):
+    """
+    分析content.xml中命名形状的文本位置
+
+    每个名称只取文档中第一个形状（与按名称修改文本时相同）。没有文本的形状以开始标签之后为插入点，
+    空元素形状（<draw:rect .../>）改写为开始标签和结束标签
+
+    Args:
+        content: content.xml的字节内容
+
+    Returns:
+        list: 按文档顺序排列的 (开始偏移, 结束偏移, 前缀, 后缀, TemplateSlot)，
+              该范围的内容由 前缀 + 文本 + 后缀 代替
+    """
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    stack = []
+    slots = []
+    seen = set()
+    # 当前正在收集文本段落的形状
+    current = [None]
+
+    def tag_end(start):
+        match = _START_TAG.match(content, start)
+        if match is None:
+            raise ValueError(f"无法解析偏移 {start} 处的开始标签")
+        return match.end()
+
+    def start_element(name, attrs):
+        start = parser.CurrentByteIndex
+        end = tag_end(start)
+        uri, local = _local(name)
+        stack.append((uri, local, start, end))
+        depth = len(stack)
+        shape = current[0]
+
+        if shape is None:
+            shape_name = attrs.get(f"{_DRAW} name")
+            if uri == _DRAW and local in _TEXT_SHAPES and shape_name and shape_name not in seen:
+                # container为段落所在元素的深度（形状本身，或图文框中的draw:text-box）
+                current[0] = {"name": shape_name, "depth": depth, "container": depth,
+                              "frame": local == "frame", "first": None, "last": None,
+                              "paragraph_style": None, "span_style": None, "open_end": end}
+            return
+
+        if uri == _DRAW and local == "text-box" and shape["frame"] and depth == shape["depth"] + 1:
+            shape["container"] = depth
+            shape["open_end"] = end
+        elif uri == _TEXT and local in _PARAGRAPHS and depth == shape["container"] + 1:
+            if shape["first"] is None:
+                shape["first"] = start
+                shape["paragraph_style"] = attrs.get(f"{_TEXT} style-name")
+        elif uri == _TEXT and local == "span" and shape["span_style"] is None and shape["first"] is not None \
+                and shape["last"] is None and depth == shape["container"] + 2:
+            shape["span_style"] = attrs.get(f"{_TEXT} style-name")
+
+    def end_element(name):
+        uri, local, start, start_end = stack.pop()
+        if content[start_end - 2:start_end] == b"/>":
+            end = start_end
+        else:
+            end = content.index(b">", parser.CurrentByteIndex) + 1
+        depth = len(stack) + 1
+        shape = current[0]
+        if shape is None:
+            return
+        if uri == _TEXT and local in _PARAGRAPHS and depth == shape["container"] + 1:
+            shape["last"] = end
+        elif depth == shape["container"] and shape["frame"] and shape["container"] != shape["depth"]:
+            # draw:text-box结束：文本段落之后的内容不属于文本
+            _finish(shape, start, start_end, end)
+        elif depth == shape["depth"]:
+            if shape["container"] == shape["depth"] and not shape["frame"]:
+                _finish(shape, start, start_end, end)
+            # 没有draw:text-box的图文框（图片等）不能放文本
+            seen.add(shape["name"])
+            current[0] = None
+
+    def _finish(shape, start, start_end, end):
+        seen.add(shape["name"])
+        slot = TemplateSlot(shape["name"], shape["paragraph_style"], shape["span_style"])
+        if shape["first"] is not None:
+            slot.default = content[shape["first"]:shape["last"]]
+            slots.append((shape["first"], shape["last"], b"", b"", slot))
+        elif start_end == end:
+            # 空元素：<draw:rect .../> -> <draw:rect ...>文本</draw:rect>
+            qname = _START_TAG.match(content, start).group(1)
+            slots.append((end - 2, end, b">", b"</" + qname + b">", slot))
+        else:
+            slots.append((shape["open_end"], shape["open_end"], b"", b"", slot))
+        shape["container"] = -1
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(content, True)
+    return slots
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return ((hour << 11) | (minute << 5) | (second // 2)), (((year - 1980) << 9) | (month << 5) | day)
+
+def _local_header(name, method, crc, compressed_size, size, date_time):
+    dos_time, dos_date = _dos_time(date_time)
+    flags = 0x800 if not name.isascii() else 0
+    encoded = name.encode("utf-8")
+    return struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, flags, method, dos_time, dos_date,
+                       crc, compressed_size, size, len(encoded), 0) + encoded
+
+def _central_header(name, method, crc, compressed_size, size, date_time, offset):
+    dos_time, dos_date = _dos_time(date_time)
+    flags = 0x800 if not name.isascii() else 0
+    encoded = name.encode("utf-8")
+    return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags, method, dos_time, dos_date,
+                       crc, compressed_size, size, len(encoded), 0, 0, 0, 0, 0, offset) + encoded
+
+class CompiledTemplate:
+    """
+    编译后的模板
+
+    静态ZIP条目（mimetype及content.xml以外的所有文件）的本地文件头和压缩数据连成一段前缀，
+    content.xml作为最后一个条目，每条记录只需生成它的本地文件头、数据和中央目录
+    """
+
+    def __init__(self, segments, slots, entries, content_date_time, source_sha256=None, compress_level=1):
+        """
+        Args:
+            segments: content.xml的静态字节段（比slots多一个）
+            slots: TemplateSlot列表
+            entries: 静态条目 [{"name", "method", "crc", "size", "compressed_size", "date_time", "data"}]
+            content_date_time: content.xml条目的修改时间
+            source_sha256: 模板文件的内容哈希
+            compress_level: 渲染时content.xml的压缩级别（0表示不压缩）
+        """
+        self.segments = segments
+        self.slots = slots
+        self.entries = entries
+        self.content_date_time = tuple(content_date_time)
+        self.source_sha256 = source_sha256
+        self.compress_level = compress_level
+        self.slot_names = {slot.name for slot in slots}
+
+        prefix = []
+        central = []
+        offset = 0
+        for entry in entries:
+            header = _local_header(entry["name"], entry["method"], entry["crc"], entry["compressed_size"],
+                                   entry["size"], entry["date_time"])
+            central.append(_central_header(entry["name"], entry["method"], entry["crc"], entry["compressed_size"],
+                                           entry["size"], entry["date_time"], offset))
+            prefix.append(header)
+            prefix.append(entry["data"])
+            offset += len(header) + len(entry["data"])
+        self._prefix = b"".join(prefix)
+        self._central = b"".join(central)
+
+    @classmethod
+    def compile(cls, file_path, compress_level=1):
+        """
+        分析模板ODG文件
+
+        Args:
+            file_path: 模板ODG文件路径
+            compress_level: 渲染时content.xml的压缩级别（0表示不压缩，1最快）
+
+        Returns:
+            CompiledTemplate
+        """
+        with open(file_path, "rb") as f:
+            data = f.read()
+        entries = []
+        with zipfile.ZipFile(file_path) as package:
+            content_info = package.getinfo("content.xml")
+            content = package.read("content.xml")
+            infos = sorted(package.infolist(), key=lambda info: info.filename != "mimetype")
+            for info in infos:
+                if info.filename == "content.xml" or info.is_dir():
+                    continue
+                raw = package.read(info.filename)
+                # mimetype和已经压缩的图片等不压缩，其他条目预先以最高级别压缩
+                if info.filename == "mimetype" or info.compress_type == zipfile.ZIP_STORED:
+                    method, stored = zipfile.ZIP_STORED, raw
+                else:
+                    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+                    method, stored = zipfile.ZIP_DEFLATED, compressor.compress(raw) + compressor.flush()
+                entries.append({"name": info.filename, "method": method, "crc": zlib.crc32(raw),
+                                "size": len(raw), "compressed_size": len(stored),
+                                "date_time": info.date_time, "data": stored})
+
+        # 每个槽的前缀并入前一段，后缀并入后一段
+        segments = []
+        slots = []
+        position = 0
+        suffix = b""
+        for start, end, slot_prefix, slot_suffix, slot in find_slots(content):
+            segments.append(suffix + content[position:start] + slot_prefix)
+            slots.append(slot)
+            position, suffix = end, slot_suffix
+        segments.append(suffix + content[position:])
+        return cls(segments, slots, entries, content_info.date_time,
+                   hashlib.sha256(data).hexdigest(), compress_level)
+
+    def render_content(self, values):
+        """按形状名称到文本的映射生成content.xml"""
+        parts = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            value = values.get(slot.name)
+            parts.append(slot.default if value is None else slot.fill(value))
+            parts.append(segment)
+        return b"".join(parts)
+
+    def render(self, values):
+        """
+        Args:
+            values: 形状名称到文本的映射，映射中没有的形状保留模板中的文本
+
+        Returns:
+            bytes: ODG文件内容
+        """
+        content = self.render_content(values)
+        crc = zlib.crc32(content)
+        if self.compress_level:
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+            data = compressor.compress(content) + compressor.flush()
+            method = zipfile.ZIP_DEFLATED
+        else:
+            data, method = content, zipfile.ZIP_STORED
+        offset = len(self._prefix)
+        header = _local_header("content.xml", method, crc, len(data), len(content), self.content_date_time)
+        central = self._central + _central_header("content.xml", method, crc, len(data), len(content),
+                                                  self.content_date_time, offset)
+        central_offset = offset + len(header) + len(data)
+        end = struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(self.entries) + 1, len(self.entries) + 1,
+                          len(central), central_offset, 0)
+        return b"".join((self._prefix, header, data, central, end))
+
+    def render_file(self, values, output_path):
+        """
+        渲染并写出一个文件（先写临时文件再改名）
+
+        Returns:
+            dict: 与按名称修改文本相同格式的结果统计
+        """
+        data = self.render(values)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, output_path)
+        found = [name for name in values if name in self.slot_names]
+        return {
+            "success": True,
+            "total_targets": len(values),
+            "modified_count": len(found),
+            "found_shapes": found,
+            "not_found_shapes": [name for name in values if name not in self.slot_names],
+            "error_shapes": [],
+            "output_path": output_path,
+            "bytes": len(data)
+        }
+
+    def save(self, artifact_path):
+        """
+        保存编译产物：ODGT + 头部长度 + JSON头部 + 数据（静态字节段、原有文本、预先压缩的条目）
+        """
+        blobs = []
+        offset = 0
+
+        def add(data):
+            nonlocal offset
+            blobs.append(data)
+            offset += len(data)
+            return [offset - len(data), len(data)]
+
+        header = {
+            "version": ARTIFACT_VERSION,
+            "source_sha256": self.source_sha256,
+            "compress_level": self.compress_level,
+            "content_date_time": list(self.content_date_time),
+            "segments": [add(segment) for segment in self.segments],
+            "slots": [dict(slot.to_json(), default=add(slot.default)) for slot in self.slots],
+            "entries": [dict({key: value for key, value in entry.items() if key != "data"},
+                             date_time=list(entry["date_time"]), data=add(entry["data"]))
+                        for entry in self.entries]
+        }
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        temp_path = f"{artifact_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(ARTIFACT_MAGIC + struct.pack("<I", len(encoded)) + encoded)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temp_path, artifact_path)
+        return artifact_path
+
+    @classmethod
+    def load(cls, artifact_path):
+        with open(artifact_path, "rb") as f:
+            data = f.read()
+        if data[:4] != ARTIFACT_MAGIC:
+            raise ValueError(f"不是编译后的模板: {artifact_path}")
+        (length,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + length].decode("utf-8"))
+        if header.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"编译产物版本不兼容: {header.get('version')}")
+        base = 8 + length
+
+        def blob(ref):
+            return data[base + ref[0]:base + ref[0] + ref[1]]
+
+        slots = [TemplateSlot(slot["name"], slot["paragraph_style"], slot["span_style"], blob(slot["default"]))
+                 for slot in header["slots"]]
+        entries = [dict(entry, date_time=tuple(entry["date_time"]), data=blob(entry["data"]))
+                   for entry in header["entries"]]
+        return cls([blob(ref) for ref in header["segments"]], slots, entries, header["content_date_time"],
+                   header["source_sha256"], header["compress_level"])
+
+    def stats(self):
+        return {
+            "slots": [slot.name for slot in self.slots],
+            "segments": len(self.segments),
+            "static_entries": len(self.entries),
+            "static_bytes": len(self._prefix),
+            "source_sha256": self.source_sha256
+        }
+
+def is_artifact(path):
+    """是否为编译产物（按文件头判断）"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == ARTIFACT_MAGIC
+    except OSError:
+        return False
+
+class TemplateRegistry:
+    """进程内的编译模板缓存（LRU），按文件标识判断模板是否变化"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.compiles = 0
+
+    def get(self, path, compress_level=1):
+        """
+        Args:
+            path: 模板ODG文件或编译产物路径
+
+        Returns:
+            CompiledTemplate
+        """
+        identity = file_identity(path)
+        if identity is None:
+            raise FileNotFoundError(path)
+        key = (identity[0], compress_level)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == identity:
+                self._entries.move_to_end(key)
+                return entry[1]
+        if is_artifact(path):
+            template = CompiledTemplate.load(path)
+        else:
+            template = CompiledTemplate.compile(path, compress_level)
+            self.compiles += 1
+        with self._lock:
+            self._entries[key] = (identity, template)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return template
+
+_registry = TemplateRegistry()
+
+def compiled_template(path, compress_level=1):
+    """取得模板（ODG文件或编译产物）的编译结果，同一进程内只编译一次"""
+    return _registry.get(path, compress_level)
+
+def compile_template(file_path, artifact_path=None, compress_level=1):
+    """
+    编译模板并保存编译产物
+
+    Args:
+        file_path: 模板ODG文件路径
+        artifact_path: 编译产物路径，默认为模板旁边的同名 .odgt 文件
+        compress_level: 渲染时content.xml的压缩级别
+
+    Returns:
+        dict: 编译产物路径、文本槽、耗时等
+    """
+    started = time.monotonic()
+    template = CompiledTemplate.compile(file_path, compress_level)
+    artifact_path = artifact_path or os.path.splitext(file_path)[0] + ".odgt"
+    template.save(artifact_path)
+    return dict(template.stats(), artifact_path=artifact_path, elapsed=round(time.monotonic() - started, 3))
+
+def main():
+    parser = argparse.ArgumentParser(description="ODG模板预编译")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_parser = subparsers.add_parser("compile", help="编译模板")
+    compile_parser.add_argument("template")
+    compile_parser.add_argument("--output", default=None, help="编译产物路径（默认 <模板>.odgt）")
+    compile_parser.add_argument("--level", type=int, default=1, help="渲染时content.xml的压缩级别（0不压缩）")
+    render_parser = subparsers.add_parser("render", help="按JSON映射渲染一个文件")
+    render_parser.add_argument("template", help="模板ODG文件或编译产物")
+    render_parser.add_argument("values", help="形状名称到文本的JSON映射")
+    render_parser.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        result = compile_template(args.template, args.output, args.level)
+    else:
+        result = compiled_template(args.template).render_file(json.loads(args.values), args.output)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板预热
+工作进程启动时按清单预先加载常用模板、建立形状索引并做一次预热导出，之后才报告就绪，
+部署后第一批请求不再承担加载和首次导出的开销；模板文件变化时自动重新预热。
+
+形状索引记录模板中每个形状名称所在的页面和位置，修改文本时直接定位目标形状，
+不必遍历所有页面的所有形状。索引按模板内容哈希保存，同一内容的模板共享索引。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from odg_affinity import TemplateHasher, content_hash
+
+def build_shape_index(document):
+    """
+    扫描文档，记录每个形状名称第一次出现的位置
+
+    Returns:
+        dict: 形状名称 -> (页面序号, 形状序号)
+    """
+    index = {}
+    pages = document.getDrawPages()
+    for i in range(pages.getCount()):
+        page = pages.getByIndex(i)
+        for j in range(page.getCount()):
+            try:
+                name = page.getByIndex(j).Name
+            except Exception:
+                continue
+            if name and name not in index:
+                index[name] = (i, j)
+    return index
+
+class ShapeIndex:
+    """按模板内容哈希缓存的形状索引（LRU）"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hasher = TemplateHasher()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, file_path):
+        """模板文件的内容哈希（按文件状态缓存）"""
+        return self.hasher.hash_file(file_path)
+
+    def get(self, key):
+        with self._lock:
+            index = self._entries.get(key)
+            if index is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return index
+
+    def put(self, key, index):
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+def load_manifest(path):
+    """
+    读取预热清单
+
+    .json文件为模板列表或 {"templates": [...]}，其他文件每行一个模板（# 开头为注释）。
+    条目为模板路径（相对路径以清单所在目录为基准）或模板内容哈希。
+
+    Returns:
+        list: 模板条目
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            entries = data.get("templates", []) if isinstance(data, dict) else data
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [entry if _is_hash(entry) else os.path.join(base_dir, entry) for entry in entries]
+
+def _is_hash(entry):
+    return len(entry) == 64 and all(c in "0123456789abcdef" for c in entry)
+
+class TemplateWarmer:
+    """按清单预热工作进程，并在模板文件变化时重新预热"""
+
+    def __init__(self, templates, resolve=None, export_pdf=True, poll_interval=2.0):
+        """
+        Args:
+            templates: 模板条目（路径或内容哈希）
+            resolve: 把内容哈希转换为文件路径的函数，返回None表示无法解析
+            export_pdf: 预热时是否同时做一次PDF导出
+            poll_interval: 检查模板文件变化的间隔（秒），0表示不检查
+        """
+        self.templates = list(templates)
+        self.resolve = resolve
+        self.export_pdf = export_pdf
+        self.poll_interval = poll_interval
+        self._states = {}
+        self._running = False
+        self.metrics = {"warmed": 0, "failures": 0, "refreshes": 0, "last_warm_seconds": None}
+
+    @classmethod
+    def from_manifest(cls, path, **kwargs):
+        return cls(load_manifest(path), **kwargs)
+
+    def paths(self, verbose=True):
+        """清单中可以解析的模板路径"""
+        paths = []
+        for entry in self.templates:
+            path = entry
+            if _is_hash(entry):
+                path = self.resolve(entry) if self.resolve else None
+                if path is None:
+                    if verbose:
+                        print(f"无法解析预热模板: {entry}")
+                    continue
+            paths.append(path)
+        return paths
+
+    def warm_worker(self, processor, shape_index, paths=None):
+        """
+        在一个工作进程上预热模板：加载文档、建立形状索引、预热导出
+
+        Args:
+            processor: 绑定到工作进程的ODGProcessor
+            shape_index: 共享的ShapeIndex
+            paths: 要预热的模板，默认为清单中的全部模板
+
+        Returns:
+            int: 预热成功的模板数
+        """
+        start = time.monotonic()
+        warmed = 0
+        for path in (self.paths() if paths is None else paths):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                if not processor.open_odg_bytes(data):
+                    raise RuntimeError("无法打开ODG文件")
+                try:
+                    shape_index.put(content_hash(data), build_shape_index(processor.document))
+                    processor.odg_bytes()
+                    if self.export_pdf:
+                        processor.store_to_bytes("draw_pdf_Export")
+                finally:
+                    processor.close_document()
+                warmed += 1
+                self.metrics["warmed"] += 1
+            except Exception as e:
+                self.metrics["failures"] += 1
+                print(f"预热模板失败 {path}: {e}")
+        self.metrics["last_warm_seconds"] = round(time.monotonic() - start, 3)
+        return warmed
+
+    def _file_state(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def watch(self, pool):
+        """启动后台线程，模板文件变化时在所有工作进程上重新预热"""
+        if not self.poll_interval:
+            return
+        self._states = {path: self._file_state(path) for path in self.paths(verbose=False)}
+        self._running = True
+        threading.Thread(target=self._watch_loop, args=(pool,), name="odg-warmup-watch", daemon=True).start()
+
+    def _watch_loop(self, pool):
+        while self._running:
+            time.sleep(self.poll_interval)
+            changed = []
+            for path in self.paths(verbose=False):
+                state = self._file_state(path)
+                if state is not None and state != self._states.get(path):
+                    changed.append(path)
+                self._states[path] = state
+            if changed:
+                print(f"模板已变化，重新预热: {', '.join(changed)}")
+                self.metrics["refreshes"] += 1
+                pool.broadcast(lambda processor: self.warm_worker(processor, pool.shape_index, changed))
+
+    def stop(self):
+        self._running = False
+
+    def stats(self):
+        return {"templates": len(self.templates), **self.metrics}
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+纯Python的ODG写入器
+直接生成ODF压缩包（mimetype、META-INF/manifest.xml、content.xml、styles.xml、meta.xml），
+创建文档不需要启动或连接office，也没有逐个属性的UNO调用。
+坐标和尺寸的单位与UNO相同（1/100毫米），颜色为 0xRRGGBB 整数。
+
+用法:
+    builder = ODGBuilder()
+    builder.add_style("title", font_size=24, bold=True, line_style="none", fill_color=None)
+    page = builder.add_page("第一页")
+    page.text(1000, 1000, 10000, 1500, "标题", name="title", style="title")
+    page.rectangle(1000, 3000, 5000, 3000, name="box", fill_color=0xFFFF00)
+    with page.group("group1") as group:
+        group.ellipse(7000, 3000, 3000, 3000)
+        group.line(7000, 7000, 10000, 7000, line_color=0xFF0000)
+    builder.save("output.odg")
+"""
+
+import datetime
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+MIMETYPE = "application/vnd.oasis.opendocument.graphics"
+
+_NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0" '
+    'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0" '
+    'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    'xmlns:meta="urn:oasis:names:tc:opendocument:xmlns:meta:1.0"'
+)
+
+_MANIFEST = f"""<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="{MIMETYPE}"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+ <manifest:file-entry manifest:full-path="styles.xml" manifest:media-type="text/xml"/>
+ <manifest:file-entry manifest:full-path="meta.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>
+"""
+
+def _length(value):
+    """1/100毫米 -> ODF长度"""
+    return f"{value / 100:.2f}mm"
+
+def _color(value):
+    return f"#{value & 0xFFFFFF:06x}"
+
+# 连续空格：第一个保留，其余用text:s表示
+_SPACES = re.compile(" {2,}")
+
+def _space_element(match):
+    return f' <text:s text:c="{len(match.group(0)) - 1}"/>'
+
+def paragraphs_xml(text, paragraph_style=None, span_style=None):
+    """
+    文本转换为段落的XML：换行分段，制表符和连续空格使用text:tab、text:s（预编译模板也用它生成槽位内容）
+
+    paragraph_style、span_style 指定时每段使用该段落样式，文本放在该字符样式的text:span中
+    """
+    paragraph_open = f"<text:p text:style-name={quoteattr(paragraph_style)}>" if paragraph_style else "<text:p>"
+    span_open = f"<text:span text:style-name={quoteattr(span_style)}>" if span_style else ""
+    span_close = "</text:span>" if span_style else ""
+    result = []
+    for line in str(text).split("\n"):
+        line = escape(line)
+        if "  " in line:
+            line = _SPACES.sub(_space_element, line)
+        if "\t" in line:
+            line = line.replace("\t", "<text:tab/>")
+        result.append(f"{paragraph_open}{span_open}{line}{span_close}</text:p>")
+    return "".join(result)
+
+def _style_properties(fill_color=None, line_color=None, line_width=None, line_style=None,
+                      font_size=None, font_color=None, bold=False, text_align=None, fill=True):
+    """样式属性 -> (graphic-properties, paragraph-properties, text-properties) 属性字符串"""
+    graphic = []
+    if fill_color is not None:
+        graphic.append(f'draw:fill="solid" draw:fill-color="{_color(fill_color)}"')
+    elif not fill:
+        graphic.append('draw:fill="none"')
+    if line_style is not None:
+        graphic.append(f'draw:stroke="{line_style}"')
+    if line_color is not None:
+        graphic.append(f'svg:stroke-color="{_color(line_color)}"')
+    if line_width is not None:
+        graphic.append(f'svg:stroke-width="{_length(line_width)}"')
+    paragraph = [f'fo:text-align="{text_align}"'] if text_align else []
+    text = []
+    if font_size is not None:
+        text.append(f'fo:font-size="{font_size}pt"')
+    if font_color is not None:
+        text.append(f'fo:color="{_color(font_color)}"')
+    if bold:
+        text.append('fo:font-weight="bold"')
+    return " ".join(graphic), " ".join(paragraph), " ".join(text)
+
+def _style_xml(name, family, properties, parent=None):
+    graphic, paragraph, text = properties
+    parent_attr = f' style:parent-style-name={quoteattr(parent)}' if parent else ""
+    body = ""
+    if graphic:
+        body += f"<style:graphic-properties {graphic}/>"
+    if paragraph:
+        body += f"<style:paragraph-properties {paragraph}/>"
+    if text:
+        body += f"<style:text-properties {text}/>"
+    return f'<style:style style:name={quoteattr(name)} style:family="{family}"{parent_attr}>{body}</style:style>'
+
+class ShapeContainer:
+    """页面或组合形状，按添加顺序保存形状的XML"""
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.shapes = []
+
+    def _common(self, name, style, overrides):
+        attrs = []
+        if name:
+            attrs.append(f"draw:name={quoteattr(name)}")
+        style_name = self.builder._shape_style(style, overrides)
+        if style_name:
+            attrs.append(f"draw:style-name={quoteattr(style_name)}")
+        return " ".join(attrs)
+
+    def _box(self, tag, x, y, width, height, name, style, text, overrides):
+        geometry = (f'svg:x="{_length(x)}" svg:y="{_length(y)}" '
+                    f'svg:width="{_length(width)}" svg:height="{_length(height)}"')
+        body = paragraphs_xml(text) if text is not None else ""
+        self.shapes.append(f"<draw:{tag} {self._common(name, style, overrides)} {geometry}>{body}</draw:{tag}>")
+        return self
+
+    def rectangle(self, x, y, width, height, name=None, style=None, text=None, **overrides):
+        """
+        添加矩形
+
+        Args:
+            x, y, width, height: 位置和尺寸（1/100毫米）
+            name: 形状名称（modify_texts等按名称查找形状）
+            style: add_style定义的样式名称
+            text: 形状中的文本
+            overrides: 只用于该形状的样式属性：fill_color、line_color、line_width、line_style、
+                       font_size、font_color、bold、text_align
+        """
+        return self._box("rect", x, y, width, height, name, style, text, overrides)
+
+    def ellipse(self, x, y, width, height, name=None, style=None, text=None, **overrides):
+        """添加椭圆，参数同rectangle"""
+        return self._box("ellipse", x, y, width, height, name, style, text, overrides)
+
+    def line(self, x1, y1, x2, y2, name=None, style=None, **overrides):
+        """添加直线"""
+        geometry = (f'svg:x1="{_length(x1)}" svg:y1="{_length(y1)}" '
+                    f'svg:x2="{_length(x2)}" svg:y2="{_length(y2)}"')
+        self.shapes.append(f"<draw:line {self._common(name, style, overrides)} {geometry}/>")
+        return self
+
+    def text(self, x, y, width, height, text, name=None, style=None, **overrides):
+        """添加文本框（与UNO的TextShape相同，保存为draw:frame中的draw:text-box），默认无边框无填充"""
+        overrides.setdefault("line_style", "none")
+        overrides.setdefault("fill", False)
+        geometry = (f'svg:x="{_length(x)}" svg:y="{_length(y)}" '
+                    f'svg:width="{_length(width)}" svg:height="{_length(height)}"')
+        self.shapes.append(
+            f"<draw:frame {self._common(name, style, overrides)} {geometry}>"
+            f"<draw:text-box>{paragraphs_xml(text)}</draw:text-box></draw:frame>")
+        return self
+
+    def group(self, name=None):
+        """
+        添加组合形状
+
+        Returns:
+            Group: 向其中添加成员形状，可以用作with语句
+        """
+        group = Group(self.builder, name)
+        self.shapes.append(group)
+        return group
+
+    def _xml(self):
+        return "".join(shape if isinstance(shape, str) else shape._xml() for shape in self.shapes)
+
+class Group(ShapeContainer):
+    """组合形状"""
+
+    def __init__(self, builder, name=None):
+        super().__init__(builder)
+        self.name = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _xml(self):
+        name = f" draw:name={quoteattr(self.name)}" if self.name else ""
+        return f"<draw:g{name}>{super()._xml()}</draw:g>"
+
+class Page(ShapeContainer):
+    """绘图页面"""
+
+    def __init__(self, builder, name):
+        super().__init__(builder)
+        self.name = name
+
+    def _xml(self):
+        return (f"<draw:page draw:name={quoteattr(self.name)} draw:master-page-name=\"Default\">"
+                f"{super()._xml()}</draw:page>")
+
+class ODGBuilder:
+    """在内存中构建ODG文档"""
+
+    def __init__(self, page_width=21000, page_height=29700, title=None):
+        """
+        Args:
+            page_width, page_height: 页面尺寸（1/100毫米），默认A4纵向
+            title: 文档标题（meta.xml）
+        """
+        self.page_width = page_width
+        self.page_height = page_height
+        self.title = title
+        self.pages = []
+        self._styles = {}
+        self._automatic = {}
+
+    def add_style(self, name, fill_color=None, line_color=None, line_width=None, line_style=None,
+                  font_size=None, font_color=None, bold=False, text_align=None, fill=True):
+        """
+        定义图形样式（写入styles.xml，在LibreOffice中显示为可复用的样式）
+
+        Args:
+            name: 样式名称
+            fill_color: 填充颜色；fill为False时不填充
+            line_color, line_width, line_style: 线条颜色、宽度（1/100毫米）、样式（solid / none）
+            font_size: 字号（磅）
+            font_color, bold: 文字颜色、粗体
+            text_align: 段落对齐（start / center / end / justify）
+
+        Returns:
+            str: 样式名称
+        """
+        self._styles[name] = _style_properties(fill_color, line_color, line_width, line_style,
+                                               font_size, font_color, bold, text_align, fill)
+        return name
+
+    def _shape_style(self, style, overrides):
+        """形状使用的样式名称：有单独的样式属性时生成以style为父样式的自动样式（相同属性共用）"""
+        if style is not None and style not in self._styles:
+            raise ValueError(f"未定义的样式: {style}")
+        if not overrides:
+            return style or "standard"
+        properties = _style_properties(**overrides)
+        key = (style, properties)
+        if key not in self._automatic:
+            self._automatic[key] = f"gr{len(self._automatic) + 1}"
+        return self._automatic[key]
+
+    def add_page(self, name=None):
+        """
+        添加页面
+
+        Returns:
+            Page: 向其中添加形状
+        """
+        page = Page(self, name or f"page{len(self.pages) + 1}")
+        self.pages.append(page)
+        return page
+
+    def content_xml(self):
+        automatic = "".join(
+            _style_xml(name, "graphic", properties, parent or "standard")
+            for (parent, properties), name in self._automatic.items())
+        # 没有页面的文档在LibreOffice中无法打开，至少保留一个空白页
+        pages = self.pages or [Page(self, "page1")]
+        body = "".join(page._xml() for page in pages)
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<office:document-content {_NAMESPACES} office:version="1.2">'
+                f"<office:automatic-styles>{automatic}</office:automatic-styles>"
+                f"<office:body><office:drawing>{body}</office:drawing></office:body>"
+                f"</office:document-content>")
+
+    def styles_xml(self):
+        standard = _style_xml("standard", "graphic", _style_properties(
+            fill_color=0xFFFFFF, line_color=0x000000, line_style="solid", font_size=18))
+        styles = "".join(_style_xml(name, "graphic", properties, "standard")
+                         for name, properties in self._styles.items())
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<office:document-styles {_NAMESPACES} office:version="1.2">'
+                f"<office:styles>{standard}{styles}</office:styles>"
+                f"<office:automatic-styles>"
+                f'<style:page-layout style:name="PM1"><style:page-layout-properties '
+                f'fo:margin-top="0mm" fo:margin-bottom="0mm" fo:margin-left="0mm" fo:margin-right="0mm" '
+                f'fo:page-width="{_length(self.page_width)}" fo:page-height="{_length(self.page_height)}" '
+                f'style:print-orientation="{"landscape" if self.page_width > self.page_height else "portrait"}"/>'
+                f"</style:page-layout>"
+                f'<style:style style:name="dp1" style:family="drawing-page">'
+                f'<style:drawing-page-properties draw:fill="none"/></style:style>'
+                f"</office:automatic-styles>"
+                f'<office:master-styles><style:master-page style:name="Default" '
+                f'style:page-layout-name="PM1" draw:style-name="dp1"/></office:master-styles>'
+                f"</office:document-styles>")
+
+    def meta_xml(self):
+        now = datetime.datetime.now().replace(microsecond=0).isoformat()
+        title = f"<dc:title>{escape(self.title)}</dc:title>" if self.title else ""
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<office:document-meta {_NAMESPACES} office:version="1.2"><office:meta>'
+                f"<meta:generator>odg-processor</meta:generator>{title}"
+                f"<meta:creation-date>{now}</meta:creation-date><dc:date>{now}</dc:date>"
+                f"</office:meta></office:document-meta>")
+
+    def to_bytes(self):
+        """
+        Returns:
+            bytes: ODG文件内容
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            # mimetype必须是第一个条目且不压缩
+            archive.writestr(zipfile.ZipInfo("mimetype"), MIMETYPE, compress_type=zipfile.ZIP_STORED)
+            for name, data in (("content.xml", self.content_xml()), ("styles.xml", self.styles_xml()),
+                               ("meta.xml", self.meta_xml()), ("META-INF/manifest.xml", _MANIFEST)):
+                archive.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+        return buffer.getvalue()
+
+    def save(self, output_path):
+        """写出ODG文件"""
+        data = self.to_bytes()
+        with open(output_path, "wb") as f:
+            f.write(data)
+        return output_path
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        按JSON描述构建文档
+
+        Args:
+            spec: {"page_width", "page_height", "title",
+                   "styles": {名称: {fill_color, line_color, ...}},
+                   "pages": [{"name", "shapes": [
+                       {"type": "rectangle" | "ellipse" | "text", "x", "y", "width", "height", "text", "name", "style", ...},
+                       {"type": "line", "x1", "y1", "x2", "y2", ...},
+                       {"type": "group", "name", "shapes": [...]}]}]}
+                  形状中其他的键作为该形状的样式属性
+
+        Returns:
+            ODGBuilder
+        """
+        builder = cls(spec.get("page_width", 21000), spec.get("page_height", 29700), spec.get("title"))
+        for name, properties in (spec.get("styles") or {}).items():
+            builder.add_style(name, **properties)
+        for page_spec in spec.get("pages") or []:
+            _add_shapes(builder.add_page(page_spec.get("name")), page_spec.get("shapes") or [])
+        return builder
+
+def _add_shapes(container, shapes):
+    for shape in shapes:
+        shape = dict(shape)
+        shape_type = shape.pop("type")
+        if shape_type == "group":
+            _add_shapes(container.group(shape.get("name")), shape.get("shapes") or [])
+        elif shape_type in ("rectangle", "ellipse", "line", "text"):
+            getattr(container, shape_type)(**shape)
+        else:
+            raise ValueError(f"未知的形状类型: {shape_type}")
+
+def write_odg(output_path, spec=None):
+    """按JSON描述写出ODG文件，spec为None时写出只有一个空白页的文档"""
+    return ODGBuilder.from_spec(spec or {}).save(output_path)
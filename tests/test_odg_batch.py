@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_batch测试：逐条读取记录、检查点日志的跳过和恢复，以及批量渲染的重试和失败统计（渲染函数为模拟的，不需要office）
+
+运行: python tests/test_odg_batch.py
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_batch import BatchJournal, map_record, output_path_for, read_records, run_batch
+
+def write_output(path, data=b"odg"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+class BatchJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-batch-")
+        self.path = os.path.join(self.temp_dir, "journal", "batch.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_record_and_reopen(self):
+        output = write_output(os.path.join(self.temp_dir, "a.odg"))
+        with BatchJournal(self.path) as journal:
+            self.assertEqual(len(journal), 0)
+            entry = journal.record({"record_id": "a", "output_path": output})
+            journal.record({"record_id": "a", "output_path": output})
+            self.assertEqual(len(journal), 1)
+            self.assertEqual(journal.completed("a")["sha256"], entry["sha256"])
+            self.assertIsNone(journal.completed("b"))
+        with BatchJournal(self.path) as journal:
+            self.assertEqual(len(journal), 1)
+            self.assertEqual(journal.completed("a")["output_path"], output)
+
+    def test_missing_output_is_not_completed(self):
+        with BatchJournal(self.path) as journal:
+            journal.record({"record_id": "a", "output_path": os.path.join(self.temp_dir, "missing.odg")})
+            self.assertIsNone(journal.completed("a"))
+
+    def test_verify_checksum(self):
+        output = write_output(os.path.join(self.temp_dir, "a.odg"))
+        with BatchJournal(self.path) as journal:
+            journal.record({"record_id": "a", "output_path": output})
+        write_output(output, b"changed")
+        with BatchJournal(self.path) as journal:
+            self.assertIsNotNone(journal.completed("a"))
+        with BatchJournal(self.path, verify=True) as journal:
+            self.assertIsNone(journal.completed("a"))
+
+    def test_truncated_last_line(self):
+        output = write_output(os.path.join(self.temp_dir, "a.odg"))
+        with BatchJournal(self.path) as journal:
+            journal.record({"record_id": "a", "output_path": output})
+        with open(self.path, "ab") as f:
+            f.write(b'{"id": "b", "outp')
+        with BatchJournal(self.path) as journal:
+            self.assertEqual(len(journal), 1)
+            journal.record({"record_id": "c", "output_path": output})
+        with BatchJournal(self.path) as journal:
+            self.assertEqual(len(journal), 2)
+            self.assertIsNotNone(journal.completed("a"))
+            self.assertIsNotNone(journal.completed("c"))
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-batch-")
+        self.pattern = os.path.join(self.temp_dir, "out", "{id}.odg")
+        self.journal = os.path.join(self.temp_dir, "batch.jsonl")
+        self.calls = []
+        self.failing = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def render(self, texts, output_path):
+        self.calls.append(texts["name"])
+        if texts["name"] in self.failing:
+            return {"success": False, "error": "渲染失败"}
+        if texts["name"] == "no-shapes":
+            # 模板中没有这些形状时不保存输出
+            return {"success": True, "modified_count": 0, "unchanged_count": 0, "not_found_shapes": ["name"]}
+        write_output(output_path, json.dumps(texts).encode("utf-8"))
+        result = {"success": True, "modified_count": len(texts), "unchanged_count": 0}
+        if texts["name"] == "no-pdf":
+            result.update(pdf_profile="default", pdf_export_error="PDF导出失败")
+        return result
+
+    def run_records(self, records, **options):
+        source = io.StringIO("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        return run_batch(self.render, source, self.pattern, retry_delay=0, **options)
+
+    def test_summary(self):
+        self.failing = {"记录3"}
+        results = []
+        summary = self.run_records([{"id": str(i), "name": f"记录{i}"} for i in range(5)], on_result=results.append)
+        self.assertEqual((summary["total"], summary["succeeded"], summary["failed"]), (5, 4, 1))
+        self.assertEqual(summary["failures"], [{"record_id": "3", "index": 3, "error": "渲染失败"}])
+        self.assertEqual([result["record_id"] for result in results], ["0", "1", "2", "3", "4"])
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "out", "0.odg")))
+
+    def test_resume_skips_completed(self):
+        records = [{"id": str(i), "name": f"记录{i}"} for i in range(5)]
+        self.failing = {"记录3"}
+        summary = self.run_records(records, journal_path=self.journal)
+        self.assertEqual((summary["succeeded"], summary["failed"]), (4, 1))
+        self.assertEqual(summary["failures"][0]["record_id"], "3")
+
+        self.failing = set()
+        self.calls = []
+        summary = self.run_records(records, journal_path=self.journal)
+        self.assertEqual((summary["skipped"], summary["succeeded"]), (4, 1))
+        self.assertEqual(self.calls, ["记录3"])
+
+    def test_retries(self):
+        self.failing = {"b"}
+        summary = self.run_records([{"id": "1", "name": "a"}, {"id": "2", "name": "b"}], retries=2)
+        self.assertEqual(self.calls, ["a", "b", "b", "b"])
+        self.assertEqual((summary["failed"], summary["retried"]), (1, 1))
+
+    def test_failed_pdf_export_is_retried_on_resume(self):
+        summary = self.run_records([{"id": "1", "name": "no-pdf"}], journal_path=self.journal)
+        self.assertEqual(summary["failed"], 1)
+        self.assertEqual(summary["failures"][0]["error"], "PDF导出失败")
+        self.calls = []
+        self.run_records([{"id": "1", "name": "no-pdf"}], journal_path=self.journal)
+        self.assertEqual(self.calls, ["no-pdf"])
+
+    def test_no_target_shapes_is_failure(self):
+        summary = self.run_records([{"id": "1", "name": "no-shapes"}], journal_path=self.journal)
+        self.assertEqual((summary["succeeded"], summary["failed"]), (0, 1))
+        self.assertEqual(summary["failures"][0]["error"], "没有找到任何目标形状，未生成输出文件")
+        self.calls = []
+        self.run_records([{"id": "1", "name": "no-shapes"}], journal_path=self.journal)
+        self.assertEqual(self.calls, ["no-shapes"])
+
+    def test_progress(self):
+        progress = []
+        self.run_records([{"id": str(i), "name": str(i)} for i in range(3)], on_progress=progress.append,
+                         progress_interval=3600)
+        self.assertEqual(len(progress), 1)
+        self.assertEqual(progress[0]["processed"], 3)
+
+class RecordsTest(unittest.TestCase):
+
+    def test_read_records(self):
+        self.assertEqual(list(read_records(io.StringIO("id,name\n1,张三\n"), "csv")), [{"id": "1", "name": "张三"}])
+        self.assertEqual(list(read_records(io.StringIO('{"a": 1}\n\n{"a": 2}\n'))), [{"a": 1}, {"a": 2}])
+        with self.assertRaises(ValueError):
+            list(read_records(io.StringIO("{bad\n")))
+
+    def test_map_record(self):
+        record = {"id": "7", "name": "张三", "amount": 12, "empty": None}
+        self.assertEqual(map_record(record), {"name": "张三", "amount": "12", "empty": ""})
+        self.assertEqual(map_record(record, {"name": "shape_name", "missing": "x"}), {"shape_name": "张三"})
+
+    def test_output_path(self):
+        self.assertEqual(output_path_for("out/{id}_{index}_{name}.odg", {"name": "a"}, "x/y", 3), "out/x_y_3_a.odg")
+
+if __name__ == "__main__":
+    unittest.main()
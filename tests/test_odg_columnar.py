@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_columnar测试：列式编码和binary编码解码后与原来的形状列表一致（不需要office）
+
+运行: python tests/test_odg_columnar.py
+"""
+
+import base64
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_columnar import encode_info, pack_int32
+
+RECT = "com.sun.star.drawing.RectangleShape"
+TEXT = "com.sun.star.drawing.TextShape"
+
+def shape(index, shape_type, name, x, y, w, h, text):
+    return {"shape_index": index, "shape_type": shape_type, "shape_name": name,
+            "position": {"x": x, "y": y}, "size": {"width": w, "height": h}, "text": text}
+
+INFO = {
+    "file_path": "a.odg",
+    "pages": 2,
+    "pages_info": [
+        {"page_number": 1, "shapes": [shape(0, RECT, "r", 10, -20, 300, 400, "矩形"),
+                                      shape(1, TEXT, "t", 2 ** 31 - 1, -2 ** 31, 0, 5, "")]},
+        {"page_number": 2, "shapes": [shape(0, TEXT, "", 1, 2, 3, 4, "第二页")]},
+    ]
+}
+
+def unpack_int32(encoded):
+    data = base64.b64decode(encoded)
+    return list(struct.unpack(f"<{len(data) // 4}i", data))
+
+def decode(encoded):
+    """列式编码还原为形状列表"""
+    binary = encoded["format"] == "binary"
+    pages = []
+    for page in encoded["pages_info"]:
+        columns = {name: unpack_int32(values) if binary and name not in ("names", "text") else values
+                   for name, values in page["columns"].items()}
+        pages.append([shape(columns["index"][i], encoded["shape_types"][columns["types"][i]], columns["names"][i],
+                            columns["x"][i], columns["y"][i], columns["w"][i], columns["h"][i], columns["text"][i])
+                      for i in range(page["count"])])
+    return pages
+
+class ColumnarTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for fmt in ("columnar", "binary"):
+            encoded = encode_info(INFO, fmt)
+            self.assertEqual(encoded["format"], fmt)
+            self.assertEqual(encoded["file_path"], "a.odg")
+            self.assertEqual([page["page_number"] for page in encoded["pages_info"]], [1, 2])
+            self.assertEqual(decode(encoded), [page["shapes"] for page in INFO["pages_info"]])
+
+    def test_shared_type_table(self):
+        encoded = encode_info(INFO, "columnar")
+        self.assertEqual(encoded["shape_types"], [RECT, TEXT])
+        self.assertEqual(encoded["pages_info"][1]["columns"]["types"], [1])
+
+    def test_projected_fields(self):
+        info = {"pages_info": [{"shapes": [{"shape_name": "a", "text": "x"}, {"shape_name": "b", "text": "y"}]}]}
+        columns = encode_info(info, "binary")["pages_info"][0]["columns"]
+        self.assertEqual(columns, {"names": ["a", "b"], "text": ["x", "y"]})
+
+    def test_without_pages(self):
+        self.assertEqual(encode_info({"pages": 0}, "columnar"), {"pages": 0, "shape_types": [], "format": "columnar"})
+
+    def test_pack_int32(self):
+        self.assertEqual(unpack_int32(pack_int32([0, -1, 2 ** 31 - 1])), [0, -1, 2 ** 31 - 1])
+        self.assertEqual(pack_int32([]), "")
+
+if __name__ == "__main__":
+    unittest.main()
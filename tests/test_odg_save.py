@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_save测试：按保存配置重新打包office写出的ODG（不需要office，用odg_writer生成的包加上缩略图和设置模拟）
+
+运行: python tests/test_odg_save.py
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_save import SAVE_PROFILES, needs_repack, repack, resolve_save_profile, write_package
+from odg_search import parse_odg
+from odg_writer import ODGBuilder
+
+THUMBNAIL = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+def office_package():
+    """与office保存的包相同的结构：包含缩略图、settings.xml及其清单项，图片不压缩"""
+    builder = ODGBuilder()
+    builder.add_page().text(0, 0, 5000, 1000, "保存配置 " * 50, name="caption")
+    source = zipfile.ZipFile(io.BytesIO(builder.to_bytes()))
+    output = io.BytesIO()
+    with source, zipfile.ZipFile(output, "w") as package:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename == "META-INF/manifest.xml":
+                data = data.replace(b"</manifest:manifest>", (
+                    b' <manifest:file-entry manifest:full-path="Thumbnails/thumbnail.png" manifest:media-type="image/png"/>\n'
+                    b' <manifest:file-entry manifest:full-path="Thumbnails/" manifest:media-type=""/>\n'
+                    b' <manifest:file-entry manifest:full-path="settings.xml" manifest:media-type="text/xml"/>\n'
+                    b' <manifest:file-entry manifest:full-path="Pictures/a.png" manifest:media-type="image/png"/>\n'
+                    b"</manifest:manifest>"))
+            package.writestr(info, data, info.compress_type)
+        package.writestr("settings.xml", "<office:document-settings/>", zipfile.ZIP_DEFLATED)
+        package.writestr("Thumbnails/thumbnail.png", THUMBNAIL, zipfile.ZIP_STORED)
+        package.writestr("Pictures/a.png", THUMBNAIL, zipfile.ZIP_STORED)
+    return output.getvalue()
+
+class RepackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = office_package()
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-save-")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_profiles(self):
+        for name in ("fast", "small", "stored"):
+            with zipfile.ZipFile(io.BytesIO(repack(self.data, name))) as package, \
+                    zipfile.ZipFile(io.BytesIO(self.data)) as source:
+                self.assertIsNone(package.testzip())
+                infos = package.infolist()
+                self.assertEqual(infos[0].filename, "mimetype")
+                self.assertEqual(infos[0].compress_type, zipfile.ZIP_STORED)
+                names = package.namelist()
+                self.assertNotIn("Thumbnails/thumbnail.png", names)
+                self.assertNotIn("settings.xml", names)
+                manifest = package.read("META-INF/manifest.xml").decode("utf-8")
+                self.assertNotIn("Thumbnails/", manifest)
+                self.assertNotIn("settings.xml", manifest)
+                self.assertIn("Pictures/a.png", manifest)
+                self.assertEqual(package.read("content.xml"), source.read("content.xml"))
+                self.assertEqual(package.getinfo("Pictures/a.png").compress_type, zipfile.ZIP_STORED)
+                expected = zipfile.ZIP_STORED if name == "stored" else zipfile.ZIP_DEFLATED
+                self.assertEqual(package.getinfo("content.xml").compress_type, expected)
+
+    def test_load_back(self):
+        path = os.path.join(self.temp_dir, "out", "saved.odg")
+        write_package(path, repack(self.data, "small"))
+        self.assertEqual([shape["text"] for shape in parse_odg(path)], ["保存配置 " * 50])
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["saved.odg"])
+
+    def test_smaller_than_stored(self):
+        self.assertLess(len(repack(self.data, "small")), len(repack(self.data, "stored")))
+
+    def test_default_profile_keeps_everything(self):
+        self.assertFalse(needs_repack("default"))
+        with zipfile.ZipFile(io.BytesIO(repack(self.data, "default"))) as package:
+            self.assertIn("Thumbnails/thumbnail.png", package.namelist())
+            self.assertIn("settings.xml", package.namelist())
+
+class ResolveTest(unittest.TestCase):
+
+    def test_resolve(self):
+        self.assertEqual(resolve_save_profile(" Fast "), "fast")
+        self.assertTrue(all(needs_repack(name) for name in SAVE_PROFILES if name != "default"))
+        with self.assertRaises(ValueError):
+            resolve_save_profile("tiny")
+
+    def test_environment_default(self):
+        previous = os.environ.get("ODG_SAVE_PROFILE")
+        os.environ["ODG_SAVE_PROFILE"] = "small"
+        try:
+            self.assertEqual(resolve_save_profile(), "small")
+        finally:
+            if previous is None:
+                del os.environ["ODG_SAVE_PROFILE"]
+            else:
+                os.environ["ODG_SAVE_PROFILE"] = previous
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_search测试：索引查询的结果与逐个形状比较子串的结果相同，增量更新只处理变化的文件（不需要office）
+
+运行: python tests/test_odg_search.py
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_search import TemplateIndex, parse_odg, search_templates, tokenize
+from odg_writer import ODGBuilder
+
+WORDS = ["invoice", "invoice_no", "note", "No.", "total", "sub_total", "合同编号", "北京市", "amount", "Voice"]
+
+class TemplateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-search-")
+        self.template_dir = os.path.join(self.temp_dir, "templates")
+        os.makedirs(os.path.join(self.template_dir, "sub"))
+        rng = random.Random(3)
+        for i in range(6):
+            builder = ODGBuilder()
+            page = builder.add_page()
+            for j in range(8):
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+                page.text(0, j * 1000, 5000, 900, text, name=f"{rng.choice(WORDS)}_{i}_{j}")
+            folder = self.template_dir if i % 2 else os.path.join(self.template_dir, "sub")
+            builder.save(os.path.join(folder, f"t{i}.odg"))
+        self.db_path = os.path.join(self.temp_dir, "index.sqlite")
+        self.index = TemplateIndex(self.db_path)
+        self.index.update(self.template_dir, workers=1)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def all_shapes(self):
+        shapes = []
+        for dir_path, _, file_names in os.walk(self.template_dir):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                shapes.extend(dict(shape, file_path=path) for shape in parse_odg(path))
+        return shapes
+
+    def expected(self, query, field):
+        needle = query.lower()
+        if field == "text":
+            matches = [s for s in self.all_shapes() if needle in s["text"].lower()]
+        else:
+            matches = [s for s in self.all_shapes() if needle in (s["shape_name"] + "\n" + s["text"]).lower()]
+        return sorted((s["file_path"], s["shape_name"]) for s in matches)
+
+    def found(self, query, field):
+        return sorted((m["file_path"], m["shape_name"]) for m in self.index.search(query, field=field, limit=10000))
+
+    def test_matches_substring_scan(self):
+        queries = ["invoice", "voice", "no", "oice_n", "nvoice no", "total", "ub_tot", "编号", "市",
+                   "合同编号 total", "e inv", "o. am", "NOTE", ".", "missing"]
+        for field in ("text", "any"):
+            for query in queries:
+                self.assertEqual(self.found(query, field), self.expected(query, field), (query, field))
+
+    def test_non_ascii_case(self):
+        builder = ODGBuilder()
+        builder.add_page().text(0, 0, 100, 100, "Ärger ΣΟΦΙΑ Invoice", name="Ümlaut")
+        builder.save(os.path.join(self.template_dir, "unicode.odg"))
+        self.index.update(self.template_dir, workers=1)
+        for query in ("ärger", "ÄRGER", "σοφια", "ärger σοφια"):
+            for field in ("text", "any"):
+                self.assertEqual([m["shape_name"] for m in self.index.search(query, field=field)], ["Ümlaut"],
+                                 (query, field))
+        self.assertEqual([m["shape_name"] for m in self.index.search("ümlaut\nä", field="any")], ["Ümlaut"])
+
+    def test_name(self):
+        name = self.all_shapes()[0]["shape_name"]
+        self.assertEqual([m["shape_name"] for m in self.index.search(name.upper(), field="name")], [name])
+        with self.assertRaises(ValueError):
+            self.index.search("x", field="title")
+
+    def test_incremental_update(self):
+        stats = self.index.update(self.template_dir, workers=1)
+        self.assertEqual((stats["unchanged"], stats["added"], stats["updated"]), (6, 0, 0))
+
+        builder = ODGBuilder()
+        builder.add_page().text(0, 0, 100, 100, "全新的文本 unique", name="fresh")
+        builder.save(os.path.join(self.template_dir, "t1.odg"))
+        os.utime(os.path.join(self.template_dir, "t1.odg"), ns=(0, 0))
+        os.remove(os.path.join(self.template_dir, "sub", "t0.odg"))
+        stats = self.index.update(self.template_dir, workers=1)
+        self.assertEqual((stats["updated"], stats["removed"]), (1, 1))
+        self.assertEqual([m["shape_name"] for m in self.index.search("unique")], ["fresh"])
+        self.assertEqual(self.found("invoice", "text"), self.expected("invoice", "text"))
+
+    def test_search_templates(self):
+        result = search_templates(self.db_path, "编号")
+        self.assertEqual(result["count"], len(self.expected("编号", "text")))
+        with self.assertRaises(FileNotFoundError):
+            search_templates(os.path.join(self.temp_dir, "missing.sqlite"), "x")
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Invoice_No 合同"), {"invoice_no", "合", "同", "合同"})
+
+if __name__ == "__main__":
+    unittest.main()
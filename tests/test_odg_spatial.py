@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_spatial测试：网格索引的查询结果与逐个形状比较的结果相同，远离页面的查询也能立即返回（不需要office）
+
+运行: python tests/test_odg_spatial.py
+"""
+
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_spatial import DocumentGeometry, SpatialIndex, _contains, _distance
+
+def random_entries(rng, count):
+    return [{"shape_name": f"s{i}", "shape_type": "com.sun.star.drawing.RectangleShape", "path": [i], "depth": 0,
+             "x": rng.randint(-5000, 30000), "y": rng.randint(-5000, 30000),
+             "w": rng.randint(0, 8000), "h": rng.randint(0, 8000)} for i in range(count)]
+
+class SpatialIndexTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            entries = random_entries(rng, rng.randint(1, 40))
+            index = SpatialIndex(entries, cell_size=rng.choice([None, 1000, 5000]))
+            for _ in range(10):
+                x, y = rng.randint(-10000, 40000), rng.randint(-10000, 40000)
+                hits = index.shapes_at(x, y)
+                self.assertEqual(sorted(e["shape_name"] for e in hits),
+                                 sorted(e["shape_name"] for e in entries if _contains(e, x, y)))
+
+                rect = (rng.randint(-60000, 40000), rng.randint(-60000, 40000),
+                        rng.randint(0, 100000), rng.randint(0, 100000))
+                rx, ry, rw, rh = rect
+                intersects = [e for e in entries
+                              if e["x"] <= rx + rw and e["x"] + e["w"] >= rx and e["y"] <= ry + rh and e["y"] + e["h"] >= ry]
+                contains = [e for e in entries
+                            if e["x"] >= rx and e["y"] >= ry and e["x"] + e["w"] <= rx + rw and e["y"] + e["h"] <= ry + rh]
+                self.assertEqual(index.shapes_in(*rect), intersects)
+                self.assertEqual(index.shapes_in(*rect, mode="contains"), contains)
+
+                k = rng.randint(1, 5)
+                x, y = rng.randint(-200000, 200000), rng.randint(-200000, 200000)
+                self.assertEqual([match["distance"] for match in index.nearest(x, y, k)],
+                                 sorted(round(_distance(e, x, y), 1) for e in entries)[:k])
+
+    def test_innermost_first(self):
+        entries = [{"shape_name": "outer", "path": [0], "depth": 0, "x": 0, "y": 0, "w": 1000, "h": 1000},
+                   {"shape_name": "inner", "path": [0, 0], "depth": 1, "x": 100, "y": 100, "w": 100, "h": 100}]
+        self.assertEqual([e["shape_name"] for e in SpatialIndex(entries).shapes_at(150, 150)], ["inner", "outer"])
+
+    def test_far_queries_return_quickly(self):
+        index = SpatialIndex([{"shape_name": "a", "path": [0], "depth": 0, "x": 0, "y": 0, "w": 1000, "h": 1000},
+                              {"shape_name": "b", "path": [1], "depth": 0, "x": 5000, "y": 0, "w": 100, "h": 100}])
+        started = time.monotonic()
+        self.assertEqual(len(index.shapes_in(0, 0, 10 ** 6, 10 ** 6)), 2)
+        self.assertEqual(len(index.shapes_in(-10 ** 12, -10 ** 12, 2 * 10 ** 12, 2 * 10 ** 12)), 2)
+        self.assertEqual(index.nearest(200000, 200000)[0]["shape_name"], "b")
+        self.assertEqual(len(index.nearest(-10 ** 12, 10 ** 12, k=5)), 2)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_empty_page(self):
+        index = SpatialIndex([])
+        self.assertEqual(index.shapes_at(0, 0), [])
+        self.assertEqual(index.shapes_in(0, 0, 10 ** 9, 10 ** 9), [])
+        self.assertEqual(index.nearest(0, 0), [])
+
+class DocumentGeometryTest(unittest.TestCase):
+
+    def test_query(self):
+        geometry = DocumentGeometry([random_entries(random.Random(1), 5), []])
+        first = geometry.pages[0][0]
+        x, y = first["x"] + first["w"] // 2, first["y"] + first["h"] // 2
+        self.assertIn(first, geometry.query({"op": "at", "page": 1, "x": x, "y": y}))
+        self.assertEqual(geometry.query({"op": "nearest", "page": 1, "x": x, "y": y, "k": 1})[0]["distance"], 0)
+        self.assertEqual(len(geometry.query({"op": "in", "page": 1, "rect": [-10 ** 6, -10 ** 6, 2 * 10 ** 6, 2 * 10 ** 6]})), 5)
+        self.assertEqual(geometry.query({"op": "nearest", "page": 2, "x": 0, "y": 0}), [])
+        with self.assertRaises(ValueError):
+            geometry.query({"op": "at", "page": 3, "x": 0, "y": 0})
+        with self.assertRaises(ValueError):
+            geometry.query({"op": "near", "page": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_template测试：预编译模板渲染出的ODG是有效的zip包，重新读取后文本为填入的值（不需要office）
+
+运行: python tests/test_odg_template.py
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_search import parse_odg
+from odg_template import CompiledTemplate, TemplateRegistry, compile_template, find_slots, is_artifact
+from odg_writer import ODGBuilder
+
+def texts_of(path):
+    """形状名称 -> 文本，同名形状取第一个"""
+    texts = {}
+    for shape in parse_odg(path):
+        texts.setdefault(shape["shape_name"], shape["text"])
+    return texts
+
+class CompiledTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-template-")
+        builder = ODGBuilder()
+        page = builder.add_page()
+        page.text(0, 0, 5000, 1000, "姓名", name="name", font_size=12)
+        page.rectangle(0, 1000, 5000, 1000, name="box", text="第一段\n第二段")
+        page.rectangle(0, 2000, 5000, 1000, name="empty")
+        page.text(0, 3000, 5000, 1000, "重复", name="name")
+        with page.group("group") as group:
+            group.text(0, 4000, 5000, 1000, "成员", name="member")
+        self.template_path = builder.save(os.path.join(self.temp_dir, "template.odg"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def render(self, template, values):
+        path = os.path.join(self.temp_dir, "out.odg")
+        result = template.render_file(values, path)
+        with zipfile.ZipFile(path) as package:
+            self.assertIsNone(package.testzip())
+            self.assertEqual(package.infolist()[0].filename, "mimetype")
+        return result, path
+
+    def test_slots(self):
+        with zipfile.ZipFile(self.template_path) as package:
+            slots = find_slots(package.read("content.xml"))
+        # 同名形状只取第一个
+        self.assertEqual([slot.name for _, _, _, _, slot in slots], ["name", "box", "empty", "member"])
+
+    def test_render(self):
+        template = CompiledTemplate.compile(self.template_path)
+        values = {"name": "张三 <&>", "box": "a  b\tc\n第二行", "empty": "新文本", "member": "", "missing": "x"}
+        result, path = self.render(template, values)
+        texts = texts_of(path)
+        self.assertEqual(texts["name"], "张三 <&>")
+        self.assertEqual(texts["box"], "a  b\tc\n第二行")
+        self.assertEqual(texts["empty"], "新文本")
+        self.assertEqual(texts["member"], "")
+        self.assertEqual(result["modified_count"], 4)
+        self.assertEqual(result["not_found_shapes"], ["missing"])
+
+    def test_unset_slots_keep_template_text(self):
+        template = CompiledTemplate.compile(self.template_path)
+        _, path = self.render(template, {"name": "李四"})
+        self.assertEqual(texts_of(path), {**texts_of(self.template_path), "name": "李四"})
+
+    def test_other_entries_unchanged(self):
+        template = CompiledTemplate.compile(self.template_path, compress_level=0)
+        with zipfile.ZipFile(io.BytesIO(template.render({"name": "x"}))) as rendered, \
+                zipfile.ZipFile(self.template_path) as source:
+            self.assertEqual(sorted(rendered.namelist()), sorted(source.namelist()))
+            for name in source.namelist():
+                if name != "content.xml":
+                    self.assertEqual(rendered.read(name), source.read(name))
+            self.assertEqual(rendered.getinfo("content.xml").compress_type, zipfile.ZIP_STORED)
+
+    def test_artifact(self):
+        artifact = os.path.join(self.temp_dir, "template.odgt")
+        stats = compile_template(self.template_path, artifact)
+        self.assertEqual(stats["slots"], ["name", "box", "empty", "member"])
+        self.assertTrue(is_artifact(artifact))
+        self.assertFalse(is_artifact(self.template_path))
+        values = {"name": "王五", "box": "多\n行"}
+        self.assertEqual(CompiledTemplate.load(artifact).render(values),
+                         CompiledTemplate.compile(self.template_path).render(values))
+        with self.assertRaises(ValueError):
+            CompiledTemplate.load(self.template_path)
+
+    def test_registry(self):
+        registry = TemplateRegistry()
+        first = registry.get(self.template_path)
+        self.assertIs(registry.get(self.template_path), first)
+        self.assertEqual(registry.compiles, 1)
+        # 模板修改后重新编译
+        builder = ODGBuilder()
+        builder.add_page().text(0, 0, 100, 100, "new", name="other")
+        builder.save(self.template_path)
+        os.utime(self.template_path, ns=(0, 0))
+        self.assertEqual(registry.get(self.template_path).stats()["slots"], ["other"])
+        self.assertEqual(registry.compiles, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+odg_writer测试：生成的ODG包结构，以及用odg_search.parse_odg重新读取后形状和文本与写入的一致（不需要office）；
+安装了LibreOffice（可以导入uno且能找到soffice）时，还在office中加载生成的文档核对形状类型、名称、位置和文本
+
+运行: python tests/test_odg_writer.py
+      （UNO加载测试需要使用LibreOffice自带的Python运行）
+"""
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from odg_search import _shape_text, parse_odg
+from odg_writer import MIMETYPE, ODGBuilder, paragraphs_xml, write_odg
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from odg_office import OfficeInstance, build_accept, find_soffice
+    from odg_pool import find_free_port
+    SOFFICE = find_soffice() or shutil.which("soffice")
+except ImportError:
+    SOFFICE = None
+
+_NAMESPACES = ('xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+               'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"')
+
+def load_back(text):
+    """paragraphs_xml的输出按office读取文本的方式还原"""
+    xml = f"<draw:text-box {_NAMESPACES}>{paragraphs_xml(text)}</draw:text-box>"
+    return _shape_text(ET.fromstring(xml))
+
+class ParagraphsTest(unittest.TestCase):
+
+    def test_special_characters(self):
+        for text in ["", "a", "<&>\"'", "a  b", "   ", "a\tb", "line1\nline2", "\n", "x \t  y\n\n z", "中文  内容"]:
+            self.assertEqual(load_back(text), text)
+
+    def test_random_text(self):
+        rng = random.Random(7)
+        alphabet = "ab <>&\"'\t\n中 "
+        for _ in range(2000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            self.assertEqual(load_back(text), text)
+
+    def test_styles(self):
+        xml = paragraphs_xml("a\nb", "P1", "T1")
+        self.assertEqual(xml.count('<text:p text:style-name="P1">'), 2)
+        self.assertEqual(xml.count('<text:span text:style-name="T1">'), 2)
+
+class BuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="odg-test-writer-")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def build(self):
+        builder = ODGBuilder(title="测试 <title>")
+        builder.add_style("box", fill_color=0xEEEEEE, font_size=12, bold=True)
+        page = builder.add_page("first")
+        page.rectangle(1000, 1000, 5000, 2000, name="rect", style="box", text="矩形\n第二段")
+        page.text(1000, 4000, 8000, 1000, "a  b\tc & <d>", name="caption", font_color=0xFF0000)
+        page.line(0, 0, 1000, 1000, name="line")
+        with page.group("group") as group:
+            group.ellipse(0, 0, 100, 100, name="member1", text="m1")
+            group.text(0, 200, 100, 100, "m2", name="member2")
+        builder.add_page().text(0, 0, 100, 100, "page 2", name="p2")
+        return builder
+
+    def test_package(self):
+        data = self.build().to_bytes()
+        with zipfile.ZipFile(io.BytesIO(data)) as package:
+            infos = package.infolist()
+            self.assertEqual(infos[0].filename, "mimetype")
+            self.assertEqual(infos[0].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(package.read("mimetype").decode("ascii"), MIMETYPE)
+            self.assertIsNone(package.testzip())
+            manifest = package.read("META-INF/manifest.xml").decode("utf-8")
+            for name in ("content.xml", "styles.xml", "meta.xml"):
+                self.assertIn(f'manifest:full-path="{name}"', manifest)
+                ET.fromstring(package.read(name))
+
+    def test_load_back(self):
+        path = self.build().save(os.path.join(self.temp_dir, "built.odg"))
+        shapes = {shape["shape_name"]: shape for shape in parse_odg(path)}
+        self.assertEqual(shapes["rect"]["text"], "矩形\n第二段")
+        self.assertEqual(shapes["caption"]["text"], "a  b\tc & <d>")
+        self.assertEqual(shapes["line"]["text"], "")
+        self.assertEqual(shapes["group"]["path"], [3])
+        self.assertEqual(shapes["member1"]["path"], [3, 0])
+        self.assertEqual(shapes["member2"]["text"], "m2")
+        self.assertEqual(shapes["p2"]["page_number"], 2)
+
+    def test_shared_automatic_styles(self):
+        builder = ODGBuilder()
+        page = builder.add_page()
+        page.rectangle(0, 0, 10, 10, fill_color=0x123456)
+        page.rectangle(0, 0, 10, 10, fill_color=0x123456)
+        page.rectangle(0, 0, 10, 10, fill_color=0x654321)
+        self.assertEqual(len(builder._automatic), 2)
+
+    def test_spec(self):
+        path = os.path.join(self.temp_dir, "spec.odg")
+        write_odg(path, {
+            "styles": {"title": {"font_size": 20}},
+            "pages": [{"name": "p", "shapes": [
+                {"type": "text", "x": 0, "y": 0, "width": 100, "height": 100, "text": "标题", "name": "t",
+                 "style": "title"},
+                {"type": "group", "name": "g", "shapes": [
+                    {"type": "rectangle", "x": 0, "y": 0, "width": 10, "height": 10, "name": "r"}]}]}]
+        })
+        self.assertEqual([(s["shape_name"], s["path"]) for s in parse_odg(path)],
+                         [("t", [0]), ("g", [1]), ("r", [1, 0])])
+
+    def test_empty_document_has_one_page(self):
+        path = os.path.join(self.temp_dir, "empty.odg")
+        write_odg(path)
+        with zipfile.ZipFile(path) as package:
+            self.assertEqual(package.read("content.xml").count(b"<draw:page "), 1)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            ODGBuilder().add_page().rectangle(0, 0, 1, 1, style="missing")
+        with self.assertRaises(ValueError):
+            ODGBuilder.from_spec({"pages": [{"shapes": [{"type": "star"}]}]})
+
+@unittest.skipUnless(SOFFICE, "需要LibreOffice（uno模块和soffice）")
+class UnoLoadBackTest(unittest.TestCase):
+    """在office中加载odg_writer写出的文档"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp(prefix="odg-test-writer-uno-")
+        cls.profile_dir = tempfile.mkdtemp(prefix="odg-test-profile-")
+        cls.office = OfficeInstance(soffice_path=SOFFICE, profile_dir=cls.profile_dir,
+                                    accept=build_accept(port=find_free_port(2100)), startup_timeout=120)
+        cls.desktop = cls.office.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.office.kill()
+        shutil.rmtree(cls.profile_dir, ignore_errors=True)
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def load(self, builder):
+        path = builder.save(os.path.join(self.temp_dir, f"{self.id()}.odg"))
+        properties = (PropertyValue("Hidden", 0, True, 0), PropertyValue("ReadOnly", 0, True, 0))
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(path)), "_blank", 0, properties)
+        self.assertIsNotNone(document, "office无法加载生成的文档")
+        self.addCleanup(document.close, True)
+        return document
+
+    def test_shapes(self):
+        builder = ODGBuilder(page_width=29700, page_height=21000)
+        builder.add_style("box", fill_color=0xEEEEEE, font_size=12)
+        page = builder.add_page("first")
+        page.rectangle(1000, 1000, 5000, 2000, name="rect", style="box", text="矩形\n第二段")
+        page.ellipse(7000, 1000, 3000, 2000, name="ellipse", text="椭圆")
+        page.text(1000, 4000, 8000, 1000, "a  b\tc & <d>", name="caption", font_color=0xFF0000)
+        page.line(1000, 6000, 4000, 8000, name="line")
+        with page.group("group") as group:
+            group.rectangle(0, 10000, 1000, 1000, name="member1")
+            group.text(1500, 10000, 3000, 1000, "组合", name="member2")
+        builder.add_page().text(0, 0, 1000, 1000, "page 2", name="p2")
+
+        document = self.load(builder)
+        pages = document.getDrawPages()
+        self.assertEqual(pages.getCount(), 2)
+        page = pages.getByIndex(0)
+        self.assertEqual(page.Width, 29700)
+        expected = [
+            ("rect", "com.sun.star.drawing.RectangleShape", (1000, 1000), "矩形\n第二段"),
+            ("ellipse", "com.sun.star.drawing.EllipseShape", (7000, 1000), "椭圆"),
+            ("caption", "com.sun.star.drawing.TextShape", (1000, 4000), "a  b\tc & <d>"),
+            ("line", "com.sun.star.drawing.LineShape", (1000, 6000), None),
+            ("group", "com.sun.star.drawing.GroupShape", None, None),
+        ]
+        self.assertEqual(page.getCount(), len(expected))
+        for j, (name, shape_type, position, text) in enumerate(expected):
+            shape = page.getByIndex(j)
+            self.assertEqual((shape.Name, shape.getShapeType()), (name, shape_type))
+            if position is not None:
+                self.assertLessEqual(abs(shape.getPosition().X - position[0]), 1)
+                self.assertLessEqual(abs(shape.getPosition().Y - position[1]), 1)
+            if text is not None:
+                # office读出的段落以换行分隔
+                self.assertEqual(shape.getString().replace("\r\n", "\n").replace("\r", "\n"), text)
+        group = page.getByIndex(4)
+        self.assertEqual([group.getByIndex(i).Name for i in range(group.getCount())], ["member1", "member2"])
+        self.assertEqual(pages.getByIndex(1).getByIndex(0).getString(), "page 2")
+
+    def test_empty_document(self):
+        document = self.load(ODGBuilder())
+        self.assertEqual(document.getDrawPages().getCount(), 1)
+
+if __name__ == "__main__":
+    unittest.main()